@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from ..db.api_key_table import Client, APIKeyNotFoundException
+from .authorizer import Authorizer
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Seconds the key info of a known API key is used before it is read again (0 disables caching)
+API_KEY_CACHE_SECONDS = float(os.environ.get('API_KEY_CACHE_SECONDS', '300'))
+# Seconds a key that was not in the table (and was registered without roles) is cached
+API_KEY_NEGATIVE_CACHE_SECONDS = float(os.environ.get('API_KEY_NEGATIVE_CACHE_SECONDS', '30'))
+# Seconds between reads of the table version; a new version drops every cached key
+API_KEY_VERSION_CHECK_SECONDS = float(os.environ.get('API_KEY_VERSION_CHECK_SECONDS', '15'))
+API_KEY_CACHE_MAX_ENTRIES = int(os.environ.get('API_KEY_CACHE_MAX_ENTRIES', '1000'))
+# Authorization decisions kept per key, one per distinct (path, affiliation) requested
+API_KEY_CACHE_MAX_DECISIONS = int(os.environ.get('API_KEY_CACHE_MAX_DECISIONS', '64'))
+
+
+def load_key_info(db_client, api_key):
+    """ Will retrieve the key info of an API key, registering keys that are
+    not in the database yet with no roles or affiliations.
+
+    args:
+        db_client: api_key_table.Client
+        api_key: value of the api key
+    returns:
+        (key_info, found): key_info as returned by get_key_info, and
+            whether the key was already in the database.
+    """
+    try:
+        return db_client.get_key_info(api_key), True
+    except APIKeyNotFoundException:
+        # API Gateway already validated the key. Add it with no roles
+        # or affiliations; that cannot revoke anything, so other
+        # containers do not need to drop their caches.
+        db_client.put_or_overwrite_key(api_key, bump_version=False)
+        return { Client.ROLES_COLNAME: [], Client.AFFILIATIONS_COLNAME: [] }, False
+
+
+class CachedKey:
+    """ The key info of an API key and the authorization decisions made for it. """
+
+    __slots__ = ('key_info', 'expires_at', 'decisions')
+
+    def __init__(self, key_info, expires_at):
+        self.key_info = key_info
+        self.expires_at = expires_at
+        # (path, affiliation) -> authorized, least recently used first
+        self.decisions = OrderedDict()
+
+
+class KeyAuthorizationCache:
+    """ Warm-container cache of API key info and authorization decisions.
+
+    Known keys are cached for `ttl` seconds and keys that had to be registered
+    for `negative_ttl` seconds, so roles granted to a new key show up quickly.
+    At most every `version_check_interval` seconds the table version is read;
+    when a key was changed or deleted since (see Client.bump_table_version)
+    every cached key is dropped, which bounds how long a revoked key is still
+    honoured. At most `max_entries` keys are kept, least recently used first out.
+
+    Decisions are Authorizer.authorize results, memoized per key by the parts of
+    the event the authorizer looks at: the path and the affiliation parameter.
+    """
+
+    def __init__(self, ttl=None, negative_ttl=None, version_check_interval=None, max_entries=None,
+                 max_decisions=None, authorizer=None, clock=time.monotonic):
+        self.ttl = API_KEY_CACHE_SECONDS if ttl is None else ttl
+        self.negative_ttl = API_KEY_NEGATIVE_CACHE_SECONDS if negative_ttl is None else negative_ttl
+        self.version_check_interval = API_KEY_VERSION_CHECK_SECONDS if version_check_interval is None else version_check_interval
+        self.max_entries = API_KEY_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_decisions = API_KEY_CACHE_MAX_DECISIONS if max_decisions is None else max_decisions
+        self.authorizer = authorizer or Authorizer()
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._version_checked_at = None
+        self._lock = threading.Lock()
+
+    def authorize(self, db_client, api_key, event):
+        """ Will determine if the API key is authorized to make the call in event,
+        reading the key info from the database only when it is not cached.
+
+        args:
+            db_client: api_key_table.Client
+            api_key: value of the api key
+            event: (dict) The event object passed from API Gateway
+        returns:
+            authorized: (bool)
+        """
+        if self.ttl <= 0:
+            key_info, _ = load_key_info(db_client, api_key)
+            return self.authorizer.authorize(key_info, event)
+
+        entry = self._get_entry(db_client, api_key)
+        decision_key = self._decision_key(event)
+
+        with self._lock:
+            authorized = entry.decisions.get(decision_key)
+            if authorized is not None:
+                entry.decisions.move_to_end(decision_key)
+                return authorized
+
+        authorized = self.authorizer.authorize(entry.key_info, event)
+
+        with self._lock:
+            entry.decisions[decision_key] = authorized
+            while len(entry.decisions) > self.max_decisions:
+                entry.decisions.popitem(last=False)
+
+        return authorized
+
+    def invalidate(self, api_key=None):
+        """ Will drop the cached key info of api_key, or of every key. """
+        with self._lock:
+            if api_key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(api_key, None)
+
+    def _get_entry(self, db_client, api_key):
+        self._check_version(db_client)
+        now = self.clock()
+
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is not None and now < entry.expires_at:
+                self._entries.move_to_end(api_key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        key_info, found = load_key_info(db_client, api_key)
+        entry = CachedKey(key_info, now + (self.ttl if found else self.negative_ttl))
+
+        with self._lock:
+            self._entries[api_key] = entry
+            self._entries.move_to_end(api_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def _check_version(self, db_client):
+        now = self.clock()
+        if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+            return
+
+        try:
+            version = db_client.get_table_version()
+        except Exception as e:
+            # Keep serving cached keys (still bounded by their TTL) and retry on the next interval
+            logger.warning(f"Could not read the API key table version: {e}")
+            self._version_checked_at = now
+            return
+
+        with self._lock:
+            if self._version is not None and version != self._version:
+                logger.info(f"API key table version changed to {version}, dropping {len(self._entries)} cached keys")
+                self._entries.clear()
+            self._version = version
+            self._version_checked_at = now
+
+    @staticmethod
+    def _decision_key(event):
+        query_string_parameters = event.get('queryStringParameters') or {}
+        return (event.get('path'), query_string_parameters.get('affiliation'))
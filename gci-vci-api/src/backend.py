@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+import threading
+
+import boto3
+
+import logging
+logger = logging.getLogger(__name__)
+
+# How the proxy calls the backend (gci-vci-serverless):
+#   'lambda'    - synchronous lambda.invoke of BACKEND_FUNCTION_ARN (a second Lambda execution)
+#   'inprocess' - run the backend router (src.app) in this Lambda, falling back to
+#                 'lambda' when the backend cannot be imported
+BACKEND_MODE = os.environ.get('BACKEND_MODE', 'lambda')
+
+# Directory holding the backend's `src` package (e.g. a Lambda layer path). When it is not
+# set, the backend modules are expected to be packaged into this service's `src` package.
+BACKEND_SOURCE_DIR = os.environ.get('BACKEND_SOURCE_DIR', '')
+
+_backend_router = None
+_backend_router_failed = False
+_backend_router_lock = threading.Lock()
+_lambda_client = None
+
+
+def call_backend(event, context=None):
+    """ Will run the backend request for event and return its response.
+
+    args:
+        event: (dict) The event object passed from API Gateway
+        context: The Lambda context of this invocation
+    returns:
+        response: (dict) The backend's response, with at least 'body'
+    """
+    if BACKEND_MODE == 'inprocess':
+        router = _get_backend_router()
+        if router is not None:
+            return router.handler(event, context)
+
+    return invoke_backend_function(event)
+
+
+def invoke_backend_function(event):
+    """ Will forward event to the backend Lambda and return its decoded response. """
+    global _lambda_client
+
+    if _lambda_client is None:
+        _lambda_client = boto3.client("lambda")
+
+    resp = _lambda_client.invoke(
+        FunctionName=os.environ['BACKEND_FUNCTION_ARN'],
+        Payload=json.dumps(event)
+    )
+
+    return json.loads(resp['Payload'].read())
+
+
+def _get_backend_router():
+    """ Will import the backend router (src.app) once per container. Returns
+    None, and keeps returning None, when it cannot be imported. """
+    global _backend_router
+    global _backend_router_failed
+
+    if _backend_router is not None or _backend_router_failed:
+        return _backend_router
+
+    with _backend_router_lock:
+        if _backend_router is None and not _backend_router_failed:
+            try:
+                if BACKEND_SOURCE_DIR:
+                    _merge_backend_packages(BACKEND_SOURCE_DIR)
+                import src.app as backend_router
+                _backend_router = backend_router
+                logger.info("Running backend router in-process")
+            except Exception:
+                _backend_router_failed = True
+                logger.exception("Could not import the backend router, invoking the backend function instead")
+
+    return _backend_router
+
+
+def _merge_backend_packages(source_dir):
+    """ Will make the backend's modules importable as part of this service's packages.
+
+    Both services keep their code in a `src` package, without sharing module names
+    (their `__init__.py` files are empty), so the backend's directories are appended to
+    the search path of `src` and of the subpackages already imported from this service
+    (e.g. `src.db`). Backend subpackages imported later resolve through these paths.
+    """
+    for name, module in list(sys.modules.items()):
+        if name != 'src' and not name.startswith('src.'):
+            continue
+
+        package_path = getattr(module, '__path__', None)
+        if package_path is None:
+            continue
+
+        backend_path = os.path.join(source_dir, *name.split('.'))
+        if os.path.isdir(backend_path) and backend_path not in package_path:
+            package_path.append(backend_path)
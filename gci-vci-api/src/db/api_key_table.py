@@ -11,6 +11,10 @@ class Client:
     PARTITION_KEY='api_key_value'
     ROLES_COLNAME='roles'
     AFFILIATIONS_COLNAME='affiliations'
+    # An item (not an API key) whose counter is bumped whenever a key changes,
+    # so warm containers know when their cached key info is stale.
+    VERSION_KEY_VALUE='__api_key_table_version__'
+    VERSION_COLNAME='version'
 
     def __init__(self, table_name, is_offline=False):
         logger.info(f"Setting table name: {table_name}")
@@ -50,7 +54,7 @@ class Client:
 
         return data
 
-    def put_or_overwrite_key(self, api_key, roles=None, affiliations=None):
+    def put_or_overwrite_key(self, api_key, roles=None, affiliations=None, bump_version=True):
         """ Will create a new item in the database for the specified key value 
         or overwrite an existing value if the key already exists
 
@@ -58,6 +62,7 @@ class Client:
             api_key: Value of api key
             roles: List of roles to associate with api key
             affiliations: List of affiliation ids to associate with key
+            bump_version: Bump the table version, so cached key info is dropped
         returns:
             success: (bool) If the operation was successful.
         """
@@ -77,6 +82,9 @@ class Client:
 
         logger.info(f"put or overwrite item. Response: {response}")
 
+        if bump_version:
+            self.bump_table_version()
+
         return True
 
     def delete_key(self, api_key):
@@ -97,7 +105,44 @@ class Client:
 
         logger.info(f"Delete item. Response: {response}")
 
+        self.bump_table_version()
+
         return True
+
+    def get_table_version(self):
+        """ Will retrieve the version of the API key table, which changes
+        whenever a key is added, changed or deleted through this client.
+
+        returns:
+            version: (int) 0 if no key was ever changed
+        """
+        response = self.table.get_item(
+            Key={
+                self.PARTITION_KEY: self.VERSION_KEY_VALUE
+            },
+            ProjectionExpression='#version',
+            ExpressionAttributeNames={ '#version': self.VERSION_COLNAME }
+        )
+
+        return int(response.get('Item', {}).get(self.VERSION_COLNAME, 0))
+
+    def bump_table_version(self):
+        """ Will atomically increment the version of the API key table
+
+        returns:
+            version: (int) the new version
+        """
+        response = self.table.update_item(
+            Key={
+                self.PARTITION_KEY: self.VERSION_KEY_VALUE
+            },
+            UpdateExpression='ADD #version :one',
+            ExpressionAttributeNames={ '#version': self.VERSION_COLNAME },
+            ExpressionAttributeValues={ ':one': 1 },
+            ReturnValues='UPDATED_NEW'
+        )
+
+        return int(response['Attributes'][self.VERSION_COLNAME])
         
     
 class APIKeyNotFoundException(Exception):
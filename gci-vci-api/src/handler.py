@@ -1,16 +1,18 @@
 import json
 import os
-import boto3
 
-from src.db.api_key_table import (
-    Client,
-    APIKeyNotFoundException
-)
-from src.authorization.authorizer import Authorizer
+from src import backend
+from src.db.api_key_table import Client
+from src.authorization.key_cache import KeyAuthorizationCache
 
 import logging
 logger = logging.getLogger("gci-vci-api-main")
 
+# Created on first use and kept for the life of the container
+_db_client = None
+# Key info and authorization decisions of the API keys seen by this container
+key_cache = KeyAuthorizationCache()
+
 def handler(event, context):
 
     # Configure the logging module
@@ -18,26 +20,11 @@ def handler(event, context):
 
     logger.info(json.dumps(event))
 
-    # Create the database connection
-    table_name = os.environ['API_DYNAMO_TABLE_NAME']
-    db_client = Client(table_name)
-
-    # Get the key information from the database. If it's not present
-    # create an empty item with the key as the value.
+    # Determine if the API Key is authorized to make this call. The key
+    # information is read from the database unless this container has it
+    # cached; keys that are not present are added with no roles or affiliations.
     api_key = event['headers']['x-api-key']
-    key_info = None
-    try:
-        key_info = db_client.get_key_info(api_key)
-    except APIKeyNotFoundException:
-        # If the api key is not in the database, add it
-        # with no roles or affiliations
-        db_client.put_or_overwrite_key(api_key)
-        key_info = db_client.get_key_info(api_key)
-        
-
-    # Determine if the API Key is authorized to make this call.
-    authorizer = Authorizer()
-    if not authorizer.authorize(key_info, event):
+    if not key_cache.authorize(_get_db_client(), api_key, event):
         logger.info("Authorizer: not authorized")
         return {
             "statusCode": 403,
@@ -45,18 +32,10 @@ def handler(event, context):
         }
 
     logger.info("Authorized.")
-    function_name = os.environ['BACKEND_FUNCTION_ARN']
-
-    # Since we are here, we're authorized. So forward the 
-    # call onto the lambda which supports the backend.
-    lambda_client = boto3.client("lambda")
-    resp = lambda_client.invoke(
-        FunctionName=function_name,
-        Payload=json.dumps(event)
-    )
-
-    # Return the response from the other API.
-    response_body = json.loads(resp['Payload'].read())
+
+    # Since we are here, we're authorized. So run the call on the
+    # backend, in this Lambda or by invoking the backend's (see src.backend).
+    response_body = backend.call_backend(event, context)
     body = response_body['body']
     
     response = {
@@ -66,6 +45,14 @@ def handler(event, context):
 
     return response
 
+def _get_db_client():
+    global _db_client
+
+    if _db_client is None:
+        _db_client = Client(os.environ['API_DYNAMO_TABLE_NAME'])
+
+    return _db_client
+
 def _configure_logging():
     default_level = logging.WARN
     level = default_level
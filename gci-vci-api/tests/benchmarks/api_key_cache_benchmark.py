@@ -0,0 +1,114 @@
+""" Load test of the proxy handler's API key authorization, with and without the key cache.
+
+Run from the gci-vci-api directory:
+
+    python -m tests.benchmarks.api_key_cache_benchmark [request count]
+
+The key table is a moto stand-in for DynamoDB with a simulated round trip added to
+every read. The backend Lambda is replaced by a stub that answers at once, so the
+per-request latency reported is the proxy's own: authorization plus forwarding.
+Requests are spread over KEY_COUNT keys and a few paths and affiliations.
+"""
+
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+TABLE_NAME = 'BENCHMARK-API-KEYS'
+DEFAULT_REQUEST_COUNT = 2000
+KEY_COUNT = 50
+SIMULATED_LATENCY_MS = [0, 5]
+
+
+class StubPayload:
+    def read(self):
+        return json.dumps({ 'statusCode': 200, 'body': '[]' })
+
+
+class StubLambda:
+    def invoke(self, FunctionName, Payload):
+        return { 'Payload': StubPayload() }
+
+
+def with_latency(operation, latency_ms):
+    def delayed_operation(**kwargs):
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        return operation(**kwargs)
+    return delayed_operation
+
+
+def build_events(request_count):
+    rng = random.Random(0)
+    events = []
+    for _ in range(request_count):
+        key_index = rng.randrange(KEY_COUNT)
+        events.append({
+            'path': rng.choice(['/snapshots', '/snapshots', '/affiliations']),
+            'headers': { 'x-api-key': f'key-{key_index}' },
+            'queryStringParameters': { 'affiliation': rng.choice(['10007', '10008']) },
+        })
+    return events
+
+
+def run(request_count):
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ['API_DYNAMO_TABLE_NAME'] = TABLE_NAME
+    os.environ['BACKEND_FUNCTION_ARN'] = 'backend'
+    os.environ['LOGGING_LEVEL'] = 'WARN'
+
+    from src import handler
+    from src.authorization.key_cache import KeyAuthorizationCache
+    from src.db.api_key_table import Client
+    from src import backend
+    backend.BACKEND_MODE = 'lambda'
+    backend._lambda_client = StubLambda()
+    # The modules log every key read at INFO; keep the output to the results
+    logging.disable(logging.INFO)
+    events = build_events(request_count)
+
+    print(f'{"rtt ms":>8} {"cache":>6} {"requests":>10} {"p50 ms":>8} {"p95 ms":>8} {"mean ms":>8} {"db reads":>10}')
+    for latency_ms in SIMULATED_LATENCY_MS:
+        for cached in (False, True):
+            with mock_aws():
+                boto3.client('dynamodb').create_table(
+                    TableName=TABLE_NAME,
+                    AttributeDefinitions=[{ 'AttributeName': Client.PARTITION_KEY, 'AttributeType': 'S' }],
+                    KeySchema=[{ 'AttributeName': Client.PARTITION_KEY, 'KeyType': 'HASH' }],
+                    BillingMode='PAY_PER_REQUEST'
+                )
+                db_client = Client(TABLE_NAME)
+                for key_index in range(KEY_COUNT):
+                    db_client.put_or_overwrite_key(f'key-{key_index}', ['curator'] if key_index % 5 else ['admin'], ['10007'])
+
+                reads = []
+                get_item = with_latency(db_client.table.get_item, latency_ms)
+                def counted_get_item(**kwargs):
+                    reads.append(kwargs['Key'])
+                    return get_item(**kwargs)
+                db_client.table.get_item = counted_get_item
+                handler._db_client = db_client
+                handler.key_cache = KeyAuthorizationCache(ttl=300 if cached else 0)
+
+                timings = []
+                for event in events:
+                    start = time.perf_counter()
+                    handler.handler(event, None)
+                    timings.append((time.perf_counter() - start) * 1000)
+
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95)]
+                print(f'{latency_ms:>8} {"on" if cached else "off":>6} {request_count:>10} {statistics.median(timings):>8.3f} {p95:>8.3f} {statistics.mean(timings):>8.3f} {len(reads):>10}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUEST_COUNT)
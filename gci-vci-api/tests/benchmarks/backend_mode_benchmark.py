@@ -0,0 +1,117 @@
+""" Compares the proxy's two backend modes: invoking the backend Lambda against running its router in-process.
+
+Run from the gci-vci-api directory, next to a checkout of gci-vci-serverless:
+
+    python -m tests.benchmarks.backend_mode_benchmark [request count]
+
+Requests are GET /affiliations?target=api from an admin key, which the backend answers from
+local-files/affiliations.json without a database. In 'lambda' mode the invoke is simulated in
+this process: the event and the response are JSON encoded and decoded as they are for
+lambda.invoke, the backend router runs as the second function, and SIMULATED_INVOKE_MS is
+added for the invoke round trip. The cost columns price both functions' billed durations
+(1 ms granularity) and requests, at the default 1024 MB, per million requests.
+"""
+
+import io
+import json
+import logging
+import math
+import os
+import statistics
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'gci-vci-serverless'))
+TABLE_NAME = 'BENCHMARK-API-KEYS'
+DEFAULT_REQUEST_COUNT = 500
+SIMULATED_INVOKE_MS = [0, 15]
+
+MEMORY_GB = 1024 / 1024
+PRICE_PER_GB_SECOND = 0.0000166667
+PRICE_PER_REQUEST = 0.20 / 1000000
+
+
+class SimulatedLambda:
+    """ Runs the backend router as lambda.invoke would: JSON in, JSON out, after a round trip. """
+
+    def __init__(self, router, invoke_ms):
+        self.router = router
+        self.invoke_ms = invoke_ms
+        self.backend_ms = []
+
+    def invoke(self, FunctionName, Payload):
+        if self.invoke_ms:
+            time.sleep(self.invoke_ms / 1000)
+        start = time.perf_counter()
+        response = self.router.handler(json.loads(Payload), None)
+        payload = json.dumps(response)
+        self.backend_ms.append((time.perf_counter() - start) * 1000)
+        return { 'Payload': io.StringIO(payload) }
+
+
+def billed_cost(durations_ms):
+    gb_seconds = sum(math.ceil(duration) for duration in durations_ms) / 1000 * MEMORY_GB
+    return gb_seconds * PRICE_PER_GB_SECOND + len(durations_ms) * PRICE_PER_REQUEST
+
+
+def run(request_count):
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ['API_DYNAMO_TABLE_NAME'] = TABLE_NAME
+    os.environ['BACKEND_FUNCTION_ARN'] = 'backend'
+    os.environ['LOGGING_LEVEL'] = 'WARN'
+    # Read by the backend's controllers
+    os.environ.setdefault('DB_TABLE_NAME', 'BENCHMARK-GCI-VCI')
+    os.environ['LOCAL_FILE_DIR'] = os.path.join(BACKEND_DIR, 'local-files')
+
+    from src import backend, handler
+    from src.db.api_key_table import Client
+    backend.BACKEND_SOURCE_DIR = BACKEND_DIR
+    router = backend._get_backend_router()
+    assert router is not None, 'gci-vci-serverless could not be imported from ' + BACKEND_DIR
+    logging.disable(logging.INFO)
+
+    event = {
+        'path': '/affiliations',
+        'httpMethod': 'GET',
+        'headers': { 'x-api-key': 'admin-key' },
+        'queryStringParameters': { 'target': 'api' },
+        'multiValueQueryStringParameters': { 'target': ['api'] },
+    }
+
+    print(f'{"invoke ms":>10} {"mode":>10} {"requests":>10} {"p50 ms":>8} {"p95 ms":>8} {"executions":>11} {"$ per 1M":>10}')
+    with mock_aws():
+        boto3.client('dynamodb').create_table(
+            TableName=TABLE_NAME,
+            AttributeDefinitions=[{ 'AttributeName': Client.PARTITION_KEY, 'AttributeType': 'S' }],
+            KeySchema=[{ 'AttributeName': Client.PARTITION_KEY, 'KeyType': 'HASH' }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        Client(TABLE_NAME).put_or_overwrite_key('admin-key', ['admin'])
+
+        for invoke_ms in SIMULATED_INVOKE_MS:
+            for mode in ('lambda', 'inprocess'):
+                backend.BACKEND_MODE = mode
+                backend._lambda_client = SimulatedLambda(router, invoke_ms)
+                # warm up: key cache, backend imports
+                assert handler.handler(dict(event), None)['statusCode'] == 200
+                backend._lambda_client.backend_ms.clear()
+
+                timings = []
+                for _ in range(request_count):
+                    start = time.perf_counter()
+                    handler.handler(dict(event), None)
+                    timings.append((time.perf_counter() - start) * 1000)
+
+                backend_ms = backend._lambda_client.backend_ms
+                cost = (billed_cost(timings) + billed_cost(backend_ms)) / request_count * 1000000
+                timings.sort()
+                print(f'{invoke_ms:>10} {mode:>10} {request_count:>10} {statistics.median(timings):>8.2f} {timings[int(len(timings) * 0.95)]:>8.2f} {1 + (1 if backend_ms else 0):>11} {cost:>10.2f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUEST_COUNT)
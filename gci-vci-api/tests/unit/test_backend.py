@@ -0,0 +1,80 @@
+import io
+import json
+import sys
+
+import pytest
+
+import src
+import src.db
+from src import backend
+
+BACKEND_APP = '''
+from src.db import backend_store
+
+def handler(event, context):
+    return { 'statusCode': 200, 'body': backend_store.body_for(event['path']) }
+'''
+
+BACKEND_STORE = '''
+def body_for(path):
+    return 'in-process ' + path
+'''
+
+class StubLambda:
+    def __init__(self):
+        self.payloads = []
+
+    def invoke(self, FunctionName, Payload):
+        self.payloads.append(json.loads(Payload))
+        return { 'Payload': io.StringIO(json.dumps({ 'statusCode': 200, 'body': 'remote' })) }
+
+@pytest.fixture
+def stub_lambda(monkeypatch):
+    stub = StubLambda()
+    monkeypatch.setenv('BACKEND_FUNCTION_ARN', 'backend-function')
+    monkeypatch.setattr(backend, '_lambda_client', stub)
+    return stub
+
+@pytest.fixture
+def backend_source(monkeypatch, tmp_path):
+    ''' A stand-in for the backend's source directory, with a router using a `src.db` module. '''
+
+    (tmp_path / 'src' / 'db').mkdir(parents=True)
+    (tmp_path / 'src' / '__init__.py').write_text('')
+    (tmp_path / 'src' / 'db' / '__init__.py').write_text('')
+    (tmp_path / 'src' / 'app.py').write_text(BACKEND_APP)
+    (tmp_path / 'src' / 'db' / 'backend_store.py').write_text(BACKEND_STORE)
+
+    monkeypatch.setattr(src, '__path__', list(src.__path__))
+    monkeypatch.setattr(src.db, '__path__', list(src.db.__path__))
+    monkeypatch.setattr(backend, '_backend_router', None)
+    monkeypatch.setattr(backend, '_backend_router_failed', False)
+    monkeypatch.setattr(backend, 'BACKEND_MODE', 'inprocess')
+    monkeypatch.setattr(backend, 'BACKEND_SOURCE_DIR', str(tmp_path))
+    yield tmp_path
+    for name in ('src.app', 'src.db.backend_store'):
+        sys.modules.pop(name, None)
+
+def test_lambda_mode_invokes_the_backend_function(stub_lambda, monkeypatch):
+    monkeypatch.setattr(backend, 'BACKEND_MODE', 'lambda')
+
+    response = backend.call_backend({ 'path': '/snapshots' })
+
+    assert response == { 'statusCode': 200, 'body': 'remote' }
+    assert stub_lambda.payloads == [{ 'path': '/snapshots' }]
+
+def test_inprocess_mode_runs_the_backend_router(stub_lambda, backend_source):
+    assert backend.call_backend({ 'path': '/snapshots' }) == { 'statusCode': 200, 'body': 'in-process /snapshots' }
+    assert backend.call_backend({ 'path': '/affiliations' })['body'] == 'in-process /affiliations'
+
+    assert stub_lambda.payloads == []
+    # this service's modules are still importable next to the backend's
+    from src.db.api_key_table import Client
+    assert Client.PARTITION_KEY == 'api_key_value'
+
+def test_inprocess_mode_falls_back_to_the_backend_function(stub_lambda, backend_source):
+    (backend_source / 'src' / 'app.py').write_text('import a_module_the_proxy_does_not_have\n')
+
+    assert backend.call_backend({ 'path': '/snapshots' })['body'] == 'remote'
+    assert backend.call_backend({ 'path': '/gdms' })['body'] == 'remote'
+    assert [payload['path'] for payload in stub_lambda.payloads] == ['/snapshots', '/gdms']
@@ -0,0 +1,115 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from src.authorization.key_cache import KeyAuthorizationCache
+from src.db.api_key_table import Client
+
+TABLE_NAME = 'TEST-API-KEYS'
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def db_client(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-west-2')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        boto3.client('dynamodb').create_table(
+            TableName=TABLE_NAME,
+            AttributeDefinitions=[{ 'AttributeName': Client.PARTITION_KEY, 'AttributeType': 'S' }],
+            KeySchema=[{ 'AttributeName': Client.PARTITION_KEY, 'KeyType': 'HASH' }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        client = Client(TABLE_NAME)
+        client.reads = []
+        get_item = client.table.get_item
+        def counted_get_item(**kwargs):
+            client.reads.append(kwargs['Key'][Client.PARTITION_KEY])
+            return get_item(**kwargs)
+        client.table.get_item = counted_get_item
+        yield client
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(clock):
+    return KeyAuthorizationCache(ttl=300, negative_ttl=30, version_check_interval=15, max_entries=2, clock=clock)
+
+def key_reads(db_client):
+    return [key for key in db_client.reads if key != Client.VERSION_KEY_VALUE]
+
+def affiliation_event(affiliation, path='/snapshots'):
+    return { 'path': path, 'queryStringParameters': { 'affiliation': affiliation } }
+
+def test_key_info_and_decisions_are_cached(db_client, cache):
+    db_client.put_or_overwrite_key('curator-key', ['curator'], ['10007'])
+
+    for _ in range(3):
+        assert cache.authorize(db_client, 'curator-key', affiliation_event('10007')) == True
+        assert cache.authorize(db_client, 'curator-key', affiliation_event('10008')) == False
+        assert cache.authorize(db_client, 'curator-key', affiliation_event('10007', '/affiliations')) == False
+
+    assert key_reads(db_client) == ['curator-key']
+    assert (cache.hits, cache.misses) == (8, 1)
+
+def test_unknown_keys_are_registered_and_cached_briefly(db_client, cache, clock):
+    assert cache.authorize(db_client, 'new-key', affiliation_event('10007')) == False
+    assert db_client.get_key_info('new-key') == { 'roles': [], 'affiliations': [] }
+    db_client.reads.clear()
+
+    # Roles granted directly in the table (without bumping the version) show up after the negative TTL
+    db_client.table.put_item(Item={ Client.PARTITION_KEY: 'new-key', 'roles': ['admin'], 'affiliations': [] })
+    clock.now += 10
+    assert cache.authorize(db_client, 'new-key', affiliation_event('10007')) == False
+    clock.now += 21
+    assert cache.authorize(db_client, 'new-key', affiliation_event('10007')) == True
+    assert key_reads(db_client) == ['new-key']
+
+def test_changed_keys_are_dropped_on_the_next_version_check(db_client, cache, clock):
+    db_client.put_or_overwrite_key('admin-key', ['admin'])
+    assert cache.authorize(db_client, 'admin-key', affiliation_event('10007', '/affiliations')) == True
+
+    # Revoked through the client, which bumps the table version
+    db_client.put_or_overwrite_key('admin-key', ['curator'])
+    clock.now += 5
+    assert cache.authorize(db_client, 'admin-key', affiliation_event('10007', '/affiliations')) == True
+    clock.now += 11
+    assert cache.authorize(db_client, 'admin-key', affiliation_event('10007', '/affiliations')) == False
+
+    db_client.delete_key('admin-key')
+    clock.now += 16
+    assert cache.authorize(db_client, 'admin-key', affiliation_event('10007', '/affiliations')) == False
+    # the deleted key was registered again, with no roles
+    assert db_client.get_key_info('admin-key') == { 'roles': [], 'affiliations': [] }
+
+def test_keys_expire_and_memory_is_bounded(db_client, cache, clock):
+    for api_key in ['key-1', 'key-2', 'key-3']:
+        db_client.put_or_overwrite_key(api_key, ['curator'], ['10007'])
+        cache.authorize(db_client, api_key, affiliation_event('10007'))
+    db_client.reads.clear()
+
+    # key-1 was evicted (max_entries=2), key-3 is still cached
+    cache.authorize(db_client, 'key-3', affiliation_event('10007'))
+    cache.authorize(db_client, 'key-1', affiliation_event('10007'))
+    assert key_reads(db_client) == ['key-1']
+
+    clock.now += 301
+    cache.authorize(db_client, 'key-1', affiliation_event('10007'))
+    assert key_reads(db_client) == ['key-1', 'key-1']
+
+def test_zero_ttl_disables_the_cache(db_client, clock):
+    cache = KeyAuthorizationCache(ttl=0, clock=clock)
+    db_client.put_or_overwrite_key('curator-key', ['curator'], ['10007'])
+
+    for _ in range(3):
+        assert cache.authorize(db_client, 'curator-key', affiliation_event('10007')) == True
+
+    assert key_reads(db_client) == ['curator-key'] * 3
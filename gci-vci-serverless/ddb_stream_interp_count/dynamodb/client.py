@@ -4,13 +4,27 @@
 # available at http://aws.amazon.com/agreement or other written agreement between
 # Customer and either Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
 
+import time
+
 import boto3
 from boto3.dynamodb.conditions import Key
-    
+
+# BatchGetItem reads at most 100 keys per request
+BATCH_GET_SIZE = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+
+def projection_expression(names):
+    """ Will return ProjectionExpression request parameters reading the attributes
+    in names through placeholders, so reserved words can be projected. """
+    return {
+        'ProjectionExpression': ",".join(f"#p{i}" for i in range(len(names))),
+        'ExpressionAttributeNames': { f"#p{i}": name for i, name in enumerate(names) },
+    }
+
 class DynamoClient():
     def __init__(self, dynamodb_table_name):
-        dynamodb = boto3.resource('dynamodb')
-        self.table = dynamodb.Table(dynamodb_table_name)
+        self.dynamodb = boto3.resource('dynamodb')
+        self.table = self.dynamodb.Table(dynamodb_table_name)
 
     def get_items(self, pk, keyname, index_name=None, projections=None):
         kwargs = {
@@ -39,4 +53,88 @@ class DynamoClient():
             }
         )
 
-        print(response)
\ No newline at end of file
+        print(response)
+
+    def batch_get_items(self, pks, keyname, projections=None):
+        """
+        Description:
+            Will read the items with the given keys in BatchGetItem requests of up
+            to 100 keys, retrying unprocessed keys.
+
+        Args:
+            pks (iterable): Key values; duplicates are read once.
+            keyname (str): Name of the partition key.
+            projections (list): Attributes to read (the key is always included).
+
+        Returns:
+            items (dict): Items found, keyed by their key value.
+        """
+        keys = list(dict.fromkeys(pks))
+        request = {}
+        if projections is not None:
+            request.update(projection_expression([keyname] + [name for name in projections if name != keyname]))
+
+        items = {}
+        for start in range(0, len(keys), BATCH_GET_SIZE):
+            request_items = {
+                self.table.name: dict(request, Keys=[{ keyname: pk } for pk in keys[start:start + BATCH_GET_SIZE]])
+            }
+            for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+                response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                for item in response.get('Responses', {}).get(self.table.name, []):
+                    items[item[keyname]] = item
+                request_items = response.get('UnprocessedKeys')
+                if not request_items:
+                    break
+                time.sleep(0.05 * 2 ** attempt)
+            else:
+                raise RuntimeError(f"Keys still unprocessed after {BATCH_GET_MAX_ATTEMPTS} BatchGetItem attempts")
+
+        return items
+
+    def query_all(self, pk, keyname, index_name=None, projections=None):
+        """ Like get_items, following LastEvaluatedKey through every page. """
+        kwargs = {
+            'KeyConditionExpression': Key(keyname).eq(pk),
+        }
+        if index_name is not None:
+            kwargs['IndexName'] = index_name
+        if projections is not None:
+            kwargs.update(projection_expression(projections))
+
+        return self._all_pages(self.table.query, kwargs)
+
+    def scan_all(self, filter_expression=None, projections=None):
+        """ Will scan the whole table, optionally filtered, following LastEvaluatedKey. """
+        kwargs = {}
+        if filter_expression is not None:
+            kwargs['FilterExpression'] = filter_expression
+        if projections is not None:
+            kwargs.update(projection_expression(projections))
+
+        return self._all_pages(self.table.scan, kwargs)
+
+    def update_item(self, pk, keyname, **kwargs):
+        """ Will send an UpdateItem request for the item with key pk; kwargs are passed through. """
+        return self.table.update_item(Key={ keyname: pk }, **kwargs)
+
+    def get_item(self, pk, keyname, projections=None, consistent_read=False):
+        """ Will return the item with key pk, or None. """
+        kwargs = {
+            'Key': { keyname: pk },
+            'ConsistentRead': consistent_read,
+        }
+        if projections is not None:
+            kwargs.update(projection_expression(projections))
+
+        return self.table.get_item(**kwargs).get('Item')
+
+    @staticmethod
+    def _all_pages(operation, kwargs):
+        items = []
+        while True:
+            response = operation(**kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -0,0 +1,196 @@
+"""
+Description:
+    Verifies vciStatus in the VP table against a full recount of the interpretations in the
+    GeneVariantCuration table, and with --repair rewrites the variants that drifted.
+
+    python -m ddb_stream_interp_count.reconcile <GVC table> <VP table> [--repair] [-v]
+
+    A repair is conditioned on vciStatusVersion not having changed since the VP item was
+    read, so it never overwrites an update the stream processor applied in the meantime;
+    such variants are left for the next run.
+"""
+
+import argparse
+import logging
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from ddb_stream_interp_count.dynamodb.client import DynamoClient
+from ddb_stream_interp_count.vci_status import REMOVED, interpretation_marker, vci_status_from_markers
+
+logger = logging.getLogger(__name__)
+
+
+def recount(gvc_table):
+    """
+    Description:
+        Will compute the vciStatusCounted markers of every interpretation of a variant with a carId.
+
+    Args:
+        gvc_table (DynamoClient): GeneVariantCuration table.
+
+    Returns:
+        markers (dict): carId -> { interpretation PK: marker }
+    """
+    variants = gvc_table.query_all('variant', 'item_type', index_name='item_type_index', projections=['PK', 'carId'])
+    car_ids = { variant['PK']: variant['carId'] for variant in variants if variant.get('carId') }
+
+    interpretations = gvc_table.query_all(
+        'interpretation', 'item_type',
+        index_name='item_type_index',
+        projections=['PK', 'variant', 'affiliation', 'snapshots']
+    )
+    snapshot_pks = (pk for interpretation in interpretations for pk in interpretation.get('snapshots') or [])
+    snapshot_statuses = {
+        pk: snapshot['approvalStatus']
+        for pk, snapshot in gvc_table.batch_get_items(snapshot_pks, 'PK', ['approvalStatus']).items()
+        if snapshot.get('approvalStatus') is not None
+    }
+    logger.info("Recounting %d interpretations of %d variants", len(interpretations), len(car_ids))
+
+    markers = {}
+    for interpretation in interpretations:
+        car_id = car_ids.get(interpretation.get('variant'))
+        if car_id is not None:
+            markers.setdefault(car_id, {})[interpretation['PK']] = interpretation_marker(interpretation, snapshot_statuses)
+    return markers
+
+
+def normalize_vci_status(vci_status):
+    """ Will return vciStatus with int counts and without zero counts or empty groups. """
+    normalized = {}
+    for group, counts in (vci_status or {}).items():
+        if not isinstance(counts, dict):
+            normalized[group] = counts
+            continue
+        group_counts = { key: int(count) for key, count in counts.items() if count != 0 }
+        if group_counts:
+            normalized[group] = group_counts
+    return normalized
+
+
+def reconcile(gvc_table, vp_table, repair=False):
+    """
+    Description:
+        Will compare each variant's vciStatus with a recount, and optionally repair it.
+
+    Args:
+        gvc_table (DynamoClient): GeneVariantCuration table.
+        vp_table (DynamoClient): VP table.
+        repair (bool): Rewrite vciStatus and vciStatusCounted of variants that drifted,
+            or whose markers are missing or stale.
+
+    Returns:
+        report (dict): {
+            'checked': number of variants compared,
+            'drifted': [{'carId', 'PK', 'expected', 'actual'}] for counts that differ,
+            'repaired': number of variants rewritten,
+            'skipped': number of repairs skipped because the variant changed meanwhile
+        }
+    """
+    # Read the VP side first: a variant updated after this read fails the repair condition
+    vp_items = {
+        item['carId']: item
+        for item in vp_table.scan_all(
+            Attr('vciStatus').exists() | Attr('vciStatusCounted').exists(),
+            ['PK', 'carId', 'vciStatus', 'vciStatusCounted', 'vciStatusVersion']
+        )
+        if item.get('carId')
+    }
+    markers_by_car_id = recount(gvc_table)
+
+    report = { 'checked': 0, 'drifted': [], 'repaired': 0, 'skipped': 0 }
+    for car_id in sorted(set(markers_by_car_id) | set(vp_items)):
+        item = vp_items.get(car_id)
+        if item is None:
+            items = vp_table.get_items(car_id, 'carId', index_name='carId_index', projections=['PK'])
+            if len(items) != 1:
+                logger.info("Did not find PK in VP table for %s. Skipping.", car_id)
+                continue
+            item = { 'PK': items[0]['PK'] }
+
+        report['checked'] += 1
+        markers = markers_by_car_id.get(car_id, {})
+        expected = vci_status_from_markers(markers.values())
+        actual = normalize_vci_status(item.get('vciStatus'))
+        counted = item.get('vciStatusCounted') or {}
+        live_markers = { pk: marker for pk, marker in counted.items() if marker != REMOVED }
+
+        if expected != actual:
+            logger.warning("vciStatus of %s (%s) is %s, recount gives %s", car_id, item['PK'], actual, expected)
+            report['drifted'].append({ 'carId': car_id, 'PK': item['PK'], 'expected': expected, 'actual': actual })
+        elif live_markers == markers:
+            continue
+
+        if repair:
+            # Interpretations no longer found keep a tombstone, so a late retry of their removal is a no-op
+            new_markers = { pk: REMOVED for pk in counted }
+            new_markers.update(markers)
+            if write_vci_status(vp_table, item, expected, new_markers):
+                report['repaired'] += 1
+            else:
+                report['skipped'] += 1
+
+    logger.info("Checked %d variants, %d drifted, %d repaired, %d skipped",
+        report['checked'], len(report['drifted']), report['repaired'], report['skipped'])
+    return report
+
+
+def write_vci_status(vp_table, item, vci_status, markers):
+    """ Will replace vciStatus and vciStatusCounted of a VP item unless its vciStatusVersion changed since item was read. """
+    version = item.get('vciStatusVersion')
+    values = { ':status': vci_status, ':markers': markers, ':one': 1 }
+    if version is None:
+        condition = 'attribute_exists(PK) AND attribute_not_exists(vciStatusVersion)'
+    else:
+        condition = 'vciStatusVersion = :version'
+        values[':version'] = version
+
+    try:
+        vp_table.update_item(
+            item['PK'], 'PK',
+            UpdateExpression='SET vciStatus = :status, vciStatusCounted = :markers ADD vciStatusVersion :one',
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        logger.info("vciStatus of %s changed during reconciliation, not repaired", item['PK'])
+        return False
+    return True
+
+
+############### Util ####################
+def configure_logger(verbosity):
+    """ Helper method for configuing logger level and format. Higher numbers are less verbose."""
+    default_level = 30
+    log_level = default_level - (verbosity*10)
+    logging.basicConfig(level=log_level, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+def parse_args():
+    """ Parses arguments """
+    parser = argparse.ArgumentParser(description="Verify vciStatus in the VP table against a full recount.")
+    parser.add_argument('gvc_table', metavar="GeneVariantCuration-TableName",
+        help="Name of the GeneVariantCuration table (origination)")
+    parser.add_argument('vpt_table', metavar="GeneVariantVPT-TableName",
+        help="Name of the VPT Table (destination)")
+    parser.add_argument('--repair', action='store_true',
+        help="Rewrite vciStatus of the variants that drifted.")
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+        help='Increase logging verbosity [-v, -vv]')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logger(args.verbose)
+    report = reconcile(DynamoClient(args.gvc_table), DynamoClient(args.vpt_table), repair=args.repair)
+    print(f"Checked {report['checked']} variants: {len(report['drifted'])} drifted, "
+          f"{report['repaired']} repaired, {report['skipped']} skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import logging
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# vciStatus, on each variant in the VP table, counts the variant's interpretations by status:
+#   { '<affiliation>': {'i': 0, 'p': 1, 'a': 1}, 'a': <sum over affiliations>, 'd': <individual interpretations> }
+STATUS_KEYS = ('i', 'p', 'a')
+APPROVAL_STATUS_KEYS = {
+    'Provisioned': 'p',
+    'Approved': 'a'
+}
+ALL_AFFILIATIONS = 'a'
+INDIVIDUAL = 'd'
+
+# vciStatusCounted, next to vciStatus, records what each interpretation currently adds to
+# the counts as '<group>:<status keys>' (e.g. '10007:pa'), or REMOVED once its removal was
+# applied. Updates are conditioned on it, which makes re-applying a stream record a no-op.
+# vciStatusVersion is incremented by every update, for the reconciliation job.
+REMOVED = '-'
+
+type_deserializer = TypeDeserializer()
+
+
+def interpretation_statuses(interpretation, snapshot_statuses):
+    """
+    Description:
+        Will determine the vciStatus counts an interpretation adds to, as load_vciStatus.py
+        does: in progress ('i') when none of its snapshots has a status, otherwise 'p' and
+        'a' for each of Provisioned and Approved found among its snapshots.
+
+    Args:
+        interpretation (dict): Interpretation item; 'snapshots' lists snapshot PKs.
+        snapshot_statuses (dict): approvalStatus by snapshot PK. Snapshots missing from
+            it are ignored.
+
+    Returns:
+        keys (str): Status keys in STATUS_KEYS order, e.g. 'pa'.
+    """
+    statuses = set()
+    for snapshot_pk in interpretation.get('snapshots') or []:
+        status = snapshot_statuses.get(snapshot_pk)
+        if status is not None:
+            statuses.add(APPROVAL_STATUS_KEYS.get(status))
+
+    if not statuses:
+        return 'i'
+    return ''.join(key for key in STATUS_KEYS if key in statuses)
+
+
+def interpretation_marker(interpretation, snapshot_statuses):
+    """ Will return the vciStatusCounted marker of an interpretation: '<group>:<status keys>'. """
+    affiliation = interpretation.get('affiliation')
+    group = INDIVIDUAL if affiliation is None or affiliation == '' else str(affiliation)
+    return f"{group}:{interpretation_statuses(interpretation, snapshot_statuses)}"
+
+
+def marker_counts(marker):
+    """
+    Description:
+        Will expand a vciStatusCounted marker into the counts it stands for.
+
+    Args:
+        marker (str): A marker, REMOVED or None (not counted).
+
+    Returns:
+        counts (dict): 1 for each (group, status key) counted, including the
+            ALL_AFFILIATIONS group for interpretations of an affiliation.
+    """
+    if marker is None or marker == REMOVED:
+        return {}
+
+    group, keys = marker.rsplit(':', 1)
+    counts = { (group, key): 1 for key in keys }
+    if group != INDIVIDUAL:
+        counts.update({ (ALL_AFFILIATIONS, key): 1 for key in keys })
+    return counts
+
+
+def vci_status_from_markers(markers):
+    """ Will return the vciStatus (without zero counts) that a set of markers adds up to. """
+    vci_status = {}
+    for marker in markers:
+        for (group, key), count in marker_counts(marker).items():
+            group_counts = vci_status.setdefault(group, {})
+            group_counts[key] = group_counts.get(key, 0) + count
+    return vci_status
+
+
+def coalesce_changes(items, snapshot_statuses):
+    """
+    Description:
+        Will reduce the interpretation changes of a batch of stream records to one change
+        per interpretation and variant: its contribution before the batch and after it.
+
+    Args:
+        items (list): (record, old item, new item) in stream order; the items are
+            deserialized images, None when the record has no such image.
+        snapshot_statuses (dict): approvalStatus by snapshot PK.
+
+    Returns:
+        changes (dict): Variant PK -> { interpretation PK: [old marker, new marker] }, where
+            the old marker is None for interpretations the batch inserted and the new marker
+            is REMOVED for interpretations it removed.
+        first_records (dict): Variant PK -> the first record that changed it.
+    """
+    changes = {}
+    first_records = {}
+
+    def add_change(variant_pk, interpretation_pk, old_marker, new_marker, record):
+        if variant_pk is None:
+            return
+        variant_changes = changes.setdefault(variant_pk, {})
+        first_records.setdefault(variant_pk, record)
+        if interpretation_pk in variant_changes:
+            variant_changes[interpretation_pk][1] = new_marker
+        else:
+            variant_changes[interpretation_pk] = [old_marker, new_marker]
+
+    for record, old_item, new_item in items:
+        old_interpretation = old_item if old_item and old_item.get('item_type') == 'interpretation' else None
+        new_interpretation = new_item if new_item and new_item.get('item_type') == 'interpretation' else None
+        if old_interpretation is None and new_interpretation is None:
+            continue
+
+        interpretation_pk = (new_interpretation or old_interpretation)['PK']
+        old_marker = interpretation_marker(old_interpretation, snapshot_statuses) if old_interpretation else None
+        new_marker = interpretation_marker(new_interpretation, snapshot_statuses) if new_interpretation else REMOVED
+        old_variant = old_interpretation.get('variant') if old_interpretation else None
+        new_variant = new_interpretation.get('variant') if new_interpretation else None
+
+        if old_interpretation is None or new_interpretation is None or old_variant == new_variant:
+            add_change(new_variant or old_variant, interpretation_pk, old_marker, new_marker, record)
+        else:
+            # Moved to another variant: removed from one vciStatus, added to the other
+            add_change(old_variant, interpretation_pk, old_marker, REMOVED, record)
+            add_change(new_variant, interpretation_pk, None, new_marker, record)
+
+    return changes, first_records
+
+
+class VciStatusAggregator():
+    """
+    Description:
+        Applies the interpretation changes in DynamoDB stream batches of the GeneVariantCuration
+        table to vciStatus in the VP table.
+
+        Changes are coalesced per variant, so each variant gets at most one UpdateItem per
+        batch. The update adds the count deltas in place (SET path = if_not_exists(path, 0) + delta)
+        rather than reading and writing back vciStatus, and is conditioned on the
+        vciStatusCounted markers of its interpretations. When a marker is not what the old
+        image implies (a retried batch, or a recount in between) the markers are read and the
+        deltas recomputed from them.
+    """
+
+    def __init__(self, gvc_table, vp_table, max_attempts=4):
+        self.gvc_table = gvc_table
+        self.vp_table = vp_table
+        self.max_attempts = max_attempts
+        # carId -> VP PK, kept for the life of the container
+        self.vp_pks = {}
+
+    def handle_records(self, records):
+        """
+        Description:
+            Will apply the interpretation changes in a batch of stream records.
+
+        Args:
+            records (list): Records from a DynamoDB Stream.
+                See https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_streams_StreamRecord.html
+
+        Returns:
+            failed_records (list): The first record of each variant that could not be
+                updated. Variants without a carId or VP item are skipped, not failed.
+        """
+        items = [
+            (
+                record,
+                ddb_deserialize(record['dynamodb']['OldImage']) if 'OldImage' in record['dynamodb'] else None,
+                ddb_deserialize(record['dynamodb']['NewImage']) if 'NewImage' in record['dynamodb'] else None,
+            )
+            for record in records
+        ]
+        changes, first_records = coalesce_changes(items, self.get_snapshot_statuses(items))
+        changes = {
+            variant_pk: variant_changes
+            for variant_pk, variant_changes in changes.items()
+            if any(old_marker != new_marker for old_marker, new_marker in variant_changes.values())
+        }
+        logger.info("%d records change the vciStatus of %d variants", len(records), len(changes))
+        if not changes:
+            return []
+
+        car_ids = self.get_car_ids(changes)
+        failed_records = []
+        for variant_pk, variant_changes in changes.items():
+            try:
+                car_id = car_ids.get(variant_pk)
+                if car_id is None:
+                    logger.info("Did not find carId in GVC table variant PK: %s", variant_pk)
+                    continue
+
+                vp_pk = self.get_vp_pk(car_id)
+                if vp_pk is None:
+                    logger.info("Did not find PK in VP table for variant PK: %s, carId: %s", variant_pk, car_id)
+                    continue
+
+                self.apply_changes(vp_pk, variant_changes)
+            except Exception:
+                logger.exception("Could not update vciStatus for variant PK: %s", variant_pk)
+                failed_records.append(first_records[variant_pk])
+
+        return failed_records
+
+    def get_snapshot_statuses(self, items):
+        """ Will return the approvalStatus of the snapshots the batch's interpretations refer
+        to: from snapshot images in the batch, the rest in BatchGetItem requests. """
+        statuses = {}
+        snapshot_pks = set()
+        for _, old_item, new_item in items:
+            for item in (old_item, new_item):
+                if not item:
+                    continue
+                if item.get('item_type') == 'snapshot' and item.get('approvalStatus') is not None:
+                    statuses[item['PK']] = item['approvalStatus']
+                elif item.get('item_type') == 'interpretation':
+                    snapshot_pks.update(item.get('snapshots') or [])
+
+        missing_pks = snapshot_pks.difference(statuses)
+        if missing_pks:
+            for snapshot_pk, snapshot in self.gvc_table.batch_get_items(missing_pks, 'PK', ['approvalStatus']).items():
+                if snapshot.get('approvalStatus') is not None:
+                    statuses[snapshot_pk] = snapshot['approvalStatus']
+        return statuses
+
+    def get_car_ids(self, variant_pks):
+        """ Will return carId by variant PK, for the variants that have one. """
+        variants = self.gvc_table.batch_get_items(variant_pks, 'PK', ['carId'])
+        return { pk: variant['carId'] for pk, variant in variants.items() if variant.get('carId') }
+
+    def get_vp_pk(self, car_id):
+        """ Will return the PK of the VP table item for car_id, or None. """
+        if car_id not in self.vp_pks:
+            items = self.vp_table.get_items(car_id, 'carId', index_name='carId_index', projections=['PK'])
+            if len(items) != 1:
+                return None
+            self.vp_pks[car_id] = items[0]['PK']
+        return self.vp_pks[car_id]
+
+    def apply_changes(self, vp_pk, changes):
+        """
+        Description:
+            Will apply the coalesced changes of one variant to its vciStatus in a single
+            conditional UpdateItem, recomputing the deltas from the stored markers when
+            the condition fails.
+
+        Args:
+            vp_pk (str): PK of the variant in the VP table.
+            changes (dict): Interpretation PK -> [old marker, new marker] (see coalesce_changes).
+
+        Returns:
+            applied (bool): False when the VP item no longer exists.
+        """
+        # What each interpretation is assumed to add to vciStatus now, and whether that was
+        # read from its marker. Until then a missing marker is taken to mean the old image
+        # is counted (vciStatus loaded by load_vciStatus.py has no markers).
+        counted = { pk: old_marker for pk, (old_marker, _) in changes.items() }
+        read_markers = set()
+
+        for _ in range(self.max_attempts):
+            try:
+                self._update_counts(vp_pk, changes, counted, read_markers)
+                return True
+            except ClientError as e:
+                error = e.response['Error']
+                if error['Code'] == 'ValidationException' and 'document path' in error.get('Message', ''):
+                    # vciStatus, vciStatusCounted or a group in vciStatus does not exist yet
+                    self._create_maps(vp_pk, changes)
+                    continue
+                if error['Code'] != 'ConditionalCheckFailedException':
+                    raise
+
+            item = self.vp_table.get_item(vp_pk, 'PK', ['PK', 'vciStatusCounted'], consistent_read=True)
+            if item is None:
+                logger.info("VP item %s no longer exists", vp_pk)
+                return False
+            markers = item.get('vciStatusCounted') or {}
+            for pk in changes:
+                if pk in markers:
+                    counted[pk] = markers[pk]
+                    read_markers.add(pk)
+
+        raise RuntimeError(f"vciStatus of {vp_pk} was not updated in {self.max_attempts} attempts")
+
+    def _update_counts(self, vp_pk, changes, counted, read_markers):
+        deltas = {}
+        for pk, (_, new_marker) in changes.items():
+            for count_key, count in marker_counts(new_marker).items():
+                deltas[count_key] = deltas.get(count_key, 0) + count
+            for count_key, count in marker_counts(counted[pk]).items():
+                deltas[count_key] = deltas.get(count_key, 0) - count
+        deltas = { count_key: delta for count_key, delta in deltas.items() if delta != 0 }
+
+        if not deltas and all(counted[pk] == new_marker for pk, (_, new_marker) in changes.items()):
+            return
+
+        names = {}
+        values = { ':zero': 0, ':one': 1 }
+        group_names = {}
+        assignments = []
+        conditions = ['attribute_exists(PK)']
+
+        for index, ((group, key), delta) in enumerate(sorted(deltas.items())):
+            if group not in group_names:
+                group_names[group] = f'#g{len(group_names)}'
+                names[group_names[group]] = group
+            names[f'#{key}'] = key
+            path = f'vciStatus.{group_names[group]}.#{key}'
+            assignments.append(f'{path} = if_not_exists({path}, :zero) + :d{index}')
+            values[f':d{index}'] = delta
+
+        for index, (pk, (_, new_marker)) in enumerate(changes.items()):
+            path = f'vciStatusCounted.#m{index}'
+            names[f'#m{index}'] = pk
+            values[f':m{index}'] = new_marker
+            assignments.append(f'{path} = :m{index}')
+            if pk in read_markers:
+                conditions.append(f'{path} = :c{index}')
+                values[f':c{index}'] = counted[pk]
+            elif counted[pk] is None:
+                conditions.append(f'attribute_not_exists({path})')
+            else:
+                conditions.append(f'(attribute_not_exists({path}) OR {path} = :c{index})')
+                values[f':c{index}'] = counted[pk]
+
+        self.vp_table.update_item(
+            vp_pk, 'PK',
+            UpdateExpression='SET ' + ', '.join(assignments) + ' ADD vciStatusVersion :one',
+            ConditionExpression=' AND '.join(conditions),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+    def _create_maps(self, vp_pk, changes):
+        groups = set()
+        for old_marker, new_marker in changes.values():
+            for marker in (old_marker, new_marker):
+                groups.update(group for group, _ in marker_counts(marker))
+
+        self.vp_table.update_item(
+            vp_pk, 'PK',
+            UpdateExpression='SET vciStatus = if_not_exists(vciStatus, :empty), vciStatusCounted = if_not_exists(vciStatusCounted, :empty)',
+            ConditionExpression='attribute_exists(PK)',
+            ExpressionAttributeValues={ ':empty': {} }
+        )
+        if groups:
+            group_names = { f'#g{index}': group for index, group in enumerate(sorted(groups)) }
+            self.vp_table.update_item(
+                vp_pk, 'PK',
+                UpdateExpression='SET ' + ', '.join(f'vciStatus.{name} = if_not_exists(vciStatus.{name}, :empty)' for name in group_names),
+                ExpressionAttributeNames=group_names,
+                ExpressionAttributeValues={ ':empty': {} }
+            )
+
+
+def ddb_deserialize(r, type_deserializer = type_deserializer):
+    return type_deserializer.deserialize({"M": r})
@@ -33,6 +33,15 @@ es_client = ElasticsearchClient(
 def handler(event, context):
     logger.info(json.dumps(event))
 
-    for record in event.get('Records', []):
-        logger.info("Sending record to ES Client")
-        es_client.handle_record(record)
\ No newline at end of file
+    records = event.get('Records', [])
+    logger.info("Sending %d records to ES Client" % len(records))
+    failed_records = es_client.handle_records(records)
+
+    # Partial batch response: Lambda retries the stream from the earliest failed
+    # record, so later changes to the same items are re-applied in order.
+    return {
+        'batchItemFailures': [
+            { 'itemIdentifier': record['dynamodb']['SequenceNumber'] }
+            for record in failed_records
+        ]
+    }
@@ -14,6 +14,11 @@ logger = logging.getLogger(__name__)
 type_deserializer = TypeDeserializer()
 
 class ElasticsearchClient():
+    # Caps for a single _bulk request. A Lambda batch that exceeds either is split
+    # into several requests, sent in stream order.
+    BULK_MAX_ACTIONS = 500
+    BULK_MAX_BYTES = 5 * 1024 * 1024
+
     def __init__(self, domain_endpoint, region=None, index_basename='gci-vci-'):
         self.domain_endpoint = domain_endpoint
         self.region = region
@@ -24,6 +29,93 @@ class ElasticsearchClient():
         ## Setup the es client when this object is created.
         self._get_es_client()
     
+    def handle_records(self, records):
+        """ Applies a batch of DynamoDB stream records with as few _bulk requests as possible.
+
+        Records for the same PK collapse to the last one, since it carries the item's
+        final image. Returns the records whose index or delete failed; every other
+        record in the batch has been applied.
+        """
+        entries = self._collapse_records(records)
+
+        failed_records = []
+        for chunk in self._chunk_entries(entries):
+            failed_records.extend(self._send_bulk(chunk))
+        return failed_records
+
+    def _collapse_records(self, records):
+        entries = {}
+        for record in records:
+            entry = self._bulk_entry(record)
+            if entry is None:
+                continue
+            # Re-insert so the entry takes the position of the PK's last event
+            entries.pop(entry['pk'], None)
+            entries[entry['pk']] = entry
+        return list(entries.values())
+
+    def _bulk_entry(self, record):
+        event_name = record['eventName']
+        if event_name == 'MODIFY' or event_name == 'INSERT':
+            op = 'index'
+            doc = type_deserializer.deserialize( {"M": record['dynamodb']['NewImage']} )
+        elif event_name == 'REMOVE':
+            op = 'delete'
+            doc = type_deserializer.deserialize( {"M": record['dynamodb']['OldImage']} )
+        else:
+            return None
+
+        if 'item_type' not in doc:
+            logger.warning("Skipping %s without an item_type" % doc.get('PK'))
+            return None
+
+        serializer = self._get_es_client().transport.serializer
+        index_name = "".join([self.index_basename, doc['item_type']])
+        lines = [serializer.dumps({ op: { '_index': index_name, '_id': doc['PK'] } })]
+        if op == 'index':
+            lines.append(serializer.dumps(doc))
+        body = "".join(line + "\n" for line in lines)
+
+        return {
+            'pk': doc['PK'],
+            'record': record,
+            'body': body,
+            'size': len(body.encode('utf-8'))
+        }
+
+    def _chunk_entries(self, entries):
+        chunk = []
+        chunk_size = 0
+        for entry in entries:
+            if chunk and (len(chunk) >= self.BULK_MAX_ACTIONS or chunk_size + entry['size'] > self.BULK_MAX_BYTES):
+                yield chunk
+                chunk = []
+                chunk_size = 0
+            chunk.append(entry)
+            chunk_size += entry['size']
+        if chunk:
+            yield chunk
+
+    def _send_bulk(self, chunk):
+        client = self._get_es_client()
+
+        try:
+            resp = client.bulk(body="".join(entry['body'] for entry in chunk))
+        except Exception as e:
+            logger.error("Bulk request of %d actions failed: %s" % (len(chunk), e))
+            return [entry['record'] for entry in chunk]
+
+        failed_records = []
+        for entry, item in zip(chunk, resp['items']):
+            op, result = next(iter(item.items()))
+            status = result.get('status', 500)
+            # ignore not found items on delete, as remove_record does.
+            if status >= 300 and not (op == 'delete' and status in (400, 404)):
+                logger.error("Bulk %s of %s failed: %s" % (op, entry['pk'], json.dumps(result.get('error'))))
+                failed_records.append(entry['record'])
+        logger.info("Bulk request of %d actions, %d failed" % (len(chunk), len(failed_records)))
+        return failed_records
+
     def handle_record(self, record):
         event_name = record['eventName']
         if event_name == 'MODIFY' or event_name == 'INSERT':
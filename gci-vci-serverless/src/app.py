@@ -1,47 +1,69 @@
-import boto3
+import importlib
 import json
 import os
 import traceback
 
-from src.controllers import articles_controller
-from src.controllers import curated_evidences_controller
-from src.controllers import evaluations_controller
-from src.controllers import interpretations_controller
-from src.controllers import snapshots_controller
-from src.controllers import variants_controller
-from src.controllers import gdms_controller
-from src.controllers import diseases_controller
-from src.controllers import provisional_classifications_controller
-from src.controllers import annotations_controller
-from src.controllers import case_control_controller
-from src.controllers import evidence_score_controller
-from src.controllers import experimental_controller
-from src.controllers import individuals_controller
-from src.controllers import families_controller
-from src.controllers import groups_controller
-from src.controllers import populations_controller
-from src.controllers import provisional_variants_controller
-from src.controllers import functional_data_controller
-from src.controllers import computational_data_controller
-from src.controllers import users_controller
-from src.controllers import affiliations_controller
-from src.controllers import genes_controller
-from src.controllers import pathogenicity_controller
-from src.controllers import assessments_controller
-from src.controllers import messaging_controller
-from src.controllers import vpt_controller
-from src.controllers import vp_saves_controller
-from src.controllers import vp_exports_controller
-from src.controllers import variant_score_controller
-from src.controllers import history_controller
-#from src.controllers import search_controller
-from src.controllers import cspec_controller
-
 from src.controllers import warming_controller
+from src.db.ddb_client import request_identity_map
+from src.utils import tracing
 
 import logging
 logger = logging.getLogger(__name__)
 
+# Route prefixes, in match order, with the controller module (in src.controllers) that
+# handles each and any extra arguments for its handle(). Controllers are imported on
+# first use, so a cold start only pays for the route family being requested.
+ROUTES = [
+  ('/variantscore', 'variant_score_controller'),
+  ('/variants', 'variants_controller'),
+  ('/interpretations', 'interpretations_controller'),
+  ('/evaluations', 'evaluations_controller'),
+  ('/articles', 'articles_controller'),
+  ('/curated-evidences', 'curated_evidences_controller'),
+  ('/snapshots', 'snapshots_controller'),
+  ('/gdms', 'gdms_controller'),
+  ('/diseases', 'diseases_controller'),
+  ('/provisional-classifications', 'provisional_classifications_controller'),
+  ('/annotations', 'annotations_controller'),
+  ('/casecontrol', 'case_control_controller'),
+  ('/evidencescore', 'evidence_score_controller'),
+  ('/experimental', 'experimental_controller'),
+  ('/individuals', 'individuals_controller'),
+  ('/families', 'families_controller'),
+  ('/groups', 'groups_controller'),
+  ('/populations', 'populations_controller'),
+  ('/provisional-variants', 'provisional_variants_controller'),
+  ('/functional', 'functional_data_controller'),
+  ('/computational', 'computational_data_controller'),
+  ('/users', 'users_controller'),
+  ('/affiliations', 'affiliations_controller'),
+  ('/genes', 'genes_controller'),
+  ('/pathogenicity', 'pathogenicity_controller'),
+  ('/assessments', 'assessments_controller'),
+  ('/messaging', 'messaging_controller'),
+  ('/vpt/search', 'vpt_controller'),
+  ('/vpt/saves', 'vp_saves_controller'),
+  ('/vpt/export', 'vp_exports_controller'),
+  ('/history', 'history_controller'),
+  #('/search', 'search_controller', 'search'),
+  ('/filter', 'search_controller', 'filter'),
+  ('/cspec', 'cspec_controller'),
+]
+
+def load_controller(name):
+  """ Returns the controller module with the given name, importing it on first use. """
+
+  return importlib.import_module('src.controllers.' + name)
+
+def preload_controllers():
+  """ Imports every routed controller, so a warmed container serves any route without import latency. """
+
+  for route in ROUTES:
+    try:
+      load_controller(route[1])
+    except Exception:
+      logger.exception("Failed to preload %s", route[1])
+
 def configure_logging():
   if logging.getLogger().hasHandlers():
       logging.getLogger().setLevel(logging.INFO)
@@ -58,81 +80,52 @@ def handler(event, context):
 
   if 'warmer' in event and event['warmer']:
     logger.info("Calling warming_controller")
+    preload_controllers()
     response = warming_controller.handle(event)
     return response
 
+  # Sampled requests print one structured summary line (see src.utils.tracing).
+  with tracing.request_trace() as trace:
+    # Opt-in: share one request-scoped identity map across every DynamoDB client so
+    # repeated reads of the same item within this invocation only hit the table once.
+    if os.environ.get('DDB_IDENTITY_MAP', 'false') == 'true':
+      with request_identity_map() as identity_map:
+        response = route(event)
+      logger.info("DynamoDB identity map stats: %s", identity_map.stats())
+    else:
+      response = route(event)
+
+    if trace:
+      trace.set(httpMethod=event.get('httpMethod'), statusCode=response.get('statusCode'))
+
+  # Ensure that the required CORS headers are present
+  # in the response. Don't overwrite any headers that
+  # may have been set.
+  headers = response.get('headers', {})
+  headers.update({
+    'Access-Control-Allow-Credentials': True,
+    'Access-Control-Allow-Origin': '*',
+    'Content-Type': 'application/json'
+  })
+  response['headers'] = headers
+
+  return response
+
+def route(event):
+  """ Routes the request to the correct controller based on the request path. """
 
   try:
     path = event['path']
 
-    if path.startswith('/variantscore'):
-      response = variant_score_controller.handle(event)
-    elif path.startswith('/variants'):
-      response = variants_controller.handle(event)
-    elif path.startswith('/interpretations'):
-      response = interpretations_controller.handle(event)
-    elif path.startswith('/evaluations'):
-      response = evaluations_controller.handle(event)
-    elif path.startswith('/articles'):
-      response = articles_controller.handle(event)
-    elif path.startswith('/curated-evidences'):
-      response = curated_evidences_controller.handle(event)
-    elif path.startswith('/snapshots'):
-      response = snapshots_controller.handle(event)
-    elif path.startswith('/gdms'):
-      response = gdms_controller.handle(event)
-    elif path.startswith('/diseases'):
-      response = diseases_controller.handle(event)
-    elif path.startswith('/provisional-classifications'):
-      response = provisional_classifications_controller.handle(event)
-    elif path.startswith('/annotations'):
-      response = annotations_controller.handle(event)
-    elif path.startswith('/casecontrol'):
-      response = case_control_controller.handle(event)
-    elif path.startswith('/evidencescore'):
-      response = evidence_score_controller.handle(event)
-    elif path.startswith('/experimental'):
-      response = experimental_controller.handle(event)
-    elif path.startswith('/individuals'):
-      response = individuals_controller.handle(event)
-    elif path.startswith('/families'):
-      response = families_controller.handle(event)
-    elif path.startswith('/groups'):
-      response = groups_controller.handle(event)
-    elif path.startswith('/populations'):
-      response = populations_controller.handle(event)
-    elif path.startswith('/provisional-variants'):
-      response = provisional_variants_controller.handle(event)
-    elif path.startswith('/functional'):
-      response = functional_data_controller.handle(event)
-    elif path.startswith('/computational'):
-      response = computational_data_controller.handle(event)
-    elif path.startswith('/users'):
-      response = users_controller.handle(event)
-    elif path.startswith('/affiliations'):
-      response = affiliations_controller.handle(event)
-    elif path.startswith('/genes'):
-      response = genes_controller.handle(event)
-    elif path.startswith('/pathogenicity'):
-      response = pathogenicity_controller.handle(event)
-    elif path.startswith('/assessments'):
-      response = assessments_controller.handle(event)
-    elif path.startswith('/messaging'):
-      response = messaging_controller.handle(event)
-    elif path.startswith('/vpt/search'):
-      response = vpt_controller.handle(event)
-    elif path.startswith('/vpt/saves'):
-      response = vp_saves_controller.handle(event)
-    elif path.startswith('/vpt/export'):
-      response = vp_exports_controller.handle(event)
-    elif path.startswith('/history'):
-      response = history_controller.handle(event)
-    #elif path.startswith('/search'):
-    #  response = search_controller.handle(event, 'search')
-    elif path.startswith('/filter'):
-      response = search_controller.handle(event, 'filter')
-    elif path.startswith('/cspec'):
-      response = cspec_controller.handle(event)
+    for prefix, controller_name, *handler_args in ROUTES:
+      if path.startswith(prefix):
+        trace = tracing.current_trace()
+        if trace:
+          trace.set(Route=prefix)
+
+        with tracing.span('route', controller_name):
+          response = load_controller(controller_name).handle(event, *handler_args)
+        break
     else:
       response = {
           'statusCode': 400,
@@ -147,15 +140,4 @@ def handler(event, context):
     }
     traceback.print_exc()
 
-  # Ensure that the required CORS headers are present
-  # in the response. Don't overwrite any headers that
-  # may have been set.
-  headers = response.get('headers', {})
-  headers.update({
-    'Access-Control-Allow-Credentials': True,
-    'Access-Control-Allow-Origin': '*',
-    'Content-Type': 'application/json'
-  })
-  response['headers'] = headers
-
   return response
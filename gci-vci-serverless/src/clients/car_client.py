@@ -7,8 +7,9 @@ import src.clients.ldh as ldh
 from src.helpers.variant_helpers.variant_title import preferred_title_for
 from src.helpers.variant_helpers.hgvs_notation import get_hgvs_notation
 from src.clients import ensembl_vep_client, clinvar_client
+from src.clients import response_cache
 
-def find(id, compute_preferred_title=True, ensembl_vep_transcripts=None):
+def find(id=None, compute_preferred_title=True, ensembl_vep_transcripts=None, car_data=None):
   """Queries the CAR registry for a Variant object with the given CAR ID
 
   This function queries the CAR registry for a Varaint with the given CAR ID. If found,
@@ -18,28 +19,38 @@ def find(id, compute_preferred_title=True, ensembl_vep_transcripts=None):
   #### Parameters
   :param bool compute_preferred_title: if true, compute variant preferred title and include it in variant object
   :param list ensembl_vep_transcripts: optional, transcripts fetched from Ensembl VEP API. If not supplied (or supplied with None), this method will try to fetch via Ensembl VEP API. Note that supplying empty array will skip fetching, eventually letting preferred title skip MANE and Canonical title.
+  :param dict car_data: if provided, the CAR API response (see `fetch`), will use it to replace CAR api call
   """
 
-  res = requests.get(os.environ['CAR_ALLELE_ENDPOINT'] + id)
+  if car_data is None:
+    car_data = fetch(id)
+    if car_data is None:
+      return None
+
+  try:
+    variant = decode_response_obj(car_data)
+  except Exception as e:
+    traceback.print_exc()
+    raise ClientError(f'CARClientParseError: cannot parse data from CAR API, error message: {e}. See detail error stack at log.', 500)
+
+  # compute preferred title
+  if compute_preferred_title:
+    effective_vep_transcripts = ensembl_vep_transcripts
+    if effective_vep_transcripts == None:
+      # set `raise_external_api_exception=False` to continue processing preferred title even if Ensembl VEP API not available (may be temporarily not responding, or not found given the hgvs notation)
+      # i.e., fall back, only consider Clinvar title and GRCh37/38
+      effective_vep_transcripts = ensembl_vep_client.get_effective_vep_transcripts_by_variant(variant, raise_external_api_exception=False)
+
+    variant['preferredTitle'] = preferred_title_for(variant, effective_vep_transcripts, car_data=car_data)
+
+  return variant
+
+def fetch(id):
+  """Returns the CAR registry's allele with the given CAR ID, or None if there is no such allele"""
+
+  res = response_cache.get('car', os.environ['CAR_ALLELE_ENDPOINT'] + id)
   if res.status_code == requests.codes['ok']:
-    car_data = json.loads(res.text)
-    try:
-      variant = decode_response_obj(car_data)
-    except Exception as e:
-      traceback.print_exc()
-      raise ClientError(f'CARClientParseError: cannot parse data from CAR API, error message: {e}. See detail error stack at log.', 500)
-
-    # compute preferred title
-    if compute_preferred_title:
-      effective_vep_transcripts = ensembl_vep_transcripts
-      if effective_vep_transcripts == None:
-        # set `raise_external_api_exception=False` to continue processing preferred title even if Ensembl VEP API not available (may be temporarily not responding, or not found given the hgvs notation)
-        # i.e., fall back, only consider Clinvar title and GRCh37/38
-        effective_vep_transcripts = ensembl_vep_client.get_effective_vep_transcripts_by_variant(variant, raise_external_api_exception=False)
-
-      variant['preferredTitle'] = preferred_title_for(variant, effective_vep_transcripts, car_data=car_data)
-
-    return variant
+    return json.loads(res.text)
   elif res.status_code == requests.codes['not_found']:
     return None
   else:
@@ -6,9 +6,12 @@ import traceback
 
 import src.clients.car_client as car_client
 import src.parsers.variant_xml_parser as v_xml_parser
+from src.parsers import clinvar_document
 from src.helpers.variant_helpers.variant_title import preferred_title_for
 from src.helpers.variant_helpers.hgvs_notation import get_hgvs_notation
 from src.clients import ensembl_vep_client
+from src.clients import external_http
+from src.clients import response_cache
 
 def find(id=None, clinvar_xml=None, extended=False, compute_preferred_title=True, ensembl_vep_transcripts=None):
   """Queries the ClinVar API for a Variant with the given ClinVar ID
@@ -17,7 +20,7 @@ def find(id=None, clinvar_xml=None, extended=False, compute_preferred_title=True
 
   #### Parameters
   :param str id: clinvar id to make clinvar api call
-  :param dict clinvar_xml: if provided, will use it to replace clinvar api call
+  :param str|ClinVarDocument clinvar_xml: if provided, will use it to replace clinvar api call
   :param bool extended: if true, return the extended parsing for the variant
   :param bool compute_preferred_title: if true, compute variant preferred title and include it in variant object
   :param list ensembl_vep_transcripts: optional, transcripts fetched from Ensembl VEP API. If not supplied (or supplied with None), this method will try to fetch via Ensembl VEP API. Note that supplying empty array will skip fetching, eventually letting preferred title skip MANE and Canonical title.
@@ -56,7 +59,7 @@ def find(id=None, clinvar_xml=None, extended=False, compute_preferred_title=True
   return variant_extension if extended else variant
 
 def fetch(clinvar_id):
-  res = requests.get(os.environ['CLIN_VAR_EUTILS_VCV_ENDPOINT'] + clinvar_id)
+  res = response_cache.get('clinvar', os.environ['CLIN_VAR_EUTILS_VCV_ENDPOINT'] + clinvar_id)
   if res.ok:
     return res.text
   
@@ -67,13 +70,21 @@ def fetch(clinvar_id):
     raise ClientError(message, 500)
   raise ClientError(message, res.status_code)
 
+def parse(clinvar_xml):
+  """Parses a ClinVar VCV response once, so the document can be shared by every parser of the record"""
+  try:
+    return clinvar_document.parse(clinvar_xml)
+  except Exception as e:
+    traceback.print_exc()
+    raise ClientError(f'ClinvarClientParseError: cannot parse data from Clinvar API, error message: {e}. See more error stack detail at log.', 500)
+
 def find_esearch_data(variant):
   aminoAcidLocation = variant.get('allele', {}).get('ProteinChange', '')
   symbol = variant.get('gene', {}).get('symbol', '')
   if aminoAcidLocation and symbol:
     term = aminoAcidLocation[:-1]
     url = os.environ['CLIN_VAR_ESEARCH_ENDPOINT'] + term + '+%5Bvariant+name%5D+and+' + symbol + '&retmode=json'
-    res = requests.get(url)
+    res = external_http.get(url)
     if res.status_code == requests.codes['ok']:
       res = res.json()
       res['vci_term'] = term
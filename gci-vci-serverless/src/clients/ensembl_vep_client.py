@@ -1,11 +1,11 @@
 import os
-import requests
 import json
 import traceback
 
 import src.parsers.variant_xml_parser as v_xml_parser
 from src.helpers.variant_helpers.primary_transcript import get_primary_transcript
 from src.helpers.variant_helpers.hgvs_notation import get_hgvs_notation
+from src.clients import response_cache
 
  
 def find(hgvs_notation: str, grouping=True):
@@ -18,7 +18,8 @@ def find(hgvs_notation: str, grouping=True):
         If not provided, will return `primaryTranscripts` as empty [].
     """
 
-    res = requests.get(
+    res = response_cache.get(
+        'vep',
         os.environ['ENSEMBL_VEP_HGVS_ENDPOINT'] + hgvs_notation,
         params={
             'content-type': 'application/json',
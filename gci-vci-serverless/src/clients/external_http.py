@@ -0,0 +1,255 @@
+""" Shared HTTP transport for calls to external services (ClinVar, CAR, Ensembl VEP, LDH, ...).
+
+All calls go through one container-wide requests Session, so connections to a
+host are kept alive and reused across invocations of a warm Lambda. Each host
+has a ServicePolicy setting its timeouts, its retry budget for idempotent
+requests (honoring Retry-After on 429/503 responses) and the circuit breaker
+that fails calls fast while the host is down.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.utils import tracing
+
+class ServicePolicy:
+  """ Timeouts, retries and circuit breaker settings of an external service.
+
+  :param tuple timeout: (connect, read) timeout in seconds, used when a call does not pass one
+  :param int retries: retries of an idempotent request after a connection error or a `retry_statuses` response
+  :param float backoff_factor: retries are spaced by backoff_factor * 2 ** (retry - 1) seconds
+  :param int max_retry_after: longest Retry-After (in seconds) waited for before retrying
+  :param int failure_threshold: consecutive failed calls after which the circuit opens
+  :param int reset_timeout: seconds the circuit stays open before a trial call is let through
+  :param int pool_maxsize: connections kept alive to the host
+  """
+
+  def __init__(self, timeout=(5, 30), retries=2, backoff_factor=0.5, retry_statuses=(429, 500, 502, 503, 504),
+    max_retry_after=10, failure_threshold=5, reset_timeout=30, pool_maxsize=10):
+    self.timeout = timeout
+    self.retries = retries
+    self.backoff_factor = backoff_factor
+    self.retry_statuses = retry_statuses
+    self.max_retry_after = max_retry_after
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.pool_maxsize = pool_maxsize
+
+DEFAULT_POLICY = ServicePolicy()
+
+# Policies of the services called by the API, by host. NCBI (ClinVar, PubMed) and
+# Ensembl rate limit clients and answer 429 with a Retry-After header.
+SERVICE_POLICIES = {
+  'eutils.ncbi.nlm.nih.gov': ServicePolicy(timeout=(5, 60), retries=3, backoff_factor=1),
+  'rest.ensembl.org': ServicePolicy(timeout=(5, 30), retries=3, backoff_factor=1),
+  'reg.genome.network': ServicePolicy(timeout=(5, 30)),
+  'ldh.clinicalgenome.org': ServicePolicy(timeout=(5, 10), retries=1),
+  'databases.lovd.nl': ServicePolicy(timeout=(5, 10), retries=1),
+  'www.ebi.ac.uk': ServicePolicy(timeout=(5, 60)),
+  'rest.genenames.org': ServicePolicy(timeout=(5, 60)),
+}
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+  """ Raised, without calling the host, while the circuit breaker of a host is open. """
+  pass
+
+class CircuitBreaker:
+  """ Opens after `failure_threshold` consecutive failures of a host, then lets one
+  trial call through every `reset_timeout` seconds until a call succeeds. """
+
+  def __init__(self, failure_threshold, reset_timeout):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.failures = 0
+    self.opened_at = None
+    self._lock = threading.Lock()
+
+  def allow(self):
+    with self._lock:
+      if self.opened_at is None:
+        return True
+      if time.monotonic() - self.opened_at >= self.reset_timeout:
+        # Half open: the trial call re-opens the circuit if it fails
+        self.opened_at = time.monotonic()
+        return True
+      return False
+
+  def record_success(self):
+    with self._lock:
+      self.failures = 0
+      self.opened_at = None
+
+  def record_failure(self):
+    with self._lock:
+      self.failures += 1
+      if self.failures >= self.failure_threshold:
+        self.opened_at = time.monotonic()
+
+  @property
+  def is_open(self):
+    return self.opened_at is not None
+
+class _Retry(Retry):
+  """ urllib3 Retry with an upper bound on the Retry-After it waits for. """
+
+  max_retry_after = None
+
+  def new(self, **kwargs):
+    retry = super().new(**kwargs)
+    retry.max_retry_after = self.max_retry_after
+    return retry
+
+  def get_retry_after(self, response):
+    retry_after = super().get_retry_after(response)
+    if retry_after is not None and self.max_retry_after is not None:
+      return min(retry_after, self.max_retry_after)
+    return retry_after
+
+class _Host:
+  """ Transport state of one host: its policy, circuit breaker and latency statistics. """
+
+  def __init__(self, netloc, policy):
+    self.netloc = netloc
+    self.policy = policy
+    self.breaker = CircuitBreaker(policy.failure_threshold, policy.reset_timeout)
+    self.stats = { 'requests': 0, 'errors': 0, 'retries': 0, 'rejected': 0, 'totalMs': 0.0, 'maxMs': 0.0 }
+    self._lock = threading.Lock()
+
+  def record(self, duration, failed, retries):
+    ms = duration * 1000
+    with self._lock:
+      self.stats['requests'] += 1
+      self.stats['errors'] += 1 if failed else 0
+      self.stats['retries'] += retries
+      self.stats['totalMs'] += ms
+      self.stats['maxMs'] = max(self.stats['maxMs'], ms)
+
+  def reject(self):
+    with self._lock:
+      self.stats['rejected'] += 1
+
+def _create_adapter(policy):
+  retry = _Retry(
+    total=policy.retries,
+    backoff_factor=policy.backoff_factor,
+    status_forcelist=policy.retry_statuses,
+    respect_retry_after_header=True,
+    # Hand the last response back to the caller rather than raising once retries run out
+    raise_on_status=False
+  )
+  retry.max_retry_after = policy.max_retry_after
+  return HTTPAdapter(pool_connections=1, pool_maxsize=policy.pool_maxsize, max_retries=retry)
+
+# Session and host states shared by the whole (warm) Lambda container
+_session = None
+_hosts = {}
+_lock = threading.Lock()
+
+def get_session():
+  """ Returns the requests Session shared by the whole (warm) Lambda container. """
+
+  global _session
+  if _session is None:
+    with _lock:
+      if _session is None:
+        _session = requests.Session()
+  return _session
+
+def _get_host(netloc):
+  host = _hosts.get(netloc)
+  if host is None:
+    session = get_session()
+    with _lock:
+      host = _hosts.get(netloc)
+      if host is None:
+        hostname = netloc.rsplit(':', 1)[0] if ':' in netloc else netloc
+        host = _Host(netloc, SERVICE_POLICIES.get(netloc) or SERVICE_POLICIES.get(hostname) or DEFAULT_POLICY)
+        adapter = _create_adapter(host.policy)
+        session.mount(f'http://{netloc}/', adapter)
+        session.mount(f'https://{netloc}/', adapter)
+        _hosts[netloc] = host
+  return host
+
+def set_policy(netloc, policy):
+  """ Sets the policy of a host (e.g. 'rest.ensembl.org'), resetting its circuit breaker and statistics. """
+
+  with _lock:
+    SERVICE_POLICIES[netloc] = policy
+    _hosts.pop(netloc, None)
+
+def reset():
+  """ Closes the shared session and forgets all host states. """
+
+  global _session
+  with _lock:
+    if _session is not None:
+      _session.close()
+    _session = None
+    _hosts.clear()
+
+def stats():
+  """ Returns per host request, error, retry and rejected call counts, and latencies in milliseconds. """
+
+  result = {}
+  for netloc, host in list(_hosts.items()):
+    with host._lock:
+      host_stats = dict(host.stats)
+    host_stats['avgMs'] = round(host_stats['totalMs'] / host_stats['requests'], 2) if host_stats['requests'] else 0.0
+    host_stats['totalMs'] = round(host_stats['totalMs'], 2)
+    host_stats['maxMs'] = round(host_stats['maxMs'], 2)
+    host_stats['circuitOpen'] = host.breaker.is_open
+    result[netloc] = host_stats
+  return result
+
+def _retries_of(response):
+  retries = getattr(response.raw, 'retries', None)
+  return len(retries.history) if retries is not None else 0
+
+def request(method, url, **kwargs):
+  """Sends an HTTP request to an external service, recorded as an `http` span named after its host.
+
+  Returns the response whatever its status, like `requests.request`; connection errors and
+  timeouts raise requests exceptions, and CircuitOpenError while the host is considered down.
+  """
+
+  host = _get_host(urlsplit(url).netloc)
+
+  if not host.breaker.allow():
+    host.reject()
+    raise CircuitOpenError(f'Circuit open for {host.netloc} after {host.breaker.failures} consecutive failures')
+
+  kwargs.setdefault('timeout', host.policy.timeout)
+
+  with tracing.span('http', host.netloc) as span:
+    start = time.perf_counter()
+    try:
+      response = get_session().request(method, url, **kwargs)
+    except requests.exceptions.RequestException:
+      host.record(time.perf_counter() - start, True, 0)
+      host.breaker.record_failure()
+      span.add(errors=1)
+      raise
+
+    retries = _retries_of(response)
+    failed = response.status_code >= 500 or response.status_code == 429
+    host.record(time.perf_counter() - start, failed, retries)
+    if failed:
+      host.breaker.record_failure()
+      span.add(errors=1)
+    else:
+      host.breaker.record_success()
+    if retries:
+      span.add(retries=retries)
+
+    return response
+
+def get(url, **kwargs):
+  return request('GET', url, **kwargs)
+
+def post(url, **kwargs):
+  return request('POST', url, **kwargs)
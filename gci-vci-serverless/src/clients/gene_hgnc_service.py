@@ -1,5 +1,5 @@
-import requests
 import xml.etree.ElementTree as ET
+from src.clients import external_http
 
 genePropertyMap = {
   'symbol': 'symbol',
@@ -21,7 +21,7 @@ def fetch_hgnc(gene_symbol):
   fetch_url = 'https://rest.genenames.org/fetch/symbol/'
   
   try:
-    res = requests.get(fetch_url + gene_symbol, timeout=60)
+    res = external_http.get(fetch_url + gene_symbol)
   except Exception as e:
     raise
   else:
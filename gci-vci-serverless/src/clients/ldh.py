@@ -1,7 +1,7 @@
-import requests
-
 from requests.exceptions import HTTPError
 
+from src.clients import response_cache
+
 def get_ldh_data(variant_id):
   if variant_id is None:
     # TODO: Raise an error here? Look at legacy code to see how 
@@ -10,7 +10,7 @@ def get_ldh_data(variant_id):
 
   try:
     ldh_url = 'https://ldh.clinicalgenome.org/ldh/Variant/id/' + variant_id
-    ldh_data = requests.get(ldh_url, timeout=10)
+    ldh_data = response_cache.get('ldh', ldh_url)
     ldh_data.raise_for_status()
     ldh_data = ldh_data.json()
     
@@ -29,7 +29,7 @@ def get_allele_functional_impact_statements(statements):
     for statement in statements:
       afis_id = statement['ldhId']
       afis_url = 'https://ldh.clinicalgenome.org/fdr/AlleleFunctionalImpactStatement/id/' + afis_id
-      afis_record = requests.get(afis_url, timeout=10)
+      afis_record = response_cache.get('ldh', afis_url)
       afis_record = afis_record.json()
       afis_list.append(afis_record['data'])
   except:
@@ -2,12 +2,13 @@ import calendar
 import os
 import json
 import requests
+from src.clients import external_http
 
 def find_mondo_disease(mondo_id):
   mondo_search_url = 'https://www.ebi.ac.uk/ols/api/ontologies/mondo/terms?iri=http://purl.obolibrary.org/obo/'
   
   try:
-    res = requests.get(mondo_search_url + mondo_id, timeout=60)
+    res = external_http.get(mondo_search_url + mondo_id)
   except Exception as e:
     print('ERROR: OLS MONDO Request error: %s' %e)
     raise
@@ -2,12 +2,13 @@ import calendar
 import os
 import requests
 import xml.etree.ElementTree as ET
+from src.clients import external_http
 
 def find(pubmed_id):
   pubmed_search_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?api_key=&db=PubMed&retmode=xml&id='
   
   try:
-    res = requests.get(pubmed_search_url + pubmed_id, timeout=60)
+    res = external_http.get(pubmed_search_url + pubmed_id)
   except Exception as e:
     print('ERROR: Pubmed Request error: %s' %e)
     raise
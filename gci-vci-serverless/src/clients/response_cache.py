@@ -0,0 +1,256 @@
+""" Two tier cache of upstream lookups (ClinVar, CAR, Ensembl VEP, LDH).
+
+Successful GET responses are kept in an in-memory LRU of the warm Lambda and,
+when `UPSTREAM_CACHE_BUCKET` is set, gzipped in S3 so every container (and
+later deploys) share them. Entries are keyed by source and normalized URL.
+
+An entry is fresh for the TTL of its source. A stale entry is revalidated with
+If-None-Match / If-Modified-Since when upstream gave an ETag or Last-Modified,
+refetched otherwise, and served as is if upstream cannot be reached.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from botocore.exceptions import BotoCoreError, ClientError
+
+from src.clients import external_http
+from src.db import s3_client
+from src.utils import tracing
+
+# Seconds an entry of each source is served without asking upstream
+SOURCE_TTLS = {
+  'clinvar': 24 * 3600,
+  'car': 7 * 24 * 3600,
+  'vep': 7 * 24 * 3600,
+  'ldh': 24 * 3600,
+}
+DEFAULT_TTL = 3600
+
+# Bytes of response bodies kept in memory
+MEMORY_CACHE_BYTES = int(os.environ.get('UPSTREAM_CACHE_MEMORY_BYTES', str(64 * 1024 * 1024)))
+
+class CachedResponse:
+  """ A cached 200 response, with the parts of requests.Response the clients use. """
+
+  status_code = 200
+  ok = True
+
+  def __init__(self, url, content, headers, fetched_at):
+    self.url = url
+    self.content = content
+    self.headers = headers
+    self.fetched_at = fetched_at
+
+  @property
+  def text(self):
+    return self.content.decode('utf-8')
+
+  def json(self):
+    return json.loads(self.content)
+
+  def raise_for_status(self):
+    pass
+
+  def size(self):
+    return len(self.content)
+
+class MemoryLRU:
+  """ Least recently used entries, evicted once their bodies exceed `max_bytes`. Thread safe. """
+
+  def __init__(self, max_bytes):
+    self.max_bytes = max_bytes
+    self.bytes = 0
+    self.entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self.entries.get(key)
+      if entry is not None:
+        self.entries.move_to_end(key)
+      return entry
+
+  def put(self, key, entry):
+    if entry.size() > self.max_bytes:
+      return
+
+    with self._lock:
+      previous = self.entries.pop(key, None)
+      if previous is not None:
+        self.bytes -= previous.size()
+
+      self.entries[key] = entry
+      self.bytes += entry.size()
+
+      while self.bytes > self.max_bytes:
+        _, evicted = self.entries.popitem(last=False)
+        self.bytes -= evicted.size()
+
+  def clear(self):
+    with self._lock:
+      self.entries.clear()
+      self.bytes = 0
+
+_memory = MemoryLRU(MEMORY_CACHE_BYTES)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+STAT_NAMES = ('memoryHits', 'durableHits', 'misses', 'revalidated', 'staleServed')
+
+def stats():
+  """ Returns the lookup counts of each source since the container started, with its hit ratio. """
+
+  with _stats_lock:
+    result = { source: dict(counts) for source, counts in _stats.items() }
+
+  for counts in result.values():
+    lookups = sum(counts[name] for name in ('memoryHits', 'durableHits', 'misses'))
+    counts['hitRatio'] = round((counts['memoryHits'] + counts['durableHits']) / lookups, 4) if lookups else 0.0
+  return result
+
+def clear():
+  """ Empties the in-memory tier and resets the statistics. """
+
+  _memory.clear()
+  with _stats_lock:
+    _stats.clear()
+
+def _count(source, span, name):
+  with _stats_lock:
+    counts = _stats.get(source)
+    if counts is None:
+      counts = _stats[source] = dict.fromkeys(STAT_NAMES, 0)
+    counts[name] += 1
+
+  if name in ('memoryHits', 'durableHits'):
+    span.add(hits=1)
+  elif name == 'misses':
+    span.add(misses=1)
+
+def normalize_url(url, params=None):
+  """ Returns the URL with its query parameters (merged with `params`) sorted, so equal lookups share a key. """
+
+  parts = urlsplit(url)
+  query = parse_qsl(parts.query, keep_blank_values=True)
+  if params:
+    query.extend((key, str(value)) for key, value in params.items())
+  return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(sorted(query)), ''))
+
+def cache_key(source, url):
+  return f'{source}/{hashlib.sha256(url.encode("utf-8")).hexdigest()}'
+
+def _durable_bucket():
+  return os.environ.get('UPSTREAM_CACHE_BUCKET') or None
+
+def _read_durable(bucket, key, url):
+  try:
+    s3_object = s3_client.get_shared_client().s3_client.get_object(Bucket=bucket, Key=key)
+  except ClientError as ce:
+    if ce.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+      print('WARNING: Upstream cache read error: %s' %ce)
+    return None
+  except BotoCoreError as be:
+    print('WARNING: Upstream cache read error: %s' %be)
+    return None
+
+  metadata = s3_object.get('Metadata', {})
+  headers = json.loads(metadata.get('headers', '{}'))
+  return CachedResponse(url, gzip.decompress(s3_object['Body'].read()), headers, float(metadata.get('fetched-at', '0')))
+
+def _write_durable(bucket, key, entry):
+  try:
+    s3_client.get_shared_client().s3_client.put_object(
+      Bucket=bucket,
+      Key=key,
+      Body=gzip.compress(entry.content),
+      ContentType=entry.headers.get('Content-Type', 'application/octet-stream'),
+      Metadata={ 'fetched-at': repr(entry.fetched_at), 'headers': json.dumps(entry.headers) }
+    )
+  except (ClientError, BotoCoreError) as e:
+    # The lookup succeeded; failing to cache it only costs a refetch
+    print('WARNING: Upstream cache write error: %s' %e)
+
+# Response headers kept with an entry, for revalidation and content type
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+def _store(key, url, response):
+  entry = CachedResponse(url, response.content, { name: response.headers[name] for name in KEPT_HEADERS if name in response.headers }, time.time())
+  _memory.put(key, entry)
+
+  bucket = _durable_bucket()
+  if bucket:
+    _write_durable(bucket, key, entry)
+  return entry
+
+def _refresh(key, entry):
+  entry = CachedResponse(entry.url, entry.content, entry.headers, time.time())
+  _memory.put(key, entry)
+
+  bucket = _durable_bucket()
+  if bucket:
+    _write_durable(bucket, key, entry)
+  return entry
+
+def get(source, url, params=None, **kwargs):
+  """ GETs `url` (see external_http.get) through the cache of `source`.
+
+  Returns a CachedResponse for a cached or newly fetched 200 response; any other
+  response is returned uncached, as received from upstream.
+  """
+
+  normalized_url = normalize_url(url, params)
+  key = cache_key(source, normalized_url)
+  ttl = SOURCE_TTLS.get(source, DEFAULT_TTL)
+
+  with tracing.span('cache', source) as span:
+    entry = _memory.get(key)
+    tier = 'memoryHits'
+    if entry is None:
+      bucket = _durable_bucket()
+      if bucket:
+        entry = _read_durable(bucket, key, normalized_url)
+        tier = 'durableHits'
+        if entry is not None:
+          _memory.put(key, entry)
+
+    if entry is not None and time.time() - entry.fetched_at < ttl:
+      _count(source, span, tier)
+      return entry
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    if entry is not None:
+      if 'ETag' in entry.headers:
+        headers['If-None-Match'] = entry.headers['ETag']
+      if 'Last-Modified' in entry.headers:
+        headers['If-Modified-Since'] = entry.headers['Last-Modified']
+
+    try:
+      response = external_http.get(url, params=params, headers=headers, **kwargs)
+    except requests.exceptions.RequestException:
+      if entry is None:
+        _count(source, span, 'misses')
+        raise
+      _count(source, span, 'staleServed')
+      return entry
+
+    if entry is not None:
+      if response.status_code == 304:
+        _count(source, span, 'revalidated')
+        return _refresh(key, entry)
+      if not response.ok and (response.status_code >= 500 or response.status_code == 429):
+        _count(source, span, 'staleServed')
+        return entry
+
+    _count(source, span, 'misses')
+    if response.status_code == 200:
+      return _store(key, normalized_url, response)
+    return response
@@ -2,7 +2,7 @@ import datetime
 import json
 import os
 
-from src.db.ddb_client import Client as DynamoClient
+from src.db.ddb_client import Client as DynamoClient, pop_page_params
 from src.helpers import annotation_helpers
 from src.utils.exceptions import PopulatorException, NormalizerException
 
@@ -118,9 +118,14 @@ def find(pk, filters = {}):
       return { 'statusCode': 404, 'body': json.dumps({}) }
 
 def get(filters = {}):
-  """Queries and returns all annotation objects"""
+  """Queries and returns all annotation objects, or a single page of them if `page_size` or `cursor` is given"""
 
+  page_params = pop_page_params(filters)
   try:
+    if page_params:
+      page = db.query_page('item_type', 'annotation', filters, embed=True, **page_params)
+      return { 'statusCode': 200, 'body': json.dumps(page) }
+
     annotations = db.query_by_item_type('annotation', filters, embed=True)
   except (PopulatorException, NormalizerException) as error:
     return { 'statusCode': 500, 'body': json.dumps({ 'error': str(error) }) }
@@ -5,7 +5,7 @@ import uuid
 
 from src.helpers import gdm_helpers
 from decimal import Decimal
-from src.db.ddb_client import Client as DynamoClient
+from src.db.ddb_client import Client as DynamoClient, pop_page_params
 from src.utils.exceptions import PopulatorException, NormalizerException
 
 
@@ -111,10 +111,15 @@ def getCustom(query_params):
     return { 'statusCode': 200, 'body': json.dumps(gdms) }
 
 def get(filters = {}):
-    """Queries and returns all gdm objects"""
+    """Queries and returns all gdm objects, or a single page of them if `page_size` or `cursor` is given"""
 
+    page_params = pop_page_params(filters)
     try:
-        gdms = db.query_by_item_type('gdm', filters)
+        if page_params:
+            page = db.query_page('item_type', 'gdm', filters, **page_params)
+            gdms = page['items']
+        else:
+            gdms = db.query_by_item_type('gdm', filters)
     except (PopulatorException, NormalizerException) as error:
         return { 'statusCode': 500, 'body': json.dumps({ 'error': str(error) }) }
     except Exception as e:
@@ -125,6 +130,9 @@ def get(filters = {}):
     if isinstance(filters, dict) and 'submitted_by' in filters:
         gdms = list(filter(lambda gdm: 'affiliation' not in gdm, gdms))
 
+    if page_params:
+        return { 'statusCode': 200, 'body': json.dumps({ 'items': gdms, 'cursor': page['cursor'] }) }
+
     return { 'statusCode': 200, 'body': json.dumps(gdms) }
 
 def find(pk):
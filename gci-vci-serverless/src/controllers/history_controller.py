@@ -1,5 +1,7 @@
 import json
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 
 from src.db.ddb_client import Client as DynamoClient
@@ -15,6 +17,15 @@ db_history = DynamoClient(
   os.environ.get('IS_OFFLINE', 'false') == 'true'
 )
 
+# Number of related items whose history is queried concurrently (the shared DynamoDB client keeps 10 connections)
+HISTORY_QUERY_CONCURRENCY = int(os.environ.get('HISTORY_QUERY_CONCURRENCY', '8'))
+
+# Attributes of an item's new image copied to each entry of its history
+REFERENCE_ATTRIBUTES = {'item_type', 'modified_by', 'affiliation', 'last_modified', 'criteria', 'evidenceCriteria'}
+
+# User attributes needed for UI display, and the history entry attribute each is saved as
+USER_ATTRIBUTES = (('name', 'user_name'), ('family_name', 'user_family_name'), ('email', 'user_email'))
+
 def handle(event):
   httpMethod = event['httpMethod']
 
@@ -197,177 +208,154 @@ def compare_images(old_data_image, new_data_image):
 
   return difference_dictionary
 
-def generate(pk, related_attributes):
-  find_results = find(pk, False)
-
-  # If find fails, return its results/response
-  if find_results['statusCode'] != 200:
-    return find_results
-
-  result_history_dictionary = {pk: {'history': []}}
-  related_pk_set = set()
-  reference_attribute_set = {'item_type', 'modified_by', 'affiliation', 'last_modified', 'criteria', 'evidenceCriteria'}
-  user_dictionary = {}
+def iter_find(pks, max_workers=None):
+  ''' Queries the history of many items, yielding `(pk, find result)` in the order of the given PKs.
 
-  if related_attributes != None:
-    related_attribute_list = related_attributes.split(',')
-  else:
-    related_attribute_list = []
+  Up to `max_workers` queries run concurrently ahead of the consumer, so each history can be
+  processed while the following ones are still being read.
+  '''
 
-  # Iterate over all history table entries for the specified item
-  for history_item in find_results['body']:
+  max_workers = max(1, max_workers or HISTORY_QUERY_CONCURRENCY)
+  with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='history') as executor:
+    pending = deque()
     try:
-      converted_new_image = convert_data_type_dictionary(history_item['change']['dynamodb']['NewImage'])
-
-      # Collect PKs to related items from new image
+      for pk in pks:
+        pending.append((pk, executor.submit(find, pk, False)))
+        if len(pending) >= max_workers:
+          pk, future = pending.popleft()
+          yield pk, future.result()
+      while pending:
+        pk, future = pending.popleft()
+        yield pk, future.result()
+    finally:
+      # Stop queries nobody will consume when the consumer stops early
+      for _, future in pending:
+        future.cancel()
+
+def build_history(history_items, related_attribute_list=(), related_pks=None):
+  ''' Converts the history table entries of an item into the entries of its history.
+
+  Returns the entries and, for each, the PK of the user who made the change (or None), so that the
+  users of a whole history can be resolved at once (see `add_user_data`). The PKs found in the
+  `related_attribute_list` attributes of the new images are added to the `related_pks` dict.
+  '''
+
+  history = []
+  user_pks = []
+
+  for history_item in history_items:
+    converted_new_image = convert_data_type_dictionary(history_item['change']['dynamodb']['NewImage'])
+
+    # Collect PKs to related items from new image
+    if related_pks is not None:
       for related_attribute in related_attribute_list:
         if related_attribute in converted_new_image:
           if isinstance(converted_new_image[related_attribute], list):
-            related_pk_set = related_pk_set.union(set(converted_new_image[related_attribute]))
+            related_pks.update(dict.fromkeys(converted_new_image[related_attribute]))
           else:
-            related_pk_set.add(converted_new_image[related_attribute])
-
-      result_element = {'change_type': history_item['change_type']}
-
-      # Save reference data from new image (includes some data that may not change during an item's history)
-      for reference_attribute in reference_attribute_set:
-        if reference_attribute in converted_new_image:
-          result_element[reference_attribute] = converted_new_image[reference_attribute]
-
-          if reference_attribute == 'modified_by':
-            # Build a dictionary of users that have modified an item
-            if result_element[reference_attribute] not in user_dictionary:
-              try:
-                user_dictionary[result_element[reference_attribute]] = db.find(result_element[reference_attribute])
-
-              except Exception:
-                user_dictionary[result_element[reference_attribute]] = {}
-                pass
-
-            # Save user data needed for UI display
-            if 'name' in user_dictionary[result_element[reference_attribute]]:
-              result_element['user_name'] = user_dictionary[result_element[reference_attribute]]['name']
-
-            if 'family_name' in user_dictionary[result_element[reference_attribute]]:
-              result_element['user_family_name'] = user_dictionary[result_element[reference_attribute]]['family_name']
+            related_pks[converted_new_image[related_attribute]] = None
 
-            if 'email' in user_dictionary[result_element[reference_attribute]]:
-              result_element['user_email'] = user_dictionary[result_element[reference_attribute]]['email']
+    result_element = {'change_type': history_item['change_type']}
 
-      # For first entry (item creation), save entire new image (as an add)
-      if history_item['change_type'] == 'INSERT':
-        result_element['add'] = converted_new_image
+    # Save reference data from new image (includes some data that may not change during an item's history)
+    for reference_attribute in REFERENCE_ATTRIBUTES:
+      if reference_attribute in converted_new_image:
+        result_element[reference_attribute] = converted_new_image[reference_attribute]
 
-        # For item creation, user can come from submitted_by property
-        if 'modified_by' not in result_element and 'submitted_by' in converted_new_image:
-          # Build a dictionary of users that have modified an item
-          if converted_new_image['submitted_by'] not in user_dictionary:
-            try:
-              user_dictionary[converted_new_image['submitted_by']] = db.find(converted_new_image['submitted_by'])
+    user_pk = result_element.get('modified_by')
 
-            except Exception:
-              user_dictionary[converted_new_image['submitted_by']] = {}
-              pass
+    # For first entry (item creation), save entire new image (as an add)
+    if history_item['change_type'] == 'INSERT':
+      result_element['add'] = converted_new_image
 
-          # Save user data needed for UI display
-          if 'name' in user_dictionary[converted_new_image['submitted_by']]:
-            result_element['user_name'] = user_dictionary[converted_new_image['submitted_by']]['name']
+      # For item creation, user can come from submitted_by property
+      if 'modified_by' not in result_element and 'submitted_by' in converted_new_image:
+        user_pk = converted_new_image['submitted_by']
 
-          if 'family_name' in user_dictionary[converted_new_image['submitted_by']]:
-            result_element['user_family_name'] = user_dictionary[converted_new_image['submitted_by']]['family_name']
-
-          if 'email' in user_dictionary[converted_new_image['submitted_by']]:
-            result_element['user_email'] = user_dictionary[converted_new_image['submitted_by']]['email']
-
-      # After first entry, save image comparison data (includes action, add/update/delete, and corresponding data changes)
-      else:
-        image_difference = compare_images(convert_data_type_dictionary(history_item['change']['dynamodb']['OldImage']), converted_new_image)
-
-        for image_difference_key, image_difference_value in image_difference.items():
-          result_element[image_difference_key] = image_difference_value
-
-      result_history_dictionary[pk]['history'].append(result_element)
-
-    except Exception as e:
-      return { 'statusCode': 400, 'body': json.dumps({ 'error': '%s' %e }) }
+    # After first entry, save image comparison data (includes action, add/update/delete, and corresponding data changes)
+    else:
+      image_difference = compare_images(convert_data_type_dictionary(history_item['change']['dynamodb']['OldImage']), converted_new_image)
 
-  # Iterate over all related items
-  for related_pk in related_pk_set:
-    find_related_results = find(related_pk, False)
+      for image_difference_key, image_difference_value in image_difference.items():
+        result_element[image_difference_key] = image_difference_value
 
-    # If find fails, return its results/response
-    if find_related_results['statusCode'] != 200:
-      return find_related_results
+    history.append(result_element)
+    user_pks.append(user_pk)
 
-    result_history_dictionary[related_pk] = {'history': []}
+  return history, user_pks
 
-    # Iterate over all history table entries for the current related item
-    for history_item in find_related_results['body']:
-      try:
-        converted_new_image = convert_data_type_dictionary(history_item['change']['dynamodb']['NewImage'])
+def find_users(user_pks):
+  ''' Returns the users with the given PKs, by PK, read with a single batched query. Unknown users are omitted. '''
 
-        result_element = {'change_type': history_item['change_type']}
+  user_pks = [user_pk for user_pk in dict.fromkeys(user_pks) if isinstance(user_pk, str) and user_pk]
+  if len(user_pks) == 0:
+    return {}
 
-        # Save reference data from new image (includes some data that may not change during an item's history)
-        for reference_attribute in reference_attribute_set:
-          if reference_attribute in converted_new_image:
-            result_element[reference_attribute] = converted_new_image[reference_attribute]
+  try:
+    users = db.all(user_pks)
+  except Exception as e:
+    # Histories are still useful without user names
+    print('WARNING: Failed to read the users of a history: %s' %e)
+    return {}
 
-            if reference_attribute == 'modified_by':
-              # Build a dictionary of users that have modified an item
-              if result_element[reference_attribute] not in user_dictionary:
-                try:
-                  user_dictionary[result_element[reference_attribute]] = db.find(result_element[reference_attribute])
+  return { user['PK']: user for user in users }
 
-                except Exception:
-                  user_dictionary[result_element[reference_attribute]] = {}
-                  pass
+def add_user_data(history, user_pks, users):
+  ''' Saves the data of the user who made each change of a history, needed for UI display. '''
 
-              # Save user data needed for UI display
-              if 'name' in user_dictionary[result_element[reference_attribute]]:
-                result_element['user_name'] = user_dictionary[result_element[reference_attribute]]['name']
+  for result_element, user_pk in zip(history, user_pks):
+    user = users.get(user_pk) if isinstance(user_pk, str) else None
+    if user:
+      for user_attribute, result_attribute in USER_ATTRIBUTES:
+        if user_attribute in user:
+          result_element[result_attribute] = user[user_attribute]
 
-              if 'family_name' in user_dictionary[result_element[reference_attribute]]:
-                result_element['user_family_name'] = user_dictionary[result_element[reference_attribute]]['family_name']
+def generate(pk, related_attributes):
+  ''' Returns the history of an item and of the items it relates to through `related_attributes`.
 
-              if 'email' in user_dictionary[result_element[reference_attribute]]:
-                result_element['user_email'] = user_dictionary[result_element[reference_attribute]]['email']
+  The histories of related items are queried concurrently and converted as they arrive, and the
+  users who made the changes are then read all at once.
 
-        # For first entry (item creation), save entire new image (as an add)
-        if history_item['change_type'] == 'INSERT':
-          result_element['add'] = converted_new_image
+  :param str pk: The PK of the item.
+  :param str related_attributes: Comma separated attributes of the item holding the PKs of related items, or None.
+  '''
 
-          # For item creation, user can come from submitted_by property
-          if 'modified_by' not in result_element and 'submitted_by' in converted_new_image:
-            # Build a dictionary of users that have modified an item
-            if converted_new_image['submitted_by'] not in user_dictionary:
-              try:
-                user_dictionary[converted_new_image['submitted_by']] = db.find(converted_new_image['submitted_by'])
+  find_results = find(pk, False)
 
-              except Exception:
-                user_dictionary[converted_new_image['submitted_by']] = {}
-                pass
+  # If find fails, return its results/response
+  if find_results['statusCode'] != 200:
+    return find_results
 
-            # Save user data needed for UI display
-            if 'name' in user_dictionary[converted_new_image['submitted_by']]:
-              result_element['user_name'] = user_dictionary[converted_new_image['submitted_by']]['name']
+  if related_attributes != None:
+    related_attribute_list = related_attributes.split(',')
+  else:
+    related_attribute_list = []
 
-            if 'family_name' in user_dictionary[converted_new_image['submitted_by']]:
-              result_element['user_family_name'] = user_dictionary[converted_new_image['submitted_by']]['family_name']
+  # Related PKs in the order they were found (a dict is used as an ordered set)
+  related_pks = {}
+  histories = {}
 
-            if 'email' in user_dictionary[converted_new_image['submitted_by']]:
-              result_element['user_email'] = user_dictionary[converted_new_image['submitted_by']]['email']
+  try:
+    histories[pk] = build_history(find_results['body'], related_attribute_list, related_pks)
+  except Exception as e:
+    return { 'statusCode': 400, 'body': json.dumps({ 'error': '%s' %e }) }
 
-        # After first entry, save image comparison data (includes action, add/update/delete, and corresponding data changes)
-        else:
-          image_difference = compare_images(convert_data_type_dictionary(history_item['change']['dynamodb']['OldImage']), converted_new_image)
+  # Iterate over all related items
+  for related_pk, find_related_results in iter_find(related_pks):
+    # If find fails, return its results/response
+    if find_related_results['statusCode'] != 200:
+      return find_related_results
 
-          for image_difference_key, image_difference_value in image_difference.items():
-            result_element[image_difference_key] = image_difference_value
+    try:
+      histories[related_pk] = build_history(find_related_results['body'])
+    except Exception as e:
+      return { 'statusCode': 400, 'body': json.dumps({ 'error': '%s' %e }) }
 
-        result_history_dictionary[related_pk]['history'].append(result_element)
+  users = find_users(user_pk for _, user_pks in histories.values() for user_pk in user_pks)
 
-      except Exception as e:
-        return { 'statusCode': 400, 'body': json.dumps({ 'error': '%s' %e }) }
+  result_history_dictionary = {}
+  for history_pk, (history, user_pks) in histories.items():
+    add_user_data(history, user_pks, users)
+    result_history_dictionary[history_pk] = {'history': history}
 
   return { 'statusCode': 200, 'body': json.dumps(result_history_dictionary) }
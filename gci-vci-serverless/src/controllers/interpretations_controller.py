@@ -2,10 +2,8 @@ import datetime
 import json
 import os
 import uuid
-import pandas as pd
-import numpy as np
 
-from src.db.ddb_client import Client as DynamoClient
+from src.db.ddb_client import Client as DynamoClient, pop_page_params
 from src.helpers import interpretation_helpers
 from src.utils.exceptions import PopulatorException, NormalizerException
 from src.models.model_data_populator import populate_fields
@@ -50,7 +48,7 @@ def handle(event):
       if event['pathParameters'] is not None and 'pk' in event.get('pathParameters', {}):
         print ('In interpretation find by PK %s' %event['pathParameters']['pk'])
         filters['variant'] = event['pathParameters']['pk']
-        response = find(filters)
+        response = find(filters, pop_page_params(event['queryStringParameters']))
       else:
         # note that `queryStringParameters` always exist in `event`, therefore
         # `event.get('queryStringParameters', {})` will still be None instead of {} if no querystring.
@@ -127,18 +125,23 @@ def update(pk, attrs):
 
   return response
 
-def find(filters={}):
+def find(filters={}, page_params=None):
   """Queries dynamoDB for interpretation objects based on filters.
   Note that interpretation objects are embedded with related objects.
   This endpoint function is used by interpretation (variant central) page to query a list of interpretations that belong to a variant.
   
-  Returns a response object that includes a list of interpretation objects.   
+  Returns a response object that includes a list of interpretation objects, or a single page of them
+  (`{ items, cursor }`) if `page_size` or `cursor` is given.
   """
   # Some basic check on PK to make sure we're not trying to find a totally
   # bogus object. 
   if filters is None or not bool(filters) :
     return { 'statusCode': 422, 'body': json.dumps({ 'error': 'Invalid primary key for interpretation obj find'}) }
   try:
+    if page_params:
+      page = db.query_page('item_type', 'interpretation', filters, embed=True, **page_params)
+      return { 'statusCode': 200, 'body': json.dumps(page) }
+
     interpretations = db.query_by_item_type('interpretation', filters, embed=True)
   except (PopulatorException, NormalizerException) as error:
     return { 'statusCode': 500, 'body': json.dumps({ 'error': str(error) }) }
@@ -153,6 +156,7 @@ def find(filters={}):
 
 def get(query_params= {}):
   print (f'Interpretations query_params {query_params} ' )
+  page_params = pop_page_params(query_params)
   # If 'PK' is in query_params, find interpretation by PK
   if (bool(query_params) and 'PK' in query_params):
     try:
@@ -162,6 +166,17 @@ def get(query_params= {}):
       response = { 'statusCode': 400, 'body': json.dumps({ 'error': '%s' %e }) }
     else:
       response = { 'statusCode': 200, 'body': json.dumps(interpretation) }
+  elif page_params:
+    """Queries and returns a single page of Interpretation objects, with the projections asked for if any.
+    """
+    projections = query_params.pop('projections', None)
+    try:
+      page = db.query_page('item_type', 'interpretation', query_params, projections, **page_params)
+    except Exception as e:
+      print ('Exception during Get Interpretations page %s ' %e )
+      response = { 'statusCode': 400, 'body': json.dumps({ 'error': '%s' %e }) }
+    else:
+      response = { 'statusCode': 200, 'body': json.dumps(page) }
   else:
     """Queries and returns all Interpretation objects for tables in home page in UI.
     """
@@ -130,22 +130,22 @@ def publish(pk):
   # Construct message
   try:
     if data_type_to_publish == 'interpretation':
-      message_template = deepcopy(messaging_helpers.publish_interpretation_message_template)
+      message_template = messaging_helpers.render_message_template(messaging_helpers.publish_interpretation_message_template, messaging_data)
       data_to_remove = messaging_helpers.publish_interpretation_data_to_remove
-      messaging_helpers.add_data_to_message_template(messaging_data, None, None, message_template)
 
     else:
       # Determine which message template to use.  Support v7 and v8
       if 'variantIsDeNovo' in messaging_data['resource']['classificationPoints']['autosomalDominantOrXlinkedDisorder']:
-        message_template = deepcopy(messaging_helpers.publish_classification_message_template_v7)
+        classification_template = messaging_helpers.publish_classification_message_template_v7
         templateVersion = 7
       else:
-        message_template = deepcopy(messaging_helpers.publish_classification_message_template)
+        classification_template = messaging_helpers.publish_classification_message_template
         templateVersion = 8
 
       classification_points = deepcopy(evidence_counts_to_publish)
-      messaging_helpers.add_data_to_message_template(messaging_data, messaging_helpers.gather_evidence(evidence_to_publish, publishing_affiliation, templateVersion),
-        messaging_helpers.gather_evidence_counts(classification_points, True, templateVersion), message_template)
+      message_template = messaging_helpers.render_message_template(classification_template, messaging_data,
+        messaging_helpers.gather_evidence(evidence_to_publish, publishing_affiliation, templateVersion),
+        messaging_helpers.gather_evidence_counts(classification_points, True, templateVersion))
       message = json.dumps(message_template, separators=(',', ':'))
 
   except Exception as e:
@@ -185,6 +185,10 @@ def publish(pk):
     if message_results['status'] == 'Success':
       print('\n**** Messaging Success: publish success\n Data - %s \n ****\n' % message)
       return { 'statusCode': 200, 'body': json.dumps(message_results) }
+    elif message_results['status'] == 'Pending':
+      # Sent, but not acknowledged in time; publishing it again may duplicate it
+      print('\n**** Messaging Warning: publish - delivery not confirmed\n Data - %s \n ****\n' % message)
+      return { 'statusCode': 202, 'body': json.dumps(message_results) }
     else:
       print('\n**** Messaging Error: publish - Kafka server error\n Data - %s \n ****\n' % message)
       print('\n**** Messaging Error: publish - Return Kafka error: %s \n ****\n' % message_results['message'])
@@ -226,9 +230,8 @@ def generate_clinvar_data(pk):
 
   # Collect data for ClinVar submission
   try:
-    submission_template = deepcopy(messaging_helpers.publish_interpretation_message_template)
+    submission_template = messaging_helpers.render_message_template(messaging_helpers.publish_interpretation_message_template, messaging_data)
     data_to_remove = messaging_helpers.publish_interpretation_data_to_remove
-    messaging_helpers.add_data_to_message_template(messaging_data, None, None, submission_template)
 
   except Exception as e:
     print('\n**** Messaging Error: Generate clinvar data - Failed to build complete ClinVar submission \n Data - %s \n ****\n' % messaging_data)
@@ -309,6 +312,10 @@ def produce_data(messaging_data, action):
     if message_results['status'] == 'Success':
       print('\n**** Messaging Success: ' + action + ' - Success\n Data - %s \n ****\n' % message)
       return { 'statusCode': 200, 'body': json.dumps(message_results) }
+    elif message_results['status'] == 'Pending':
+      # Sent, but not acknowledged in time; sending it again may duplicate it
+      print('\n**** Messaging Warning: ' + action + ' - delivery not confirmed\n Data - %s \n ****\n' % message)
+      return { 'statusCode': 202, 'body': json.dumps(message_results) }
     else:
       print('\n**** Messaging Error: ' + action + ' - Kafka server error\n Data - %s \n ****\n' % message)
       print('\n**** Messaging Error: ' + action + ' - Return error: - %s \n ****\n' % message_results['message'])
@@ -3,7 +3,7 @@ import datetime
 import os
 import simplejson as json
 
-from src.db.ddb_client import Client as DynamoClient
+from src.db.ddb_client import Client as DynamoClient, pop_page_params
 
 from src.helpers import interpretation_helpers
 from src.helpers import snapshot_helpers
@@ -71,9 +71,13 @@ def get(query_params= {}):
   if 'target' in query_params:
     response = snapshot_report_helpers.generate_api_report(db, query_params)
   else:
+    page_params = pop_page_params(query_params)
     try:
-      # Queries and returns requested snapshot objects
-      snapshots = db.query_by_item_type('snapshot', query_params, False)
+      # Queries and returns requested snapshot objects, one page at a time if asked to
+      if page_params:
+        snapshots = db.query_page('item_type', 'snapshot', query_params, **page_params)
+      else:
+        snapshots = db.query_by_item_type('snapshot', query_params, False)
     except Exception as e:
       print ('ERROR: Exception during Get snapshots %s ' %e )
       response = { 'statusCode': 400, 'body': json.dumps({ 'error': '%s' %e }) }
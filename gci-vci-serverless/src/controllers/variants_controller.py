@@ -7,7 +7,7 @@ import traceback
 
 from botocore.exceptions import ClientError
 
-from src.db.ddb_client import Client as DynamoClient
+from src.db.ddb_client import Client as DynamoClient, pop_page_params
 import src.clients.clinvar_client as clinvar_client
 import src.clients.car_client as car_client
 import src.clients.ensembl_vep_client as ensembl_vep_client
@@ -18,6 +18,8 @@ from src.clients.car_client import ClientError as CarClientError
 from src.helpers.variant_helpers.hgvs_notation import get_hgvs_notation
 from src.helpers.variant_helpers.variant_title import preferred_title_for
 from src.helpers.variant_helpers.lovd import get_lovd
+from src.helpers.fetch_plan import FetchPlan, DeadlineExceeded, DependencyFailed
+from src.helpers.variant_title_index import variant_title_index
 from src.parsers.variant_xml_clinvar_interpretation_parser import from_xml as parse_clinvar_interpretations
 
 
@@ -50,7 +52,7 @@ def handle(event):
     ):
       response = get_lovd_link(event['queryStringParameters']['geneName'], event['queryStringParameters']['variantOnGenome'])
     else:
-      response = { 'statusCode': 400, 'body': json.dumps({ 'error': 'Unrecognized request ' + httpMethod + ' for /variants' }) }
+      response = get(event['queryStringParameters'])
 
   elif httpMethod == 'POST':
     try:
@@ -139,51 +141,70 @@ def find_by_basic_info(variant_source, variant_id):
   :param variant_source: either `clinvar` or `car`
   """
 
+  # ClinVar, CAR and Ensembl VEP are queried concurrently as soon as the identifiers they need are known.
   # Initialize clinvar data, best effort to acquire clinvar regardless of variant source
-  clinvar_xml = None
-  clinvar_id = None
+  # `clinvar_xml` is parsed once and the document is shared by all the ClinVar parsers below
   print ("Basic info for source %s variant id %s" %(variant_source,variant_id))
-  # Retrieve variant object; and best effort to assign `clinvar_xml` and `clinvar_id`
+  plan = FetchPlan()
+
+  # Retrieve variant object; and best effort to assign `clinvar_xml`
   if variant_source == 'clinvar':
-    clinvar_id = variant_id
-    try:
-      clinvar_xml = clinvar_client.fetch(clinvar_id)
-      variant = clinvar_client.find(clinvar_xml=clinvar_xml, compute_preferred_title=False)
-    except ClinVarClientError as e:
-      return { 'statusCode': 500, 'body': json.dumps({ "error": e.message + ' ' + str(e.status_code) }) }
+    plan.add('clinvar_xml', fetch_clinvar_document, variant_id)
+    plan.add('variant', lambda clinvar_xml: clinvar_client.find(clinvar_xml=clinvar_xml, compute_preferred_title=False), requires=('clinvar_xml',))
   elif variant_source == 'car':
-    try:
-      variant = car_client.find(variant_id, compute_preferred_title=False)
-      if 'clinvarVariantId' in variant and variant['clinvarVariantId']:
-        clinvar_id = variant['clinvarVariantId']
-        clinvar_xml = clinvar_client.fetch(clinvar_id)
-    except CarClientError as e:
-      return { 'statusCode': 500, 'body': json.dumps({ "error": e.message + ' ' + str(e.status_code) }) }
+    plan.add('variant', lambda: car_client.find(variant_id, compute_preferred_title=False))
+    plan.add('clinvar_xml', lambda variant: fetch_clinvar_document(variant.get('clinvarVariantId')), requires=('variant',))
   else:
     return {'statusCode': 400, 'body': json.dumps({
       'error': 'variant_source must be clinvar or car, but given ' + variant_source
     })}
 
-  # Retrieve transcripts from Ensembl VEP 
-  hgvs_notation = get_hgvs_notation(variant, 'GRCh38', True)
+  # Retrieve transcripts from Ensembl VEP, while the ClinVar interpretations are parsed
+  plan.add('variant_effects', lambda variant: ensembl_vep_client.find(get_hgvs_notation(variant, 'GRCh38', True)), requires=('variant',))
+  plan.add('clinvar_interpretations', lambda clinvar_xml: parse_clinvar_interpretations(clinvar_xml) if clinvar_xml else None, requires=('clinvar_xml',))
+  plan.run()
+
+  # Only the variant itself is required; ClinVar and VEP results that failed or missed the
+  # deadline are left out and whatever did finish is returned
+  variant_error = plan.error('variant')
+  while isinstance(variant_error, DependencyFailed):
+    variant_error = variant_error.error
+  if isinstance(variant_error, (ClinVarClientError, CarClientError)):
+    return { 'statusCode': 500, 'body': json.dumps({ "error": variant_error.message + ' ' + str(variant_error.status_code) }) }
+  if isinstance(variant_error, DeadlineExceeded):
+    return { 'statusCode': 504, 'body': json.dumps({ "error": str(variant_error) }) }
+  if variant_error is not None:
+    raise variant_error
+
+  # best effort for car variants, whose ClinVar record is optional
+  clinvar_xml = plan.result('clinvar_xml', None)
+  if plan.error('clinvar_xml') is not None:
+    print('WARNING: No ClinVar data for %s %s: %s' %(variant_source, variant_id, plan.error('clinvar_xml')))
+
   variant_effects = {}
   try:
-    variant_effects = ensembl_vep_client.find(hgvs_notation)
+    variant_effects = plan.result('variant_effects')
   except ensembl_vep_client.EnsemblVEPClientError as e:
     print('No valid ClinVar data returned for %s %s' %(variant_source, variant_id))
     traceback.print_exc()
     return { 'statusCode': 400, 'body': json.dumps({ "error": e.message + ' ' + str(e.status_code) }) }
+  except DeadlineExceeded as e:
+    print('WARNING: No Ensembl VEP data for %s %s: %s' %(variant_source, variant_id, e))
+    variant_effects = {}
   try:
     # best effort to get primary transcript from clinvar, since clinvar may not be available for car variants
-    variant_effects = ensembl_vep_client.get_clinvar_primary_transcript(variant_effects, clinvar_xml)
+    if variant_effects:
+      variant_effects = ensembl_vep_client.get_clinvar_primary_transcript(variant_effects, clinvar_xml)
   except ensembl_vep_client.EnsemblVEPClientError as e:
     print('No valid ClinVar data returned for %s %s' %(variant_source, variant_id))
     traceback.print_exc()
     #return { 'statusCode': 400, 'body': json.dumps({ "error": e.message + ' ' + str(e.status_code) }) }
   
   # Retrieve interpretations from clinvar
-  if clinvar_xml:
-    clinvar_interpretations = parse_clinvar_interpretations(clinvar_xml)
+  clinvar_interpretations = plan.result('clinvar_interpretations', None)
+  if clinvar_xml and plan.error('clinvar_interpretations') is not None:
+    print('WARNING: No ClinVar interpretations for %s %s: %s' %(variant_source, variant_id, plan.error('clinvar_interpretations')))
+  if clinvar_interpretations:
     variant_effects = {
       **variant_effects, **clinvar_interpretations
     }
@@ -195,6 +216,12 @@ def find_by_basic_info(variant_source, variant_id):
   
   return response
 
+def fetch_clinvar_document(clinvar_id):
+  """Fetches and parses the ClinVar VCV record of a variant; None if the variant has no ClinVar ID."""
+  if not clinvar_id:
+    return None
+  return clinvar_client.parse(clinvar_client.fetch(clinvar_id))
+
 def get_lovd_link(gene_name, variant_on_genome):
   try:
     lovd = get_lovd(gene_name, variant_on_genome)
@@ -222,6 +249,28 @@ def find(pk):
 
   return response
 
+def get(filters):
+  """Queries and returns a single page of variant objects. `page_size` or `cursor` is required, variants are never listed all at once"""
+
+  page_params = pop_page_params(filters)
+  if not page_params:
+    return { 'statusCode': 400, 'body': json.dumps({ 'error': 'Unrecognized request GET for /variants' }) }
+
+  try:
+    page = db.query_page('item_type', 'variant', filters, **page_params)
+  except Exception as e:
+    return { 'statusCode': 400, 'body': json.dumps({ 'error': '%s' %e }) }
+
+  return { 'statusCode': 200, 'body': json.dumps(page) }
+
+def find_live_variants(index_items):
+  """Reads the variants found on the clinvarVariantId or carId index, which only projects keys, leaving out deleted ones"""
+
+  pks = [item['PK'] for item in index_items]
+  if not pks:
+    return []
+  return [item for item in db.all(pks) if item.get('item_type') == 'variant' and item.get('status') != 'deleted']
+
 def create_or_update(variant):
   """Saves a Variant type to the database. 
   
@@ -245,14 +294,9 @@ def create_or_update(variant):
         try:
           # we want to access `variant.status` to filter out deleted variant
           # note that `db.query_by_clinvar_variant_id()` does not return the complete variant object
-          # only an object with key `carId`, `clinvarVariantId` and `PK`; 
-          # so we need `db.query_by_item_type` in order to access `status`.
-          # another way is to add `status` to `NonKeyAttributes` for DynamoDB
-          # but may require updating dynamoDB table
-          variants = db.query_by_item_type('variant', filters={
-            'clinvarVariantId': variant['clinvarVariantId'],
-            'status!': 'deleted'
-          })
+          # only an object with key `carId`, `clinvarVariantId` and `PK`;
+          # so the matching variants are read by PK to access `status`.
+          variants = find_live_variants(db.query_by_clinvar_variant_id(variant['clinvarVariantId']))
         except Exception as e:
           return { 'statusCode': 422, 'body': json.dumps({ 'error': '%s' %e }) }
         else:
@@ -262,10 +306,7 @@ def create_or_update(variant):
 
       if source_variant is None and 'carId' in variant:
         try:
-          variants = db.query_by_item_type('variant', filters={
-            'carId': variant['carId'],
-            'status!': 'deleted'
-          })
+          variants = find_live_variants(db.query_by_car_id(variant['carId']))
         except Exception as e:
           return { 'statusCode': 422, 'body': json.dumps({ 'error': '%s' %e }) }
         else:
@@ -316,6 +357,7 @@ def create(variant):
   except Exception as e:
     response = { 'statusCode': 422, 'body': json.dumps({ 'error': '%s' %e }) }
   else:
+    variant_title_index.record(variant)
     response = { 'statusCode': 201, 'body': json.dumps(variant) }
 
   return response
@@ -354,6 +396,7 @@ def update(pk, attrs):
   except Exception as e:
     response = { 'statusCode': 422, 'body': json.dumps({ 'error': '%s' %e }) }
   else:
+    variant_title_index.record(variant)
     response = { 'statusCode': 200, 'body': json.dumps(variant) }
 
   return response
@@ -382,33 +425,48 @@ def get_preferred_title_for_migrated_variant(migrated_variant):
   clinvarVariantId = migrated_variant.get('clinvarVariantId')
   carId = migrated_variant.get('carId')
 
+  # Ensembl VEP, ClinVar and CAR are queried concurrently, under one deadline.
   # Ensembl VEP transcripts requires CAR or Clinvar client working in order to be processed
   # When `effective_vep_transcripts` is a list, will skip Ensembl API request in Clinvar or CAR client;
   # otherwise, if `effective_vep_transcripts=None`, will attempt request Ensembl API in Clinvar or CAR client
-  effective_vep_transcripts = None
+  # CAR is queried speculatively alongside ClinVar, so a ClinVar failure does not add a CAR round trip
+  plan = FetchPlan()
   if clinvarVariantId or carId:
     # set `raise_external_api_exception=False` to continue processing preferred title even if Ensembl VEP API not available (may be temporarily not responding, or not found given the hgvs notation)
     # i.e., fall back, only consider Clinvar title and GRCh37/38, etc
-    effective_vep_transcripts = ensembl_vep_client.get_effective_vep_transcripts_by_variant(migrated_variant, raise_external_api_exception=False)
-  
+    plan.add('vep', ensembl_vep_client.get_effective_vep_transcripts_by_variant, migrated_variant, False)
+  if clinvarVariantId:
+    plan.add('clinvar_xml', fetch_clinvar_document, clinvarVariantId)
+  if carId:
+    plan.add('car_data', car_client.fetch, carId)
+  plan.run()
+
+  # if Ensembl VEP did not answer in time, compute the title without its transcripts (skipping MANE and Canonical titles)
+  effective_vep_transcripts = plan.result('vep', [])
+
   # note that we cannot compute perferred title right away here, because we still need gene information from Clinvar or CAR API, and variant object does not store gene info. Therefore, we have to go through Clinvar and CAR client, and let them compute the perferred title
   variant = {}
 
   # process as a Clinvar variant
   if clinvarVariantId:
     try:
-      variant = clinvar_client.find(clinvarVariantId, ensembl_vep_transcripts=effective_vep_transcripts)
+      variant = clinvar_client.find(clinvar_xml=plan.result('clinvar_xml'), ensembl_vep_transcripts=effective_vep_transcripts)
     except ClinVarClientError as error:
       # in case Clinvar API failed, we may try carId next
       print(f'WARNING: queried variant by clinvarVariantId {clinvarVariantId} but ClinvarClient reported error: {error.message}. An existing clinvarVariantId means the data should be available on Clinvar API, but it could be the API temporary unavailable. Will try to query CAR instead. Note that Clinvar is favored over CAR data.')
+    except DeadlineExceeded as error:
+      print(f'WARNING: queried variant by clinvarVariantId {clinvarVariantId} but ClinVar did not respond in time: {error}. Will try to use CAR data instead.')
 
   # process as a CAR variant
   if not variant and carId:
     try:
-      variant = car_client.find(carId, ensembl_vep_transcripts=effective_vep_transcripts)
+      car_data = plan.result('car_data')
+      variant = car_client.find(car_data=car_data, ensembl_vep_transcripts=effective_vep_transcripts) if car_data is not None else None
     except CarClientError as error:
       # even if CAR failed, still try to continue
       print(f'WARNING: queried variant by CAR id {carId} but CARClient reported error: {error.message}. Will try to continue computing preferred title with the migrated variant data. You may want to re-try later since the CAR API may be temparorily unavailable.')
+    except DeadlineExceeded as error:
+      print(f'WARNING: queried variant by CAR id {carId} but CAR did not respond in time: {error}. Will try to continue computing preferred title with the migrated variant data.')
   
   # in case both Clinvar and CAR API failed or not found (i.e. `variant` is None), we don't have gene info,
   # still try to compute preferred title (may be less accurate, e.g., only GRCh38 w/o amino acid info) with the migrated variant data we have
@@ -0,0 +1,53 @@
+''' Converts DynamoDB AttributeValues (the low level client's wire format) to JSON-native Python objects.
+
+This is what `TypeDeserializer` followed by a `json.loads(json.dumps(..., cls=SetJSONEncoder))`
+round trip used to produce, built in a single pass without the intermediate Decimals, sets
+and JSON string:
+
+  S, BOOL, NULL  str, bool, None
+  N              int, or float if the number has a fraction or an exponent (e.g. `1.5`, `1E+2`)
+  M, L           dict, list
+  SS, NS         list, in the order DynamoDB returned the members (sets had no order)
+  B, BS          bytes, list of bytes (the JSON round trip could not encode binary at all)
+'''
+
+def to_number(value):
+  ''' Converts the string of an `N` AttributeValue, as json.loads would read str(Decimal(value)). '''
+
+  if '.' in value or 'e' in value or 'E' in value:
+    return float(value)
+  return int(value)
+
+def to_value(attribute_value):
+  ''' Converts a single AttributeValue, e.g. `{ 'S': 'abc' }`, and everything nested in it. '''
+
+  (type_name, value), = attribute_value.items()
+  if type_name == 'S':
+    return value
+  if type_name == 'M':
+    return { k: to_value(v) for k, v in value.items() }
+  if type_name == 'L':
+    return [to_value(v) for v in value]
+  if type_name == 'N':
+    return to_number(value)
+  if type_name == 'BOOL':
+    return value
+  if type_name == 'NULL':
+    return None
+  if type_name == 'SS':
+    return list(value)
+  if type_name == 'NS':
+    return [to_number(v) for v in value]
+  if type_name == 'B':
+    return bytes(value)
+  if type_name == 'BS':
+    return [bytes(v) for v in value]
+  raise TypeError(f'Dynamodb type {type_name} is not supported')
+
+def to_item(ddb_item):
+  ''' Converts an item returned by DynamoDB, e.g. `{ 'PK': { 'S': '...' }, ... }`, to a dict. '''
+
+  return { k: to_value(v) for k, v in ddb_item.items() if v }
+
+def to_items(ddb_items):
+  return [to_item(ddb_item) for ddb_item in ddb_items]
@@ -1,16 +1,27 @@
+import base64
 import botocore
+import copy
+import hashlib
+import hmac
 import json
 import os
+import random
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import boto3
 from botocore.config import Config
 from botocore.exceptions import ClientError
 from botocore.exceptions import BotoCoreError
-from boto3.dynamodb.types import TypeDeserializer
+from boto3.dynamodb.types import TypeSerializer
 from boto3.dynamodb.transform import TransformationInjector
 
-from src.utils.json import SetJSONEncoder
+from src.utils import tracing
+from src.utils.exceptions import QueryCursorException
+from src.db import attribute_values
 from src.models.item_type_serializer import ModelSerializer
 
 
@@ -23,8 +34,206 @@ class IndexNames:
   HGNC_GROUP_INDEX_NAME = 'hgnc_group_index'
   AFFILIATION_INDEX = 'affiliation_index'
 
+# Secondary indexes configured with `ProjectionType: ALL`, whose query results are complete items.
+FULL_ITEM_INDEX_NAMES = (IndexNames.ITEM_TYPE_INDEX_NAME, IndexNames.AFFILIATION_INDEX)
+
+# Partition keys that `Client.query_page` can query by, and the index serving each.
+# `PK` queries the table itself, e.g. all versions of an item in the history table.
+QUERY_INDEX_NAMES = {
+  'item_type': IndexNames.ITEM_TYPE_INDEX_NAME,
+  'affiliation': IndexNames.AFFILIATION_INDEX,
+  'hgnc': IndexNames.HGNC_TYPE_INDEX_NAME,
+  'gr': IndexNames.HGNC_GROUP_INDEX_NAME,
+  'carId': IndexNames.CAR_ID_INDEX_NAME,
+  'clinvarVariantId': IndexNames.CLINVAR_VARIANT_ID_INDEX_NAME,
+  'PK': None,
+}
+
+# Query string parameters list endpoints accept to return one page instead of every item.
+PAGE_SIZE_PARAM = 'page_size'
+CURSOR_PARAM = 'cursor'
+
+def pop_page_params(query_params):
+  ''' Removes the pagination parameters from a request's query string parameters.
+
+  Returns None if the request did not ask for a page, otherwise `{ 'page_size': ..., 'cursor': ... }`
+  to pass on to `Client.query_page`. The remaining query string parameters can be used as filters.
+  '''
+
+  if not query_params or (PAGE_SIZE_PARAM not in query_params and CURSOR_PARAM not in query_params):
+    return None
+
+  return {
+    'page_size': query_params.pop(PAGE_SIZE_PARAM, None),
+    'cursor': query_params.pop(CURSOR_PARAM, None)
+  }
+
+
+class QueryCursor:
+  ''' Encodes a query's LastEvaluatedKey into an opaque, signed token and back.
+
+  The token is bound to the query that produced it, so it cannot be tampered with or replayed
+  against a different query. Tokens are signed with `QUERY_CURSOR_SECRET`, shared by every Lambda
+  container so that a cursor resumes wherever the next request lands. Without it paging is refused
+  rather than signed with a key only one container knows.
+  '''
+
+  @classmethod
+  def secret(cls):
+    secret = os.environ.get('QUERY_CURSOR_SECRET', '')
+    if not secret:
+      raise QueryCursorException('QueryCursorError: paging is disabled, QUERY_CURSOR_SECRET is not configured')
+    return secret.encode('utf-8')
+
+  @classmethod
+  def encode(cls, last_evaluated_key, query_params):
+    payload = base64.urlsafe_b64encode(
+      json.dumps(last_evaluated_key, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    ).decode('ascii').rstrip('=')
+    return f'{payload}.{cls._sign(payload, query_params)}'
+
+  @classmethod
+  def decode(cls, cursor, query_params):
+    try:
+      payload, signature = cursor.split('.')
+      if not hmac.compare_digest(signature, cls._sign(payload, query_params)):
+        raise ValueError('signature mismatch')
+      padding = '=' * (-len(payload) % 4)
+      return json.loads(base64.urlsafe_b64decode(payload + padding))
+    except (AttributeError, TypeError, ValueError) as e:
+      raise QueryCursorException(f'QueryCursorError: invalid or expired cursor: {e}')
+
+  @classmethod
+  def _sign(cls, payload, query_params):
+    # Everything but the position and page size identifies the query.
+    query = {k: v for k, v in query_params.items() if k not in ('ExclusiveStartKey', 'Limit')}
+    message = json.dumps(query, sort_keys=True, separators=(',', ':')) + '|' + payload
+    digest = hmac.new(cls.secret(), message.encode('utf-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+
+class IdentityMap:
+  ''' A read-through cache of items keyed by table name and PK.
+
+  Meant to live for a single request (Lambda invocation): every Client read path consults it
+  before going to DynamoDB and records what it fetched, while writes through a Client drop the
+  affected PK. Items are stored and handed out as copies so callers are free to mutate them.
+  '''
+
+  def __init__(self):
+    self.items = {}
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+
+  def get(self, table_name, pk):
+    ''' Returns a copy of the cached item, or None (counted as a miss) if it is not cached. '''
+
+    with self._lock:
+      item = self.items.get((table_name, pk))
+      if item is None:
+        self.misses += 1
+        return None
+      self.hits += 1
+    return copy.deepcopy(item)
+
+  def add(self, table_name, items):
+    ''' Caches full items read from `table_name`. '''
+
+    with self._lock:
+      for item in items:
+        if item.get('PK'):
+          self.items[(table_name, item['PK'])] = copy.deepcopy(item)
+
+  def invalidate(self, table_name, pk):
+    with self._lock:
+      self.items.pop((table_name, pk), None)
+
+  def stats(self):
+    return {
+      'items': len(self.items),
+      'hits': self.hits,
+      'misses': self.misses
+    }
+
+
+# The identity map shared by all clients for the current request, see `request_identity_map()`.
+_identity_map = None
+
+@contextmanager
+def request_identity_map():
+  ''' Enables a shared IdentityMap for every Client for the duration of the block.
+
+  Repeated reads of the same PK inside the block are served from memory after the first fetch.
+  Nested use reuses the outer map. Yields the IdentityMap so callers can report its stats.
+  '''
+
+  global _identity_map
+
+  if _identity_map is not None:
+    yield _identity_map
+    return
+
+  _identity_map = IdentityMap()
+  try:
+    yield _identity_map
+  finally:
+    _identity_map = None
+
+
+# boto3 DynamoDB clients shared by every Client in the (warm) Lambda container that uses
+# the default configuration, keyed by whether they target DynamoDB local.
+_shared_ddb_clients = {}
+_shared_ddb_clients_lock = threading.Lock()
+
+# Marks a Client whose boto3 client has not been created yet.
+_UNSET = object()
+
+# TypeSerializer keeps no state, so one instance serves every Client and builder, on any thread.
+_type_serializer = TypeSerializer()
+
+def get_shared_ddb_client(is_offline):
+  ''' Returns the container-wide boto3 DynamoDB client, creating it on first use.
+
+  Controllers each build a module-level Client; sharing the boto3 client means an import
+  does not create one and they all reuse a single connection pool.
+  '''
+
+  if is_offline not in _shared_ddb_clients:
+    with _shared_ddb_clients_lock:
+      if is_offline not in _shared_ddb_clients:
+        _shared_ddb_clients[is_offline] = _create_ddb_client(is_offline, Client.default_config())
+  return _shared_ddb_clients[is_offline]
+
+def _create_ddb_client(is_offline, ddb_config):
+  # if 'IS_OFFLINE' in os.environ and os.environ['IS_OFFLINE'] == 'true':
+  if is_offline:
+    # print('DEBUG: Using offline settings for dynamodb.')
+    ddb_client = boto3.client('dynamodb', endpoint_url='http://localhost:8000', config=ddb_config)
+  else:
+    ddb_client = boto3.client('dynamodb', config=ddb_config)
+
+  tracing.instrument_boto3_client(ddb_client, 'dynamodb')
+  return ddb_client
+
 
 class Client:
+
+  # DynamoDB rejects a batch_get_item request asking for more than 100 keys.
+  BATCH_GET_MAX_KEYS = 100
+  # Upper bound on batch_get_item chunks in flight at once for a single `all()` call.
+  BATCH_GET_MAX_WORKERS = 8
+  # Retry budget and backoff (seconds) for keys DynamoDB returns in `UnprocessedKeys`.
+  BATCH_GET_MAX_RETRIES = 8
+  BATCH_GET_BASE_BACKOFF = 0.05
+  BATCH_GET_MAX_BACKOFF = 2.0
+  # DynamoDB rejects a batch_write_item or transact_write_items request with more than 25 items.
+  BATCH_WRITE_MAX_ITEMS = 25
+  # Retry budget for items DynamoDB returns in `UnprocessedItems`, with the backoff of batch reads.
+  BATCH_WRITE_MAX_RETRIES = 8
+  # Page sizes for `query_page`.
+  DEFAULT_PAGE_SIZE = 100
+  MAX_PAGE_SIZE = 1000
  
   def __init__(self, table_name, is_offline, config=None):
     """Initializes a client that can interact with our DynamoDB instance.
@@ -34,32 +243,43 @@ class Client:
     detects if we're offline and will configure the client with the correct settings.s
     """
 
-    if config:
-      ddb_config = config
-    else:
-      ddb_config = Config(
-        signature_version = 'v4',
-        retries = {
-            'max_attempts': 10,
-            'mode': 'standard'
-        }
-      )
+    self.is_offline = is_offline
+    self.table_name = table_name
 
-    # if 'IS_OFFLINE' in os.environ and os.environ['IS_OFFLINE'] == 'true':
-    if is_offline:
-      # print('DEBUG: Using offline settings for dynamodb.')
-      self.ddb_client = boto3.client(
-          'dynamodb', endpoint_url='http://localhost:8000', config=ddb_config)
-    else:
-      self.ddb_client = boto3.client('dynamodb', config=ddb_config)
+    # The boto3 client is created on first use (see `ddb_client`), so building a
+    # Client at import time is cheap. A custom config gets a client of its own.
+    self._config = config
+    self._ddb_client = _UNSET
+
+    self.type_serializer = _type_serializer
+
+    # Thread pool used to fan out batch read and write chunks, created on first use
+    # and reused across warm invocations.
+    self._batch_executor = None
+    self._batch_executor_lock = threading.Lock()
+
+  @staticmethod
+  def default_config():
+    return Config(
+      signature_version = 'v4',
+      retries = {
+          'max_attempts': 10,
+          'mode': 'standard'
+      }
+    )
 
-    self.table_name = table_name
+  @property
+  def ddb_client(self):
+    if self._ddb_client is _UNSET:
+      if self._config:
+        self._ddb_client = _create_ddb_client(self.is_offline, self._config)
+      else:
+        self._ddb_client = get_shared_ddb_client(self.is_offline)
+    return self._ddb_client
 
-    # Force load of the DynamoDB resource. Boto3 is dynamic and
-    # if we don't do this the following types statement fails.
-    boto3.resource('dynamodb')
-    self.type_deserializer = boto3.dynamodb.types.TypeDeserializer()
-    self.type_serializer = boto3.dynamodb.types.TypeSerializer()
+  @ddb_client.setter
+  def ddb_client(self, ddb_client):
+    self._ddb_client = ddb_client
 
   def describe_endpoints(self):
     """ Implementing this as a nothing call to establish an SSL connection """
@@ -100,11 +320,11 @@ class Client:
 
     # always normalize data before writing to db, no matter `embed` is enabled or not
     item = ModelSerializer.normalize(self, item, item['item_type'])
+    if _identity_map is not None and item.get('PK'):
+      _identity_map.invalidate(self.table_name, item['PK'])
     try:
-      boto3.resource('dynamodb')
-      serializer = boto3.dynamodb.types.TypeSerializer()
       item = self.stripNullsInCreate(item)
-      ddb_item = {k: serializer.serialize(v) for k, v in item.items() if v is not None}
+      ddb_item = self.__to_ddb_item(item)
       condition_expr_builder = ConditionExpressionBuilder()
       condition_expr_builder.attribute_not_exists('PK')
       # Remove conditional expression for migration
@@ -144,6 +364,111 @@ class Client:
       else:
         return item
 
+  def put_many(self, items, overwrite=None):
+    ''' Persists a list of items with as few DynamoDB requests as possible.
+
+    Items are normalized and stripped of nulls as in `put`, then written in chunks of at most
+    `BATCH_WRITE_MAX_ITEMS`, fanned out on the batch thread pool. Returns the items written.
+
+    Like `put`, an item is only created if no item has its PK yet: each chunk is a single
+    transact_write_items request conditioned on `attribute_not_exists(PK)`, so a chunk holding an
+    existing PK is rejected as a whole (ClientError `TransactionCanceledException`) while the other
+    chunks are still written. With `overwrite`, which defaults to true when `MIGRATION` is 'true' as
+    for `put`, chunks go through batch_write_item instead, replacing existing items for half the
+    write capacity of a transaction; `UnprocessedItems` are retried with backoff.
+
+    :param list items: The items to create, each with a distinct `PK`.
+    :param bool overwrite: Replace existing items instead of failing on them.
+    '''
+
+    if overwrite is None:
+      overwrite = os.environ.get('MIGRATION', 'false') == 'true'
+
+    written_items = []
+    ddb_items = []
+    pks = set()
+    for item in items:
+      if not item.get('item_type'):
+        raise Exception(f'DynamoDBClientError: cannot create object in db because object is missing `item_type`: {item}')
+      item = self.stripNullsInCreate(ModelSerializer.normalize(self, item, item['item_type']))
+      if not item.get('PK'):
+        raise Exception(f'DynamoDBClientError: cannot create object in db because object is missing `PK`: {item}')
+      if item['PK'] in pks:
+        raise Exception(f'DynamoDBClientError: cannot create objects in db because `PK` {item["PK"]} is given more than once.')
+      pks.add(item['PK'])
+      written_items.append(item)
+      ddb_items.append(self.__to_ddb_item(item))
+
+    if _identity_map is not None:
+      for pk in pks:
+        _identity_map.invalidate(self.table_name, pk)
+
+    chunks = [
+      ddb_items[i:i + self.BATCH_WRITE_MAX_ITEMS]
+      for i in range(0, len(ddb_items), self.BATCH_WRITE_MAX_ITEMS)
+    ]
+    write_chunk = self._batch_write_chunk if overwrite else self._transact_put_chunk
+    if len(chunks) == 1:
+      write_chunk(chunks[0])
+    elif chunks:
+      # Consuming the results re-raises the first failed chunk's error
+      list(self._get_batch_executor().map(write_chunk, chunks))
+
+    return written_items
+
+  def __to_ddb_item(self, item):
+    return {k: self.type_serializer.serialize(v) for k, v in item.items() if v is not None}
+
+  def _batch_write_chunk(self, ddb_items):
+    ''' Writes a single chunk of at most `BATCH_WRITE_MAX_ITEMS` serialized items with one or more batch_write_item calls.
+
+    Re-sends any `UnprocessedItems` until the chunk is written, sleeping with full-jitter
+    exponential backoff between attempts.
+    '''
+
+    request_items = {
+      self.table_name: [{'PutRequest': {'Item': ddb_item}} for ddb_item in ddb_items]
+    }
+    attempt = 0
+    while True:
+      try:
+        ddb_res = self.ddb_client.batch_write_item(RequestItems=request_items)
+      except ClientError as ce:
+        print('ERROR: DynamoDB batch write error: %s' % ce)
+        raise
+      except BotoCoreError as be:
+        print('ERROR: BotoCore error: %s' % be)
+        raise
+
+      request_items = ddb_res.get('UnprocessedItems')
+      if not request_items:
+        return
+
+      attempt += 1
+      if attempt > self.BATCH_WRITE_MAX_RETRIES:
+        unprocessed_count = len(request_items.get(self.table_name, []))
+        raise Exception(f'DynamoDBClientError: batch write gave up after {self.BATCH_WRITE_MAX_RETRIES} retries with {unprocessed_count} items still unprocessed.')
+
+      self._sleep_before_retry(attempt)
+
+  def _transact_put_chunk(self, ddb_items):
+    ''' Creates a single chunk of at most `BATCH_WRITE_MAX_ITEMS` serialized items, all or none, failing if any PK exists. '''
+
+    condition_expr_builder = ConditionExpressionBuilder()
+    condition_expr_builder.attribute_not_exists('PK')
+    condition_expr = condition_expr_builder.build_expression()
+    try:
+      self.ddb_client.transact_write_items(TransactItems=[
+        {'Put': {'TableName': self.table_name, 'Item': ddb_item, 'ConditionExpression': condition_expr}}
+        for ddb_item in ddb_items
+      ])
+    except ClientError as ce:
+      print('ERROR: DynamoDB transact put error: %s' % ce)
+      raise
+    except BotoCoreError as be:
+      print('ERROR: BotoCore error: %s' % be)
+      raise
+
   def update(self, pk, attrs, item_type, embed=False, embed_exclude_keys=None, embed_include_keys=None):
     ''' Updates an existing item specified by the given PK
 
@@ -159,14 +484,14 @@ class Client:
 
     # always normalize data before writing to db, no matter `embed` is enabled or not
     attrs = ModelSerializer.normalize(self, attrs, item_type)
+    if _identity_map is not None:
+      _identity_map.invalidate(self.table_name, pk)
 
     try:
-      boto3.resource('dynamodb')
-      serializer = boto3.dynamodb.types.TypeSerializer()
 
       # Serialize the key for the item that will be updated. We also ensure that 'PK' is not
       # included in the attributes otherwise DynamoDB will throw an error.
-      key = {'PK':  serializer.serialize(pk)}
+      key = {'PK':  self.type_serializer.serialize(pk)}
       if 'PK' in attrs:
         del attrs['PK']
 
@@ -201,13 +526,8 @@ class Client:
       raise
     else:
       if ddb_update_res['ResponseMetadata']['HTTPStatusCode'] == 200:
-        ddb_item = ddb_update_res['Attributes']
-        deserializer = boto3.dynamodb.types.TypeDeserializer()
-        item = {k: deserializer.deserialize(v)
-                                            for k, v in ddb_item.items() if v}
-
-        item = json.loads(json.dumps(item, cls=SetJSONEncoder))
-        return ModelSerializer.populate(self, item, exclude_key_list=embed_exclude_keys, include_key_list=embed_include_keys) if embed else item
+        item = attribute_values.to_item(ddb_update_res['Attributes'])
+        return ModelSerializer.populate(self, item, exclude_key_list=embed_exclude_keys, include_key_list=embed_include_keys, in_place=True) if embed else item
       else:
         return None
 
@@ -215,9 +535,17 @@ class Client:
     """Retrieves the item from our database with the given PK.
 
     Returns an item using DynamoDB's get_item() interface with the
-    given PK. If not found it returns None.
+    given PK. If not found it returns None. When a request identity map
+    is active a previously read item is returned without calling DynamoDB.
     """
 
+    if _identity_map is not None:
+      item = _identity_map.get(self.table_name, pk)
+      if item is not None:
+        if embed is True:
+          item = ModelSerializer.populate(self, item, exclude_key_list=embed_exclude_keys, include_key_list=embed_include_keys, in_place=True)
+        return item
+
     try:
       ddb_get_item_res = self.ddb_client.get_item(
         Key={
@@ -240,63 +568,136 @@ class Client:
         except:
           return None
         else:
-          # Force load of the DynamoDB resource. Boto3 is dynamic and
-          # if we don't do this the following types statement fails.
-          boto3.resource('dynamodb')
-          deserializer = boto3.dynamodb.types.TypeDeserializer()
-
-          item = {k: deserializer.deserialize(v)
-                                              for k, v in ddb_item.items() if v}
+          item = attribute_values.to_item(ddb_item)
 
-          item = json.loads(json.dumps(item, cls=SetJSONEncoder))
+          if _identity_map is not None:
+            _identity_map.add(self.table_name, [item])
 
           if embed is True:
             # print("DEBUG: pass thru populate")
-            item =  ModelSerializer.populate(self, item, exclude_key_list=embed_exclude_keys, include_key_list=embed_include_keys)
+            item =  ModelSerializer.populate(self, item, exclude_key_list=embed_exclude_keys, include_key_list=embed_include_keys, in_place=True)
 
           return item
       else:
         return None
 
-  def all(self, pks):
+  def all(self, pks, projections=None):
     ''' Retrieves all items with the given list of primary keys.
 
     Uses DynamoDB's batch_get_item action to fetch items that match the given primary keys.
-    If successful returns a list of items.
+    Keys are de-duplicated and split into chunks of at most `BATCH_GET_MAX_KEYS`, and the chunks
+    are fetched concurrently on a bounded thread pool. Keys DynamoDB reports as `UnprocessedKeys`
+    are retried with jittered exponential backoff. If successful returns a list of items, one per
+    distinct primary key found, in the order the keys were first given. Keys that do not exist
+    in the table are omitted.
 
     :param list pks: List of primary keys for the items you want to retrieve from the database.
+    :param str projections: Optional projection expression. Projected reads bypass the request identity map.
     '''
 
     if len(pks) == 0:
       return []
 
-    keys = [{'PK': self.type_serializer.serialize(pk)} for pk in pks if pk]
+    # Preserve the caller's ordering while dropping empty and duplicate keys;
+    # DynamoDB rejects a batch request that contains the same key twice.
+    unique_pks = list(dict.fromkeys(pk for pk in pks if pk))
+    if len(unique_pks) == 0:
+      return []
 
-    try:
-      ddb_res = self.ddb_client.batch_get_item(
-        RequestItems={
-          self.table_name: {
-            'Keys': keys
-          }
-        }
-      )
-    except ClientError as ce:
-      print('ERROR: DynamoDB get item error: %s' % ce)
-      raise
-    except BotoCoreError as be:
-      print('ERROR: BotoCore error: %s' % be)
-      raise
+    cached_items_by_pk = {}
+    fetch_pks = unique_pks
+    use_identity_map = _identity_map is not None and not projections
+    if use_identity_map:
+      for pk in unique_pks:
+        item = _identity_map.get(self.table_name, pk)
+        if item is not None:
+          cached_items_by_pk[pk] = item
+      fetch_pks = [pk for pk in unique_pks if pk not in cached_items_by_pk]
+      if len(fetch_pks) == 0:
+        return [cached_items_by_pk[pk] for pk in unique_pks]
+
+    chunks = [
+      fetch_pks[i:i + self.BATCH_GET_MAX_KEYS]
+      for i in range(0, len(fetch_pks), self.BATCH_GET_MAX_KEYS)
+    ]
+
+    if len(chunks) == 1:
+      ddb_items = self._batch_get_chunk(chunks[0], projections)
     else:
-      items = []
-      for ddb_item in ddb_res['Responses'][self.table_name]:
-        item = {k: self.type_deserializer.deserialize(
-            v) for k, v in ddb_item.items() if v}
-        items.append(item)
+      ddb_items = []
+      for chunk_items in self._get_batch_executor().map(self._batch_get_chunk, chunks, [projections] * len(chunks)):
+        ddb_items.extend(chunk_items)
+
+    items_by_pk = {}
+    for ddb_item in ddb_items:
+      item = attribute_values.to_item(ddb_item)
+      items_by_pk[item['PK']] = item
 
-      # Dump the deserialized DynamodDB data with a set encoder to get a valid JSON object
-      # that has sets converted to lists. Load it using the regular JSON encoder so that
-      # we return an object instead of string.
-      return json.loads(json.dumps(items, cls=SetJSONEncoder))
+    if use_identity_map:
+      _identity_map.add(self.table_name, items_by_pk.values())
+      items_by_pk.update(cached_items_by_pk)
+
+    return [items_by_pk[pk] for pk in unique_pks if pk in items_by_pk]
+
+  def _get_batch_executor(self):
+    ''' Returns the thread pool shared by batch reads and writes, creating it on first use. '''
+
+    if self._batch_executor is None:
+      with self._batch_executor_lock:
+        if self._batch_executor is None:
+          self._batch_executor = ThreadPoolExecutor(
+            max_workers=self.BATCH_GET_MAX_WORKERS,
+            thread_name_prefix='ddb-batch'
+          )
+    return self._batch_executor
+
+  def _batch_get_chunk(self, pks, projections=None):
+    ''' Fetches a single chunk of at most `BATCH_GET_MAX_KEYS` keys with one or more batch_get_item calls.
+
+    Re-requests any `UnprocessedKeys` until the chunk is complete, sleeping with full-jitter
+    exponential backoff between attempts. Returns the raw (serialized) DynamoDB items.
+
+    :param list pks: The distinct primary keys to fetch.
+    :param str projections: Optional projection expression.
+    '''
+
+    request_items = {
+      self.table_name: {
+        'Keys': [{'PK': self.type_serializer.serialize(pk)} for pk in pks]
+      }
+    }
+    if projections:
+      request_items[self.table_name]['ProjectionExpression'] = projections
+    ddb_items = []
+    attempt = 0
+    while True:
+      try:
+        ddb_res = self.ddb_client.batch_get_item(RequestItems=request_items)
+      except ClientError as ce:
+        print('ERROR: DynamoDB get item error: %s' % ce)
+        raise
+      except BotoCoreError as be:
+        print('ERROR: BotoCore error: %s' % be)
+        raise
+
+      ddb_items.extend(ddb_res['Responses'].get(self.table_name, []))
+
+      request_items = ddb_res.get('UnprocessedKeys')
+      if not request_items:
+        return ddb_items
+
+      attempt += 1
+      if attempt > self.BATCH_GET_MAX_RETRIES:
+        unprocessed_count = len(request_items.get(self.table_name, {}).get('Keys', []))
+        raise Exception(f'DynamoDBClientError: batch get gave up after {self.BATCH_GET_MAX_RETRIES} retries with {unprocessed_count} keys still unprocessed.')
+
+      self._sleep_before_retry(attempt)
+
+  def _sleep_before_retry(self, attempt):
+    ''' Sleeps before the given retry of a batch request, with full-jitter exponential backoff. '''
+
+    backoff = min(self.BATCH_GET_MAX_BACKOFF, self.BATCH_GET_BASE_BACKOFF * (2 ** (attempt - 1)))
+    time.sleep(random.uniform(0, backoff))
 
   def query_by_hgnc(self, hgnc, filters={}, projections={}):
     ''' Queries the database for items with the given item type.
@@ -307,12 +708,11 @@ class Client:
     :param str item_type: The item type to use in the query.
 
     '''
-    print ('In query by hgnc %s' %filters)
     items = self.__query(
       'hgnc',
       hgnc,
-      IndexNames.HGNC_TYPE_INDEX_NAME,
       self.table_name,
+      IndexNames.HGNC_TYPE_INDEX_NAME,
       filters,
       projections,
     )
@@ -328,7 +728,6 @@ class Client:
     :param str item_type: The item type to use in the query.
 
     '''
-    print ('In query by hgnc group %s' %filters)
     items = self.__query(
       'gr',
       hgnc,
@@ -350,7 +749,6 @@ class Client:
     :param str item_type: The item type to use in the query.
 
     '''
-    print ('In query by item type %s' %filters)
     items = self.__query(
       'item_type',
       item_type,
@@ -362,7 +760,7 @@ class Client:
 
     if embed is True:
       # print("DEBUG: pass thru populate")
-      items = [ModelSerializer.populate(self, item, exclude_key_list=embed_exclude_keys, include_key_list=embed_include_keys) for item in items]
+      items = ModelSerializer.populate_many(self, items, exclude_key_list=embed_exclude_keys, include_key_list=embed_include_keys, in_place=True)
 
     return items
 
@@ -437,6 +835,114 @@ class Client:
                                   { 'variant': ['variant-PK-01', 'variant-PK-02'] } filter by `variant` at multiple values 'variant-PK-01', 'variant-PK-02', corresponds to url querystring `?variant=variant-PK-01&variant-PK-02`
                                   { 'status!': 'delete' } filter by `status` not equal to `delete`, corresponds to url querystring `?status!=delete`
     '''
+    query_params = self.__build_query_params(primary_key_name, primary_key_value, \
+      table_name, index_name, filters, projections)
+    items = []
+    for page in self.__query_pages(query_params):
+      items.extend(page)
+
+    # Only whole items are worth remembering: skip projected queries, indexes that
+    # do not project every attribute, and other tables' multi-version (history) rows.
+    if _identity_map is not None and not projections and table_name == self.table_name \
+      and index_name in FULL_ITEM_INDEX_NAMES:
+      _identity_map.add(self.table_name, items)
+
+    return items
+
+  def query_page(self, primary_key_name, primary_key_value, filters={}, projections={}, \
+    page_size=None, cursor=None, embed=False, embed_exclude_keys=None, embed_include_keys=None):
+    ''' Returns a single page of query results and a cursor for the following page.
+
+    Queries this client's table through the index registered for `primary_key_name` in `QUERY_INDEX_NAMES`
+    (e.g. `item_type`, `affiliation`, `hgnc`, `gr`, `carId`, `clinvarVariantId`, or `PK` for the history
+    table). DynamoDB is asked for at most `page_size` items per request, so large item types are never
+    loaded whole. When filters drop items the client keeps reading until the page is full or the
+    partition is exhausted.
+
+    Returns `{ 'items': [...], 'cursor': str }`. `cursor` is None on the last page; otherwise it is an
+    opaque, signed token that resumes the same query when passed back in as `cursor`.
+
+    :param str primary_key_name: The partition key to query by, one of `QUERY_INDEX_NAMES`.
+    :param str primary_key_value: The value of the partition key.
+    :param obj filters: Same as `__query`.
+    :param str projections: Same as `__query`.
+    :param int page_size: Number of items per page. Defaults to `DEFAULT_PAGE_SIZE` and is capped at `MAX_PAGE_SIZE`.
+    :param str cursor: A cursor returned by a previous call with the same query, or None for the first page.
+    :param bool embed: Populate the items on the page, as in `query_by_item_type`.
+    :raises QueryCursorException: if `cursor` is invalid, or `QUERY_CURSOR_SECRET` is not configured.
+    '''
+
+    QueryCursor.secret()
+    page_size = self.__clamp_page_size(page_size)
+    query_params = self.__build_paged_query_params(primary_key_name, primary_key_value, filters, projections)
+    if cursor:
+      query_params['ExclusiveStartKey'] = QueryCursor.decode(cursor, query_params)
+
+    items = []
+    last_key = None
+    while len(items) < page_size:
+      query_params['Limit'] = page_size - len(items)
+      ddb_res = self.__query_once(query_params)
+      items.extend(self.__to_json_items(ddb_res['Items']))
+      last_key = ddb_res.get('LastEvaluatedKey')
+      if not last_key:
+        break
+      query_params['ExclusiveStartKey'] = last_key
+
+    if embed is True:
+      items = ModelSerializer.populate_many(self, items, exclude_key_list=embed_exclude_keys, include_key_list=embed_include_keys, in_place=True)
+
+    return {
+      'items': items,
+      'cursor': QueryCursor.encode(last_key, query_params) if last_key else None
+    }
+
+  def __build_paged_query_params(self, primary_key_name, primary_key_value, filters, projections):
+    if primary_key_name not in QUERY_INDEX_NAMES:
+      raise Exception(f'DynamoDBClientError: cannot page through items by `{primary_key_name}`, expected one of {list(QUERY_INDEX_NAMES)}.')
+
+    return self.__build_query_params(primary_key_name, primary_key_value, \
+      self.table_name, QUERY_INDEX_NAMES[primary_key_name], filters, projections)
+
+  def __clamp_page_size(self, page_size):
+    if page_size is None:
+      return self.DEFAULT_PAGE_SIZE
+    try:
+      page_size = int(page_size)
+    except (TypeError, ValueError):
+      raise Exception(f'DynamoDBClientError: page size must be a number, got `{page_size}`.')
+    return max(1, min(page_size, self.MAX_PAGE_SIZE))
+
+  def __query_pages(self, query_params):
+    ''' Yields the JSON-ready items of each page, following LastEvaluatedKey until the query is exhausted. '''
+
+    query_params = dict(query_params)
+    while True:
+      ddb_res = self.__query_once(query_params)
+      yield self.__to_json_items(ddb_res['Items'])
+      if 'LastEvaluatedKey' not in ddb_res:
+        return
+      query_params['ExclusiveStartKey'] = ddb_res['LastEvaluatedKey']
+
+  def __query_once(self, query_params):
+    try:
+      return self.ddb_client.query(**query_params)
+    except ClientError as ce:
+      print('ERROR: DynamoDB get all error: %s' % ce)
+      raise
+    except BotoCoreError as be:
+      print('ERROR: BotoCore error: %s' % be)
+      raise
+
+  def __to_json_items(self, ddb_items):
+    return attribute_values.to_items(ddb_items)
+
+  def __build_query_params(self, primary_key_name, primary_key_value, \
+    table_name, index_name=None, filters={}, projections={}):
+    ''' Builds the parameters of a DynamoDB query request. See `__query` for the arguments. '''
+
+    # Work on a copy, the `last_modified` handling below removes keys from it.
+    filters = dict(filters) if filters else {}
     query_params = {}
     expr_names_builder = ExpressionAttributeNamesBuilder()
     expr_names_builder.append_attribute_name(primary_key_name)
@@ -471,7 +977,6 @@ class Client:
           key_expr_builder.append_sort_key_start('last_modified')
           expr_values_builder.append_attribute('start', last_modified_range[0])
       del filters['last_modified']
-    print ("Filters %s" %filters)
     if filters is not None and len(filters) > 0:
       filter_expr_builder = FilterExpressionBuilder()
       for k, v in filters.items():
@@ -506,7 +1011,6 @@ class Client:
       query_params['FilterExpression'] = filter_expr_builder.build_expression()
     if (bool(index_name)):
       query_params['IndexName'] = index_name
-    print ('Projections %s ' %projections)
     if (bool(projections)):
       query_params['ProjectionExpression'] \
         = projections
@@ -516,48 +1020,7 @@ class Client:
       'ExpressionAttributeNames': expr_names_builder.build_attribute_names(),
       'ExpressionAttributeValues': expr_values_builder.build_attribute_values()
     })
-    print('Query Params %s' %(query_params))
-    items = []
-    try:
-      ddb_res = self.ddb_client.query(**query_params)
-      items = add_items(self, ddb_res['Items']) 
-      last_key = None
-      while 'LastEvaluatedKey' in ddb_res:
-        last_key=ddb_res['LastEvaluatedKey']
-        #print('Number of items returned = %s Last Key %s' % (len(items),last_key))
-        query_params.update({ 'ExclusiveStartKey' : last_key})
-        ddb_res = self.ddb_client.query(**query_params)
-        items= items + add_items(self, ddb_res['Items'])
-      #print('Number of items returned = %s ' % len(items))
-    except ClientError as ce:
-      print('ERROR: DynamoDB get all error: %s' % ce)
-      raise
-    except BotoCoreError as be:
-      print('ERROR: BotoCore error: %s' % be)
-      raise
-    '''
-        else:
-        for ddb_item in ddb_res['Items']:
-            count = count + 1
-            # print('Item count, Item = %s  ddb_items %s' % (count, ddb_item))
-            item = {k: self.type_deserializer.deserialize(v) for k, v in ddb_item.items() if v}
-            items.append(item)
-        last_evaluated_key = ddb_res.get('LastEvaluatedKey')
-        print ('Number of items returned = %s Last Key %s' %(len(items), last_evaluated_key))
-        if not last_evaluated_key:
-          break
-    '''
-    # Dump the deserialized DynamodDB data with a set encoder to get a valid JSON object
-    # that has sets converted to lists. Load it using the regular JSON encoder so that
-    # we return an object instead of string.
-    return json.loads(json.dumps(items, cls=SetJSONEncoder))
-
-def add_items(self, data):
-  items=[]
-  for ddb_item in data:
-    item = {k: self.type_deserializer.deserialize(v) for k, v in ddb_item.items() if v}
-    items.append(item)
-  return items
+    return query_params
 
 class UpdateExpressionBuilder:
   """ Builds a DynamoDB update expression from a list of actions.
@@ -651,8 +1114,7 @@ class ExpressionAttributeValuesBuilder:
   def __init__(self):
     self.attr_values = {}
 
-    boto3.resource('dynamodb')
-    self.serializer = boto3.dynamodb.types.TypeSerializer()
+    self.serializer = _type_serializer
 
   def append_attribute(self, attr_name, attr_value, attr_value_deref_prefix=':'):
     ''' Appends an attribute key and value to the expression.
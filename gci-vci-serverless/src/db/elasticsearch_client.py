@@ -4,6 +4,8 @@ from requests_aws4auth import AWS4Auth
 from elasticsearch import Elasticsearch, RequestsHttpConnection
 from elasticsearch.helpers import bulk
 
+from src.utils import tracing
+
 class Client:
     def __init__(self, domain_endpoint, region=None, index_name_prefix="gci-vci-"):
         self.domain_endpoint = domain_endpoint
@@ -40,10 +42,11 @@ class Client:
 
     def passthrough_search(self, search_body, item_type=None):
         index_name = self._item_type_to_index_name(item_type)
-        resp = self.es_client.search(
-            index=index_name,
-            body=search_body
-        )
+        with tracing.span('elasticsearch', 'search'):
+            resp = self.es_client.search(
+                index=index_name,
+                body=search_body
+            )
         return resp['hits']
 
     def _item_type_to_index_name(self, item_type):
@@ -1,14 +1,39 @@
 import os
+import threading
 import boto3
 import botocore
 import simplejson as json
 
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from botocore.exceptions import BotoCoreError
 from decimal import Decimal
 
+from src.utils import tracing
+
+# Size of the HTTP connection pool of the shared client. Bounds how many objects
+# can be downloaded concurrently without connections being discarded.
+SHARED_MAX_POOL_CONNECTIONS = 32
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def get_shared_client():
+  ''' Returns an S3 client shared by the whole (warm) Lambda container.
+
+  The underlying boto3 client is thread safe, so concurrent readers reuse its
+  connection pool instead of each building a new client.
+  '''
+
+  global _shared_client
+  if _shared_client is None:
+    with _shared_client_lock:
+      if _shared_client is None:
+        _shared_client = Client(max_pool_connections=SHARED_MAX_POOL_CONNECTIONS)
+  return _shared_client
+
 class Client:
-  def __init__(self):
+  def __init__(self, max_pool_connections=None):
     s3_client_options = {}
 
     # if running serverless offline (local), set up local s3
@@ -18,8 +43,12 @@ class Client:
         'aws_secret_access_key': 'S3RVER',
         'endpoint_url': 'http://localhost:4569'
       }
+
+    if max_pool_connections is not None:
+      s3_client_options['config'] = Config(max_pool_connections=max_pool_connections)
     
     self.s3_client = boto3.client('s3', **s3_client_options)
+    tracing.instrument_boto3_client(self.s3_client, 's3')
   
   def put_object(self, obj, bucket, key):
     try:
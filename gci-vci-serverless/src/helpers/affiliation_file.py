@@ -1,57 +1,147 @@
 import simplejson as json
+import hashlib
 import os
+import threading
+import time
 from decimal import Decimal
 
 local_file_dir = os.environ.get('LOCAL_FILE_DIR', '')
-affiliation_data = []
-saved_affiliation = []
 
-# Load affiliation data from a JSON file maintained for the UI
-def load_affiliation_data():
-  global affiliation_data
+# Seconds between checks of whether affiliations.json changed (its checksum is compared, then the registry rebuilt)
+AFFILIATION_FILE_CHECK_SECONDS = float(os.environ.get('AFFILIATION_FILE_CHECK_SECONDS', '60'))
 
-  if not affiliation_data:
-    try:
-      # print ('local_file_dir = %s ' %local_file_dir )
-      affiliation_data = json.load(open(local_file_dir + '/affiliations.json'))
+# Subgroups indexed by ID, in the order an ID is matched (a GCEP before a VCEP of the same affiliation)
+AFFILIATION_SUBGROUPS = ('gcep', 'vcep')
 
-    except Exception:
-      pass
 
-# Lookup affiliation data associated with a provided ID
-def lookup_affiliation_data(affiliation_id, affiliation_key, affiliation_subgroup=None):
-  global affiliation_data
-  global saved_affiliation
+class AffiliationRegistry:
+  ''' The affiliations of affiliations.json, indexed by affiliation ID, subgroup (GCEP/VCEP) ID and approver name.
 
-  # print ('affiliation_id = %s ' %affiliation_id )
-  # print ('affiliation_key = %s ' %affiliation_key )
-  # print ('affiliation_subgroup = %s ' %affiliation_subgroup )
-  if affiliation_id and affiliation_key:
-    if not saved_affiliation or 'affiliation_id' not in saved_affiliation or affiliation_id != saved_affiliation['affiliation_id']:
-      load_affiliation_data()
+  As with a scan of the file, the first affiliation (or subgroup) listed with an ID is the one an ID resolves to.
+  '''
+
+  def __init__(self, affiliations, checksum=None):
+    self.affiliations = affiliations if isinstance(affiliations, list) else []
+    self.checksum = checksum
+    self.by_id = {}
+    self.by_subgroup_id = {}
+    self.by_approver = {}
+    # affiliation ID -> position in the file, to return affiliations in file order
+    self._positions = {}
+
+    for position, affiliation in enumerate(self.affiliations):
+      if not isinstance(affiliation, dict):
+        continue
+
+      affiliation_id = affiliation.get('affiliation_id')
+      if isinstance(affiliation_id, str) and affiliation_id not in self.by_id:
+        self.by_id[affiliation_id] = affiliation
+        self._positions[affiliation_id] = position
+
+      subgroups = affiliation.get('subgroups')
+      if isinstance(subgroups, dict):
+        for subgroup_name in AFFILIATION_SUBGROUPS:
+          subgroup = subgroups.get(subgroup_name)
+          if isinstance(subgroup, dict) and isinstance(subgroup.get('id'), str):
+            self.by_subgroup_id.setdefault(subgroup['id'], (affiliation, subgroup_name))
+
+      approvers = affiliation.get('approver')
+      if isinstance(approvers, list):
+        for approver in approvers:
+          if isinstance(approver, str):
+            self.by_approver.setdefault(approver, []).append(affiliation)
 
-      for affiliation in affiliation_data:
-        try:
-          if affiliation_id == affiliation['affiliation_id']:
-            saved_affiliation = affiliation
-            break
+  def find(self, affiliation_id):
+    ''' Returns the affiliation with the given ID, or None. '''
 
-        except Exception:
-          pass
+    return self.by_id.get(affiliation_id) if isinstance(affiliation_id, str) else None
+
+  def find_all(self, affiliation_ids):
+    ''' Returns the affiliations with the given IDs, once each and in file order. Unknown IDs are left out. '''
+
+    found_ids = { affiliation_id for affiliation_id in affiliation_ids if isinstance(affiliation_id, str) and affiliation_id in self.by_id }
+    return [self.by_id[affiliation_id] for affiliation_id in sorted(found_ids, key=self._positions.get)]
+
+  def find_subgroup(self, subgroup_id):
+    ''' Returns `(affiliation, subgroup name)` of the GCEP or VCEP with the given ID, or None. '''
+
+    return self.by_subgroup_id.get(subgroup_id) if isinstance(subgroup_id, str) else None
+
+  def find_by_approver(self, approver):
+    ''' Returns the affiliations listing the given name as an approver. '''
+
+    return list(self.by_approver.get(approver, ())) if isinstance(approver, str) else []
+
+  def lookup(self, affiliation_id, affiliation_key, affiliation_subgroup=None):
+    ''' Returns an attribute of an affiliation (or of one of its subgroups), or None. '''
+
+    affiliation = self.find(affiliation_id)
 
     try:
       if affiliation_subgroup:
-        # temp = json.dumps(saved_affiliation, separators=(',', ':'))
-        # print ('saved_affiliation = %s ' %temp)
-
-        return saved_affiliation['subgroups'][affiliation_subgroup][affiliation_key]
+        return affiliation['subgroups'][affiliation_subgroup][affiliation_key]
       else:
-        return saved_affiliation[affiliation_key]
+        return affiliation[affiliation_key]
 
     except Exception:
-      pass
+      return None
 
-    return None
+  def resolve(self, affiliation_ids, affiliation_key, affiliation_subgroup=None):
+    ''' Batch `lookup`: returns `{ affiliation ID: attribute }` for the given IDs (None where not found). '''
+
+    return { affiliation_id: self.lookup(affiliation_id, affiliation_key, affiliation_subgroup) for affiliation_id in affiliation_ids if isinstance(affiliation_id, str) }
+
+
+registry = None
+registry_checked_at = 0
+registry_lock = threading.Lock()
+
+# Read affiliations.json, returning the current registry when the file's checksum has not changed
+def load_affiliation_registry(current=None):
+  try:
+    with open(local_file_dir + '/affiliations.json', 'rb') as affiliation_file:
+      content = affiliation_file.read()
+
+  except Exception:
+    return current if current is not None else AffiliationRegistry([])
+
+  checksum = hashlib.sha256(content).hexdigest()
+
+  if current is not None and current.checksum == checksum:
+    return current
+
+  try:
+    return AffiliationRegistry(json.loads(content), checksum)
+
+  except Exception as e:
+    print('ERROR: affiliations.json could not be parsed: %s' % e)
+    return current if current is not None else AffiliationRegistry([])
+
+# Return the affiliation registry, loaded on first use and rebuilt when affiliations.json changes
+def get_affiliation_registry():
+  global registry
+  global registry_checked_at
+
+  now = time.monotonic()
+  current = registry
+
+  if current is not None and now - registry_checked_at < AFFILIATION_FILE_CHECK_SECONDS:
+    return current
+
+  with registry_lock:
+    if registry is None or now - registry_checked_at >= AFFILIATION_FILE_CHECK_SECONDS:
+      registry = load_affiliation_registry(registry)
+      registry_checked_at = now
+
+    return registry
+
+# Lookup affiliation data associated with a provided ID
+def lookup_affiliation_data(affiliation_id, affiliation_key, affiliation_subgroup=None):
+  if affiliation_id and affiliation_key:
+    return get_affiliation_registry().lookup(affiliation_id, affiliation_key, affiliation_subgroup)
   else:
     return None
 
+# Lookup affiliation data for many IDs at once: { affiliation ID: value }
+def resolve_affiliation_data(affiliation_ids, affiliation_key, affiliation_subgroup=None):
+  return get_affiliation_registry().resolve(affiliation_ids, affiliation_key, affiliation_subgroup)
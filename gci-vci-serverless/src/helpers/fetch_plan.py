@@ -0,0 +1,119 @@
+''' Runs a set of dependent upstream lookups concurrently under one deadline.
+
+A lookup starts as soon as the lookups it requires have succeeded, so independent
+calls (e.g. ClinVar and Ensembl VEP once the variant's identifiers are known) are
+in flight together and the total latency is that of the slowest chain rather than
+the sum of all calls.
+'''
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Seconds all the lookups of a plan may take together (API Gateway gives up at 29)
+UPSTREAM_DEADLINE = float(os.environ.get('UPSTREAM_DEADLINE', '20'))
+
+class DeadlineExceeded(TimeoutError):
+  ''' Result of a lookup that was not finished (or not started) when the plan's deadline passed. '''
+  pass
+
+class DependencyFailed(Exception):
+  ''' Result of a lookup skipped because a lookup it requires failed. '''
+
+  def __init__(self, name, error):
+    super().__init__(f'{name} failed: {error}')
+    self.name = name
+    self.error = error
+
+_RAISE = object()
+
+class FetchPlan:
+  ''' Lookups, by name, and their results once `run()` returns.
+
+  Usage:
+    plan = FetchPlan()
+    plan.add('car', car_client.fetch, car_id)
+    plan.add('clinvar', lambda car_data: ..., requires=('car',))
+    plan.run()
+    car_data = plan.result('car')
+  '''
+
+  def __init__(self, deadline=None, max_workers=None):
+    self.deadline = UPSTREAM_DEADLINE if deadline is None else deadline
+    self.max_workers = max_workers
+    self.tasks = {}
+    self.results = {}
+    self.errors = {}
+
+  def add(self, name, fn, *args, requires=()):
+    ''' Adds a lookup calling fn(*args, *results of `requires`). Returns the plan. '''
+
+    for required in requires:
+      if required not in self.tasks:
+        raise ValueError(f'{name} requires {required}, which has not been added to the plan')
+
+    self.tasks[name] = (fn, args, tuple(requires))
+    return self
+
+  def run(self):
+    ''' Runs the lookups, returning once all are done or the deadline has passed. '''
+
+    if not self.tasks:
+      return self
+
+    end = time.monotonic() + self.deadline
+    waiting = dict(self.tasks)
+    running = {}
+
+    executor = ThreadPoolExecutor(max_workers=self.max_workers or len(self.tasks), thread_name_prefix='fetch-plan')
+    try:
+      while waiting or running:
+        for name, (fn, args, requires) in list(waiting.items()):
+          failed = next((required for required in requires if required in self.errors), None)
+          if failed is not None:
+            del waiting[name]
+            self.errors[name] = DependencyFailed(failed, self.errors[failed])
+          elif all(required in self.results for required in requires):
+            del waiting[name]
+            running[executor.submit(fn, *args, *(self.results[required] for required in requires))] = name
+
+        if not running:
+          continue
+
+        done, _ = wait(running, timeout=max(end - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+          break
+
+        for future in done:
+          name = running.pop(future)
+          try:
+            self.results[name] = future.result()
+          except Exception as e:
+            self.errors[name] = e
+    finally:
+      # Lookups still running past the deadline are abandoned, not waited for
+      for future, name in running.items():
+        future.cancel()
+        self.errors[name] = DeadlineExceeded(f'{name} did not finish within {self.deadline}s')
+      for name in waiting:
+        self.errors[name] = DeadlineExceeded(f'{name} was not started within {self.deadline}s')
+      executor.shutdown(wait=False)
+
+    return self
+
+  def result(self, name, default=_RAISE):
+    ''' Returns the result of a lookup, or `default` if it failed or was not added.
+
+    Without a default, the lookup's error is raised, and None returned for a lookup not in the plan.
+    '''
+
+    if name in self.results:
+      return self.results[name]
+    if default is not _RAISE:
+      return default
+    if name in self.errors:
+      raise self.errors[name]
+    return None
+
+  def error(self, name):
+    return self.errors.get(name)
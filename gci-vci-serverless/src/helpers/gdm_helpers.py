@@ -1,4 +1,3 @@
-import pandas as pd
 import simplejson as json
 import os
 
@@ -71,18 +70,23 @@ def getStatusInfoFromProvisional (provisional, type):
 
   return statusInfo
 
+def getSnapshotPk (snapshot):
+  # Snapshots are referenced by PK, or by an embedded object carrying its `uuid`
+  return snapshot['uuid'] if isinstance(snapshot, dict) and 'uuid' in snapshot else snapshot
+
+def getItemsByPk (db, pks):
+  ''' Fetches the given items with batched reads and returns them keyed by PK. '''
+  pks = [pk for pk in dict.fromkeys(pks) if pk and isinstance(pk, str)]
+  if not pks:
+    return {}
+  return { item['PK']: item for item in db.all(pks) }
+
 @timer.timeit
-def processNotApproved (provisionalClassification,db):
+def processNotApproved (provisionalClassification, snapshotsByPk):
   snaps=[]
   if ('associatedClassificationSnapshots' in provisionalClassification ):
     for s in provisionalClassification['associatedClassificationSnapshots']:
-      if ('uuid'in s):
-        pk=s['uuid']
-      else:
-        pk=s
-      #print ('Associated snapshot pk %s' %pk )
-      snapshot=db.find(pk)
-      #print ('Snapshot returned %s' %snapshot )
+      snapshot=snapshotsByPk.get(getSnapshotPk(s))
       if bool(snapshot) and 'resource' in snapshot:
         statusInfo=getStatusInfo(snapshot)
         snaps.append(statusInfo)
@@ -97,31 +101,53 @@ def processApproved (provisionalClassification):
   statuses.append(statusInfo)
   return statuses
 
+def findAffiliatedProvisional (gdm, provisionalsByPk, affiliation):
+  ''' Returns the GDM's first provisional classification owned by the given affiliation, if any. '''
+  for c in gdm.get('provisionalClassifications', []):
+    provisionalClassification = provisionalsByPk.get(c)
+    if bool(provisionalClassification) and provisionalClassification.get('affiliation') == affiliation:
+      return provisionalClassification
+  return None
+
 @timer.timeit
 def appendSnapshotStatuses (db, gdms, filters):
-  # Map of snap
-  for gdm in gdms:
+  ''' Adds classification and snapshot statuses to each GDM for the dashboard.
+
+  Every referenced provisional classification, and then every snapshot of the
+  not yet approved ones, is fetched with batched reads across all the GDMs,
+  so the number of round trips does not grow with the number of GDMs.
+  '''
+  affiliatedProvisionals = [None] * len(gdms)
+  if 'affiliation' in filters:
+    provisionalsByPk = getItemsByPk(db, [
+      c for gdm in gdms for c in gdm.get('provisionalClassifications', [])
+    ])
+    affiliatedProvisionals = [
+      findAffiliatedProvisional(gdm, provisionalsByPk, filters['affiliation']) for gdm in gdms
+    ]
+
+  snapshotsByPk = getItemsByPk(db, [
+    getSnapshotPk(s)
+    for provisionalClassification in affiliatedProvisionals
+    if provisionalClassification is not None and provisionalClassification.get('classificationStatus', 'Approved') != 'Approved'
+    for s in provisionalClassification.get('associatedClassificationSnapshots', [])
+  ])
+
+  for gdm, provisionalClassification in zip(gdms, affiliatedProvisionals):
     if ('provisionalClassifications' in gdm):
-      for c in gdm['provisionalClassifications']:
-        checkProvisionalClassification=db.find(c)
-        if ('affiliation' in filters and 'affiliation' in checkProvisionalClassification):
-          currentAff = filters['affiliation']
-          provisionAff = checkProvisionalClassification['affiliation']
-          if (currentAff == provisionAff):
-            provisionalClassification = checkProvisionalClassification
-            if ('autoClassification' in provisionalClassification):
-              gdm['autoClassification']= provisionalClassification['autoClassification']
-            if ('alteredClassification' in provisionalClassification):
-              gdm['alteredClassification']= provisionalClassification['alteredClassification']
-            if ('classificationStatus' in provisionalClassification) : 
-              statuses = []
-              cs = provisionalClassification['classificationStatus']
-              if (cs != 'Approved'):
-                statuses= processNotApproved (provisionalClassification,db)
-              elif (cs == 'Approved'):
-                statuses= processApproved (provisionalClassification)
-              gdm['snapshotStatuses']=statuses
-            break
+      if provisionalClassification is not None:
+        if ('autoClassification' in provisionalClassification):
+          gdm['autoClassification']= provisionalClassification['autoClassification']
+        if ('alteredClassification' in provisionalClassification):
+          gdm['alteredClassification']= provisionalClassification['alteredClassification']
+        if ('classificationStatus' in provisionalClassification) : 
+          statuses = []
+          cs = provisionalClassification['classificationStatus']
+          if (cs != 'Approved'):
+            statuses= processNotApproved (provisionalClassification,snapshotsByPk)
+          elif (cs == 'Approved'):
+            statuses= processApproved (provisionalClassification)
+          gdm['snapshotStatuses']=statuses
     else:
       gdm['snapshotStatuses'] = []
   return None
@@ -1,15 +1,17 @@
-import pandas as pd
-import numpy as np
 import json
 import os
 
 from .timeit import TimerPerf
+from .variant_title_index import variant_title_index
 
 import pprint
 pp = pprint.PrettyPrinter(indent=2)
 
 timer = TimerPerf()
 
+# pandas and numpy are imported inside the dashboard functions that use them, so
+# routes that only need the other helpers do not load them on a cold start.
+
 def get_related(db, interpretation):
   ''' Fetches all items related to the given interpretation.
 
@@ -117,6 +119,8 @@ def add_snapshot(db, interpretation, snapshot_pk, status, timestamp):
   return interpretation
 
 def get_items_in_batch(db,pks):
+  import numpy as np
+
   slices = (len(pks)/100)+1
   rid_batch = np.array_split(np.array(pks), slices)
   items = []
@@ -233,12 +237,25 @@ def getStatusInfo (provisionalVariant, type):
   return statusInfo
 
 
-def getStatusInfoFromSnapshot(interpretation,db):
+def getStatusInfoFromSnapshot(interpretation, snapshotsByPk):
   return [
-    getSnapInfo(s) 
-    for s in db.all( interpretation.get('snapshots',[]) ) 
-    if bool(s) and 'resource' in s
+    getSnapInfo(snapshotsByPk[pk])
+    for pk in dict.fromkeys(interpretation.get('snapshots',[]))
+    if bool(snapshotsByPk.get(pk)) and 'resource' in snapshotsByPk[pk]
+  ]
+
+def getSnapshotsByPk(db, interpretations):
+  ''' Fetches, with batched reads, the snapshots of every interpretation whose
+  provisional variant is not approved yet, keyed by PK. '''
+  pks = [
+    pk
+    for interpretation in interpretations
+    if (interpretation.get('provisionalVariant') or {}).get('classificationStatus', 'Approved') != 'Approved'
+    for pk in interpretation.get('snapshots', [])
   ]
+  if not pks:
+    return {}
+  return { s['PK']: s for s in db.all(list(dict.fromkeys(pks))) }
 
 
 # TODO: not used so remove later
@@ -258,6 +275,8 @@ def getStatusInfoFromSnapshotOld(interpretation, db):
 
 @timer.timeit
 def appendSnapshotStatuses(db, interpretations,filters):
+  # Fetch the snapshots of the whole dashboard at once rather than per interpretation
+  snapshotsByPk = getSnapshotsByPk(db, interpretations)
   for interpretation in interpretations:
     if ('provisionalVariant' in interpretation):
         if ('autoClassification' in interpretation['provisionalVariant']):
@@ -273,7 +292,7 @@ def appendSnapshotStatuses(db, interpretations,filters):
           if (cs != 'Approved'):
             snap_list = interpretation.get('snapshots', [])
             if len(snap_list) != 0:
-              statuses= getStatusInfoFromSnapshot(interpretation,db)
+              statuses= getStatusInfoFromSnapshot(interpretation,snapshotsByPk)
             #print('STATUSES RETURN AFTER getStatusInfoFromSnapshot', statuses)
           elif (cs == 'Approved'):
             statusInfo = getStatusInfo(interpretation['provisionalVariant'], "Provisional")
@@ -328,15 +347,17 @@ def appendSnapshotStatusesTest(db, interpretations, filters):
   return None
   
 
-def getAllVariantsWithTitle (db):
-  projections= 'PK,preferredTitle'
-  #filters = {"criteriaStatus":"met"}
-  filters={}
-  variants = db.query_by_item_type('variant',filters,projections)
-  return variants
+def getVariantsWithTitle (db, interpretations):
+  ''' Returns `PK` and `preferredTitle` of only the variants the given interpretations reference. '''
+  titles = variant_title_index.lookup(db, [i.get('variant') for i in interpretations])
+  return [
+    { 'PK': pk, 'preferredTitle': title['preferredTitle'] }
+    for pk, title in titles.items()
+  ]
 
 @timer.timeit
 def append_criteria (db,interpretations,filters):
+  import pandas as pd
   dfie=None
 
   try:
@@ -356,13 +377,14 @@ def append_criteria (db,interpretations,filters):
   return dfie
 
 def append_variant_title_all_interp (db,interpretations):
+  import pandas as pd
 
   pd.set_option('display.max_rows', None)
   pd.set_option('display.max_columns', None)
   pd.set_option('display.width', None)
   pd.set_option('display.max_colwidth', -1)
 
-  variants=getAllVariantsWithTitle(db)
+  variants=getVariantsWithTitle(db,interpretations)
   print (f' all Number of variants returned = {len(variants)}')
   dfi=pd.DataFrame(interpretations, columns=[ \
   'PK','variant','item_type', 'submitted_by', 'affiliation', \
@@ -370,7 +392,7 @@ def append_variant_title_all_interp (db,interpretations):
   'last_modified','date_created']) \
     .fillna("")
   print (f'all Interpretation dimensions {dfi.shape}')
-  dfv=pd.DataFrame(variants).rename(index=str, columns={"PK" : "variant"}) \
+  dfv=pd.DataFrame(variants, columns=["PK", "preferredTitle"]).rename(index=str, columns={"PK" : "variant"}) \
     .fillna("")
   print (f'Variant dimensions {dfv.shape}')
   df=pd.merge(dfi,dfv,on='variant')
@@ -385,13 +407,14 @@ def append_variant_title_all_interp (db,interpretations):
 
 @timer.timeit
 def append_variant_title (db,interpretations,dfie=None):
+  import pandas as pd
 
   pd.set_option('display.max_rows', None)
   pd.set_option('display.max_columns', None)
   pd.set_option('display.width', None)
   pd.set_option('display.max_colwidth', None)
 
-  variants=getAllVariantsWithTitle(db)
+  variants=getVariantsWithTitle(db,interpretations)
   print (f'Number of variants returned = {len(variants)}')
   dfi=pd.DataFrame(interpretations, columns=[ \
   'PK','variant','snapshotStatuses','item_type', 'submitted_by', 'affiliation', \
@@ -402,7 +425,7 @@ def append_variant_title (db,interpretations,dfie=None):
   print (f'Interpretation dimensions {dfi.shape}')
   dfi['snapshotStatuses'].apply(pd.Series)
   print (f'Interpretation dimensions after serializing snaps {dfi.shape}')
-  dfv=pd.DataFrame(variants).rename(index=str, columns={"PK" : "variant"}) \
+  dfv=pd.DataFrame(variants, columns=["PK", "preferredTitle"]).rename(index=str, columns={"PK" : "variant"}) \
     .fillna("")
   print (f'Variant dimensions {dfv.shape}')
   df=pd.merge(dfi,dfv,on='variant')
@@ -1,8 +1,14 @@
 import simplejson as json
 import os
 import requests
-from confluent_kafka import Producer
+import threading
+import time
+from copy import deepcopy
+from confluent_kafka import KafkaError, Producer
 from decimal import Decimal
+from src.clients import external_http
+from src.helpers import affiliation_file
+from src.utils import tracing
 
 # SOPv7 publish GDM classification template. scoreJson.GeneticEvidence.CaseLevelData.VariantEvidence attribute has old format.
 publish_classification_message_template_v7 = {
@@ -799,8 +805,6 @@ publish_interpretation_data_to_remove = [
 ]
 
 local_file_dir = os.environ.get('LOCAL_FILE_DIR', '')
-affiliation_data = []
-saved_affiliation = []
 
 # Retrieve data from search result(s) using a path (list of keys)
 def get_data_by_path(data, path, return_no_data=None):
@@ -1228,39 +1232,28 @@ def add_animal_model_only(data, template):
   else:
     template['AnimalModelOnly'] = 'NO'
 
-# Load affiliation data from a JSON file maintained for the UI
-def load_affiliation_data():
-  global affiliation_data
-
-  if not affiliation_data:
-    try:
-      affiliation_data = json.load(open(local_file_dir + '/affiliations.json'))
-
-    except Exception:
-      pass
-
 # Add dictionary containing secondary contributors/approver to the message template
 def add_secondary_contributors_approver(data, template):
-  global affiliation_data
   contributors = get_data_by_path(data, ['resource', 'classificationContributors'], [])
   approver = get_data_by_path(data, ['resource', 'additionalApprover'])
 
   if len(contributors) > 0 or approver:
-    load_affiliation_data()
     template['contributors'] = []
+  else:
+    return
 
-  if len(contributors) > 0:
-    for affiliation in affiliation_data:
-      try:
-        if affiliation['affiliation_id'] in contributors:
-          template['contributors'].append({
-            'id': affiliation['affiliation_id'],
-            'name': affiliation['affiliation_fullname'],
-            'role': 'secondary contributor'
-          })
+  affiliations = affiliation_file.get_affiliation_registry()
 
-      except Exception:
-        pass
+  for affiliation in affiliations.find_all(contributors):
+    try:
+      template['contributors'].append({
+        'id': affiliation['affiliation_id'],
+        'name': affiliation['affiliation_fullname'],
+        'role': 'secondary contributor'
+      })
+
+    except Exception:
+      pass
 
   try:
     template['contributors'].sort(key = lambda contributor: contributor['name'])
@@ -1269,220 +1262,294 @@ def add_secondary_contributors_approver(data, template):
     pass
 
   if approver:
-    for affiliation in affiliation_data:
-      try:
-        if approver == affiliation['subgroups']['gcep']['id']:
-          template['contributors'].append({
-            'id': approver,
-            'name': affiliation['subgroups']['gcep']['fullname'],
-            'role': 'secondary approver'
-          })
-          break
+    approver_subgroup = affiliations.find_subgroup(approver)
 
-      except Exception:
-        pass
+    try:
+      if approver_subgroup:
+        affiliation, subgroup_name = approver_subgroup
+        template['contributors'].append({
+          'id': approver,
+          'name': affiliation['subgroups'][subgroup_name]['fullname'],
+          'role': 'secondary approver'
+        })
 
-      try:
-        if approver == affiliation['subgroups']['vcep']['id']:
-          template['contributors'].append({
-            'id': approver,
-            'name': affiliation['subgroups']['vcep']['fullname'],
-            'role': 'secondary approver'
-          })
+    except Exception:
+      pass
+
+# Directives of the message template mini-language, interpreted when a template is compiled
+message_template_directives = {
+  '$PATH_TO_DATA',
+  '$USE_FIRST_DATA',
+  '$CHECK_FOR_DATA',
+  '$REPLACE_DATA',
+  '$CONVERT_DATA',
+  '$COMBINE_DATA',
+  '$LOOKUP_AFFILIATION_DATA',
+  '$EVIDENCE_COUNT',
+  '$SCORE_DATA',
+  '$EVIDENCE_DATA'
+}
+
+# Compile a data path list into an accessor that behaves like get_data_by_path(data, path)
+def compile_data_path(path):
+  if not isinstance(path, list) or len(path) == 0:
+    return lambda data: None
+
+  keys = tuple(path)
+  first_key = keys[0]
+
+  def get_data(data):
+    if isinstance(data, dict) and first_key in data:
+      for key in keys:
+        if key in data and data[key] is not None:
+          data = data[key]
+        else:
+          return None
+
+      return data
+    else:
+      return None
+
+  return get_data
+
+# Copy template constants that are mutable, so rendered messages never share them with the template
+def emit_constant(value):
+  if isinstance(value, (list, dict)):
+    return lambda data, evidence, evidence_counts: deepcopy(value)
+  else:
+    return lambda data, evidence, evidence_counts: value
+
+def copy_if_mutable(value):
+  return deepcopy(value) if isinstance(value, (list, dict)) else value
+
+# Compile a directive list (e.g. ['$PATH_TO_DATA', ...]) into an emitter and, for directives that may keep
+# a falsy result, a check deciding whether to keep it; returns None when the key is always removed
+def compile_directive(value):
+  directive = value[0]
+  value_length = len(value)
+
+  # Retrieve data using data path lists
+  if directive == '$PATH_TO_DATA':
+    get_data = compile_data_path(value[1:])
+    return (lambda data, evidence, evidence_counts: get_data(data)), None
+
+  # Keep first, non-excluded data found (using data path lists)
+  elif directive == '$USE_FIRST_DATA':
+    if value_length <= 2:
+      return None
+
+    excluded = value[1]
+    getters = [compile_data_path(data_path) for data_path in value[2:]]
+
+    def use_first_data(data, evidence, evidence_counts):
+      for get_data in getters:
+        temp_result = get_data(data)
+
+        if temp_result not in {excluded, None}:
           break
 
-      except Exception:
-        pass
+      return temp_result if temp_result != excluded else ''
 
-# Lookup affiliation data associated with a provided ID
-def lookup_affiliation_data(affiliation_id, affiliation_key, affiliation_subgroup=None):
-  global affiliation_data
-  global saved_affiliation
+    return use_first_data, None
 
-  if affiliation_id and affiliation_key:
-    if not saved_affiliation or 'affiliation_id' not in saved_affiliation or affiliation_id != saved_affiliation['affiliation_id']:
-      load_affiliation_data()
+  # Use one of two provided values, based on data (from a data path list)
+  elif directive == '$CHECK_FOR_DATA':
+    if value_length != 4:
+      return None
 
-      for affiliation in affiliation_data:
-        try:
-          if affiliation_id == affiliation['affiliation_id']:
-            saved_affiliation = affiliation
-            break
+    get_data = compile_data_path(value[1])
+    found, not_found = value[2], value[3]
+    return (lambda data, evidence, evidence_counts: copy_if_mutable(found if get_data(data) else not_found)), None
 
-        except Exception:
-          pass
+  # Replace data (from a data path list) using the provided strings
+  elif directive == '$REPLACE_DATA':
+    if value_length != 4:
+      return None
 
-    try:
-      if affiliation_subgroup:
-        return saved_affiliation['subgroups'][affiliation_subgroup][affiliation_key]
+    get_data = compile_data_path(value[1])
+    old, new = value[2], value[3]
+
+    def replace_data(data, evidence, evidence_counts):
+      temp_result = get_data(data)
+      return temp_result.replace(old, new) if isinstance(temp_result, str) else ''
+
+    return replace_data, None
+
+  # Convert data (from a data path list) using the provided map
+  elif directive == '$CONVERT_DATA':
+    if value_length != 3:
+      return None
+
+    get_data = compile_data_path(value[1])
+    conversions = value[2]
+    default_result_key = '$DEFAULT'
+
+    def convert_data(data, evidence, evidence_counts):
+      temp_result = get_data(data)
+
+      if temp_result in conversions:
+        return copy_if_mutable(conversions[temp_result])
+      elif default_result_key in conversions:
+        return copy_if_mutable(conversions[default_result_key])
       else:
-        return saved_affiliation[affiliation_key]
+        return ''
 
-    except Exception:
-      pass
+    return convert_data, None
 
-    return None
-  else:
-    return None
+  # Combine data (from dictionary of data path lists) with a separator
+  elif directive == '$COMBINE_DATA':
+    if value_length != 3:
+      return None
 
-# Traverse message template, performing various data retrieval/update operations
-def add_data_to_message_template(data, evidence, evidence_counts, template):
-  keep_falsy_data = False
-  keys_to_delete = []
+    separator = value[1]
+    render_parts = compile_message_template(value[2])
+    return (lambda data, evidence, evidence_counts: separator.join(render_parts(data, evidence, evidence_counts).values())), None
 
-  for key, value in template.items():
-    if isinstance(value, str):
-      if value == '':
-        keys_to_delete.append(key)
+  # Lookup an affiliation name by ID (from a data path list)
+  elif directive == '$LOOKUP_AFFILIATION_DATA':
+    if value_length not in (3, 4):
+      return None
 
-    elif isinstance(value, list):
-      value_length = len(value)
+    get_data = compile_data_path(value[1])
+    affiliation_key = value[-1]
+    affiliation_subgroup = value[2] if value_length == 4 else None
+    return (lambda data, evidence, evidence_counts: affiliation_file.lookup_affiliation_data(get_data(data), affiliation_key, affiliation_subgroup)), None
 
-      if value_length > 0:
-        # Retrieve data using data path lists
-        if value[0] == '$PATH_TO_DATA':
-          template[key] = get_data_by_path(data, value[1:])
+  # Add evidence count (using a data path list)
+  elif directive == '$EVIDENCE_COUNT':
+    if value_length != 2:
+      return None
 
-        # Keep first, non-excluded data found (using data path lists)
-        elif value[0] == '$USE_FIRST_DATA':
-          if value_length > 2:
-            for data_path in value[2:]:
-              temp_result = get_data_by_path(data, data_path)
+    get_count = compile_data_path(value[1])
+    return (lambda data, evidence, evidence_counts: get_count(evidence_counts)), None
 
-              if temp_result not in {value[1], None}:
-                break
+  # Add score (using a data path list)
+  elif directive == '$SCORE_DATA':
+    if value_length < 3:
+      return None
 
-            if temp_result != value[1]:
-              template[key] = temp_result
-            else:
-              template[key] = ''
-          else:
-            template[key] = ''
+    get_data = compile_data_path(value[1])
 
-        # Use one of two provided values, based on data (from a data path list)
-        elif value[0] == '$CHECK_FOR_DATA':
-          if value_length == 4:
-            if get_data_by_path(data, value[1]):
-              template[key] = value[2]
-            else:
-              template[key] = value[3]
-          else:
-            template[key] = ''
+    # If score is zero, check if it should be included in message (e.g. if evidence count is non-zero)
+    if value[2] == True:
+      keep_zero = lambda score, evidence, evidence_counts: score == 0
+    else:
+      count_getters = [compile_data_path(data_path) for data_path in value[2:]]
+      keep_zero = lambda score, evidence, evidence_counts: score == 0 and any(get_count(evidence_counts) for get_count in count_getters)
 
-        # Replace data (from a data path list) using the provided strings
-        elif value[0] == '$REPLACE_DATA':
-          if value_length == 4:
-            temp_result = get_data_by_path(data, value[1])
+    return (lambda data, evidence, evidence_counts: get_data(data)), keep_zero
 
-            if isinstance(temp_result, str):
-              template[key] = temp_result.replace(value[2], value[3])
-            else:
-              template[key] = ''
-          else:
-            template[key] = ''
-
-        # Convert data (from a data path list) using the provided map
-        elif value[0] == '$CONVERT_DATA':
-          if value_length == 3:
-            temp_result = get_data_by_path(data, value[1])
-            default_result_key = '$DEFAULT'
-
-            if temp_result in value[2]:
-              template[key] = value[2][temp_result]
-            elif default_result_key in value[2]:
-              template[key] = value[2][default_result_key]
-            else:
-              template[key] = ''
-          else:
-            template[key] = ''
+  # Add evidence (articles, counts or points) based on information type
+  elif directive == '$EVIDENCE_DATA':
+    if value_length not in (2, 3):
+      return None
 
-        # Combine data (from dictionary of data path lists) with a separator
-        elif value[0] == '$COMBINE_DATA':
-          if value_length == 3:
-            add_data_to_message_template(data, evidence, evidence_counts, value[2])
-            template[key] = value[1].join(value[2].values())
-          else:
-            template[key] = ''
-
-        # Lookup an affiliation name by ID (from a data path list)
-        elif value[0] == '$LOOKUP_AFFILIATION_DATA':
-          if value_length == 4:
-            template[key] = lookup_affiliation_data(get_data_by_path(data, value[1]), value[3], value[2])
-          elif value_length == 3:
-            template[key] = lookup_affiliation_data(get_data_by_path(data, value[1]), value[2])
-          else:
-            template[key] = ''
+    information_type = value[1]
+    keep_empty = None
 
-        # Add evidence count (using a data path list)
-        elif value[0] == '$EVIDENCE_COUNT':
-          if value_length == 2:
-            template[key] = get_data_by_path(evidence_counts, value[1])
-          else:
-            template[key] = ''
-
-        # Add score (using a data path list)
-        elif value[0] == '$SCORE_DATA':
-          if value_length >= 3:
-            template[key] = get_data_by_path(data, value[1])
-
-            # If score is zero, check if it should be included in message (e.g. if evidence count is non-zero)
-            if template[key] == 0:
-              if value[2] == True:
-                keep_falsy_data = True
-              else:
-                for data_path in value[2:]:
-                  if get_data_by_path(evidence_counts, data_path):
-                    keep_falsy_data = True
-                    break
-          else:
-            template[key] = ''
+    if value_length == 3 and value[2] == True:
+      keep_empty = lambda result, evidence, evidence_counts: information_type in evidence
 
-        # Add evidence (articles, counts or points) based on information type
-        elif value[0] == '$EVIDENCE_DATA':
-          if value_length in (2, 3) and value[1] in evidence:
-            template[key] = evidence[value[1]]
+    return (lambda data, evidence, evidence_counts: evidence[information_type] if information_type in evidence else ''), keep_empty
 
-            if not template[key] and value_length == 3 and value[2] == True:
-              keep_falsy_data = True
+  else:
+    return None
 
-          else:
-            template[key] = ''
+# Compile a list that is not a directive: its dictionary elements are rendered, anything else copied
+def compile_list(value):
+  element_emitters = [compile_message_template(element) if isinstance(element, dict) else emit_constant(element) for element in value]
+  return lambda data, evidence, evidence_counts: [emit(data, evidence, evidence_counts) for emit in element_emitters]
 
+# Compile a message template (or a dictionary within one) into a render plan: a function rendering it as a new dictionary
+def compile_message_template(template):
+  steps = []
+
+  for key, value in template.items():
+    # Each step is (key, emitter, keep), where keep is True (value is always kept), None (falsy value is removed)
+    # or a check of whether a falsy value should still be kept
+    if isinstance(value, str):
+      if value != '':
+        steps.append((key, emit_constant(value), True))
+
+    elif isinstance(value, list):
+      if len(value) > 0:
+        if isinstance(value[0], str) and value[0] in message_template_directives:
+          compiled = compile_directive(value)
+
+          if compiled is not None:
+            steps.append((key, compiled[0], compiled[1]))
         else:
-          for element in value:
-            if isinstance(element, dict):
-              add_data_to_message_template(data, evidence, evidence_counts, element)
-      else:
-        # If empty list, check for EarliestArticles
-        # SOP8 - handling to incorporate earliest articles
-        if key == 'EarliestArticles':
-          add_earliest_articles(data, value)
-
-      # Save keys with falsy values for later deletion
-      if not template[key]:
-        if keep_falsy_data:
-          keep_falsy_data = False
-        else:
-          keys_to_delete.append(key)
+          steps.append((key, compile_list(value), None))
+
+      # If empty list, check for EarliestArticles
+      # SOP8 - handling to incorporate earliest articles
+      elif key == 'EarliestArticles':
+        steps.append((key, emit_earliest_articles, None))
 
     elif isinstance(value, dict):
-      add_data_to_message_template(data, evidence, evidence_counts, value)
+      render_value = compile_message_template(value)
 
       # Special handling to incorporate contradictory evidence (articles)
       if key == 'ValidContradictoryEvidence':
-        add_contradictory_evidence(data, evidence, value)
+        render_value = with_contradictory_evidence(render_value)
 
       # Special handling to incorporate secondary contributors/approver
       elif key == 'summary':
-        add_animal_model_only(data, value)
-        add_secondary_contributors_approver(data, value)
+        render_value = with_summary_tags(render_value)
 
-      if not template[key]:
-        keys_to_delete.append(key)
+      steps.append((key, render_value, None))
 
-  # Remove keys with no values
-  for key in keys_to_delete:
-    del template[key]
+    else:
+      steps.append((key, emit_constant(value), True))
+
+  def render(data, evidence, evidence_counts):
+    message = {}
+
+    for key, emit, keep in steps:
+      result = emit(data, evidence, evidence_counts)
+
+      # Only add keys with truthy values (unless a falsy value should be kept)
+      if result or keep is True or (keep is not None and keep(result, evidence, evidence_counts)):
+        message[key] = result
+
+    return message
+
+  return render
+
+def emit_earliest_articles(data, evidence, evidence_counts):
+  earliest_articles = []
+  add_earliest_articles(data, earliest_articles)
+  return earliest_articles
+
+def with_contradictory_evidence(render_value):
+  def render(data, evidence, evidence_counts):
+    message = render_value(data, evidence, evidence_counts)
+    add_contradictory_evidence(data, evidence, message)
+    return message
+
+  return render
+
+def with_summary_tags(render_value):
+  def render(data, evidence, evidence_counts):
+    message = render_value(data, evidence, evidence_counts)
+    add_animal_model_only(data, message)
+    add_secondary_contributors_approver(data, message)
+    return message
+
+  return render
+
+# Render plans of the message templates, compiled on first use: { id(template): (template, render) }
+message_template_plans = {}
+
+# Render a message template with the given data, evidence and evidence counts, returning a new message
+# (the template itself is never modified, so it needs no copying)
+def render_message_template(template, data, evidence=None, evidence_counts=None):
+  plan = message_template_plans.get(id(template))
+
+  if plan is None or plan[0] is not template:
+    plan = message_template_plans[id(template)] = (template, compile_message_template(template))
+
+  return plan[1](data, evidence, evidence_counts)
 
 # Remove unnecessary data from interpretation (before sending it to transformation service)
 def remove_data_from_message_template(delete_list, template):
@@ -1533,7 +1600,7 @@ def transform_interpretation(source_data, use_local):
 
     service_url = ''
 
-    transform_result = requests.post('{}/vci2cgsepio'.format(service_url), headers={'Content-Type': 'application/json'}, data=source_data_str, timeout=10)
+    transform_result = external_http.post('{}/vci2cgsepio'.format(service_url), headers={'Content-Type': 'application/json'}, data=source_data_str, timeout=10)
 
   except Exception:
     raise Exception('Data transformation service unavailable')
@@ -1560,7 +1627,7 @@ def request_clinvar_data(source_data):
   # Send interpretation to ClinVar submitter service
   try:
     service_url = ''
-    clinvar_result = requests.post('{}'.format(service_url), headers={'Content-Type': 'application/json'}, data=source_data_str, timeout=10)
+    clinvar_result = external_http.post('{}'.format(service_url), headers={'Content-Type': 'application/json'}, data=source_data_str, timeout=10)
   except Exception:
     raise Exception('Data generation service unavailable')
 
@@ -1575,63 +1642,137 @@ def request_clinvar_data(source_data):
   except Exception:
     raise Exception('Result of data generation not in expected format')
 
-def send_message(message, kafka_topic, use_local, extra_conf=None, message_key=None):
-  message_results = { 'status': 'Fail' }
+# Producer tuning. Messages produced together within linger.ms are sent as one
+# batch; idempotence lets librdkafka retry without writing duplicates.
+kafka_producer_conf = {
+  'linger.ms': int(os.environ.get('KAFKA_LINGER_MS', '5')),
+  'batch.size': int(os.environ.get('KAFKA_BATCH_SIZE', '1000000')),
+  'enable.idempotence': True,
+  'message.timeout.ms': 30000
+}
+
+# Seconds one invocation waits for outstanding deliveries. Messages still queued locally then are
+# purged and reported failed; those already sent are reported pending, as they may yet be delivered
+kafka_flush_timeout = float(os.environ.get('KAFKA_FLUSH_TIMEOUT', '10'))
+
+# Producers kept for the life of the (warm) Lambda container, keyed by configuration
+kafka_producers = {}
+kafka_producers_lock = threading.Lock()
+
+# Build the producer configuration for the local or Data Exchange broker
+def get_kafka_conf(use_local, extra_conf=None):
+  kafka_cert_pw = os.environ.get('KAFKA_CERT_PW', '')
+  kafka_cert_location = local_file_dir + '/certs'
+  cert_dir = 'local' if use_local else 'dataexchange'
+
+  kafka_conf = { 'bootstrap.servers': 'localhost:9093' if use_local else 'exchange.clinicalgenome.org:9093',
+    'log_level': 0,
+    'security.protocol': 'ssl',
+    'ssl.key.location': kafka_cert_location + '/' + cert_dir + '/client.key',
+    'ssl.key.password': kafka_cert_pw,
+    'ssl.certificate.location': kafka_cert_location + '/' + cert_dir + '/client.crt',
+    'ssl.ca.location': kafka_cert_location + '/' + cert_dir + '/server.crt' }
+  kafka_conf.update(kafka_producer_conf)
+
+  if extra_conf:
+    kafka_conf.update(extra_conf)
+
+  return kafka_conf
+
+# Return the container's producer for the given configuration, creating it on first use
+def get_producer(kafka_conf):
+  conf_key = tuple(sorted(kafka_conf.items()))
+
+  with kafka_producers_lock:
+    producer = kafka_producers.get(conf_key)
+
+    if producer is None:
+      producer = Producer(**kafka_conf)
+      kafka_producers[conf_key] = producer
+
+  return producer
+
+# Drop a producer (e.g. after a fatal error) so the next send builds a new one
+def discard_producer(kafka_conf):
+  with kafka_producers_lock:
+    kafka_producers.pop(tuple(sorted(kafka_conf.items())), None)
+
+# Send messages, as (message, message_key) tuples, and wait up to flush_timeout for their delivery
+def send_messages(messages, kafka_topic, use_local, extra_conf=None, flush_timeout=None):
+  messages = list(messages)
 
   # Configure common message delivery parameters
   try:
-    kafka_cert_pw = os.environ.get('KAFKA_CERT_PW', '')
-    kafka_cert_location = local_file_dir + '/certs'
-    kafka_timeout = 10
-
-    if use_local:
-      kafka_conf = { 'bootstrap.servers': 'localhost:9093',
-        'log_level': 0,
-        'security.protocol': 'ssl',
-        'ssl.key.location': kafka_cert_location + '/local/client.key',
-        'ssl.key.password': kafka_cert_pw,
-        'ssl.certificate.location': kafka_cert_location + '/local/client.crt',
-        'ssl.ca.location': kafka_cert_location + '/local/server.crt' }
+    kafka_conf = get_kafka_conf(use_local, extra_conf)
+    producer = get_producer(kafka_conf)
 
-    else:
-      kafka_conf = { 'bootstrap.servers': 'exchange.clinicalgenome.org:9093',
-        'log_level': 0,
-        'security.protocol': 'ssl',
-        'ssl.key.location': kafka_cert_location + '/dataexchange/client.key',
-        'ssl.key.password': kafka_cert_pw,
-        'ssl.certificate.location': kafka_cert_location + '/dataexchange/client.crt',
-        'ssl.ca.location': kafka_cert_location + '/dataexchange/server.crt' }
-
-    if extra_conf:
-      kafka_conf.update(extra_conf)
-
-  except Exception as e:
-    message_results['message'] = 'Failed to configure message delivery parameters'
-    return message_results
-
-  # Send message
-  def delivery_callback(err, msg):
-    nonlocal message_results
-    if err:
-      message_results['message'] = err
+  except Exception:
+    return [{ 'status': 'Fail', 'message': 'Failed to configure message delivery parameters' } for m in messages]
 
-    else:
-      message_results = { 'status': 'Success',
-        'message': message,
-        'partition': msg.partition(),
-        'offset': msg.offset() }
+  if flush_timeout is None:
+    flush_timeout = kafka_flush_timeout
 
-  try:
-    p = Producer(**kafka_conf)
+  # Sent to the broker but not acknowledged in time: retrying such a message may publish it twice
+  message_results = [{ 'status': 'Pending', 'message': 'Message delivery not confirmed in time, it may still be delivered' } for m in messages]
 
-    if message_key:
-      p.produce(kafka_topic, message, message_key, callback=delivery_callback)
-    else:
-      p.produce(kafka_topic, message, callback=delivery_callback)
+  # Record the delivery report of the message at the given index
+  def delivery_callback(index, message):
+    def callback(err, msg):
+      if err and err.code() == KafkaError._PURGE_QUEUE:
+        message_results[index] = { 'status': 'Fail', 'message': 'Message delivery timed out' }
+
+      elif err:
+        message_results[index] = { 'status': 'Fail', 'message': err }
 
-    p.flush(kafka_timeout)
+        if err.fatal():
+          discard_producer(kafka_conf)
 
-  except Exception as e:
-    message_results['message'] = 'Message delivery failed'
+      else:
+        message_results[index] = { 'status': 'Success',
+          'message': message,
+          'partition': msg.partition(),
+          'offset': msg.offset() }
+
+    return callback
+
+  # Send messages (batched by the producer), then wait for outstanding deliveries
+  with tracing.span('kafka', kafka_topic, messages=len(messages)):
+    deadline = time.monotonic() + flush_timeout
+
+    for index, (message, message_key) in enumerate(messages):
+      callback = delivery_callback(index, message)
+
+      try:
+        while True:
+          try:
+            if message_key:
+              producer.produce(kafka_topic, message, message_key, callback=callback)
+            else:
+              producer.produce(kafka_topic, message, callback=callback)
+            break
+
+          except BufferError:
+            # Local queue is full; serve delivery reports to make room
+            if time.monotonic() >= deadline:
+              raise
+            producer.poll(0.1)
+
+        producer.poll(0)
+
+      except Exception:
+        message_results[index] = { 'status': 'Fail', 'message': 'Message delivery failed' }
+
+    try:
+      if producer.flush(max(deadline - time.monotonic(), 0)) > 0:
+        # Drop the messages not sent yet, so that a later poll of this container's producer cannot
+        # deliver a message reported failed, and serve their delivery reports
+        producer.purge(in_queue=True, in_flight=False, blocking=False)
+        producer.poll(0)
+
+    except Exception:
+      discard_producer(kafka_conf)
 
   return message_results
+
+def send_message(message, kafka_topic, use_local, extra_conf=None, message_key=None):
+  return send_messages([(message, message_key)], kafka_topic, use_local, extra_conf)[0]
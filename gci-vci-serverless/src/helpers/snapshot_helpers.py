@@ -3,13 +3,20 @@ import uuid
 import os
 import simplejson as json
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from src.db.s3_client import Client as S3Client
+from src.db.s3_client import get_shared_client, SHARED_MAX_POOL_CONNECTIONS
 from decimal import Decimal
 
-def get_from_archive(archive_key):
+# Default number of snapshot archives downloaded concurrently by iter_from_archives
+ARCHIVE_FETCH_CONCURRENCY = int(os.environ.get('SNAPSHOT_ARCHIVE_CONCURRENCY', '16'))
+
+def get_from_archive(archive_key, s3_client=None):
   ''' Download a snapshot's curation data from S3.
 
   :param str archive_key: The curation data's location (S3 bucket and file path). This value is required.
+  :param S3Client s3_client: The client to download with. Defaults to the shared, pooled client.
   '''
 
   if archive_key is None or '/' not in archive_key:
@@ -17,7 +24,8 @@ def get_from_archive(archive_key):
 
   bucket, key = archive_key.split('/', 1)
 
-  s3_client = S3Client()
+  if s3_client is None:
+    s3_client = get_shared_client()
 
   try:
     archive_object = json.loads(s3_client.get_object(bucket, key)['Body'].read(),parse_float=Decimal)
@@ -27,6 +35,37 @@ def get_from_archive(archive_key):
 
   return archive_object
 
+def iter_from_archives(archive_keys, max_workers=None, s3_client=None):
+  ''' Downloads many snapshots' curation data, yielding each one in the order of the given keys.
+
+  Up to `max_workers` archives are downloaded and decoded concurrently ahead of the
+  consumer, so only that many decoded archives are held in memory at once. An archive
+  that fails to download raises its error when the consumer reaches it.
+
+  :param list archive_keys: The curation data locations, as accepted by get_from_archive.
+  :param int max_workers: The maximum number of concurrent downloads. Defaults to ARCHIVE_FETCH_CONCURRENCY.
+  :param S3Client s3_client: The client to download with. Defaults to the shared, pooled client.
+  '''
+
+  max_workers = max(1, min(max_workers or ARCHIVE_FETCH_CONCURRENCY, SHARED_MAX_POOL_CONNECTIONS))
+  if s3_client is None:
+    s3_client = get_shared_client()
+
+  archive_keys = iter(archive_keys)
+  with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='s3-archive') as executor:
+    pending = deque()
+    try:
+      for archive_key in archive_keys:
+        pending.append(executor.submit(get_from_archive, archive_key, s3_client))
+        if len(pending) >= max_workers:
+          yield pending.popleft().result()
+      while pending:
+        yield pending.popleft().result()
+    finally:
+      # Stop downloads nobody will consume when the consumer stops early or an archive failed
+      for future in pending:
+        future.cancel()
+
 def build(snapshot={}):
   ''' Builds and returns a valid snapshot object.
 
@@ -300,21 +300,34 @@ def gather_gdm_proband_individuals(snapshot, curation, aff, status):
   return gdm
 
 
+def iter_archived_curations(snapshots):
+  ''' Yields `(snapshot, curation)` for every snapshot with archived curation data.
+
+  Archives are downloaded concurrently ahead of the caller, so each curation can be
+  processed as soon as it arrives instead of waiting on one download after another.
+  '''
+  archived = [
+    snapshot for snapshot in snapshots
+    if 'resource' in snapshot and 'resourceParent' in snapshot and 's3_archive_key' in snapshot['resourceParent']
+  ]
+  curations = snapshot_helpers.iter_from_archives(
+    [snapshot['resourceParent']['s3_archive_key'] for snapshot in archived]
+  )
+  return zip(archived, curations)
+
 def generate_gci_probands_report(query_params, snapshots):
   status = query_params['status']
   aff = query_params['affiliation']
   gdms = []
 
   # Loop through all snapshots to gather data and return
-  for snapshot in snapshots:
-    if 'resource' in snapshot and 'resourceParent' in snapshot and 's3_archive_key' in snapshot['resourceParent']:
-      try:
-        curation = snapshot_helpers.get_from_archive(snapshot['resourceParent']['s3_archive_key'])
-        gdm = gather_gdm_proband_individuals(snapshot, curation, aff, status)
-        if gdm is not None and gdm:
-          gdms.append(gdm)
-      except Exception as e:
-        return { 'statusCode': 400, 'body': json.dumps({ 'generate_gci_probands_report error': '%s' %e }) }
+  try:
+    for snapshot, curation in iter_archived_curations(snapshots):
+      gdm = gather_gdm_proband_individuals(snapshot, curation, aff, status)
+      if gdm is not None and gdm:
+        gdms.append(gdm)
+  except Exception as e:
+    return { 'statusCode': 400, 'body': json.dumps({ 'generate_gci_probands_report error': '%s' %e }) }
 
   try:
     if status == 'published':
@@ -585,16 +598,14 @@ def generate_gci_summary_report(query_params, snapshots):
     format = query_params['format']
 
   gdms = []
-  for snapshot in snapshots:
-    if 'resource' in snapshot and 'resourceParent' in snapshot and 's3_archive_key' in snapshot['resourceParent']:
-      try:
-        curation = snapshot_helpers.get_from_archive(snapshot['resourceParent']['s3_archive_key'])
-        gdm = gather_gdm_summary(snapshot, curation, aff)
-
-        if gdm is not None and gdm:
-          gdms.append(gdm)
-      except Exception as e:
-          return { 'statusCode': 400, 'body': json.dumps({ 'generate_gci_summary_report error': '%s' %e }) }
+  try:
+    for snapshot, curation in iter_archived_curations(snapshots):
+      gdm = gather_gdm_summary(snapshot, curation, aff)
+
+      if gdm is not None and gdm:
+        gdms.append(gdm)
+  except Exception as e:
+      return { 'statusCode': 400, 'body': json.dumps({ 'generate_gci_summary_report error': '%s' %e }) }
 
   try:
     gdms.sort(key = lambda gdm: (gdm['Final Classification'], gdm['SOP Version']))
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Variant attributes kept in the title index. Dashboards only need enough to label a variant.
+VARIANT_TITLE_PROJECTION = 'PK, preferredTitle, clinvarVariantTitle, carId, hgvsNames, last_modified'
+
+# Genomic HGVS names worth keeping; the (potentially long) list of `others` is dropped.
+HGVS_ASSEMBLIES = ('GRCh38', 'GRCh37')
+
+
+def to_title_record(variant):
+  ''' Reduces a variant to the compact record stored in the title index. '''
+
+  hgvs_names = variant.get('hgvsNames') or {}
+  return {
+    'PK': variant['PK'],
+    'preferredTitle': variant.get('preferredTitle'),
+    'clinvarVariantTitle': variant.get('clinvarVariantTitle'),
+    'carId': variant.get('carId'),
+    'hgvsNames': { assembly: hgvs_names[assembly] for assembly in HGVS_ASSEMBLIES if hgvs_names.get(assembly) },
+    'last_modified': variant.get('last_modified'),
+  }
+
+
+class VariantTitleIndex:
+  ''' A warm, in-process projection of variant PK -> title record.
+
+  Dashboards look up only the variants their interpretations reference instead of querying every
+  variant in the table. Records are kept for `max_age` seconds; misses and expired records are
+  re-read with a single projected batch read. Variant writes in this process update the index right
+  away (`record`). Nothing is stored outside the container, so a title changed by any other writer
+  (another container, the LDH Kafka consumer, migrations) can be shown stale for up to `max_age`
+  seconds, which is why it is kept short.
+
+  Each record carries the variant's `last_modified` as its version stamp so an older write can never
+  replace a newer one, and the index keeps a `version` counter that is bumped on every change.
+  '''
+
+  def __init__(self, max_age=60, max_entries=200000):
+    self.max_age = max_age
+    self.max_entries = max_entries
+    self.version = 0
+    self.hits = 0
+    self.misses = 0
+    # pk -> (loaded_at, record), least recently used first
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def lookup(self, db, pks):
+    ''' Returns `{ PK: record }` for the given variant PKs. Variants that do not exist are left out.
+
+    :param DynamoClient db: the client used to read variants missing from the index.
+    :param list pks: variant PKs, duplicates and empty values are ignored.
+    '''
+
+    now = time.time()
+    records = {}
+    missing_pks = []
+    with self._lock:
+      for pk in dict.fromkeys(pk for pk in pks if pk and isinstance(pk, str)):
+        entry = self._entries.get(pk)
+        if entry is not None and now - entry[0] < self.max_age:
+          self._entries.move_to_end(pk)
+          records[pk] = entry[1]
+          self.hits += 1
+        else:
+          missing_pks.append(pk)
+          self.misses += 1
+
+    if missing_pks:
+      for variant in db.all(missing_pks, projections=VARIANT_TITLE_PROJECTION):
+        records[variant['PK']] = self.record(variant, loaded_at=now)
+
+    return records
+
+  def record(self, variant, loaded_at=None):
+    ''' Adds or refreshes a variant's record, e.g. right after the variant was written. Returns the stored record. '''
+
+    if not variant or not variant.get('PK'):
+      return None
+
+    title_record = to_title_record(variant)
+    loaded_at = loaded_at if loaded_at is not None else time.time()
+    with self._lock:
+      entry = self._entries.get(title_record['PK'])
+      if entry is not None and (entry[1].get('last_modified') or '') > (title_record.get('last_modified') or ''):
+        # The stored record is still the newest one known, as of now
+        self._entries[title_record['PK']] = (loaded_at, entry[1])
+        self._entries.move_to_end(title_record['PK'])
+        return entry[1]
+
+      self._entries[title_record['PK']] = (loaded_at, title_record)
+      self._entries.move_to_end(title_record['PK'])
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+      self.version += 1
+    return title_record
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self.version += 1
+
+  def stats(self):
+    return {
+      'version': self.version,
+      'entries': len(self._entries),
+      'hits': self.hits,
+      'misses': self.misses
+    }
+
+
+# Shared by every request handled by this (warm) Lambda container.
+variant_title_index = VariantTitleIndex()
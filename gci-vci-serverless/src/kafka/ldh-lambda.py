@@ -1,13 +1,17 @@
 import simplejson as json
 import os
 import datetime
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 
+import boto3
 from botocore.config import Config
-from botocore.exceptions import ClientError
 
 from src.db.ddb_client import Client as DynamoClient
+from src.utils import tracing
 
 config = Config(
     retries = {
@@ -22,32 +26,37 @@ db = DynamoClient(
     config
 )
 
+# Lookups and writes of a batch in flight at once. DynamoDB has no batch query or
+# batch update, so each allele's CAR ID lookup and update is a request of its own.
+WRITE_WORKERS = int(os.environ.get('LDH_WRITE_WORKERS', '16'))
 
-def update(pk, attrs):
-  """Updates an existing VP object with the given PK"""
+# Records that could not be written are sent to this queue, which the function consumes too.
+# The Kafka consumer commits its offsets whatever the function returns, so without it they
+# would be lost.
+RETRY_QUEUE_URL = os.environ.get('LDH_RETRY_QUEUE_URL')
+SQS_BATCH_MAX_MESSAGES = 10
 
-  # Some basic check on PK to make sure we're not saving a totally
-  # bogus object.
-  if pk is None or len(pk) == 0:
-    return { 'statusCode': 422, 'body': json.dumps({ 'error': 'Invalid primary key for Interpretation update'}) }
+_executor = None
+_executor_lock = threading.Lock()
+_sqs = None
 
-  # Update the last modified date.
-  now = datetime.datetime.now().isoformat()
-  attrs['last_modified'] = now
+def get_executor():
+    ''' Returns the thread pool shared by the batches of the (warm) Lambda container. '''
 
-  # Frontend may only send fields to be updated and not sending in entire interpretation object,
-  # need to add item_type so that `normalize_fields` works
-  if 'item_type' not in attrs:
-    attrs['item_type'] = 'variant'
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WRITE_WORKERS, thread_name_prefix='ldh-write')
+    return _executor
 
-  try:
-    variant = db.update(pk, attrs, embed=False, item_type='variant')
-  except Exception as e:
-    response = { 'statusCode': 422, 'body': json.dumps({ 'error': '%s' %e }) }
-  else:
-    response = { 'statusCode': 200, 'body': json.dumps(variant) }
 
-  return response
+def get_sqs():
+    global _sqs
+    if _sqs is None:
+        _sqs = boto3.client('sqs', config=config)
+    return _sqs
+
 
 def transform (variant):
     now = datetime.datetime.now().isoformat()
@@ -59,50 +68,218 @@ def transform (variant):
     variant['carId']=variant['caId']
     return variant
 
+
+
+class Allele:
+    ''' The events of a batch for one allele (CAR ID), coalesced into the allele's final state.
+
+    Events are applied in order, each one setting the attributes it carries, as writing
+    them one after the other would.
+    '''
+
+    def __init__(self, car_id):
+        self.car_id = car_id
+        self.indexes = []
+        self.state = {}
+        self.gr = None
+
+    def add(self, index, variant, gr):
+        self.indexes.append(index)
+        self.state.update(variant)
+        # A new allele is grouped by the first event that would have created it
+        if self.gr is None:
+            self.gr = gr
+
+    def new_item(self):
+        return dict(self.state, PK=str(uuid.uuid4()), gr=self.gr)
+
+def event_time(record, variant):
+    ''' Returns when a record was produced, in seconds since the epoch, or None if unknown. '''
+
+    if record.get('timestamp'):
+        return int(record['timestamp']) / 1000
+    if variant.get('eventTime'):
+        return datetime.datetime.fromisoformat(variant['eventTime'].replace('Z', '+00:00')).timestamp()
+    return None
+
+def map_to_results(fn, args_list):
+    ''' Calls fn on each args on the thread pool, returning its results with exceptions in place of failed calls. '''
+
+    def call(args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            return e
+    return list(get_executor().map(call, args_list))
+
+def find_pk(car_id):
+    db_variants = db.query_by_car_id(car_id)
+    return db_variants[0]['PK'] if len(db_variants) > 0 else None
+
+def update_allele(pk, allele):
+    db.update(pk, dict(allele.state), embed=False, item_type='variant')
+
+def create_alleles(alleles):
+    # The PKs are new, so there is nothing to overwrite and a conditional create would only double the cost
+    db.put_many([allele.new_item() for allele in alleles], overwrite=True)
+
 def process(event, context):
-    # Todo: Parse event and pull out needed variant
-    # info from event
-    # variant = cleanVariant(event['incomingVariantInfo'])
-    count=0
-    record_count = 0
-    for record in event:
-        count=count+1
-        #print('records received %s' %record)
-        variant=json.loads(record['value'],parse_float=Decimal)
+    ''' Writes a batch of LDH variant records to the VPT table.
+
+    Records are grouped by CAR ID and the events of each allele coalesced, so an allele is
+    written once per batch whatever its number of events. Existing alleles are looked up on
+    the carId index concurrently, then new ones are created in chunks of `put_many` and
+    existing ones updated, concurrently too. An `Add` of an allele already in the table updates
+    it rather than creating a duplicate.
+
+    Returns the statistics of the batch, with `failed`, the indexes in `event` of the records
+    that could not be parsed or written, so that only they need to be retried.
+    '''
+
+    failed = {}
+    alleles = {}
+    event_times = []
+    for index, record in enumerate(event):
         try:
-            variant=transform(variant)
-            if 'event' in variant and variant['event'] == 'Add':
-                variant['PK']=str(uuid.uuid4())
-                variant['gr']=variant['hgnc'] + '_' + str(record['partition']) + '_' + str(count % 2)
-                variant=db.put(variant)
-            elif 'event' in variant and variant['event'] == 'Update':
-                db_variant=db.query_by_car_id(variant['carId'])
-                if (len(db_variant) > 0):
-                  variant=update(db_variant[0]['PK'],variant)
-                else:
-                  print (f"CAID missing in DB {variant['carId']} {variant['hgnc']}")
-                  variant['PK']=str(uuid.uuid4())
-                  variant['gr']=variant['hgnc'] + '_' + str(record['partition']) + '_' + str(count % 2)
-                  variant=db.put(variant)
-            else:
-                raise ValueError('event element missing') 
-        except ValueError as ve:
-            response = { 'statusCode': 422, 'body': json.dumps({ 'error': '%s' % str(ve) }) }
-        except ClientError as ce:
-            print(str(ce))
-            response = { 'statusCode': 422, 'body': json.dumps({ 'error': '%s' % str(ce) }) }
+            variant = transform(json.loads(record['value'], parse_float=Decimal))
+            if variant.get('event') not in ('Add', 'Update'):
+                raise ValueError('event element missing')
+            gr = variant['hgnc'] + '_' + str(record['partition']) + '_' + str((index + 1) % 2)
+            produced_at = event_time(record, variant)
         except Exception as e:
-            response = { 'statusCode': 422, 'body': json.dumps({ 'error': '%s' % e }) }
-            print('DB put error Response %s \n %s' % (response,variant['caId']))
+            print('ERROR: LDH record %s could not be parsed: %s' % (index, e))
+            failed[index] = e
+            continue
+
+        if produced_at is not None:
+            event_times.append(produced_at)
+        allele = alleles.get(variant['carId'])
+        if allele is None:
+            allele = alleles[variant['carId']] = Allele(variant['carId'])
+        allele.add(index, variant, gr)
+
+    def fail(allele, error):
+        print('ERROR: LDH records of %s could not be written: %s' % (allele.car_id, error))
+        for index in allele.indexes:
+            failed[index] = error
+
+    new_alleles = []
+    existing_alleles = []
+    for allele, pk in zip(alleles.values(), map_to_results(find_pk, [(car_id,) for car_id in alleles])):
+        if isinstance(pk, Exception):
+            fail(allele, pk)
+        elif pk is None:
+            new_alleles.append(allele)
         else:
-            record_count = record_count + 1
-            response = { 'statusCode': 201, 'body': json.dumps(variant) }
+            existing_alleles.append((pk, allele))
+
+    chunks = [
+        new_alleles[i:i + db.BATCH_WRITE_MAX_ITEMS]
+        for i in range(0, len(new_alleles), db.BATCH_WRITE_MAX_ITEMS)
+    ]
+    # (alleles written, function, arguments) of each write
+    writes = [(chunk, create_alleles, (chunk,)) for chunk in chunks] + \
+        [([allele], update_allele, (pk, allele)) for pk, allele in existing_alleles]
+    results = map_to_results(lambda fn, args: fn(*args), [(fn, args) for _, fn, args in writes])
+    for (written_alleles, _, _), error in zip(writes, results):
+        if isinstance(error, Exception):
+            for allele in written_alleles:
+                fail(allele, error)
+
+    return {
+        'records': len(event),
+        'alleles': len(alleles),
+        'created': sum(1 for allele in new_alleles if allele.indexes[0] not in failed),
+        'updated': sum(1 for _, allele in existing_alleles if allele.indexes[0] not in failed),
+        'failed': sorted(failed),
+        'oldestEventTime': min(event_times) if event_times else None,
+    }
+
+def record_id(record, index):
+    ''' Returns topic/partition/offset of a Kafka record, unique across the partitions of a batch,
+    or its index in the batch when it has no offset. '''
+
+    if record.get('offset') is None:
+        return str(index)
+    return '%s/%s/%s' % (record.get('topic', ''), record.get('partition', ''), record['offset'])
+
+def send_to_retry_queue(records):
+    ''' Sends (record_id, record) pairs to the retry queue, returning the record ids of those that could not be sent. '''
+
+    unsent = []
+    for start in range(0, len(records), SQS_BATCH_MAX_MESSAGES):
+        chunk = records[start:start + SQS_BATCH_MAX_MESSAGES]
+        entries = [
+            { 'Id': str(n), 'MessageBody': json.dumps(record), 'MessageAttributes': {
+                'record': { 'DataType': 'String', 'StringValue': name }
+            } }
+            for n, (name, record) in enumerate(chunk)
+        ]
+        try:
+            response = get_sqs().send_message_batch(QueueUrl=RETRY_QUEUE_URL, Entries=entries)
+        except Exception as e:
+            print('ERROR: LDH records could not be sent to the retry queue: %s' % e)
+            unsent.extend(name for name, _ in chunk)
+            continue
+        for failure in response.get('Failed', []):
+            name = chunk[int(failure['Id'])][0]
+            print('ERROR: LDH record %s could not be sent to the retry queue: %s' % (name, failure.get('Message')))
+            unsent.append(name)
+    return unsent
 
 def handler(event, context):
-    ''' Handles code incoming from cspec topic '''
-    
+    ''' Handles code incoming from cspec topic, and records of it retried through the retry queue
+
+    A Kafka batch is a list of records. Those that fail are sent to the retry queue, named by
+    topic/partition/offset, and the function fails if any cannot be sent so that Lambda retries
+    the whole batch (records already written are rewritten to the same state). A retry queue batch is an SQS event; its failed
+    messages are returned in `batchItemFailures` for SQS to deliver again, and after 5 receives
+    they move to the dead-letter queue.
+    '''
+
+    from_queue = isinstance(event, dict)
+    if from_queue:
+        messages = event.get('Records', [])
+        event = [json.loads(message['body']) for message in messages]
+
     print('Number of records received %s' %len(event))
+    if len(event) == 0:
+        return { 'batchItemFailures': [] }
     print('First record received %s' %event[0])
     print('Last record received %s' %event[len(event)-1])
-    process(event, context)
-    return event
+
+    with tracing.request_trace(sample_rate=1) as trace:
+        trace.set(Route='kafka/ldh/retry' if from_queue else 'kafka/ldh')
+        start = time.perf_counter()
+        stats = process(event, context)
+        elapsed = time.perf_counter() - start
+
+        trace.metric('Records', stats['records'])
+        trace.metric('Alleles', stats['alleles'])
+        trace.metric('AllelesCreated', stats['created'])
+        trace.metric('AllelesUpdated', stats['updated'])
+        trace.metric('FailedRecords', len(stats['failed']))
+        trace.metric('RecordsPerSecond', round(stats['records'] / elapsed, 2) if elapsed > 0 else 0, 'Count/Second')
+        if stats['oldestEventTime'] is not None:
+            trace.metric('Lag', round((time.time() - stats['oldestEventTime']) * 1000), 'Milliseconds')
+
+    if from_queue:
+        return {
+            'batchItemFailures': [
+                { 'itemIdentifier': messages[index]['messageId'] }
+                for index in stats['failed']
+            ]
+        }
+
+    failed = [(record_id(event[index], index), event[index]) for index in stats['failed']]
+    if failed:
+        if RETRY_QUEUE_URL is None:
+            print('ERROR: no LDH_RETRY_QUEUE_URL, %s failed records are dropped' % len(failed))
+        else:
+            unsent = send_to_retry_queue(failed)
+            if unsent:
+                raise RuntimeError('%s failed LDH records could not be sent to the retry queue: %s' % (len(unsent), ', '.join(unsent)))
+
+    return {
+        'batchItemFailures': [{ 'itemIdentifier': name } for name, _ in failed]
+    }
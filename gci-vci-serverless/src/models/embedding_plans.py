@@ -0,0 +1,96 @@
+''' Embedding plans: the relational (linkTo) fields of each item type, compiled from its json schema.
+
+A plan lists, for every field holding the PK (or list of PKs) of another item, the
+path to the field, whether it is an array and the item type it links to. Plans are
+compiled at build time into `embedding_plans.json`, so models read no schema files:
+
+  python -m src.models.embedding_plans
+
+An item type missing from the file (e.g. a schema added without rebuilding) is
+compiled from its schema on first use.
+'''
+
+import json
+import os
+import threading
+from collections import namedtuple
+
+from src.models.schema_reader import SchemaReader
+
+PLANS_FILE = os.path.join(SchemaReader.MODELS_DIR, 'embedding_plans.json')
+
+# `dot_representation` is the key used by embed include/exclude lists, e.g. `segregation.variants[]`;
+# `key` is the same without brackets and `path` its components, e.g. ('segregation', 'variants')
+EmbeddingField = namedtuple('EmbeddingField', ['dot_representation', 'key', 'path', 'is_array', 'item_type'])
+
+def compile_plan(item_type):
+  '''Walks the schema of `item_type` and returns its relational fields, sorted by key, as json-ready dicts.'''
+
+  plan = []
+  stack = [('', SchemaReader.get_schema(item_type))]
+  while stack:
+    dot_representation, schema = stack.pop()
+    for field_key, field_schema in schema.items():
+      key = '.'.join([dot_representation, field_key]) if dot_representation else field_key
+      if SchemaReader.is_singular_relational_field(field_schema):
+        # e.g. `...submitted_by`
+        related_item_type, _ = SchemaReader.parse_schema_string(field_schema['$schema'])
+        plan.append({ 'key': key, 'isArray': False, 'itemType': related_item_type })
+      elif SchemaReader.is_plural_relational_field(field_schema):
+        # e.g. `...variants[]`
+        related_item_type, _ = SchemaReader.parse_schema_string(field_schema['items']['$schema'])
+        plan.append({ 'key': key, 'isArray': True, 'itemType': related_item_type })
+      elif SchemaReader.is_nested_field(field_schema):
+        # e.g. `...segregation`
+        stack.append((key, field_schema['properties']))
+
+  return sorted(plan, key=lambda field: field['key'])
+
+def compile_plans(item_types):
+  return { item_type: compile_plan(item_type) for item_type in sorted(item_types) }
+
+def _to_fields(plan):
+  return tuple(
+    EmbeddingField(
+      field['key'] + '[]' if field['isArray'] else field['key'],
+      field['key'],
+      tuple(field['key'].split('.')),
+      field['isArray'],
+      field['itemType']
+    )
+    for field in plan
+  )
+
+_compiled_plans = None
+_plans = {}
+_lock = threading.Lock()
+
+def _load_compiled_plans():
+  global _compiled_plans
+  if _compiled_plans is None:
+    try:
+      with open(PLANS_FILE, 'r') as plans_file:
+        _compiled_plans = json.load(plans_file)
+    except FileNotFoundError:
+      print(f'WARNING: {PLANS_FILE} not found, embedding plans will be compiled from the schemas. Run `python -m src.models.embedding_plans` to build it.')
+      _compiled_plans = {}
+  return _compiled_plans
+
+def get_plan(item_type):
+  '''Returns the embedding plan of `item_type` as a tuple of EmbeddingField.'''
+
+  fields = _plans.get(item_type)
+  if fields is None:
+    with _lock:
+      compiled_plans = _load_compiled_plans()
+      plan = compiled_plans[item_type] if item_type in compiled_plans else compile_plan(item_type)
+      fields = _plans[item_type] = _to_fields(plan)
+  return fields
+
+if __name__ == '__main__':
+  from src.models.item_type_models import ITEM_TYPE_TO_MODEL
+
+  with open(PLANS_FILE, 'w') as plans_file:
+    json.dump(compile_plans(ITEM_TYPE_TO_MODEL.keys()), plans_file, indent=2, sort_keys=True)
+    plans_file.write('\n')
+  print(f'Wrote embedding plans of {len(ITEM_TYPE_TO_MODEL)} item types to {PLANS_FILE}')
@@ -1,6 +1,7 @@
 import copy
 
 from src.models.schema_reader import SchemaReader
+from src.models.embedding_plans import get_plan
 from src.utils.exceptions import PopulatorException
 from src.utils.dict import dictdeepget, dictdeepset
 
@@ -23,6 +24,8 @@ class BaseModel:
     # 'submitted_by': 'user',
     # 'segregation.variants': 'variant'
   }
+  # the same fields as `EmbeddingField`s, with their path pre-split, see `embedding_plans`
+  embedding_fields = ()
 
   def __init__(self, item_type=None):
     if not self.item_type:
@@ -46,43 +49,26 @@ class BaseModel:
   def get_dot_representation_keys(self):
     singular_keys = []
     plural_keys = []
-    for dot_representation in self.dot_representations_for_embedding:
-      if self.is_array_dot_representation(dot_representation):
-        plural_keys.append(dot_representation.replace('[]', ''))
+    for embedding_field in self.embedding_fields:
+      if embedding_field.is_array:
+        plural_keys.append(embedding_field.key)
       else:
-        singular_keys.append(dot_representation)
+        singular_keys.append(embedding_field.key)
     
     return singular_keys, plural_keys
 
+  @property
+  def schema(self):
+    return SchemaReader.get_schema(self.item_type)
+
   def _load_dot_representations_for_embedding(self):
     if not self.item_type:
       raise Exception('item_type not set')
     
-    self.dot_representations_for_embedding = []
-    
-    self.schema = parent_schema = SchemaReader.get_schema(self.item_type)
-    stack = [('', parent_schema)]
-    while stack:
-      dot_representation, schema = stack.pop()
-      for field_key, field_schema in schema.items():
-        key = '.'.join([dot_representation, field_key]) if dot_representation else field_key
-        if SchemaReader.is_singular_relational_field(field_schema):
-          item_type, _ = SchemaReader.parse_schema_string(field_schema['$schema'])
-          # e.g. `...submitted_by`
-          self.dot_representations_for_embedding.append(key)
-          self.map_dot_representation_to_item_type[key] = item_type
-        elif SchemaReader.is_plural_relational_field(field_schema):
-          item_type, _ = SchemaReader.parse_schema_string(field_schema['items']['$schema'])
-          # e.g. `...variants[]`
-          key_with_brackets = key + '[]'
-          self.dot_representations_for_embedding.append(key_with_brackets)
-          self.map_dot_representation_to_item_type[key] = item_type
-        elif SchemaReader.is_nested_field(field_schema):
-          # e.g. `...segregation`
-          stack.append((key, field_schema['properties']))
-      
-    # make sure the list is unique
-    self.dot_representations_for_embedding = list(set(self.dot_representations_for_embedding))
+    # the relational fields, precompiled from the json schema (see `embedding_plans`)
+    self.embedding_fields = get_plan(self.item_type)
+    self.dot_representations_for_embedding = [embedding_field.dot_representation for embedding_field in self.embedding_fields]
+    self.map_dot_representation_to_item_type = { embedding_field.key: embedding_field.item_type for embedding_field in self.embedding_fields }
 
 
 class IndividualModel(BaseModel):
@@ -1,7 +1,7 @@
 import copy
 
 from src.utils.exceptions import PopulatorException
-from src.utils.dict import dictdeepget, dictdeepset, dictdeepdel
+from src.utils.dict import dictdeepget, dictdeepdel
 from src.models.item_type_models import ITEM_TYPE_TO_MODEL, ITEM_TYPE_TO_MODEL_INSTANCE
 
 
@@ -22,129 +22,170 @@ class _ModelSerializer:
 
     return ITEM_TYPE_TO_MODEL_INSTANCE[item_type]
 
-  def populate(self, db, src_parent: dict, exclude_key_list: list = None, include_key_list: list = None):
+  def populate(self, db, src_parent: dict, exclude_key_list: list = None, include_key_list: list = None, in_place: bool = False):
     '''
     :param DynamoClient db: the DynamoDB client used by each controller
     :param dict src_parent: the initial, top-level object to get populated
     :param list exclude_key_list: optional, a list of key in dot representation. If `include_key_list` also supplied, keys in `exclude_key_list` take the priority.
     :param list include_key_list: optional, a list of key in dot representation. If `exclude_key_list` also supplied, keys in `exclude_key_list` take the priority.
+    :param bool in_place: populate `src_parent` itself instead of a copy, for objects the caller owns (e.g. just read from db).
 
     :return: the populated object derived from `src_parent`.
     :rtype: dict
     '''
 
-    if 'item_type' not in src_parent or not src_parent['item_type']:
-      raise Exception(f"PopulateError: parent object does not have item_type on it. `parent` is {str(src_parent)}.")
+    return self.populate_many(db, [src_parent], exclude_key_list=exclude_key_list, include_key_list=include_key_list, in_place=in_place)[0]
 
-    populated_src_parent = copy.deepcopy(src_parent)
+  def populate_many(self, db, src_parents: list, exclude_key_list: list = None, include_key_list: list = None, in_place: bool = False):
+    '''Populate a list of objects together, e.g. all the items returned by a query.
+
+    Objects are populated breadth-first in waves: every PK still to be embedded at the current
+    embedding depth, across all parents, is fetched with a single `db.all()` call before moving
+    on to the next depth. The number of db round trips therefore grows with the embedding depth
+    of the models rather than with the number of objects.
+
+    :param DynamoClient db: the DynamoDB client used by each controller
+    :param list src_parents: the top-level objects to get populated
+    :param list exclude_key_list: optional, applied to each top-level object as in `populate`.
+    :param list include_key_list: optional, applied to each top-level object as in `populate`.
+    :param bool in_place: optional, as in `populate`.
+
+    :return: the populated objects derived from `src_parents`, in the same order.
+    :rtype: list
+    '''
+
+    for src_parent in src_parents:
+      if 'item_type' not in src_parent or not src_parent['item_type']:
+        raise Exception(f"PopulateError: parent object does not have item_type on it. `parent` is {str(src_parent)}.")
+
+    populated_src_parents = list(src_parents) if in_place else copy.deepcopy(src_parents)
 
     include_key_set = set(include_key_list if include_key_list else [])
     exclude_key_set = set(exclude_key_list if exclude_key_list else [])
-    
-    # use a DFS traverse to go through all levels of fields that need populated
-    # avoid recursion since in case there's bug in recursion and got infinite calls, could cause serverless to keep scaling up and does not stop
-    populate_stack = [(include_key_set, exclude_key_set, populated_src_parent)]
-    while populate_stack:
-      include_key_set, exclude_key_set, parent = populate_stack.pop()
-
-      Model = self._get_model(parent)
-
-      # yield the final fields to populate
-      opt_in_fields = None
-      if not include_key_set and not exclude_key_set:
-        opt_in_fields = Model.dot_representations_for_embedding
-      elif not include_key_set and exclude_key_set:
-        opt_in_fields = set(Model.dot_representations_for_embedding) - exclude_key_set
-      elif include_key_set and not exclude_key_set:
-        opt_in_fields = include_key_set.intersection(Model.dot_representations_for_embedding)
-      elif include_key_set and exclude_key_set:
-        opt_in_fields = include_key_set.intersection(Model.dot_representations_for_embedding) - exclude_key_set
-
-      # only fields in dot representation are concerned
-      all_related_pks = set()
-      # `embedding_meta_list` will store meta info about where an object or objects should be embedded
-      embedding_meta_list = []
-      for _dot_representation in opt_in_fields:
-        is_array = Model.is_array_dot_representation(_dot_representation)
-        dot_representation = _dot_representation.replace('[]', '')
-        
-        parent_value = dictdeepget(parent, dot_representation)
 
-        # skip if such field is missing (not a pk string or not a list of pk strings) on parent object
-        if not parent_value:
-          continue
-        
-        # check consistency whether it's an array field or not 
-        # between parent object and schema
-        if not (
-          (is_array and isinstance(parent_value, list) and parent_value) or
-          (not is_array and isinstance(parent_value, str))
-        ):
+    # use a BFS traverse, one wave per embedding depth, to go through all levels of fields that need populated
+    # avoid recursion since in case there's bug in recursion and got infinite calls, could cause serverless to keep scaling up and does not stop
+    populate_wave = [(include_key_set, exclude_key_set, parent) for parent in populated_src_parents]
+    while populate_wave:
+      # `pending_parents` stores, for every parent in this wave that has related PKs, where objects should be embedded
+      pending_parents = []
+      wave_related_pks = set()
+      for include_key_set, exclude_key_set, parent in populate_wave:
+        Model = self._get_model(parent)
+        opt_in_fields = self._get_opt_in_fields(Model, include_key_set, exclude_key_set)
+        embedding_meta_list, related_pks = self._collect_related_pks(Model, parent, opt_in_fields)
+
+        # no relational PK, so no need to do any populating
+        if len(related_pks) == 0:
           continue
-        
-        # collect all pks
-        if is_array:
-          for pk in parent_value:
-            if pk and isinstance(pk, str):
-              all_related_pks.add(pk)
-        else:
-          if parent_value and isinstance(parent_value, str):
-            all_related_pks.add(parent_value)
-        
-        embedding_meta_list.append({
-          # store local parent so we can set attr more quickly
-          'dot_representation': dot_representation,
-          'is_array': is_array
-        })
-      
-      # no relational PK, so no need to do any populating
+
+        pending_parents.append((Model, parent, opt_in_fields, embedding_meta_list, related_pks))
+        wave_related_pks.update(related_pks)
+
       # (db.all() will throw error if list is empty)
-      if len(all_related_pks) == 0:
-        continue
+      if len(wave_related_pks) == 0:
+        break
 
-      # batch pull from db client
+      # batch pull from db client, once for the whole wave
       try:
-        items = db.all(list(all_related_pks))
+        items = db.all(list(wave_related_pks))
       except Exception as e:
-        raise PopulatorException(f'PopulateFieldError: the db client failed to collect related objects for parent of type `{parent["item_type"]}`:\n{e}.\nFields to populate: {opt_in_fields}\nParent object: {parent}\nDB client error detail: {e}')
-      if len(items) != len(all_related_pks):
-        items_from_db_set = set([item['PK'] for item in items])
-        object_not_found_in_db_pks = all_related_pks.difference(items_from_db_set)
-        raise PopulatorException(f'PopulateFieldError: cannot populate some related fields for {parent["item_type"]} because the following PKs not found in db: {object_not_found_in_db_pks}\nFields to populate: {list(map(lambda meta: meta["dot_representation"], embedding_meta_list))}\nParent object: {parent}')
+        parent_item_types = sorted(set(pending[1]['item_type'] for pending in pending_parents))
+        raise PopulatorException(f'PopulateFieldError: the db client failed to collect related objects for parents of type {parent_item_types}:\n{e}.\nDB client error detail: {e}')
 
       # gerenate a store of { PK01: object01, ... } to quickly retrieve the db object by its PK
-      related_lookup = { item['PK']: item for item in items }
+      wave_lookup = { item['PK']: item for item in items }
+
+      next_populate_wave = []
+      claimed_pks = set()
+      for Model, parent, opt_in_fields, embedding_meta_list, related_pks in pending_parents:
+        object_not_found_in_db_pks = related_pks.difference(wave_lookup)
+        if object_not_found_in_db_pks:
+          raise PopulatorException(f'PopulateFieldError: cannot populate some related fields for {parent["item_type"]} because the following PKs not found in db: {object_not_found_in_db_pks}\nFields to populate: {[embedding_field.key for embedding_field in embedding_meta_list]}\nParent object: {parent}')
+
+        # every parent gets its own copy of a shared related object, same as fetching them separately would,
+        # so that `did_populate` hooks and deeper embedding on one parent never leak into another
+        related_lookup = {}
+        for pk in related_pks:
+          if pk in claimed_pks:
+            related_lookup[pk] = copy.deepcopy(wave_lookup[pk])
+          else:
+            related_lookup[pk] = wave_lookup[pk]
+            claimed_pks.add(pk)
+
+        self._embed_related_objects(parent, embedding_meta_list, related_lookup)
+
+        # allow any custom logic to modify the populated object
+        Model.did_populate(parent)
+
+        # keep doing the same thing on embedded objects in the next wave
+        next_populate_wave.extend([(None, None, item) for item in related_lookup.values()])
+
+      populate_wave = next_populate_wave
+
+    return populated_src_parents
+
+  def _get_opt_in_fields(self, Model, include_key_set, exclude_key_set):
+    '''Yield the final fields (`EmbeddingField`s) to populate on an object of `Model`.'''
+
+    if not include_key_set and not exclude_key_set:
+      return Model.embedding_fields
+    
+    return [
+      embedding_field for embedding_field in Model.embedding_fields
+      if (not include_key_set or embedding_field.dot_representation in include_key_set) and
+        embedding_field.dot_representation not in exclude_key_set
+    ]
+
+  def _collect_related_pks(self, Model, parent, opt_in_fields):
+    '''Collect the PKs referenced by `opt_in_fields` on `parent`.
+
+    :return: the `EmbeddingField`s where objects should be embedded, and the set of PKs to fetch.
+    :rtype: (list, set)
+    '''
+
+    # only fields in dot representation are concerned
+    related_pks = set()
+    # `embedding_meta_list` will store the fields where an object or objects should be embedded
+    embedding_meta_list = []
+    for embedding_field in opt_in_fields:
+      parent_value = _get_path(parent, embedding_field.path)
+
+      # skip if such field is missing (not a pk string or not a list of pk strings) on parent object
+      if not parent_value:
+        continue
       
-      # embed objects onto parent
-      for embedding_meta in embedding_meta_list:
-        dot_representation = embedding_meta['dot_representation']
-        is_array = embedding_meta['is_array']
-        value_on_parent = dictdeepget(parent, dot_representation)
-
-        if is_array and isinstance(value_on_parent, list):
-          dictdeepset(
-            parent, 
-            dot_representation,
-            list(map(
-              lambda value: related_lookup[value] if isinstance(value, str) else value,
-              value_on_parent
-            ))
-          )
-        elif not is_array and isinstance(value_on_parent, str):
-          dictdeepset(
-            parent,
-            dot_representation,
-            related_lookup[value_on_parent]
-          )
+      # check consistency whether it's an array field or not 
+      # between parent object and schema, and collect all pks
+      if embedding_field.is_array:
+        if not isinstance(parent_value, list):
+          continue
+        for pk in parent_value:
+          if pk and isinstance(pk, str):
+            related_pks.add(pk)
+      else:
+        if not isinstance(parent_value, str):
+          continue
+        related_pks.add(parent_value)
       
-      # allow any custom logic to modify the populated object
-      Model.did_populate(parent)
+      embedding_meta_list.append(embedding_field)
 
-      # keep doing the same thing on embedded objects
-      # use DFS and push into stack
-      populate_stack.extend([(None, None, item) for item in items])
-    
-    return populated_src_parent
+    return embedding_meta_list, related_pks
+
+  def _embed_related_objects(self, parent, embedding_meta_list, related_lookup):
+    '''Replace PKs on `parent` by the objects in `related_lookup`, in-place.'''
+
+    for embedding_field in embedding_meta_list:
+      container = _get_path(parent, embedding_field.path[:-1])
+      if not isinstance(container, dict):
+        continue
+      field_key = embedding_field.path[-1]
+      value_on_parent = container.get(field_key)
+
+      if embedding_field.is_array and isinstance(value_on_parent, list):
+        container[field_key] = [related_lookup[value] if isinstance(value, str) else value for value in value_on_parent]
+      elif not embedding_field.is_array and isinstance(value_on_parent, str):
+        container[field_key] = related_lookup[value_on_parent]
 
   def normalize(self, db, src_parent: dict, item_type: str):
     '''Replace embed objects by PK, and strip off any computed field in `src_parent`, so the db does not store redundant data.
@@ -165,21 +206,22 @@ class _ModelSerializer:
 
     # only need to normalize fields on `dot_representations`
     Model = self._get_model(parent, item_type)
-    for _dot_representation in Model.dot_representations_for_embedding:
-      is_array = Model.is_array_dot_representation(_dot_representation)
-      dot_representation = _dot_representation.replace('[]', '')
+    for embedding_field in Model.embedding_fields:
+      container = _get_path(parent, embedding_field.path[:-1])
+      if not isinstance(container, dict):
+        continue
+      field_key = embedding_field.path[-1]
 
       # only normalize if such field exists && contains objects
-      field_value = dictdeepget(parent, dot_representation)
+      field_value = container.get(field_key)
       if not field_value:
         continue
         
-      if is_array:
-        pks = list(map(lambda value: value['PK'] if isinstance(value, dict) and 'PK' in value else value, field_value))
-        dictdeepset(parent, dot_representation, pks)
+      if embedding_field.is_array:
+        container[field_key] = [value['PK'] if isinstance(value, dict) and 'PK' in value else value for value in field_value]
       else:
         if isinstance(field_value, dict) and 'PK' in field_value:
-          dictdeepset(parent, dot_representation, field_value['PK'])
+          container[field_key] = field_value['PK']
     
     # also remove computed properties so that they won't be stored in db
     for computed_property_key in Model.computed_properties:
@@ -189,4 +231,12 @@ class _ModelSerializer:
     
     return parent
 
+def _get_path(obj, path):
+  '''Returns the value at `path` (a tuple of keys) in nested dicts, or None if any level is missing.'''
+  for key in path:
+    if not isinstance(obj, dict):
+      return None
+    obj = obj.get(key)
+  return obj
+
 ModelSerializer = _ModelSerializer()
@@ -1,12 +1,28 @@
 import os
 import json
+import threading
+
+# Schema documents read so far, by item_type. Schemas only change with a deploy, so each
+# file is read once per process; callers must not modify the returned dicts.
+_schema_documents = {}
+_schema_documents_lock = threading.Lock()
 
 class _SchemaReader:
   MODELS_DIR = os.path.dirname(os.path.realpath(__file__))
 
   def get_schema(self, item_type) -> dict:
-    with open(self._get_schema_file_path(item_type), 'r') as schema_file:
-      return json.load(schema_file)['properties']
+    return self.get_schema_document(item_type)['properties']
+
+  def get_schema_document(self, item_type) -> dict:
+    '''Returns the whole json schema of `item_type`, read from disk on first use only.'''
+    schema_document = _schema_documents.get(item_type)
+    if schema_document is None:
+      with _schema_documents_lock:
+        schema_document = _schema_documents.get(item_type)
+        if schema_document is None:
+          with open(self._get_schema_file_path(item_type), 'r') as schema_file:
+            schema_document = _schema_documents[item_type] = json.load(schema_file)
+    return schema_document
   
   def is_singular_relational_field(self, schema_property_value):
     if (
@@ -72,8 +88,7 @@ def get_schema(parent) -> dict:
     raise Exception(f"ReadSchemaError: parent object does not have item_type on it. `parent` is {str(parent)}.")
   item_type = parent['item_type']
 
-  with open(__get_schema_file_path(item_type), 'r') as schema_file:
-    return json.load(schema_file)
+  return SchemaReader.get_schema_document(item_type)
   
 def is_singular_relational_field(schema_property_value):
   if (
@@ -96,16 +111,6 @@ def is_plural_relational_field(schema_property_value):
   else:
     return False
 
-def __get_schema_file_path(item_type):
-  '''Get the schema file path based on item_type.
-  Also maps item_type to the file name of the schema json file.
-
-  :param str item_type: the item_type on an object.
-  '''
-
-  filename_no_extension = item_type.replace('-', '_')
-  return f'src/models/{filename_no_extension}.json'
-
 def parse_schema_string(schema_string: str) -> (str, set):
   '''Parse the $schema field of the json schema, and retrieve the item_type and schema args
 
@@ -0,0 +1,256 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+# Element paths (tags from the InterpretedRecord down) whose subtrees are
+# extracted as soon as they are parsed and then dropped from the document
+CLINICAL_ASSERTION_PATH = ('InterpretedRecord', 'ClinicalAssertionList', 'ClinicalAssertion')
+TRAIT_MAPPING_PATH = ('InterpretedRecord', 'TraitMappingList', 'TraitMapping')
+
+# Characters (or bytes) of the response handed to the parser at a time
+PARSE_CHUNK_SIZE = 64 * 1024
+
+class ClinVarDocument:
+  """A ClinVar VCV response parsed once and shared by all of its consumers.
+
+  `root` is the ClinVarResult-Set element with the per-submission subtrees
+  (ClinicalAssertion and TraitMapping elements) removed; their data is kept,
+  already extracted, in `clinical_assertions` and `trait_mappings`. Variant
+  identity, HGVS and transcript data are read from `root`.
+  """
+
+  def __init__(self, root, clinical_assertions, trait_mappings, error=None):
+    self.root = root
+    self.clinical_assertions = clinical_assertions
+    self.trait_mappings = trait_mappings
+
+    # First error raised while extracting an SCV; only interpretation parsing fails on it
+    self.error = error
+
+def parse(xml):
+  """Parses a ClinVar VCV response (str or bytes) in a single streaming pass.
+
+  Each ClinicalAssertion is reduced to the data the interpretation parser needs
+  once its end tag is read, and its element is discarded, so memory use grows
+  with the size of the extracted data rather than with the SCV subtrees.
+  """
+
+  if isinstance(xml, ClinVarDocument):
+    return xml
+
+  clinical_assertions = []
+  trait_mappings = []
+  error = None
+
+  root = None
+  path = []
+  elements = []
+
+  # Same event stream as ET.iterparse, fed from slices of the response so it is not copied
+  parser = ET.XMLPullParser(events=('start', 'end'))
+
+  for offset in range(0, len(xml) or 1, PARSE_CHUNK_SIZE):
+    parser.feed(xml[offset:offset + PARSE_CHUNK_SIZE])
+
+    for event, element in parser.read_events():
+      if event == 'start':
+        if root is None:
+          root = element
+        path.append(element.tag)
+        elements.append(element)
+        continue
+
+      if tuple(path[-3:]) == CLINICAL_ASSERTION_PATH:
+        if error is None:
+          try:
+            clinical_assertion = read_clinical_assertion(element)
+            if clinical_assertion is not None:
+              clinical_assertions.append(clinical_assertion)
+          except Exception as e:
+            error = e
+        elements[-2].remove(element)
+
+      elif tuple(path[-3:]) == TRAIT_MAPPING_PATH:
+        trait_mapping = read_trait_mapping(element)
+        if trait_mapping is not None:
+          trait_mappings.append(trait_mapping)
+        elements[-2].remove(element)
+
+      path.pop()
+      elements.pop()
+
+  parser.close()
+
+  return ClinVarDocument(root, clinical_assertions, trait_mappings, error)
+
+def root_of(xml):
+  """Returns the root element of a ClinVar VCV response given as a string or a ClinVarDocument."""
+
+  if isinstance(xml, ClinVarDocument):
+    return xml.root
+  return ET.fromstring(xml)
+
+# Reference data used to look up condition names and/or MedGen IDs of SCVs
+def read_trait_mapping(element_trait_mapping):
+  if element_trait_mapping.get('TraitType') != 'Disease':
+    return None
+
+  obj_trait_map = {
+    'ClinicalAssertionID': element_trait_mapping.get('ClinicalAssertionID'),
+    'MappingType': element_trait_mapping.get('MappingType'),
+    'MappingValue': element_trait_mapping.get('MappingValue'),
+    'MappingRef': element_trait_mapping.get('MappingRef')
+  }
+  element_med_gen = element_trait_mapping.find('.//MedGen')
+
+  if element_med_gen is not None:
+    obj_trait_map['MedGenCUI'] = element_med_gen.get('CUI')
+    obj_trait_map['MedGenName'] = element_med_gen.get('Name')
+
+  return obj_trait_map
+
+def read_clinical_assertion(element_clinical_assertion):
+  """Extracts an SCV from a ClinicalAssertion element.
+
+  Condition names and MedGen IDs that have to be looked up in the TraitMappingList
+  (which follows the ClinicalAssertionList) are left as pending `lookups`; see
+  variant_xml_clinvar_interpretation_parser.resolve_SCV.
+  """
+
+  element_clinvar_accession = element_clinical_assertion.find('.//ClinVarAccession')
+
+  if element_clinvar_accession is None or element_clinvar_accession.get('Type') != 'SCV':
+    return None
+
+  obj_SCV = {'phenotypeList': []}
+  bool_save_SCV = False
+  lookups = []
+  attribute_accession = element_clinvar_accession.get('Accession')
+  attribute_submitter_name = element_clinvar_accession.get('SubmitterName')
+  element_CA_review_status = element_clinical_assertion.find('.//ReviewStatus')
+  element_CA_interpretation = element_clinical_assertion.find('.//Interpretation')
+  element_trait_set = element_clinical_assertion.find('.//TraitSet')
+
+  # Save submission accession (including version)
+  if attribute_accession:
+    attribute_version = element_clinvar_accession.get('Version')
+
+    obj_SCV['accession'] = attribute_accession
+    bool_save_SCV = True
+
+    if attribute_version:
+      obj_SCV['version'] = attribute_version
+
+  # Save submitter name/ID and study description
+  if attribute_submitter_name:
+    attribute_org_id = element_clinvar_accession.get('OrgID')
+    element_study_description = element_clinical_assertion.find('.//StudyDescription')
+
+    obj_SCV['submitterName'] = attribute_submitter_name
+    bool_save_SCV = True
+
+    if attribute_org_id:
+      obj_SCV['orgID'] = attribute_org_id
+
+    if element_study_description is not None:
+      obj_SCV['studyDescription'] = element_study_description.text
+
+  # Save review status
+  if element_CA_review_status is not None:
+    obj_SCV['reviewStatus'] = element_CA_review_status.text
+    bool_save_SCV = True
+
+  # Save clinical significance and last evaluated date (from first Interpretation element)
+  if element_CA_interpretation is not None:
+    element_CA_description = element_CA_interpretation.find('.//Description')
+
+    if element_CA_description is not None:
+      attribute_CA_date_last_evaluated = element_CA_interpretation.get('DateLastEvaluated')
+
+      obj_SCV['clinicalSignificance'] = element_CA_description.text
+      bool_save_SCV = True
+
+      if attribute_CA_date_last_evaluated:
+        obj_SCV['dateLastEvaluated'] = datetime.strptime(attribute_CA_date_last_evaluated, '%Y-%m-%d').strftime('%b %d, %Y')
+
+  # Save condition(s); whether a condition is saved does not depend on the TraitMapping lookups
+  if element_trait_set is not None and element_trait_set.get('Type') == 'Disease':
+    for element_trait in element_trait_set.findall('.//Trait'):
+      if element_trait.get('Type') == 'Disease':
+        element_element_value = attribute_type = None
+        obj_trait = {'identifiers': []}
+        bool_save_trait = False
+        bool_med_gen_found = False
+        element_name = element_trait.find('.//Name')
+        xrefs = []
+
+        # Save condition name from the first Name element
+        if element_name is not None:
+          element_element_value = element_name.find('.//ElementValue')
+
+          if element_element_value is not None:
+            attribute_type = element_element_value.get('Type')
+            obj_trait['name'] = element_element_value.text
+            bool_save_SCV = True
+            bool_save_trait = True
+
+        # Save condition ID(s) (and corresponding data source(s))
+        for element_xref in element_trait.findall('.//XRef'):
+          attribute_db = element_xref.get('DB')
+          attribute_id = element_xref.get('ID')
+          obj_xref = {
+            'db': attribute_db if attribute_db else None,
+            'id': attribute_id if attribute_id else None
+          }
+
+          obj_trait['identifiers'].append(obj_xref)
+          xrefs.append(obj_xref)
+          bool_save_trait = True
+
+          if obj_xref['db'] == 'MedGen':
+            bool_med_gen_found = True
+
+        if bool_save_trait:
+          obj_SCV['phenotypeList'].append(obj_trait)
+          lookups.append({
+            'trait': obj_trait,
+            'xrefs': xrefs,
+            'nameType': attribute_type,
+            'lookupMedGen': element_element_value is not None and not bool_med_gen_found
+          })
+
+  # Save assertion method and/or mode of inheritance
+  for element_attribute_set in element_clinical_assertion.findall('.//AttributeSet'):
+    element_attribute = element_attribute_set.find('.//Attribute')
+
+    if element_attribute is not None:
+      attribute_as_type = element_attribute.get('Type')
+
+      # Save assertion method data (when it can be partnered with a review status)
+      if attribute_as_type == 'AssertionMethod' and obj_SCV.get('reviewStatus'):
+        element_citation = element_attribute_set.find('Citation')
+
+        obj_SCV['assertionMethod'] = element_attribute.text
+
+        if element_citation is not None:
+          element_url = element_citation.find('.//URL')
+
+          # For an assertion method citation, prefer a provided URL to a PubMed ID
+          if element_url is not None:
+            obj_SCV['AssertionMethodCitationURL'] = element_url.text
+          else:
+            # Save first PubMed ID
+            for element_id in element_citation.findall('.//ID'):
+              if element_id.get('Source') == 'PubMed':
+                obj_SCV['AssertionMethodCitationPubMedID'] = element_id.text
+                break
+
+      # Save a mode of inheritance (when it can be partnered with a condition)
+      elif attribute_as_type == 'ModeOfInheritance' and len(obj_SCV['phenotypeList']):
+        obj_SCV['modeOfInheritance'] = element_attribute.text
+
+  return {
+    'id': element_clinical_assertion.get('ID'),
+    'scv': obj_SCV,
+    'save': bool_save_SCV,
+    'lookups': lookups
+  }
@@ -1,13 +1,13 @@
 import re
 
-import xml.etree.ElementTree as ET
+from src.parsers import clinvar_document
 
 def from_xml(xml, extended=False):
-  """Parses a ClinVar XML response and returns a Variant object"""
+  """Parses a ClinVar XML response, or an already parsed ClinVarDocument, and returns a Variant object"""
   
   variant = {}
 
-  root = ET.fromstring(xml)
+  root = clinvar_document.root_of(xml)
   
   # Get variant metadata. TODO: This will be moved to a more object oriented class
   # when needed.
@@ -2,4 +2,7 @@ class PopulatorException(Exception):
   pass
 
 class NormalizerException(Exception):
-  pass
\ No newline at end of file
+  pass
+
+class QueryCursorException(Exception):
+  pass
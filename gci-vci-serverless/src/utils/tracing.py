@@ -0,0 +1,270 @@
+''' Lightweight per-request tracing.
+
+Spans (routing, DynamoDB, S3, Elasticsearch, Kafka, external HTTP, and functions
+decorated with `traced`) are aggregated by kind and name while a request is traced.
+When the request ends a single JSON line is printed, in CloudWatch Embedded Metric
+Format so per-route metrics can be graphed and alarmed on without log parsing.
+
+A fraction `TRACE_SAMPLE_RATE` (0 to 1) of requests is traced. With a rate of 0
+tracing is disabled: `traced` returns functions undecorated and `span` returns a
+shared no-op.
+'''
+
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0'))
+METRICS_NAMESPACE = os.environ.get('TRACE_METRICS_NAMESPACE', 'GciVciApi')
+
+# Span kinds reported as metrics, and the metric name prefix of each. Other kinds
+# (e.g. 'function') only appear in the per-span detail of the summary line.
+METRIC_KINDS = {
+  'dynamodb': 'DynamoDB',
+  's3': 'S3',
+  'elasticsearch': 'Elasticsearch',
+  'kafka': 'Kafka',
+  'http': 'HTTP',
+  'cache': 'UpstreamCache'
+}
+
+# Span counters also reported as metrics (prefixed with the kind's metric prefix)
+METRIC_COUNTERS = {
+  'consumedCapacity': 'ConsumedCapacity',
+  'hits': 'Hits',
+  'misses': 'Misses'
+}
+
+# The trace of the request being handled, see `request_trace()`.
+_trace = None
+
+
+class Trace:
+  ''' Span statistics of one request, aggregated by (kind, name). Thread safe. '''
+
+  def __init__(self):
+    self.start = time.perf_counter()
+    self.fields = {}
+    self.spans = {}
+    self.metrics = {}
+    self._lock = threading.Lock()
+
+  def record(self, kind, name, duration, counters=None):
+    with self._lock:
+      stats = self.spans.get((kind, name))
+      if stats is None:
+        stats = self.spans[(kind, name)] = { 'count': 0, 'ms': 0.0, 'maxMs': 0.0 }
+
+      ms = duration * 1000
+      stats['count'] += 1
+      stats['ms'] += ms
+      stats['maxMs'] = max(stats['maxMs'], ms)
+
+      for counter, value in (counters or {}).items():
+        stats[counter] = stats.get(counter, 0) + value
+
+  def set(self, **fields):
+    ''' Adds fields (e.g. Route, statusCode) to the summary line. '''
+
+    self.fields.update(fields)
+
+  def metric(self, name, value, unit='Count'):
+    ''' Adds a metric of the request (e.g. records handled by a stream consumer) to the summary line. '''
+
+    with self._lock:
+      self.metrics[name] = (value, unit)
+
+  def summary(self):
+    ''' Returns the EMF summary of the request: metrics, per-span detail and fields. '''
+
+    metrics = { 'Duration': round((time.perf_counter() - self.start) * 1000, 2) }
+    units = { 'Duration': 'Milliseconds' }
+    spans = []
+
+    with self._lock:
+      for (kind, name), stats in sorted(self.spans.items()):
+        spans.append({ 'kind': kind, 'name': name, **{ k: round(v, 2) for k, v in stats.items() } })
+
+        prefix = METRIC_KINDS.get(kind)
+        if prefix:
+          metrics[prefix + 'Calls'] = metrics.get(prefix + 'Calls', 0) + stats['count']
+          metrics[prefix + 'Time'] = round(metrics.get(prefix + 'Time', 0) + stats['ms'], 2)
+          units[prefix + 'Calls'] = 'Count'
+          units[prefix + 'Time'] = 'Milliseconds'
+
+          for counter, suffix in METRIC_COUNTERS.items():
+            if counter in stats:
+              metrics[prefix + suffix] = metrics.get(prefix + suffix, 0) + stats[counter]
+              units[prefix + suffix] = 'Count'
+
+      for name, (value, unit) in self.metrics.items():
+        metrics[name] = value
+        units[name] = unit
+
+    dimensions = [['Route']] if 'Route' in self.fields else [[]]
+
+    return {
+      '_aws': {
+        'Timestamp': int(time.time() * 1000),
+        'CloudWatchMetrics': [{
+          'Namespace': METRICS_NAMESPACE,
+          'Dimensions': dimensions,
+          'Metrics': [{ 'Name': name, 'Unit': units[name] } for name in metrics]
+        }]
+      },
+      **self.fields,
+      **metrics,
+      'spans': spans
+    }
+
+
+class Span:
+  ''' Times a block and records it on a trace. Counters can be added with `add()`. '''
+
+  __slots__ = ('trace', 'kind', 'name', 'counters', 'start')
+
+  def __init__(self, trace, kind, name, counters):
+    self.trace = trace
+    self.kind = kind
+    self.name = name
+    self.counters = counters
+
+  def add(self, **counters):
+    for counter, value in counters.items():
+      self.counters[counter] = self.counters.get(counter, 0) + value
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.trace.record(self.kind, self.name, time.perf_counter() - self.start, self.counters)
+    return False
+
+
+class NoopSpan:
+  ''' Returned by `span()` when the request is not traced. '''
+
+  __slots__ = ()
+
+  def add(self, **counters):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    return False
+
+_NOOP_SPAN = NoopSpan()
+
+
+def span(kind, name, **counters):
+  ''' Returns a context manager timing a block as a span of the current request. '''
+
+  trace = _trace
+  if trace is None:
+    return _NOOP_SPAN
+  return Span(trace, kind, name, counters)
+
+
+def traced(kind, name=None):
+  ''' Decorator recording each call of a function as a span. A no-op when tracing is disabled. '''
+
+  def decorator(method):
+    if SAMPLE_RATE <= 0:
+      return method
+
+    span_name = name or method.__name__
+
+    def wrapper(*args, **kwargs):
+      trace = _trace
+      if trace is None:
+        return method(*args, **kwargs)
+
+      with Span(trace, kind, span_name, {}):
+        return method(*args, **kwargs)
+
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    wrapper.__wrapped__ = method
+    return wrapper
+
+  return decorator
+
+
+def current_trace():
+  return _trace
+
+
+@contextmanager
+def request_trace(sample_rate=None):
+  ''' Traces the block if the request is sampled, then prints its summary line.
+
+  Yields the Trace, or None when the request is not sampled (or a trace is already active).
+  '''
+
+  global _trace
+
+  rate = SAMPLE_RATE if sample_rate is None else sample_rate
+  if _trace is not None or rate <= 0 or (rate < 1 and random.random() >= rate):
+    yield None
+    return
+
+  _trace = trace = Trace()
+  try:
+    yield trace
+  finally:
+    _trace = None
+    print(json.dumps(trace.summary(), default=str))
+
+
+def instrument_boto3_client(client, kind):
+  ''' Records every API call of a boto3 client as a span, using botocore's event hooks.
+
+  DynamoDB calls also report consumed capacity (requested only while a trace is
+  active), pages and item counts.
+  '''
+
+  events = client.meta.events
+  events.register('before-call', _before_call)
+  events.register('after-call', lambda **kwargs: _after_call(kind, **kwargs))
+  events.register('after-call-error', lambda **kwargs: _after_call(kind, **kwargs))
+
+  if kind == 'dynamodb':
+    events.register('before-parameter-build', _request_consumed_capacity)
+
+
+def _request_consumed_capacity(params, model, **kwargs):
+  if _trace is not None and 'ReturnConsumedCapacity' not in params and model.input_shape is not None and \
+    'ReturnConsumedCapacity' in model.input_shape.members:
+    params['ReturnConsumedCapacity'] = 'TOTAL'
+
+
+def _before_call(context, **kwargs):
+  if _trace is not None:
+    context['trace_start'] = time.perf_counter()
+
+
+def _after_call(kind, context, model=None, parsed=None, event_name='', **kwargs):
+  # `after-call-error` events carry the exception instead of the operation model
+  start = context.pop('trace_start', None)
+  trace = _trace
+  if start is None or trace is None:
+    return
+
+  counters = {}
+  if kind == 'dynamodb' and isinstance(parsed, dict):
+    consumed = parsed.get('ConsumedCapacity')
+    if consumed:
+      consumed = consumed if isinstance(consumed, list) else [consumed]
+      counters['consumedCapacity'] = sum(c.get('CapacityUnits', 0) for c in consumed)
+    if 'Count' in parsed:
+      counters['pages'] = 1
+      counters['items'] = parsed['Count']
+
+  operation_name = model.name if model is not None else event_name.rsplit('.', 1)[-1]
+  trace.record(kind, operation_name, time.perf_counter() - start, counters)
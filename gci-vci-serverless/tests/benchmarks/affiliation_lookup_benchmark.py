@@ -0,0 +1,53 @@
+''' Compares affiliation lookups: the previous scan of affiliations.json against the indexed registry.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.affiliation_lookup_benchmark [lookup count]
+
+Lookups use the affiliations in local-files/affiliations.json. "repeated" looks the same
+affiliation up again and again (what the previous lookup memoized); "interleaved" picks a
+random affiliation each time, as bulk reports and republishes do. The registry is timed
+directly, through lookup_affiliation_data (which also checks whether the file is due for a
+checksum comparison) and resolving every ID with a single `resolve`.
+'''
+
+import random
+import sys
+import time
+
+from src.helpers import affiliation_file
+from tests.unit.test_affiliation_file import LegacyLookup, load_affiliations
+
+DEFAULT_LOOKUP_COUNT = 100000
+
+
+def run(lookup_count):
+  affiliations = load_affiliations()
+  affiliation_ids = [affiliation['affiliation_id'] for affiliation in affiliations]
+  registry = affiliation_file.AffiliationRegistry(affiliations)
+  affiliation_file.registry = registry
+  affiliation_file.registry_checked_at = time.monotonic()
+  rng = random.Random(0)
+  patterns = [
+    ('repeated', [affiliation_ids[len(affiliation_ids) // 2]] * lookup_count),
+    ('interleaved', [rng.choice(affiliation_ids) for _ in range(lookup_count)]),
+  ]
+
+  print(f'{"ids":>12} {"lookup":>24} {"lookups":>10} {"ms":>10} {"lookups/s":>12}')
+  for label, ids in patterns:
+    legacy = LegacyLookup(affiliations)
+    lookups = [
+      ('scan', lambda: [legacy.lookup_affiliation_data(affiliation_id, 'fullname', 'gcep') for affiliation_id in ids]),
+      ('registry', lambda: [registry.lookup(affiliation_id, 'fullname', 'gcep') for affiliation_id in ids]),
+      ('lookup_affiliation_data', lambda: [affiliation_file.lookup_affiliation_data(affiliation_id, 'fullname', 'gcep') for affiliation_id in ids]),
+      ('registry resolve', lambda: registry.resolve(ids, 'fullname', 'gcep')),
+    ]
+    for lookup_label, lookup in lookups:
+      start = time.perf_counter()
+      lookup()
+      elapsed = time.perf_counter() - start
+      print(f'{label:>12} {lookup_label:>24} {lookup_count:>10} {elapsed * 1000:>10.1f} {lookup_count / elapsed:>12.0f}')
+
+
+if __name__ == '__main__':
+  run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LOOKUP_COUNT)
@@ -0,0 +1,89 @@
+''' Measures ClinVar VCV parsing on the tests/data fixtures and on a synthetic large VCV.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.clinvar_parse_benchmark [SCV count]
+
+"per consumer" parses the XML string in each of the three consumers of
+variants_controller.find_by_basic_info (variant, primary transcript and
+interpretations); "shared" parses it once with clinvar_document.parse. Peak
+memory is measured with tracemalloc on a VCV whose SCV is repeated many times.
+'''
+
+import glob
+import re
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from src.parsers import clinvar_document
+import src.parsers.variant_xml_parser as variant_xml_parser
+from src.parsers.variant_xml_clinvar_interpretation_parser import from_xml as clinvar_interpretation_parser
+
+DEFAULT_SCV_COUNT = 5000
+ROUNDS = 20
+
+
+def consume(xml):
+  variant_xml_parser.from_xml(xml, True)
+  variant_xml_parser.from_xml(xml, True)
+  clinvar_interpretation_parser(xml)
+
+
+def per_consumer(xml):
+  consume(xml)
+
+
+def shared(xml):
+  consume(clinvar_document.parse(xml))
+
+
+def timed(run, xml):
+  start = time.perf_counter()
+  for _ in range(ROUNDS):
+    run(xml)
+  return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def peak_memory(run):
+  tracemalloc.start()
+  run()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak / 1024 / 1024
+
+
+def large_vcv(scv_count):
+  ''' The variant 10 fixture with its first ClinicalAssertion repeated scv_count times. '''
+
+  xml = open('tests/data/variant_10.xml').read()
+  assertion = re.search(r'<ClinicalAssertion .*?</ClinicalAssertion>', xml, re.S).group(0)
+  assertions = ''.join(assertion.replace('ID="', f'ID="{i}', 1) for i in range(scv_count))
+  return re.sub(r'<ClinicalAssertionList>.*</ClinicalAssertionList>', lambda m: f'<ClinicalAssertionList>{assertions}</ClinicalAssertionList>', xml, flags=re.S)
+
+
+def main():
+  scv_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SCV_COUNT
+
+  print(f'{"fixture":<28} {"per consumer":>14} {"shared":>10}')
+  for path in sorted(glob.glob('tests/data/variant_[0-9]*.xml')):
+    xml = open(path).read()
+    print(f'{path.split("/")[-1]:<28} {timed(per_consumer, xml):11.2f} ms {timed(shared, xml):7.2f} ms')
+
+  xml = large_vcv(scv_count)
+  print(f'\nsynthetic VCV, {scv_count} SCVs, {len(xml) / 1024 / 1024:.1f}MB')
+
+  start = time.perf_counter()
+  per_consumer(xml)
+  print(f'  per consumer  {time.perf_counter() - start:6.2f}s')
+  start = time.perf_counter()
+  shared(xml)
+  print(f'  shared        {time.perf_counter() - start:6.2f}s')
+
+  print(f'  peak memory, full tree (ET.fromstring)   {peak_memory(lambda: ET.fromstring(xml)):7.1f}MB')
+  print(f'  peak memory, streaming document          {peak_memory(lambda: clinvar_document.parse(xml)):7.1f}MB')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,103 @@
+''' Reports the cold-start cost of each route family of the API Lambda.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.cold_start_benchmark [--budget-ms N] [--budget-mb N]
+
+Each route family is loaded in a fresh interpreter: src.app is imported and the
+family's controller loaded, as a first request would. Import time and the growth
+in resident memory over a bare interpreter are reported, along with loading every
+controller (the cost of the old eager imports, and of a warmer invocation). With
+a budget, exits non-zero if any single route family exceeds it.
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from src.app import ROUTES
+
+# Environment the controllers read at import time
+ENV = {
+  'DB_TABLE_NAME': 'TEST_TABLE',
+  'DB_VPFILTER_TABLE_NAME': 'TEST_VPFILTER_TABLE',
+  'HISTORY_TABLE': 'TEST_HISTORY_TABLE',
+  'DB_VPT_TABLE_NAME': 'TEST_VPT_TABLE',
+  'ES_DOMAIN_ENDPOINT': 'localhost',
+  'CAR_ALLELE_ENDPOINT': 'http://localhost/',
+  'CLIN_VAR_EUTILS_VCV_ENDPOINT': 'http://localhost/',
+  'AWS_DEFAULT_REGION': 'us-west-2',
+  'AWS_ACCESS_KEY_ID': 'testing',
+  'AWS_SECRET_ACCESS_KEY': 'testing'
+}
+
+MEASURE = '''
+import json, sys, time
+
+def rss_kb():
+  with open('/proc/self/status') as status:
+    for line in status:
+      if line.startswith('VmRSS:'):
+        return int(line.split()[1])
+
+names = sys.argv[1:]
+rss_before = rss_kb()
+start = time.perf_counter()
+from src import app
+for name in names:
+  app.load_controller(name)
+elapsed = time.perf_counter() - start
+heavy = [m for m in ('pandas', 'numpy', 'confluent_kafka', 'elasticsearch') if m in sys.modules]
+print(json.dumps({ 'ms': elapsed * 1000, 'mb': (rss_kb() - rss_before) / 1024, 'heavy': heavy }))
+'''
+
+
+def measure(controller_names):
+  result = subprocess.run(
+    [sys.executable, '-c', MEASURE] + controller_names,
+    env={ **os.environ, **ENV },
+    capture_output=True,
+    text=True
+  )
+  if result.returncode != 0:
+    return { 'error': result.stderr.strip().splitlines()[-1] }
+  return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--budget-ms', type=float)
+  parser.add_argument('--budget-mb', type=float)
+  args = parser.parse_args()
+
+  families = []
+  for route in ROUTES:
+    if route[1] not in [name for prefix, name in families]:
+      families.append((route[0], route[1]))
+
+  over_budget = []
+  loaded = []
+  print(f'{"route family":<30} {"ms":>8} {"MB":>7}  heavy modules')
+
+  for prefix, name in families + [('(all controllers)', None)]:
+    result = measure([name] if name else loaded)
+
+    if 'error' in result:
+      print(f'{prefix:<30} {"failed":>8}          {result["error"]}')
+      continue
+    if name:
+      loaded.append(name)
+
+    print(f'{prefix:<30} {result["ms"]:8.1f} {result["mb"]:7.1f}  {", ".join(result["heavy"])}')
+    if name and ((args.budget_ms and result['ms'] > args.budget_ms) or (args.budget_mb and result['mb'] > args.budget_mb)):
+      over_budget.append(prefix)
+
+  if over_budget:
+    print(f'\nOver budget: {", ".join(over_budget)}')
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
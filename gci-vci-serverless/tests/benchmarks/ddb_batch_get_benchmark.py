@@ -0,0 +1,74 @@
+''' Measures Client.all() throughput against a moto-backed table.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.ddb_batch_get_benchmark
+
+moto answers in-process, so without help the numbers only reflect client-side
+overhead (serialization, chunking, thread fan-out). Each configuration is therefore
+also run with a simulated per-request round trip added in front of moto, which is
+where bounded parallel fan-out pays off.
+'''
+
+import time
+
+from moto import mock_aws
+
+from src.db.ddb_client import Client
+from tests.ddb_table import TEST_TABLE_NAME, set_fake_aws_env, create_table, load_items
+
+KEY_COUNTS = [10, 100, 1000, 10000]
+WORKER_COUNTS = [1, 8]
+SIMULATED_LATENCY_MS = [0, 20]
+REPEATS = 3
+
+
+def build_items(count):
+  return [
+    {
+      'PK': f'variant-{i:06d}',
+      'item_type': 'variant',
+      'last_modified': '2020-03-22T17:52:33.345798',
+      'carId': f'CA{i:06d}',
+      'preferredTitle': f'NM_000151.4:c.{i}C>T',
+      'hgvsNames': { 'GRCh38': f'NC_000017.11:g.{i}C>T', 'others': [f'NM_000151.4:c.{i}C>T'] },
+    }
+    for i in range(count)
+  ]
+
+
+def with_latency(batch_get_item, latency_ms):
+  if not latency_ms:
+    return batch_get_item
+
+  def delayed_batch_get_item(**kwargs):
+    time.sleep(latency_ms / 1000)
+    return batch_get_item(**kwargs)
+  return delayed_batch_get_item
+
+
+def run():
+  set_fake_aws_env()
+  with mock_aws():
+    create_table()
+    load_items(build_items(max(KEY_COUNTS)))
+
+    print(f'{"rtt ms":>8} {"keys":>8} {"workers":>8} {"best ms":>10} {"items/s":>12}')
+    for latency_ms, worker_count in [(l, w) for l in SIMULATED_LATENCY_MS for w in WORKER_COUNTS]:
+      client = Client(TEST_TABLE_NAME, False)
+      client.BATCH_GET_MAX_WORKERS = worker_count
+      client.ddb_client.batch_get_item = with_latency(client.ddb_client.batch_get_item, latency_ms)
+      for key_count in KEY_COUNTS:
+        pks = [f'variant-{i:06d}' for i in range(key_count)]
+        best = None
+        for _ in range(REPEATS):
+          start = time.perf_counter()
+          items = client.all(pks)
+          elapsed = time.perf_counter() - start
+          assert len(items) == key_count
+          best = elapsed if best is None else min(best, elapsed)
+        print(f'{latency_ms:>8} {key_count:>8} {worker_count:>8} {best * 1000:>10.1f} {key_count / best:>12.0f}')
+
+
+if __name__ == '__main__':
+  run()
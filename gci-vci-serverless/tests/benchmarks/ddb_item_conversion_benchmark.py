@@ -0,0 +1,74 @@
+''' Times the conversion of DynamoDB responses to JSON-native items on real item fixtures.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.ddb_item_conversion_benchmark [item counts...]
+
+Compares the previous read path (TypeDeserializer, then a json.dumps/json.loads
+round trip through SetJSONEncoder) with `attribute_values.to_item`, for every
+fixture of the equivalence tests and for batches of an interpretation-sized item
+holding hundreds of evaluations.
+'''
+
+import sys
+import time
+
+from src.db import attribute_values
+from tests.unit.test_attribute_values import FIXTURES, legacy_to_item, load_fixture, to_ddb_item
+
+DEFAULT_ITEM_COUNTS = [1, 20]
+EVALUATION_COUNT = 300
+REPEAT = 5
+
+
+def timed(fn, repeat=REPEAT):
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def build_interpretation(evaluation_count):
+  ''' An interpretation with its variant, evaluations and ClinVar SCVs embedded, the size of a large populated one. '''
+
+  scvs = load_fixture('variant_10_interpretation_scv.json')
+  transcript_consequences = load_fixture('ensembl_vep_hgvs_X:g.102654175T>C.json')['data'][0]['transcript_consequences']
+  return {
+    'PK': 'interpretation-0',
+    'item_type': 'interpretation',
+    'variant': load_fixture('migrated_variant_139214.json'),
+    'evaluations': [
+      {
+        'PK': f'evaluation-{i}',
+        'item_type': 'evaluation',
+        'criteria': f'PM{i % 7}',
+        'criteriaStatus': 'met' if i % 2 else 'not-met',
+        'explanation': 'Allele frequency below the threshold in every population. ' * 3,
+        'computational': transcript_consequences[i % len(transcript_consequences)],
+      }
+      for i in range(evaluation_count)
+    ],
+    'clinvar': scvs,
+  }
+
+
+def compare(label, ddb_items):
+  legacy_time = timed(lambda: [legacy_to_item(ddb_item) for ddb_item in ddb_items])
+  new_time = timed(lambda: attribute_values.to_items(ddb_items))
+  print(f'{label}: legacy {legacy_time * 1000:.2f}ms, to_item {new_time * 1000:.2f}ms, {legacy_time / new_time:.1f}x')
+
+
+def main(item_counts):
+  for file_name in FIXTURES:
+    compare(file_name, [to_ddb_item(load_fixture(file_name))])
+
+  interpretation = to_ddb_item(build_interpretation(EVALUATION_COUNT))
+  for item_count in item_counts:
+    compare(f'{item_count} interpretation(s) of {EVALUATION_COUNT} evaluations', [interpretation] * item_count)
+
+
+if __name__ == '__main__':
+  main([int(count) for count in sys.argv[1:]] or DEFAULT_ITEM_COUNTS)
@@ -0,0 +1,79 @@
+''' Measures write throughput of Client.put (one item per request) and Client.put_many against a moto-backed table.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.ddb_put_benchmark
+
+Like ddb_batch_get_benchmark, each configuration is also run with a simulated per-request
+round trip added in front of moto, which is what chunking and parallel fan-out save. moto
+does not apply concurrent writes safely, so the simulated round trips overlap but the
+writes themselves are applied one at a time. moto's transactions also slow down as the
+table grows, which DynamoDB's do not, so `put_many create` is pessimistic on larger counts.
+'''
+
+import threading
+import time
+
+from moto import mock_aws
+
+from src.db.ddb_client import Client
+from tests.ddb_table import TEST_TABLE_NAME, set_fake_aws_env, create_table
+from tests.benchmarks.ddb_batch_get_benchmark import build_items
+
+ITEM_COUNTS = [100, 400]
+SIMULATED_LATENCY_MS = [0, 20]
+WRITE_OPERATIONS = ['put_item', 'batch_write_item', 'transact_write_items']
+
+
+def with_latency(operation, latency_ms, lock):
+  def delayed_operation(**kwargs):
+    if latency_ms:
+      time.sleep(latency_ms / 1000)
+    with lock:
+      return operation(**kwargs)
+  return delayed_operation
+
+
+def put_one_by_one(client, items):
+  for item in items:
+    client.put(item)
+
+
+def put_many_overwriting(client, items):
+  client.put_many(items, overwrite=True)
+
+
+def put_many_creating(client, items):
+  client.put_many(items)
+
+
+WRITERS = [
+  ('put', put_one_by_one),
+  ('put_many overwrite', put_many_overwriting),
+  ('put_many create', put_many_creating),
+]
+
+
+def run():
+  set_fake_aws_env()
+  print(f'{"rtt ms":>8} {"items":>8} {"writer":>20} {"ms":>10} {"items/s":>12}')
+  for latency_ms in SIMULATED_LATENCY_MS:
+    for item_count in ITEM_COUNTS:
+      for label, write in WRITERS:
+        # A fresh table each time, so creating writers never hit existing PKs
+        with mock_aws():
+          create_table()
+          client = Client(TEST_TABLE_NAME, False)
+          lock = threading.Lock()
+          for operation in WRITE_OPERATIONS:
+            setattr(client.ddb_client, operation, with_latency(getattr(client.ddb_client, operation), latency_ms, lock))
+
+          items = build_items(item_count)
+          start = time.perf_counter()
+          write(client, items)
+          elapsed = time.perf_counter() - start
+          print(f'{latency_ms:>8} {item_count:>8} {label:>20} {elapsed * 1000:>10.1f} {item_count / elapsed:>12.0f}')
+
+
+if __name__ == '__main__':
+  run()
@@ -0,0 +1,76 @@
+''' Times history_controller.generate on a synthetic GDM with 500 related items.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.history_benchmark [related item count]
+
+Each related item has three history entries made by one of 50 users. The tables are
+in memory with a simulated round trip per DynamoDB request, because moto spends more
+CPU on each query than a real round trip takes. A concurrency of 1 queries the related
+items one after the other, as generate used to; it then also read each user with a
+`find` of its own, which is counted as "user reads".
+'''
+
+import os
+import sys
+import time
+
+from tests.ddb_table import TEST_TABLE_NAME, TEST_HISTORY_TABLE_NAME
+from tests.unit.test_history_controller import build_gdm_history
+
+DEFAULT_RELATED_COUNT = 500
+USER_COUNT = 50
+CONCURRENCIES = [1, 8, 16]
+SIMULATED_LATENCY_MS = [0, 10]
+
+
+class InMemoryTables:
+  ''' Stands in for both DynamoDB clients of the history controller, counting requests. '''
+
+  def __init__(self, users, entries, latency_ms):
+    self.users = { user['PK']: user for user in users }
+    self.entries = {}
+    for entry in entries:
+      self.entries.setdefault(entry['PK'], []).append(entry)
+    self.latency = latency_ms / 1000
+    self.user_reads = 0
+
+  def round_trip(self):
+    if self.latency:
+      time.sleep(self.latency)
+
+  def query_for_item_history(self, pk):
+    self.round_trip()
+    return list(self.entries.get(pk, []))
+
+  def all(self, pks):
+    self.round_trip()
+    self.user_reads += 1
+    return [dict(self.users[pk]) for pk in pks if pk in self.users]
+
+
+def run(related_count):
+  os.environ.setdefault('DB_TABLE_NAME', TEST_TABLE_NAME)
+  os.environ.setdefault('HISTORY_TABLE', TEST_HISTORY_TABLE_NAME)
+  from src.controllers import history_controller
+
+  users, entries = build_gdm_history(related_count, user_count=USER_COUNT)
+
+  print(f'{"rtt ms":>8} {"related":>8} {"workers":>8} {"ms":>10} {"user reads":>12}')
+  for latency_ms in SIMULATED_LATENCY_MS:
+    for concurrency in CONCURRENCIES:
+      tables = InMemoryTables(users, entries, latency_ms)
+      history_controller.db = history_controller.db_history = tables
+      history_controller.HISTORY_QUERY_CONCURRENCY = concurrency
+
+      start = time.perf_counter()
+      response = history_controller.generate('gdm-0', 'annotations')
+      elapsed = time.perf_counter() - start
+      assert response['statusCode'] == 200
+      print(f'{latency_ms:>8} {related_count:>8} {concurrency:>8} {elapsed * 1000:>10.1f} {tables.user_reads:>12}')
+
+  print(f'(reading users one `find` each took {USER_COUNT} user reads)')
+
+
+if __name__ == '__main__':
+  run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RELATED_COUNT)
@@ -0,0 +1,75 @@
+''' Measures Data Exchange publishing throughput against librdkafka's in-process mock cluster.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.kafka_producer_benchmark [message count]
+
+Compares building a producer per message (the old send_message) with the pooled
+producer, one message per send and batched. The mock cluster has no SSL, so the
+per-message setup cost seen here is a lower bound of the one paid against the
+Data Exchange.
+'''
+
+import sys
+import time
+
+import simplejson as json
+from confluent_kafka import Producer
+
+from src.helpers import messaging_helpers
+
+DEFAULT_MESSAGE_COUNT = 200
+TOPIC = 'gene_validity_raw_dev'
+
+
+def build_message(i):
+  return json.dumps({ 'PK': f'classification-{i}', 'resource': { 'publishDate': '2020-01-01', 'scoreJson': { 'points': [n for n in range(200)] } } })
+
+
+def per_message_producer(bootstrap_servers, messages):
+  ''' The previous behaviour: a new producer, and a synchronous flush, for every message. '''
+
+  for message, message_key in messages:
+    p = Producer({ 'bootstrap.servers': bootstrap_servers })
+    p.produce(TOPIC, message, message_key)
+    p.flush(10)
+
+
+def pooled_single(messages):
+  for message, message_key in messages:
+    result = messaging_helpers.send_message(message, TOPIC, False, message_key=message_key)
+    assert result['status'] == 'Success', result
+
+
+def pooled_batch(messages):
+  results = messaging_helpers.send_messages(messages, TOPIC, False)
+  assert all(r['status'] == 'Success' for r in results), results
+
+
+def main():
+  message_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MESSAGE_COUNT
+  messages = [(build_message(i), f'classification-{i}') for i in range(message_count)]
+
+  # A producer configured with test.mock.num.brokers starts a mock cluster and
+  # exposes its address, so other producers can connect to it
+  cluster = Producer({ 'test.mock.num.brokers': 1 })
+  bootstrap_servers = cluster.list_topics(timeout=5).orig_broker_name.split('/')[0]
+
+  messaging_helpers.get_kafka_conf = lambda use_local, extra_conf=None: dict(messaging_helpers.kafka_producer_conf, **{ 'bootstrap.servers': bootstrap_servers })
+
+  runs = [
+    ('producer per message', lambda: per_message_producer(bootstrap_servers, messages)),
+    ('pooled, one per send', lambda: pooled_single(messages)),
+    ('pooled, batched', lambda: pooled_batch(messages))
+  ]
+
+  print(f'{message_count} messages')
+  for name, run in runs:
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(f'  {name:<22} {elapsed:7.2f}s  {message_count / elapsed:9.1f} msg/s')
+
+
+if __name__ == '__main__':
+  main()
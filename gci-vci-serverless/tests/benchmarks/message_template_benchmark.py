@@ -0,0 +1,61 @@
+''' Measures Data Exchange message rendering throughput for a bulk republish.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.message_template_benchmark [message count]
+
+For each template it renders the same number of messages, from varied synthetic snapshots,
+with the previous renderer (deep copy of the template, then interpreting its directives in
+place) and with the compiled render plan. The snapshots and evidence are built up front so
+only rendering is timed; gather_evidence and the JSON encoding are unchanged and excluded.
+'''
+
+import random
+import sys
+import time
+from copy import deepcopy
+
+from src.helpers import affiliation_file, messaging_helpers
+from tests.unit.test_message_template_plans import AFFILIATIONS, TEMPLATES, build_source, legacy_add_data_to_message_template, template_paths
+
+DEFAULT_MESSAGE_COUNT = 2000
+
+
+def render_legacy(template, sources):
+  for data, evidence, evidence_counts in sources:
+    message = deepcopy(template)
+    legacy_add_data_to_message_template(data, evidence, evidence_counts, message)
+
+
+def render_plan(template, sources):
+  for data, evidence, evidence_counts in sources:
+    messaging_helpers.render_message_template(template, data, evidence, evidence_counts)
+
+
+RENDERERS = [
+  ('deepcopy + interpret', render_legacy),
+  ('render plan', render_plan),
+]
+
+
+def run(message_count):
+  affiliation_file.registry = affiliation_file.AffiliationRegistry(deepcopy(AFFILIATIONS))
+  affiliation_file.registry_checked_at = time.monotonic()
+  # add_earliest_articles prints a line per article
+  messaging_helpers.print = lambda *args, **kwargs: None
+
+  print(f'{"template":>20} {"renderer":>22} {"messages":>10} {"ms":>10} {"messages/s":>12}')
+  for template_name, template in TEMPLATES.items():
+    rng = random.Random(0)
+    paths = template_paths(template)
+    sources = [build_source(rng, template_name, paths) for _ in range(message_count)]
+
+    for label, render in RENDERERS:
+      start = time.perf_counter()
+      render(template, sources)
+      elapsed = time.perf_counter() - start
+      print(f'{template_name:>20} {label:>22} {message_count:>10} {elapsed * 1000:>10.1f} {message_count / elapsed:>12.0f}')
+
+
+if __name__ == '__main__':
+  run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MESSAGE_COUNT)
@@ -0,0 +1,58 @@
+''' Times ModelSerializer normalize/populate on large GDM fixtures.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.model_serializer_benchmark [annotation counts...]
+
+Reports the cold cost of building every model (loading embedding plans), then
+per-call times of normalize over every item of the fixture and of populating
+all of its annotations, with an in-memory db so only serializer CPU is measured.
+'''
+
+import sys
+import time
+
+from src.models import item_type_models
+from src.models.item_type_serializer import ModelSerializer
+from tests.unit.test_item_type_serializer import RoundTripCountingDb, build_gdm_fixture
+
+DEFAULT_ANNOTATION_COUNTS = [20, 100]
+REPEAT = 5
+
+
+def timed(fn, repeat=REPEAT):
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best, result
+
+
+def build_models():
+  item_type_models.ITEM_TYPE_TO_MODEL_INSTANCE.clear()
+  for item_type in item_type_models.ITEM_TYPE_TO_MODEL:
+    ModelSerializer._get_model({ 'item_type': item_type })
+
+
+def main(annotation_counts):
+  cold, _ = timed(build_models, repeat=1)
+  print(f'build {len(item_type_models.ITEM_TYPE_TO_MODEL)} models: {cold * 1000:.2f}ms')
+
+  for annotation_count in annotation_counts:
+    gdm, annotations, items = build_gdm_fixture(annotation_count=annotation_count)
+    db = RoundTripCountingDb(items)
+
+    populate_time, populated = timed(lambda: ModelSerializer.populate_many(db, annotations))
+    normalize_time, _ = timed(lambda: [ModelSerializer.normalize(db, item, item['item_type']) for item in items])
+    renormalize_time, _ = timed(lambda: [ModelSerializer.normalize(db, annotation, 'annotation') for annotation in populated])
+
+    print(f'{annotation_count} annotations, {len(items)} items: '
+      f'populate_many {populate_time * 1000:.1f}ms, '
+      f'normalize items {normalize_time * 1000:.1f}ms, '
+      f'normalize populated annotations {renormalize_time * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+  main([int(count) for count in sys.argv[1:]] or DEFAULT_ANNOTATION_COUNTS)
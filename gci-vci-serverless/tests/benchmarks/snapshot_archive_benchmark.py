@@ -0,0 +1,76 @@
+''' Measures snapshot archive retrieval throughput against a moto-backed S3 bucket.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.snapshot_archive_benchmark [archive count]
+
+moto answers in-process, so each get_object is also delayed by a simulated round
+trip; that latency, not decoding, dominates report generation on Lambda.
+'''
+
+import sys
+import time
+
+import boto3
+import simplejson as json
+from moto import mock_aws
+
+from src.db.s3_client import Client as S3Client
+from src.db.s3_client import SHARED_MAX_POOL_CONNECTIONS
+from src.helpers import snapshot_helpers
+from tests.ddb_table import set_fake_aws_env
+
+BUCKET = 'snapshot-archive'
+DEFAULT_ARCHIVE_COUNT = 500
+CONCURRENCY_LEVELS = [1, 4, 8, 16, 32]
+SIMULATED_LATENCY_MS = 30
+
+
+def build_curation(i):
+  ''' A GDM curation with a few annotations of case level evidence, roughly 40KB of JSON. '''
+
+  return {
+    'PK': f'gdm-{i}',
+    'item_type': 'gdm',
+    'annotations': [
+      {
+        'PK': f'annotation-{i}-{a}',
+        'article': { 'PK': str(30000000 + a), 'date': '2019 Jan 1' },
+        'individuals': [
+          { 'PK': f'individual-{i}-{a}-{n}', 'proband': True, 'variants': [f'variant-{n}'], 'score': 1.5 }
+          for n in range(40)
+        ],
+      }
+      for a in range(5)
+    ],
+  }
+
+
+class DelayedS3Client(S3Client):
+  def get_object(self, bucket, key):
+    time.sleep(SIMULATED_LATENCY_MS / 1000)
+    return super().get_object(bucket, key)
+
+
+def run(archive_count):
+  set_fake_aws_env()
+  with mock_aws():
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={ 'LocationConstraint': 'us-west-2' })
+    keys = []
+    for i in range(archive_count):
+      s3.put_object(Bucket=BUCKET, Key=f'gdm-{i}.json', Body=json.dumps(build_curation(i)))
+      keys.append(f'{BUCKET}/gdm-{i}.json')
+
+    s3_client = DelayedS3Client(max_pool_connections=SHARED_MAX_POOL_CONNECTIONS)
+    print(f'{"rtt ms":>8} {"archives":>9} {"workers":>8} {"seconds":>9} {"docs/s":>9}')
+    for concurrency in CONCURRENCY_LEVELS:
+      start = time.perf_counter()
+      count = sum(1 for _ in snapshot_helpers.iter_from_archives(keys, max_workers=concurrency, s3_client=s3_client))
+      elapsed = time.perf_counter() - start
+      assert count == archive_count
+      print(f'{SIMULATED_LATENCY_MS:>8} {archive_count:>9} {concurrency:>8} {elapsed:>9.2f} {archive_count / elapsed:>9.0f}')
+
+
+if __name__ == '__main__':
+  run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ARCHIVE_COUNT)
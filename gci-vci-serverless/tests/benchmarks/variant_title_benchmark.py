@@ -0,0 +1,93 @@
+''' Compares dashboard variant-title resolution against a moto-backed table.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.variant_title_benchmark [stored variant counts...]
+
+For each number of stored variants it times the previous approach (query every variant's
+title, then merge) against VariantTitleIndex lookups of only the variants referenced by a
+dashboard's interpretations, both cold (empty index) and warm.
+'''
+
+import random
+import sys
+import time
+
+import pandas as pd
+from moto import mock_aws
+
+from src.db.ddb_client import Client
+from src.helpers.variant_title_index import VariantTitleIndex
+from tests.ddb_table import TEST_TABLE_NAME, set_fake_aws_env, create_table, load_items
+
+DEFAULT_VARIANT_COUNTS = [10000, 100000]
+INTERPRETATION_COUNT = 500
+
+
+def build_variants(start, count):
+  return [
+    {
+      'PK': f'variant-{i:06d}',
+      'item_type': 'variant',
+      'last_modified': f'2020-03-22T17:52:{i % 60:02d}',
+      'carId': f'CA{i:06d}',
+      'clinvarVariantId': str(i),
+      'preferredTitle': f'NM_000151.4(G6PC):c.{i}C>T',
+      'clinvarVariantTitle': f'NM_000151.4(G6PC):c.{i}C>T (p.Gln347Ter)',
+      'hgvsNames': { 'GRCh38': f'NC_000017.11:g.{i}C>T', 'GRCh37': f'NC_000017.10:g.{i}C>T' },
+    }
+    for i in range(start, start + count)
+  ]
+
+
+def merge_titles(interpretations, variants):
+  dfi = pd.DataFrame(interpretations, columns=['PK', 'variant'])
+  dfv = pd.DataFrame(variants, columns=['PK', 'preferredTitle']).rename(columns={'PK': 'variant'})
+  return pd.merge(dfi, dfv, on='variant')
+
+
+def query_all_titles(db, interpretations):
+  return merge_titles(interpretations, db.query_by_item_type('variant', {}, 'PK,preferredTitle'))
+
+
+def indexed_titles(db, interpretations, index):
+  titles = index.lookup(db, [i['variant'] for i in interpretations])
+  return merge_titles(interpretations, [
+    { 'PK': pk, 'preferredTitle': title['preferredTitle'] } for pk, title in titles.items()
+  ])
+
+
+def timed(fn):
+  start = time.perf_counter()
+  result = fn()
+  return (time.perf_counter() - start) * 1000, result
+
+
+def run(variant_counts):
+  set_fake_aws_env()
+  with mock_aws():
+    create_table()
+    db = Client(TEST_TABLE_NAME, False)
+
+    stored = 0
+    print(f'{"variants":>9} {"query all ms":>13} {"index cold ms":>14} {"index warm ms":>14}')
+    for variant_count in sorted(variant_counts):
+      load_items(build_variants(stored, variant_count - stored))
+      stored = variant_count
+
+      interpretations = [
+        { 'PK': f'interpretation-{i}', 'variant': f'variant-{random.randrange(stored):06d}' }
+        for i in range(INTERPRETATION_COUNT)
+      ]
+      index = VariantTitleIndex()
+
+      query_ms, expected = timed(lambda: query_all_titles(db, interpretations))
+      cold_ms, cold = timed(lambda: indexed_titles(db, interpretations, index))
+      warm_ms, warm = timed(lambda: indexed_titles(db, interpretations, index))
+      assert len(expected) == len(cold) == len(warm) == INTERPRETATION_COUNT
+
+      print(f'{variant_count:>9} {query_ms:>13.1f} {cold_ms:>14.1f} {warm_ms:>14.1f}')
+
+
+if __name__ == '__main__':
+  run([int(count) for count in sys.argv[1:]] or DEFAULT_VARIANT_COUNTS)
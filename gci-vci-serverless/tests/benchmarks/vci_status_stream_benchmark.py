@@ -0,0 +1,165 @@
+''' Compares the previous vp-count stream handler with VciStatusAggregator on the same batches.
+
+Run from the gci-vci-serverless directory:
+
+  python -m tests.benchmarks.vci_status_stream_benchmark [variant count]
+
+Each variant gets an affiliation and an individual interpretation, which are created, then
+provisioned and approved through new snapshots, and edited without a status change, spread
+over batches of 100 records as the stream delivers them. The tables are moto stand-ins; a
+simulated round trip is added to every DynamoDB request. The previous handler is copied
+below: per record it queried each snapshot of both images, found the variant's vciStatus
+with three queries and wrote the whole of it back.
+'''
+
+import contextlib
+import io
+import sys
+import time
+
+from boto3.dynamodb.types import TypeSerializer
+from moto import mock_aws
+
+from ddb_stream_interp_count.dynamodb.client import DynamoClient
+from ddb_stream_interp_count.vci_status import VciStatusAggregator, ddb_deserialize
+from tests.ddb_table import TEST_TABLE_NAME, create_table, set_fake_aws_env
+from tests.unit.test_vci_status_stream import VP_TABLE_NAME, create_vp_table, interpretation, snapshot
+
+DEFAULT_VARIANT_COUNT = 50
+BATCH_SIZE = 100
+SIMULATED_LATENCY_MS = [0, 5]
+
+type_serializer = TypeSerializer()
+legacy_status_map = {
+  'Provisioned': 'p',
+  'Approved': 'a',
+  'in_progress': 'i'
+}
+
+
+def legacy_interpretation_status(interpretation, gvc_table):
+  statuses = { 'in_progress': 0, 'Provisioned': 0, 'Approved': 0 }
+  if 'snapshots' in interpretation:
+    for snapshot_pk in interpretation['snapshots']:
+      items = gvc_table.get_items(snapshot_pk, 'PK', projections=['approvalStatus'])
+      if len(items) == 1:
+        statuses[items[0]['approvalStatus']] = 1
+  else:
+    statuses['in_progress'] = 1
+  return statuses
+
+
+def legacy_handle_records(records, gvc_table, vp_table):
+  for record in records:
+    images = record['dynamodb']
+    new_item = ddb_deserialize(images['NewImage']) if 'NewImage' in images else None
+    old_item = ddb_deserialize(images['OldImage']) if 'OldImage' in images else None
+    item = new_item or old_item
+    if item.get('item_type') != 'interpretation':
+      continue
+
+    new_status = legacy_interpretation_status(new_item, gvc_table) if new_item else { k: 0 for k in legacy_status_map }
+    old_status = legacy_interpretation_status(old_item, gvc_table) if old_item else { k: 0 for k in legacy_status_map }
+    actions = { k: new_status[k] - old_status[k] for k in legacy_status_map }
+    if not any(actions.values()):
+      continue
+
+    car_id = gvc_table.get_items(item['variant'], 'PK', projections=['carId'])[0]['carId']
+    vp_pk = vp_table.get_items(car_id, 'carId', index_name='carId_index', projections=['PK'])[0]['PK']
+    aggregate = vp_table.get_items(vp_pk, 'PK', projections=['vciStatus'])[0]['vciStatus']
+    affiliation = item.get('affiliation') or 'd'
+    for group in ([affiliation, 'a'] if affiliation != 'd' else ['d']):
+      counts = aggregate.setdefault(group, {})
+      for status, key in legacy_status_map.items():
+        counts[key] = counts.get(key, 0) + actions[status]
+    with contextlib.redirect_stdout(io.StringIO()):
+      vp_table.update_attr(vp_pk, 'PK', 'vciStatus', aggregate)
+
+
+def build_batches(variant_count):
+  ''' Returns (items to load into the GVC table, stream batches). '''
+  items = []
+  records = []
+
+  def record(event_name, old_item=None, new_item=None):
+    images = { 'SequenceNumber': str(len(records) + 1) }
+    if old_item is not None:
+      images['OldImage'] = { k: type_serializer.serialize(v) for k, v in old_item.items() }
+    if new_item is not None:
+      images['NewImage'] = { k: type_serializer.serialize(v) for k, v in new_item.items() }
+    records.append({ 'eventName': event_name, 'dynamodb': images })
+
+  for index in range(variant_count):
+    items.append({ 'PK': f'variant-{index}', 'item_type': 'variant', 'carId': f'CA{index}', 'last_modified': '2021-08-06' })
+  for step in range(4):
+    for index in range(variant_count):
+      for affiliation in ('10007', None):
+        pk = f'int-{index}-{affiliation}'
+        snapshots = [f's-{pk}-{n}' for n in range(min(step, 2))]
+        current = interpretation(pk, variant=f'variant-{index}', affiliation=affiliation, snapshots=snapshots)
+        if step == 0:
+          record('INSERT', new_item=current)
+        elif step == 3:
+          record('MODIFY', current, dict(current, last_modified='2021-08-07'))
+        else:
+          status = 'Provisioned' if step == 1 else 'Approved'
+          new_snapshot = snapshot(f's-{pk}-{step - 1}', status)
+          items.append(new_snapshot)
+          record('INSERT', new_item=new_snapshot)
+          previous = interpretation(pk, variant=f'variant-{index}', affiliation=affiliation, snapshots=snapshots[:-1])
+          record('MODIFY', previous, current)
+
+  return items, [records[start:start + BATCH_SIZE] for start in range(0, len(records), BATCH_SIZE)]
+
+
+def with_round_trips(client, latency_ms, counter):
+  def round_trip(**kwargs):
+    counter[0] += 1
+    if latency_ms:
+      time.sleep(latency_ms / 1000)
+  client.table.meta.client.meta.events.register('before-call.dynamodb', round_trip)
+
+
+def run(variant_count):
+  set_fake_aws_env()
+  items, batches = build_batches(variant_count)
+  record_count = sum(len(batch) for batch in batches)
+
+  print(f'{"rtt ms":>8} {"handler":>12} {"records":>8} {"requests":>10} {"ms":>10} {"ms/batch":>10}')
+  for latency_ms in SIMULATED_LATENCY_MS:
+    results = {}
+    for label in ('previous', 'aggregator'):
+      with mock_aws():
+        create_table()
+        create_vp_table()
+        gvc_table = DynamoClient(TEST_TABLE_NAME)
+        vp_table = DynamoClient(VP_TABLE_NAME)
+        for item in items:
+          gvc_table.table.put_item(Item=item)
+        for index in range(variant_count):
+          vp_table.table.put_item(Item={ 'PK': f'vp-{index}', 'carId': f'CA{index}', 'vciStatus': {} })
+
+        requests = [0]
+        with_round_trips(gvc_table, latency_ms, requests)
+        with_round_trips(vp_table, latency_ms, requests)
+        aggregator = VciStatusAggregator(gvc_table, vp_table)
+
+        start = time.perf_counter()
+        for batch in batches:
+          if label == 'previous':
+            legacy_handle_records(batch, gvc_table, vp_table)
+          else:
+            assert aggregator.handle_records(batch) == []
+        elapsed = (time.perf_counter() - start) * 1000
+
+        results[label] = [
+          { group: { k: int(v) for k, v in counts.items() if v } for group, counts in item['vciStatus'].items() }
+          for item in sorted(vp_table.scan_all(projections=['PK', 'vciStatus']), key=lambda item: item['PK'])
+        ]
+        print(f'{latency_ms:>8} {label:>12} {record_count:>8} {requests[0]:>10} {elapsed:>10.1f} {elapsed / len(batches):>10.1f}')
+
+    assert results['previous'] == results['aggregator'], 'The handlers disagree on vciStatus'
+
+
+if __name__ == '__main__':
+  run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_VARIANT_COUNT)
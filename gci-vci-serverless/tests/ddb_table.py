@@ -0,0 +1,100 @@
+''' Helpers for standing up the GCI/VCI DynamoDB table under moto for tests and benchmarks. '''
+
+import os
+
+import boto3
+
+TEST_TABLE_NAME = 'TEST_TABLE'
+TEST_HISTORY_TABLE_NAME = 'TEST_HISTORY_TABLE'
+
+
+def set_fake_aws_env():
+  ''' Points boto3 at fake credentials and a fixed region so nothing can reach a real AWS account. '''
+
+  os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+  os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+  os.environ['AWS_SECURITY_TOKEN'] = 'testing'
+  os.environ['AWS_SESSION_TOKEN'] = 'testing'
+  os.environ['AWS_DEFAULT_REGION'] = 'us-west-2'
+
+
+def create_table(table_name=TEST_TABLE_NAME):
+  ''' Creates a table with the key schema and indexes described in resources/gci-vci-table.yml.
+
+  Must be called while a moto mock is active.
+  '''
+
+  ddb = boto3.client('dynamodb')
+  ddb.create_table(
+    TableName=table_name,
+    BillingMode='PAY_PER_REQUEST',
+    AttributeDefinitions=[
+      {'AttributeName': 'PK', 'AttributeType': 'S'},
+      {'AttributeName': 'item_type', 'AttributeType': 'S'},
+      {'AttributeName': 'clinvarVariantId', 'AttributeType': 'S'},
+      {'AttributeName': 'carId', 'AttributeType': 'S'},
+      {'AttributeName': 'last_modified', 'AttributeType': 'S'},
+      {'AttributeName': 'affiliation', 'AttributeType': 'S'},
+    ],
+    KeySchema=[{'AttributeName': 'PK', 'KeyType': 'HASH'}],
+    GlobalSecondaryIndexes=[
+      {
+        'IndexName': 'item_type_index',
+        'KeySchema': [
+          {'AttributeName': 'item_type', 'KeyType': 'HASH'},
+          {'AttributeName': 'last_modified', 'KeyType': 'RANGE'},
+        ],
+        'Projection': {'ProjectionType': 'ALL'},
+      },
+      {
+        'IndexName': 'clinvarVariantId_index',
+        'KeySchema': [{'AttributeName': 'clinvarVariantId', 'KeyType': 'HASH'}],
+        'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['rid', 'carId']},
+      },
+      {
+        'IndexName': 'carId_index',
+        'KeySchema': [{'AttributeName': 'carId', 'KeyType': 'HASH'}],
+        'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['rid', 'clinvarVariantId']},
+      },
+      {
+        'IndexName': 'affiliation_index',
+        'KeySchema': [
+          {'AttributeName': 'affiliation', 'KeyType': 'HASH'},
+          {'AttributeName': 'last_modified', 'KeyType': 'RANGE'},
+        ],
+        'Projection': {'ProjectionType': 'ALL'},
+      },
+    ],
+  )
+  return ddb
+
+
+def create_history_table(table_name=TEST_HISTORY_TABLE_NAME):
+  ''' Creates a table with the key schema of resources/history-table.yml: each item's versions by last_modified.
+
+  Must be called while a moto mock is active.
+  '''
+
+  ddb = boto3.client('dynamodb')
+  ddb.create_table(
+    TableName=table_name,
+    BillingMode='PAY_PER_REQUEST',
+    AttributeDefinitions=[
+      {'AttributeName': 'PK', 'AttributeType': 'S'},
+      {'AttributeName': 'last_modified', 'AttributeType': 'S'},
+    ],
+    KeySchema=[
+      {'AttributeName': 'PK', 'KeyType': 'HASH'},
+      {'AttributeName': 'last_modified', 'KeyType': 'RANGE'},
+    ],
+  )
+  return ddb
+
+
+def load_items(items, table_name=TEST_TABLE_NAME):
+  ''' Writes plain (already normalized) items straight into the table, bypassing the model serializer. '''
+
+  table = boto3.resource('dynamodb').Table(table_name)
+  with table.batch_writer() as writer:
+    for item in items:
+      writer.put_item(Item=item)
@@ -0,0 +1,27 @@
+import pytest
+
+from moto import mock_aws
+
+from src.db import ddb_client
+from tests.ddb_table import TEST_TABLE_NAME, set_fake_aws_env, create_table
+
+set_fake_aws_env()
+
+
+@pytest.fixture
+def ddb_table():
+  ''' Yields the name of an empty moto-backed GCI/VCI table. '''
+
+  # Clients created under a previous test's mock (and patched by it) must not be reused
+  ddb_client._shared_ddb_clients.clear()
+
+  with mock_aws():
+    create_table()
+    yield TEST_TABLE_NAME
+
+
+@pytest.fixture(autouse=True)
+def query_cursor_secret(monkeypatch):
+  ''' Configures the secret list pagination cursors are signed with, as every deployed stage has one. '''
+
+  monkeypatch.setenv('QUERY_CURSOR_SECRET', 'test-query-cursor-secret')
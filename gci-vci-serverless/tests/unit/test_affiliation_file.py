@@ -0,0 +1,108 @@
+import json
+import os
+
+import pytest
+
+from src.helpers import affiliation_file
+
+AFFILIATIONS_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'local-files', 'affiliations.json')
+
+def load_affiliations():
+  with open(AFFILIATIONS_PATH) as affiliations_file:
+    return json.load(affiliations_file)
+
+class LegacyLookup:
+  ''' The previous lookup: a scan of the affiliation list, memoizing the last affiliation found. '''
+
+  def __init__(self, affiliation_data):
+    self.affiliation_data = affiliation_data
+    self.saved_affiliation = []
+
+  def lookup_affiliation_data(self, affiliation_id, affiliation_key, affiliation_subgroup=None):
+    if affiliation_id and affiliation_key:
+      if not self.saved_affiliation or 'affiliation_id' not in self.saved_affiliation or affiliation_id != self.saved_affiliation['affiliation_id']:
+        for affiliation in self.affiliation_data:
+          try:
+            if affiliation_id == affiliation['affiliation_id']:
+              self.saved_affiliation = affiliation
+              break
+
+          except Exception:
+            pass
+
+      try:
+        if affiliation_subgroup:
+          return self.saved_affiliation['subgroups'][affiliation_subgroup][affiliation_key]
+        else:
+          return self.saved_affiliation[affiliation_key]
+
+      except Exception:
+        pass
+
+      return None
+    else:
+      return None
+
+@pytest.fixture
+def affiliations_dir(monkeypatch, tmp_path):
+  (tmp_path / 'affiliations.json').write_text(json.dumps(load_affiliations()))
+  monkeypatch.setattr(affiliation_file, 'local_file_dir', str(tmp_path))
+  monkeypatch.setattr(affiliation_file, 'registry', None)
+  return tmp_path
+
+LOOKUPS = [('affiliation_fullname', None), ('fullname', 'gcep'), ('id', 'gcep'), ('fullname', 'vcep'), ('guidelines_url', 'vcep'), ('publish_approval', None)]
+
+@pytest.mark.parametrize('affiliation_key, affiliation_subgroup', LOOKUPS)
+def test_lookups_match_scanning_the_file(affiliations_dir, affiliation_key, affiliation_subgroup):
+  affiliations = load_affiliations()
+  affiliation_ids = [affiliation['affiliation_id'] for affiliation in affiliations]
+
+  for affiliation_id in affiliation_ids:
+    legacy = LegacyLookup(affiliations)
+    expected = legacy.lookup_affiliation_data(affiliation_id, affiliation_key, affiliation_subgroup)
+
+    assert affiliation_file.lookup_affiliation_data(affiliation_id, affiliation_key, affiliation_subgroup) == expected
+
+  resolved = affiliation_file.resolve_affiliation_data(affiliation_ids, affiliation_key, affiliation_subgroup)
+  assert list(resolved) == affiliation_ids
+  assert resolved[affiliation_ids[1]] == LegacyLookup(affiliations).lookup_affiliation_data(affiliation_ids[1], affiliation_key, affiliation_subgroup)
+
+def test_unknown_ids_do_not_return_the_previous_affiliation(affiliations_dir):
+  assert affiliation_file.lookup_affiliation_data('10001', 'affiliation_fullname') == 'KCNQ1'
+  assert affiliation_file.lookup_affiliation_data('99999', 'affiliation_fullname') is None
+  assert affiliation_file.lookup_affiliation_data(None, 'affiliation_fullname') is None
+  assert affiliation_file.lookup_affiliation_data(['10001'], 'affiliation_fullname') is None
+
+def test_registry_indexes_subgroups_and_approvers(affiliations_dir):
+  registry = affiliation_file.get_affiliation_registry()
+
+  affiliation, subgroup_name = registry.find_subgroup('50002')
+  assert (affiliation['affiliation_id'], subgroup_name) == ('10002', 'vcep')
+  assert [affiliation['affiliation_id'] for affiliation in registry.find_by_approver('Birgit Funke')] == ['10002']
+  assert registry.find_by_approver('Nobody') == []
+  # once each, in file order
+  assert [affiliation['affiliation_id'] for affiliation in registry.find_all(['10002', '99999', '10001', '10002'])] == ['10001', '10002']
+
+def test_registry_is_rebuilt_when_the_file_checksum_changes(affiliations_dir, monkeypatch):
+  monkeypatch.setattr(affiliation_file, 'AFFILIATION_FILE_CHECK_SECONDS', 0)
+  first = affiliation_file.get_affiliation_registry()
+
+  # Rewriting the same content keeps the registry
+  (affiliations_dir / 'affiliations.json').write_text(json.dumps(load_affiliations()))
+  assert affiliation_file.get_affiliation_registry() is first
+
+  changed = load_affiliations()
+  changed[1]['affiliation_fullname'] = 'Renamed'
+  (affiliations_dir / 'affiliations.json').write_text(json.dumps(changed))
+  assert affiliation_file.lookup_affiliation_data('10001', 'affiliation_fullname') == 'Renamed'
+
+  # A broken file keeps the last good registry
+  (affiliations_dir / 'affiliations.json').write_text('[{ not json')
+  assert affiliation_file.lookup_affiliation_data('10001', 'affiliation_fullname') == 'Renamed'
+
+def test_registry_is_not_reread_between_checks(affiliations_dir, monkeypatch):
+  monkeypatch.setattr(affiliation_file, 'AFFILIATION_FILE_CHECK_SECONDS', 3600)
+  first = affiliation_file.get_affiliation_registry()
+  (affiliations_dir / 'affiliations.json').write_text('[]')
+
+  assert affiliation_file.get_affiliation_registry() is first
@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src import app
+
+# Modules that must only be imported by the routes that use them
+HEAVY_MODULES = ('pandas', 'numpy', 'confluent_kafka')
+
+
+def test_routes_match_in_order():
+  matched = {}
+  for path in ['/variantscore/1', '/variants/1', '/vpt/search', '/vpt/saves/1', '/users/1']:
+    matched[path] = next(route[1] for route in app.ROUTES if path.startswith(route[0]))
+
+  assert matched == {
+    '/variantscore/1': 'variant_score_controller',
+    '/variants/1': 'variants_controller',
+    '/vpt/search': 'vpt_controller',
+    '/vpt/saves/1': 'vp_saves_controller',
+    '/users/1': 'users_controller'
+  }
+
+
+def test_route_passes_handler_args(monkeypatch):
+  calls = []
+
+  class FakeController:
+    @staticmethod
+    def handle(event, *args):
+      calls.append(args)
+      return { 'statusCode': 200 }
+
+  monkeypatch.setattr(app, 'load_controller', lambda name: FakeController)
+
+  assert app.route({ 'path': '/filter' })['statusCode'] == 200
+  assert app.route({ 'path': '/users/1' })['statusCode'] == 200
+  assert calls == [('filter',), ()]
+
+
+def test_unrecognized_route():
+  assert app.route({ 'path': '/unknown' })['statusCode'] == 400
+
+
+@pytest.mark.parametrize('controller_name', ['users_controller', 'snapshots_controller', 'gdms_controller'])
+def test_cold_start_does_not_import_heavy_modules(controller_name):
+  script = (
+    'import json, sys\n'
+    'from src import app\n'
+    f'app.load_controller({controller_name!r})\n'
+    f'print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n'
+  )
+  env = { **os.environ, 'DB_TABLE_NAME': 'TEST_TABLE', 'HISTORY_TABLE': 'TEST_HISTORY_TABLE', 'AWS_DEFAULT_REGION': 'us-west-2' }
+  result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True)
+
+  assert json.loads(result.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,92 @@
+import json
+import os
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from src.db import attribute_values
+from src.utils.json import SetJSONEncoder
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+# Real payloads kept in DynamoDB items: variants, ClinVar interpretations, LDH and Ensembl VEP data, VPT rows
+FIXTURES = [
+  'migrated_variant_139214.json',
+  'migrated_variant_CA913175340.json',
+  'variant_10_interpretation_scv.json',
+  'variant_55962_interpretation_scv.json',
+  'variant_CA2738256.json',
+  'ldh_data.json',
+  'ensembl_vep_hgvs_X:g.102654175T>C.json',
+  'vpt/CA021691.json',
+]
+
+def legacy_to_item(ddb_item):
+  ''' The previous read path: TypeDeserializer, then a JSON round trip to turn Decimals and sets into JSON types. '''
+
+  deserializer = TypeDeserializer()
+  item = { k: deserializer.deserialize(v) for k, v in ddb_item.items() if v }
+  return json.loads(json.dumps(item, cls=SetJSONEncoder))
+
+def to_ddb_item(item):
+  serializer = TypeSerializer()
+  return { k: serializer.serialize(v) for k, v in item.items() }
+
+def load_fixture(file_name):
+  with open(os.path.join(DATA_DIR, file_name)) as fixture_file:
+    data = json.load(fixture_file, parse_float=Decimal)
+  # Items are maps; wrap fixtures that are lists
+  return data if isinstance(data, dict) else { 'PK': file_name, 'data': data }
+
+@pytest.mark.parametrize('file_name', FIXTURES)
+def test_fixture_items_match_legacy_conversion(file_name):
+  ddb_item = to_ddb_item(load_fixture(file_name))
+
+  assert json.dumps(attribute_values.to_item(ddb_item)) == json.dumps(legacy_to_item(ddb_item))
+
+@pytest.mark.parametrize('number', [
+  '0', '-0', '7', '-42', '100', '1.5', '-0.0', '100.00', '1E+2', '1e2', '1E-7', '0.0000001',
+  '12345678901234567890123456789012345678', '-1.2345678901234567890123456789012345678',
+  '1E-130', '9.9999999999999999999999999999999999999E+125',
+])
+def test_numbers_match_legacy_conversion(number):
+  ddb_item = { 'PK': { 'S': 'pk' }, 'n': { 'N': number }, 'l': { 'L': [{ 'N': number }] } }
+
+  assert json.dumps(attribute_values.to_item(ddb_item)) == json.dumps(legacy_to_item(ddb_item))
+
+def test_scalar_and_container_types_match_legacy_conversion():
+  ddb_item = {
+    'PK': { 'S': 'pk' },
+    'empty': { 'S': '' },
+    'unicode': { 'S': 'Gène "β" – \n' },
+    'yes': { 'BOOL': True },
+    'no': { 'BOOL': False },
+    'nothing': { 'NULL': True },
+    'nested': { 'M': { 'a': { 'L': [{ 'M': {} }, { 'L': [] }, { 'N': '3' }, { 'NULL': True }] } } },
+    'one': { 'SS': ['only'] },
+    'ones': { 'NS': ['1.0'] },
+  }
+
+  assert json.dumps(attribute_values.to_item(ddb_item)) == json.dumps(legacy_to_item(ddb_item))
+
+def test_sets_keep_the_returned_order():
+  ddb_item = { 'PK': { 'S': 'pk' }, 'ss': { 'SS': ['c', 'a', 'b'] }, 'ns': { 'NS': ['3', '1.5', '2'] } }
+
+  item = attribute_values.to_item(ddb_item)
+  legacy_item = legacy_to_item(ddb_item)
+
+  assert item['ss'] == ['c', 'a', 'b']
+  assert item['ns'] == [3, 1.5, 2]
+  # the legacy lists were in arbitrary set order
+  assert sorted(legacy_item['ss']) == sorted(item['ss'])
+  assert sorted(legacy_item['ns']) == sorted(item['ns'])
+
+def test_binary_values_are_bytes():
+  item = attribute_values.to_item({ 'b': { 'B': b'\x00\x01' }, 'bs': { 'BS': [b'a', b'b'] } })
+
+  assert item == { 'b': b'\x00\x01', 'bs': [b'a', b'b'] }
+
+def test_unknown_types_raise():
+  with pytest.raises(TypeError):
+    attribute_values.to_value({ 'X': 'value' })
@@ -0,0 +1,40 @@
+import pytest
+
+from src.parsers import clinvar_document
+import src.parsers.variant_xml_parser as variant_xml_parser
+from src.parsers.variant_xml_clinvar_interpretation_parser import from_xml as clinvar_interpretation_parser
+
+from tests.unit.test_variant_xml_parser import load_variant_xml as load_clinvar_variant_xml
+
+CLINVAR_IDS = ['10', '12000', '139214', '550731', '55962']
+
+
+@pytest.mark.parametrize('clinvar_id', CLINVAR_IDS)
+def test_shared_document_matches_parsing_each_string(clinvar_id):
+  xml = load_clinvar_variant_xml(clinvar_id)
+  doc = clinvar_document.parse(xml)
+
+  assert variant_xml_parser.from_xml(doc) == variant_xml_parser.from_xml(xml)
+  assert variant_xml_parser.from_xml(doc, True) == variant_xml_parser.from_xml(xml, True)
+  assert clinvar_interpretation_parser(doc) == clinvar_interpretation_parser(xml)
+
+  # A document can be resolved more than once
+  assert clinvar_interpretation_parser(doc) == clinvar_interpretation_parser(doc)
+
+
+def test_clinical_assertions_are_dropped_from_the_tree():
+  doc = clinvar_document.parse(load_clinvar_variant_xml('10'))
+
+  assert doc.root.find('.//ClinicalAssertion') is None
+  assert doc.root.find('.//TraitMapping') is None
+  assert len(doc.clinical_assertions) == 19
+  assert doc.root.find('.//VariationArchive').get('VariationID') == '10'
+
+
+def test_scv_extraction_error_only_fails_interpretations():
+  xml = load_clinvar_variant_xml('55962').replace('<Interpretation>', '<Interpretation DateLastEvaluated="unknown">', 1)
+  doc = clinvar_document.parse(xml)
+
+  assert variant_xml_parser.from_xml(doc)['clinvarVariantId'] == '55962'
+  with pytest.raises(ValueError):
+    clinvar_interpretation_parser(doc)
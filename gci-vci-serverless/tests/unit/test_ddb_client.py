@@ -2,6 +2,7 @@ import json
 import pytest
 
 from src.db import ddb_client
+from tests.ddb_table import load_items
 
 from botocore.exceptions import ClientError
 from botocore.exceptions import BotoCoreError
@@ -165,3 +166,246 @@ def test_put_throws_client_error():
 
   with pytest.raises(ClientError):
     pass
+
+def make_items(count, item_type='variant'):
+  return [
+    { 'PK': f'pk-{i:05d}', 'item_type': item_type, 'last_modified': '2020-03-22T17:52:33', 'index': i }
+    for i in range(count)
+  ]
+
+def test_all_fetches_more_than_one_batch(ddb_table):
+  load_items(make_items(250))
+  test_client = ddb_client.Client(ddb_table, False)
+
+  pks = [f'pk-{i:05d}' for i in range(250)]
+  items = test_client.all(pks)
+
+  assert [item['PK'] for item in items] == pks, 'Items should come back in the requested order'
+  assert items[0]['index'] == 0
+
+def test_all_deduplicates_and_skips_missing_keys(ddb_table):
+  load_items(make_items(3))
+  test_client = ddb_client.Client(ddb_table, False)
+
+  items = test_client.all(['pk-00002', 'pk-00000', 'pk-00002', None, 'missing', 'pk-00000'])
+
+  assert [item['PK'] for item in items] == ['pk-00002', 'pk-00000']
+
+def test_all_retries_unprocessed_keys(ddb_table):
+  load_items(make_items(10))
+  test_client = ddb_client.Client(ddb_table, False)
+  test_client.BATCH_GET_BASE_BACKOFF = 0
+
+  batch_get_item = test_client.ddb_client.batch_get_item
+  calls = []
+  def throttled_batch_get_item(RequestItems):
+    calls.append(RequestItems)
+    keys = RequestItems[ddb_table]['Keys']
+    if len(calls) > 1:
+      return batch_get_item(RequestItems=RequestItems)
+    # pretend DynamoDB only had capacity for the first few keys
+    res = batch_get_item(RequestItems={ ddb_table: { 'Keys': keys[:3] } })
+    res['UnprocessedKeys'] = { ddb_table: { 'Keys': keys[3:] } }
+    return res
+  test_client.ddb_client.batch_get_item = throttled_batch_get_item
+
+  pks = [f'pk-{i:05d}' for i in range(10)]
+  items = test_client.all(pks)
+
+  assert len(calls) == 2
+  assert len(calls[1][ddb_table]['Keys']) == 7
+  assert [item['PK'] for item in items] == pks
+
+def test_all_raises_when_retries_are_exhausted(ddb_table):
+  test_client = ddb_client.Client(ddb_table, False)
+  test_client.BATCH_GET_BASE_BACKOFF = 0
+  test_client.BATCH_GET_MAX_RETRIES = 2
+
+  def always_throttled(RequestItems):
+    return { 'Responses': { ddb_table: [] }, 'UnprocessedKeys': RequestItems }
+  test_client.ddb_client.batch_get_item = always_throttled
+
+  with pytest.raises(Exception, match='unprocessed'):
+    test_client.all(['pk-00000'])
+
+def test_put_many_writes_more_than_one_chunk(ddb_table):
+  test_client = ddb_client.Client(ddb_table, False)
+  # moto does not apply concurrent transactions safely
+  test_client.BATCH_GET_MAX_WORKERS = 1
+  transact_calls = count_calls(test_client, 'transact_write_items')
+
+  items = test_client.put_many(make_items(60))
+
+  assert [len(call['TransactItems']) for call in transact_calls] == [25, 25, 10]
+  assert len(items) == 60
+  assert test_client.find('pk-00059')['index'] == 59
+
+def test_put_many_only_creates_new_items(ddb_table):
+  load_items(make_items(1))
+  test_client = ddb_client.Client(ddb_table, False)
+  items = make_items(3)
+  items[0]['index'] = 'changed'
+
+  with pytest.raises(ClientError):
+    test_client.put_many(items)
+
+  # the chunk with the existing PK is written all or nothing
+  assert test_client.find('pk-00000')['index'] == 0
+  assert test_client.find('pk-00001') is None
+
+  test_client.put_many(items, overwrite=True)
+  assert test_client.find('pk-00000')['index'] == 'changed'
+  assert test_client.find('pk-00002')['index'] == 2
+
+def test_put_many_rejects_repeated_pks(ddb_table):
+  test_client = ddb_client.Client(ddb_table, False)
+
+  with pytest.raises(Exception, match='more than once'):
+    test_client.put_many(make_items(2) + make_items(1))
+
+def test_put_many_retries_unprocessed_items(ddb_table):
+  test_client = ddb_client.Client(ddb_table, False)
+  test_client.BATCH_GET_BASE_BACKOFF = 0
+
+  batch_write_item = test_client.ddb_client.batch_write_item
+  calls = []
+  def throttled_batch_write_item(RequestItems):
+    calls.append(RequestItems)
+    requests = RequestItems[ddb_table]
+    if len(calls) > 1:
+      return batch_write_item(RequestItems=RequestItems)
+    # pretend DynamoDB only had capacity for the first few items
+    res = batch_write_item(RequestItems={ ddb_table: requests[:3] })
+    res['UnprocessedItems'] = { ddb_table: requests[3:] }
+    return res
+  test_client.ddb_client.batch_write_item = throttled_batch_write_item
+
+  test_client.put_many(make_items(10), overwrite=True)
+
+  assert [len(call[ddb_table]) for call in calls] == [10, 7]
+  assert len(test_client.all([f'pk-{i:05d}' for i in range(10)])) == 10
+
+def count_calls(test_client, operation):
+  calls = []
+  original = getattr(test_client.ddb_client, operation)
+  def counted(**kwargs):
+    calls.append(kwargs)
+    return original(**kwargs)
+  setattr(test_client.ddb_client, operation, counted)
+  return calls
+
+def test_identity_map_serves_repeated_reads(ddb_table):
+  load_items(make_items(5))
+  test_client = ddb_client.Client(ddb_table, False)
+  get_calls = count_calls(test_client, 'get_item')
+  batch_calls = count_calls(test_client, 'batch_get_item')
+
+  with ddb_client.request_identity_map() as identity_map:
+    first = test_client.find('pk-00001')
+    first['index'] = 'changed by caller'
+    again = test_client.find('pk-00001')
+    items = test_client.all(['pk-00001', 'pk-00002'])
+    items_again = test_client.all(['pk-00002', 'pk-00001'])
+
+  assert len(get_calls) == 1
+  assert len(batch_calls) == 1
+  assert batch_calls[0]['RequestItems'][ddb_table]['Keys'] == [{ 'PK': { 'S': 'pk-00002' } }]
+  assert again['index'] == 1, 'Cached items must not be shared with callers'
+  assert [item['PK'] for item in items] == ['pk-00001', 'pk-00002']
+  assert [item['PK'] for item in items_again] == ['pk-00002', 'pk-00001']
+  assert identity_map.stats() == { 'items': 2, 'hits': 4, 'misses': 2 }
+
+def test_identity_map_is_filled_by_item_type_queries(ddb_table):
+  load_items(make_items(3))
+  test_client = ddb_client.Client(ddb_table, False)
+  get_calls = count_calls(test_client, 'get_item')
+
+  with ddb_client.request_identity_map():
+    test_client.query_by_item_type('variant')
+    item = test_client.find('pk-00002')
+
+  assert item['index'] == 2
+  assert len(get_calls) == 0
+
+def test_identity_map_is_invalidated_by_writes(ddb_table):
+  load_items([{ 'PK': 'user-1', 'item_type': 'user', 'name': 'before' }])
+  test_client = ddb_client.Client(ddb_table, False)
+
+  with ddb_client.request_identity_map():
+    assert test_client.find('user-1')['name'] == 'before'
+    test_client.update('user-1', { 'name': 'after' }, 'user')
+    assert test_client.find('user-1')['name'] == 'after'
+
+def test_identity_map_is_off_outside_of_a_request(ddb_table):
+  load_items(make_items(1))
+  test_client = ddb_client.Client(ddb_table, False)
+  get_calls = count_calls(test_client, 'get_item')
+
+  test_client.find('pk-00000')
+  test_client.find('pk-00000')
+
+  assert len(get_calls) == 2
+
+def make_dated_items(count):
+  return [
+    { 'PK': f'gdm-{i:03d}', 'item_type': 'gdm', 'last_modified': f'2021-01-01T00:00:{i:02d}', 'status': 'deleted' if i % 3 == 0 else 'in progress' }
+    for i in range(count)
+  ]
+
+def test_query_page_walks_every_item_with_a_cursor(ddb_table):
+  load_items(make_dated_items(25))
+  test_client = ddb_client.Client(ddb_table, False)
+
+  pks = []
+  cursor = None
+  page_count = 0
+  while True:
+    page = test_client.query_page('item_type', 'gdm', page_size=10, cursor=cursor)
+    assert len(page['items']) <= 10
+    pks.extend(item['PK'] for item in page['items'])
+    page_count += 1
+    cursor = page['cursor']
+    if not cursor:
+      break
+
+  assert pks == [item['PK'] for item in make_dated_items(25)]
+  assert page_count == 3
+
+def test_query_page_fills_pages_when_filters_drop_items(ddb_table):
+  load_items(make_dated_items(25))
+  test_client = ddb_client.Client(ddb_table, False)
+
+  page = test_client.query_page('item_type', 'gdm', { 'status!': 'deleted' }, page_size=10)
+
+  assert len(page['items']) == 10
+  assert all(item['status'] != 'deleted' for item in page['items'])
+  assert page['cursor'] is not None
+
+def test_query_page_rejects_tampered_or_foreign_cursors(ddb_table):
+  load_items(make_dated_items(5))
+  test_client = ddb_client.Client(ddb_table, False)
+  cursor = test_client.query_page('item_type', 'gdm', page_size=2)['cursor']
+
+  payload, signature = cursor.split('.')
+  with pytest.raises(ddb_client.QueryCursorException):
+    test_client.query_page('item_type', 'gdm', page_size=2, cursor=payload[:-2] + 'xx.' + signature)
+  with pytest.raises(ddb_client.QueryCursorException):
+    test_client.query_page('item_type', 'variant', page_size=2, cursor=cursor)
+
+def test_query_page_is_refused_without_a_cursor_secret(ddb_table, monkeypatch):
+  load_items(make_dated_items(5))
+  test_client = ddb_client.Client(ddb_table, False)
+  query_calls = count_calls(test_client, 'query')
+  monkeypatch.delenv('QUERY_CURSOR_SECRET')
+
+  with pytest.raises(ddb_client.QueryCursorException, match='QUERY_CURSOR_SECRET'):
+    test_client.query_page('item_type', 'gdm', page_size=2)
+  assert query_calls == []
+
+def test_pop_page_params():
+  query_params = { 'page_size': '50', 'status!': 'deleted' }
+
+  assert ddb_client.pop_page_params(query_params) == { 'page_size': '50', 'cursor': None }
+  assert query_params == { 'status!': 'deleted' }
+  assert ddb_client.pop_page_params({ 'status': 'deleted' }) is None
+  assert ddb_client.pop_page_params(None) is None
@@ -0,0 +1,59 @@
+import json
+
+from src.models import embedding_plans
+from src.models.item_type_models import ITEM_TYPE_TO_MODEL
+from src.models.item_type_serializer import ModelSerializer
+from src.models.schema_reader import SchemaReader
+
+def test_compiled_plans_are_up_to_date():
+  with open(embedding_plans.PLANS_FILE) as plans_file:
+    compiled_plans = json.load(plans_file)
+
+  assert compiled_plans == embedding_plans.compile_plans(ITEM_TYPE_TO_MODEL.keys()), \
+    'Schemas changed: rebuild the plans with `python -m src.models.embedding_plans`'
+
+def test_plan_fields():
+  fields = { field.key: field for field in embedding_plans.get_plan('family') }
+
+  assert fields['submitted_by'] == embedding_plans.EmbeddingField('submitted_by', 'submitted_by', ('submitted_by',), False, 'user')
+  assert fields['segregation.variants'] == \
+    embedding_plans.EmbeddingField('segregation.variants[]', 'segregation.variants', ('segregation', 'variants'), True, 'variant')
+  assert embedding_plans.get_plan('family') is embedding_plans.get_plan('family')
+
+def test_item_types_missing_from_the_file_are_compiled(monkeypatch):
+  monkeypatch.setattr(embedding_plans, '_compiled_plans', {})
+  monkeypatch.setattr(embedding_plans, '_plans', {})
+
+  fields = embedding_plans.get_plan('group')
+
+  assert 'familyIncluded[]' in [field.dot_representation for field in fields]
+
+def test_schemas_are_read_once():
+  assert SchemaReader.get_schema('gdm') is SchemaReader.get_schema('gdm')
+
+def test_models_map_their_own_item_types():
+  # the map used to be a class attribute shared, and filled, by every model
+  for item_type in ('gdm', 'interpretation', 'family'):
+    Model = ModelSerializer._get_model({ 'item_type': item_type })
+    assert Model.map_dot_representation_to_item_type == {
+      field.key: field.item_type for field in embedding_plans.get_plan(item_type)
+    }
+
+def test_normalize_replaces_nested_objects_by_pk():
+  family = {
+    'PK': 'family-1', 'item_type': 'family',
+    'submitted_by': { 'PK': 'user-1', 'name': 'curator' },
+    'segregation': { 'variants': [{ 'PK': 'variant-1' }, 'variant-2'], 'lodScore': 1 },
+    'individualIncluded': [{ 'PK': 'individual-1' }],
+    'associatedGroups': ['group-1']
+  }
+
+  normalized = ModelSerializer.normalize(None, family, 'family')
+
+  assert normalized == {
+    'PK': 'family-1', 'item_type': 'family',
+    'submitted_by': 'user-1',
+    'segregation': { 'variants': ['variant-1', 'variant-2'], 'lodScore': 1 },
+    'individualIncluded': ['individual-1']
+  }
+  assert family['submitted_by'] == { 'PK': 'user-1', 'name': 'curator' }
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+pytest.importorskip('elasticsearch')
+pytest.importorskip('requests_aws4auth')
+
+from boto3.dynamodb.types import TypeSerializer
+
+from ddb_stream_to_es.gci_vci_elasticsearch.client import ElasticsearchClient
+
+type_serializer = TypeSerializer()
+
+
+def stream_record(sequence_number, event_name, item):
+  image = { k: type_serializer.serialize(v) for k, v in item.items() }
+  return {
+    'eventName': event_name,
+    'dynamodb': {
+      'SequenceNumber': str(sequence_number),
+      'NewImage' if event_name != 'REMOVE' else 'OldImage': image
+    }
+  }
+
+
+class FakeBulk:
+  ''' Records _bulk request bodies and answers with the given per-item statuses. '''
+
+  def __init__(self, statuses=None, error=None):
+    self.statuses = statuses or {}
+    self.error = error
+    self.requests = []
+
+  def __call__(self, body):
+    if self.error is not None:
+      raise self.error
+    lines = [json.loads(line) for line in body.splitlines()]
+    actions = []
+    items = []
+    while lines:
+      action = lines.pop(0)
+      op, meta = next(iter(action.items()))
+      doc = lines.pop(0) if op == 'index' else None
+      actions.append((op, meta['_index'], meta['_id'], doc))
+      items.append({ op: { '_id': meta['_id'], 'status': self.statuses.get(meta['_id'], 200) } })
+    self.requests.append(actions)
+    return { 'errors': any(self.statuses.values()), 'items': items }
+
+
+@pytest.fixture
+def es_client():
+  return ElasticsearchClient(domain_endpoint='search.example.com', region='us-west-2')
+
+
+def test_batch_is_sent_as_one_bulk_request_with_last_event_per_pk(es_client):
+  es_client._es_client.bulk = bulk = FakeBulk()
+  records = [
+    stream_record(1, 'INSERT', { 'PK': 'a', 'item_type': 'gdm', 'status': 'created' }),
+    stream_record(2, 'INSERT', { 'PK': 'b', 'item_type': 'variant' }),
+    stream_record(3, 'MODIFY', { 'PK': 'a', 'item_type': 'gdm', 'status': 'in progress' }),
+    stream_record(4, 'REMOVE', { 'PK': 'b', 'item_type': 'variant' }),
+    stream_record(5, 'INSERT', { 'PK': 'c' }),
+  ]
+
+  assert es_client.handle_records(records) == []
+  assert bulk.requests == [[
+    ('index', 'gci-vci-gdm', 'a', { 'PK': 'a', 'item_type': 'gdm', 'status': 'in progress' }),
+    ('delete', 'gci-vci-variant', 'b', None),
+  ]]
+
+def test_failed_items_are_returned_and_missing_deletes_ignored(es_client):
+  es_client._es_client.bulk = FakeBulk(statuses={ 'b': 429, 'c': 404, 'd': 404, 'e': 400, 'f': 400 })
+  records = [
+    stream_record(1, 'INSERT', { 'PK': 'a', 'item_type': 'gdm' }),
+    stream_record(2, 'MODIFY', { 'PK': 'b', 'item_type': 'gdm' }),
+    stream_record(3, 'REMOVE', { 'PK': 'c', 'item_type': 'gdm' }),
+    stream_record(4, 'MODIFY', { 'PK': 'd', 'item_type': 'gdm' }),
+    stream_record(5, 'REMOVE', { 'PK': 'e', 'item_type': 'gdm' }),
+    stream_record(6, 'MODIFY', { 'PK': 'f', 'item_type': 'gdm' }),
+  ]
+
+  failed = es_client.handle_records(records)
+
+  assert [record['dynamodb']['SequenceNumber'] for record in failed] == ['2', '4', '6']
+
+def test_large_batches_are_split_in_stream_order(es_client):
+  es_client._es_client.bulk = bulk = FakeBulk()
+  es_client.BULK_MAX_ACTIONS = 2
+  records = [stream_record(i, 'INSERT', { 'PK': f'pk-{i}', 'item_type': 'gdm' }) for i in range(5)]
+
+  assert es_client.handle_records(records) == []
+  assert [[pk for _, _, pk, _ in actions] for actions in bulk.requests] == \
+    [['pk-0', 'pk-1'], ['pk-2', 'pk-3'], ['pk-4']]
+
+def test_failed_bulk_request_fails_its_records(es_client):
+  es_client._es_client.bulk = FakeBulk(error=ConnectionError('timed out'))
+  records = [stream_record(i, 'INSERT', { 'PK': f'pk-{i}', 'item_type': 'gdm' }) for i in range(3)]
+
+  assert es_client.handle_records(records) == records
@@ -0,0 +1,124 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.clients import external_http
+from src.utils import tracing
+
+class StubHandler(BaseHTTPRequestHandler):
+  ''' Answers from the server's script: a list of (status, headers, body) per path, the last one repeating. '''
+
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+    self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+    self.server.peers.add(self.client_address)
+
+    responses = self.server.script.get(self.path, [(404, {}, b'not found')])
+    status, headers, body = responses[min(self.server.hits[self.path], len(responses)) - 1]
+
+    self.send_response(status)
+    for name, value in headers.items():
+      self.send_header(name, value)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  do_POST = do_GET
+
+  def log_message(self, *args):
+    pass
+
+@pytest.fixture
+def stub_server():
+  server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+  server.script = {}
+  server.hits = {}
+  server.peers = set()
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+
+  netloc = f'127.0.0.1:{server.server_address[1]}'
+  server.url = f'http://{netloc}'
+  external_http.set_policy(netloc, external_http.ServicePolicy(timeout=(1, 1), retries=2, backoff_factor=0,
+    failure_threshold=3, reset_timeout=60))
+
+  yield server
+
+  server.shutdown()
+  server.server_close()
+  external_http.reset()
+  external_http.SERVICE_POLICIES.pop(netloc, None)
+
+def test_connections_are_reused(stub_server):
+  stub_server.script['/ok'] = [(200, {}, b'ok')]
+
+  for _ in range(5):
+    assert external_http.get(stub_server.url + '/ok').text == 'ok'
+
+  assert stub_server.hits['/ok'] == 5
+  assert len(stub_server.peers) == 1, 'All requests should use one kept alive connection'
+
+def test_retries_after_429_honoring_retry_after(stub_server):
+  stub_server.script['/limited'] = [(429, {'Retry-After': '0'}, b'slow down'), (200, {}, b'ok')]
+
+  res = external_http.get(stub_server.url + '/limited')
+
+  assert res.status_code == 200
+  assert stub_server.hits['/limited'] == 2
+  assert external_http.stats()[stub_server.url[7:]]['retries'] == 1
+
+def test_post_is_not_retried(stub_server):
+  stub_server.script['/transform'] = [(503, {}, b'down'), (200, {}, b'ok')]
+
+  res = external_http.post(stub_server.url + '/transform', data='{}')
+
+  assert res.status_code == 503
+  assert stub_server.hits['/transform'] == 1
+
+def test_last_response_is_returned_when_retries_run_out(stub_server):
+  stub_server.script['/down'] = [(503, {}, b'down')]
+
+  res = external_http.get(stub_server.url + '/down')
+
+  assert res.status_code == 503
+  assert stub_server.hits['/down'] == 3
+
+def test_circuit_opens_after_consecutive_failures(stub_server):
+  stub_server.script['/down'] = [(503, {}, b'down')]
+
+  for _ in range(3):
+    external_http.get(stub_server.url + '/down')
+
+  with pytest.raises(requests.exceptions.ConnectionError):
+    external_http.get(stub_server.url + '/down')
+
+  host_stats = external_http.stats()[stub_server.url[7:]]
+  assert stub_server.hits['/down'] == 9
+  assert host_stats['circuitOpen']
+  assert host_stats['errors'] == 3
+  assert host_stats['rejected'] == 1
+
+def test_circuit_closes_after_a_successful_trial_call(stub_server):
+  netloc = stub_server.url[7:]
+  external_http.set_policy(netloc, external_http.ServicePolicy(retries=0, failure_threshold=1, reset_timeout=0))
+  stub_server.script['/flaky'] = [(500, {}, b'error'), (200, {}, b'ok')]
+
+  assert external_http.get(stub_server.url + '/flaky').status_code == 500
+  assert external_http.stats()[netloc]['circuitOpen']
+
+  assert external_http.get(stub_server.url + '/flaky').status_code == 200
+  assert not external_http.stats()[netloc]['circuitOpen']
+
+def test_requests_are_traced_per_host(stub_server, capsys):
+  stub_server.script['/ok'] = [(200, {}, b'ok')]
+
+  with tracing.request_trace(sample_rate=1) as trace:
+    external_http.get(stub_server.url + '/ok')
+    external_http.get(stub_server.url + '/ok')
+    summary = trace.summary()
+
+  assert summary['HTTPCalls'] == 2
+  assert summary['spans'][0]['name'] == stub_server.url[7:]
@@ -0,0 +1,141 @@
+import json
+import time
+
+import pytest
+
+from src.helpers.fetch_plan import FetchPlan, DeadlineExceeded, DependencyFailed
+
+def slow(value, seconds=0.2):
+  time.sleep(seconds)
+  return value
+
+def test_independent_lookups_run_concurrently():
+  start = time.monotonic()
+  plan = FetchPlan(deadline=5)
+  plan.add('clinvar', slow, 'xml')
+  plan.add('car', slow, {'carId': 'CA1'})
+  plan.add('vep', slow, [])
+  plan.run()
+
+  assert time.monotonic() - start < 0.4
+  assert plan.result('clinvar') == 'xml'
+  assert plan.result('car') == {'carId': 'CA1'}
+  assert plan.result('vep') == []
+
+def test_lookups_receive_the_results_they_require():
+  plan = FetchPlan(deadline=5)
+  plan.add('car', slow, {'clinvarVariantId': '123'}, 0.05)
+  plan.add('clinvar', lambda car: 'clinvar-' + car['clinvarVariantId'], requires=('car',))
+  plan.add('title', lambda car, clinvar: (car['clinvarVariantId'], clinvar), requires=('car', 'clinvar'))
+  plan.run()
+
+  assert plan.result('title') == ('123', 'clinvar-123')
+
+def test_failures_skip_dependent_lookups():
+  def fail():
+    raise ValueError('upstream error')
+
+  plan = FetchPlan(deadline=5)
+  plan.add('car', fail)
+  plan.add('clinvar', lambda car: car, requires=('car',))
+  plan.add('vep', slow, [], 0)
+  plan.run()
+
+  with pytest.raises(ValueError):
+    plan.result('car')
+  assert isinstance(plan.error('clinvar'), DependencyFailed)
+  assert plan.result('clinvar', None) is None
+  assert plan.result('vep') == []
+
+def test_deadline_returns_partial_results():
+  start = time.monotonic()
+  plan = FetchPlan(deadline=0.2)
+  plan.add('fast', slow, 'done', 0)
+  plan.add('slow', slow, 'late', 2)
+  plan.add('after_slow', lambda value: value, requires=('slow',))
+  plan.run()
+
+  assert time.monotonic() - start < 1
+  assert plan.result('fast') == 'done'
+  assert plan.result('slow', 'fallback') == 'fallback'
+  with pytest.raises(DeadlineExceeded):
+    plan.result('after_slow')
+
+def test_requires_must_be_added_first():
+  with pytest.raises(ValueError):
+    FetchPlan().add('clinvar', slow, requires=('car',))
+
+def test_preferred_title_queries_upstreams_concurrently(monkeypatch):
+  monkeypatch.setenv('DB_TABLE_NAME', 'GeneVariantCuration-dev')
+  from src.controllers import variants_controller
+
+  calls = []
+  def fake(name, result):
+    def call(*args, **kwargs):
+      calls.append(name)
+      return slow(result)
+    return call
+
+  monkeypatch.setattr(variants_controller.ensembl_vep_client, 'get_effective_vep_transcripts_by_variant', fake('vep', []))
+  monkeypatch.setattr(variants_controller, 'fetch_clinvar_document', fake('clinvar', '<xml/>'))
+  monkeypatch.setattr(variants_controller.car_client, 'fetch', fake('car', {'@id': 'CA1'}))
+  monkeypatch.setattr(variants_controller.clinvar_client, 'find',
+    lambda clinvar_xml=None, ensembl_vep_transcripts=None: { 'preferredTitle': 'title from ' + clinvar_xml })
+
+  start = time.monotonic()
+  title = variants_controller.get_preferred_title_for_migrated_variant({ 'clinvarVariantId': '1', 'carId': 'CA1' })
+
+  assert title == 'title from <xml/>'
+  assert sorted(calls) == ['car', 'clinvar', 'vep']
+  assert time.monotonic() - start < 0.4
+
+@pytest.fixture
+def basic_info(monkeypatch):
+  ''' Stubs the upstreams of find_by_basic_info; returns the controller and the stubbed results. '''
+  monkeypatch.setenv('DB_TABLE_NAME', 'GeneVariantCuration-dev')
+  from src.controllers import variants_controller
+  from src.helpers import fetch_plan
+
+  monkeypatch.setattr(fetch_plan, 'UPSTREAM_DEADLINE', 0.3)
+  results = {
+    'car': ({ 'carId': 'CA1', 'clinvarVariantId': '1' }, 0),
+    'clinvar': ('<xml/>', 0),
+    'vep': ({ 'refSeqTranscripts': ['NM_1'] }, 0),
+  }
+  def fake(name):
+    return lambda *args, **kwargs: slow(*results[name])
+
+  monkeypatch.setattr(variants_controller.car_client, 'find', fake('car'))
+  monkeypatch.setattr(variants_controller, 'fetch_clinvar_document', fake('clinvar'))
+  monkeypatch.setattr(variants_controller.clinvar_client, 'find', lambda clinvar_xml=None, compute_preferred_title=True: { 'clinvarVariantId': '1' })
+  monkeypatch.setattr(variants_controller.ensembl_vep_client, 'find', fake('vep'))
+  monkeypatch.setattr(variants_controller.ensembl_vep_client, 'get_clinvar_primary_transcript', lambda variant_effects, clinvar_xml: variant_effects)
+  monkeypatch.setattr(variants_controller, 'get_hgvs_notation', lambda variant, assembly, with_ref: 'NC_000001.11:g.1A>G')
+  monkeypatch.setattr(variants_controller, 'parse_clinvar_interpretations', lambda clinvar_xml: { 'clinvarInterpretations': ['Benign'] })
+  return variants_controller, results
+
+def test_basic_info_returns_clinvar_interpretations_when_vep_misses_the_deadline(basic_info):
+  variants_controller, results = basic_info
+  results['vep'] = ({ 'refSeqTranscripts': ['NM_1'] }, 2)
+
+  response = variants_controller.find_by_basic_info('clinvar', '1')
+
+  assert response['statusCode'] == 200
+  assert json.loads(response['body']) == { 'clinvarInterpretations': ['Benign'] }
+
+def test_basic_info_returns_vep_data_when_clinvar_misses_the_deadline(basic_info):
+  variants_controller, results = basic_info
+  results['clinvar'] = ('<xml/>', 2)
+
+  response = variants_controller.find_by_basic_info('car', 'CA1')
+
+  assert response['statusCode'] == 200
+  assert json.loads(response['body']) == { 'refSeqTranscripts': ['NM_1'] }
+
+def test_basic_info_times_out_only_when_the_variant_misses_the_deadline(basic_info):
+  variants_controller, results = basic_info
+  results['car'] = ({ 'carId': 'CA1' }, 2)
+
+  response = variants_controller.find_by_basic_info('car', 'CA1')
+
+  assert response['statusCode'] == 504
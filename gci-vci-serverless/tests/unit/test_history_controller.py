@@ -0,0 +1,111 @@
+import json
+import os
+
+import pytest
+
+from src.db import ddb_client
+from tests.ddb_table import TEST_HISTORY_TABLE_NAME, create_history_table, load_items
+
+os.environ.setdefault('DB_TABLE_NAME', 'TEST_TABLE')
+os.environ.setdefault('HISTORY_TABLE', TEST_HISTORY_TABLE_NAME)
+from src.controllers import history_controller
+
+
+def image(**attributes):
+  ''' The DynamoDB stream image of an item with string attributes (lists as string lists). '''
+
+  return { k: { 'L': [{ 'S': e } for e in v] } if isinstance(v, list) else { 'S': v } for k, v in attributes.items() }
+
+def history_entries(pk, item_type, user_pk, versions=3, **attributes):
+  ''' The history table entries of an item created, then modified `versions - 1` times, by `user_pk`. '''
+
+  entries = []
+  old_image = None
+  for version in range(versions):
+    last_modified = f'2021-01-01T00:00:{version:02d}'
+    new_image = image(PK=pk, item_type=item_type, last_modified=last_modified, status=f'status-{version}', **attributes)
+    if version > 0:
+      new_image['modified_by'] = { 'S': user_pk }
+    else:
+      new_image['submitted_by'] = { 'S': user_pk }
+    change = { 'dynamodb': { 'NewImage': new_image } }
+    if old_image is not None:
+      change['dynamodb']['OldImage'] = old_image
+    entries.append({
+      'PK': pk,
+      'last_modified': last_modified,
+      'item_type': item_type,
+      'change_type': 'MODIFY' if old_image else 'INSERT',
+      'change': change,
+    })
+    old_image = new_image
+  return entries
+
+def build_gdm_history(related_count, user_count=10, versions=3):
+  ''' Returns the users and the history table entries of a GDM with `related_count` annotations. '''
+
+  users = [{ 'PK': f'user-{i}', 'item_type': 'user', 'name': f'Name {i}', 'family_name': f'Family {i}', 'email': f'user{i}@example.org' } for i in range(user_count)]
+  annotation_pks = [f'annotation-{i:04d}' for i in range(related_count)]
+  entries = history_entries('gdm-0', 'gdm', 'user-0', versions, annotations=annotation_pks)
+  for i, annotation_pk in enumerate(annotation_pks):
+    entries.extend(history_entries(annotation_pk, 'annotation', f'user-{i % user_count}', versions))
+  return users, entries
+
+@pytest.fixture
+def tables(ddb_table, monkeypatch):
+  create_history_table()
+  monkeypatch.setattr(history_controller, 'db', ddb_client.Client(ddb_table, False))
+  monkeypatch.setattr(history_controller, 'db_history', ddb_client.Client(TEST_HISTORY_TABLE_NAME, False))
+  return history_controller.db
+
+def count_calls(client, operation):
+  calls = []
+  original = getattr(client.ddb_client, operation)
+  def counted(**kwargs):
+    calls.append(kwargs)
+    return original(**kwargs)
+  setattr(client.ddb_client, operation, counted)
+  return calls
+
+def test_generate_includes_related_items_and_their_users(tables):
+  users, entries = build_gdm_history(related_count=20, user_count=5)
+  load_items(users)
+  load_items(entries, TEST_HISTORY_TABLE_NAME)
+  get_calls = count_calls(tables, 'get_item')
+  batch_calls = count_calls(tables, 'batch_get_item')
+
+  response = history_controller.generate('gdm-0', 'annotations')
+
+  assert response['statusCode'] == 200
+  histories = json.loads(response['body'])
+  assert list(histories) == ['gdm-0'] + [f'annotation-{i:04d}' for i in range(20)]
+  annotation_history = histories['annotation-0003']['history']
+  assert [entry['change_type'] for entry in annotation_history] == ['INSERT', 'MODIFY', 'MODIFY']
+  assert annotation_history[0]['add']['status'] == 'status-0'
+  assert annotation_history[1]['update'] == { 'last_modified': '2021-01-01T00:00:01', 'status': 'status-1' }
+  assert annotation_history[1]['add'] == { 'modified_by': 'user-3' }
+  assert annotation_history[0]['user_email'] == 'user3@example.org'
+  assert annotation_history[2]['user_name'] == 'Name 3'
+  # every user is read by one batched read
+  assert (len(get_calls), len(batch_calls)) == (0, 1)
+
+def test_generate_without_users_or_related_items(tables):
+  users, entries = build_gdm_history(related_count=2)
+  load_items(entries, TEST_HISTORY_TABLE_NAME)
+
+  response = history_controller.generate('annotation-0001', None)
+
+  assert response['statusCode'] == 200
+  history = json.loads(response['body'])['annotation-0001']['history']
+  assert len(history) == 3
+  assert 'user_name' not in history[0]
+
+def test_iter_find_keeps_the_order_of_the_pks(tables):
+  users, entries = build_gdm_history(related_count=12, versions=1)
+  load_items(entries, TEST_HISTORY_TABLE_NAME)
+  pks = [f'annotation-{i:04d}' for i in reversed(range(12))]
+
+  results = list(history_controller.iter_find(pks, max_workers=4))
+
+  assert [pk for pk, _ in results] == pks
+  assert all(result['body'][0]['PK'] == pk for pk, result in results)
@@ -0,0 +1,162 @@
+import copy
+import pytest
+
+from src.models.item_type_serializer import ModelSerializer
+from src.utils.exceptions import PopulatorException
+
+
+class RoundTripCountingDb:
+  ''' In-memory stand-in for the DynamoDB client that counts `all()` round trips. '''
+
+  def __init__(self, items):
+    self.items = { item['PK']: item for item in items }
+    self.round_trips = 0
+
+  def all(self, pks):
+    self.round_trips += 1
+    # hand out fresh copies, like deserializing a DynamoDB response does
+    return [copy.deepcopy(self.items[pk]) for pk in dict.fromkeys(pks) if pk in self.items]
+
+
+def populate_depth_first(db, src_parent):
+  ''' The previous populate strategy: one `db.all()` per parent, walking the graph depth-first. '''
+
+  populated_src_parent = copy.deepcopy(src_parent)
+  populate_stack = [populated_src_parent]
+  while populate_stack:
+    parent = populate_stack.pop()
+    Model = ModelSerializer._get_model(parent)
+    embedding_meta_list, related_pks = ModelSerializer._collect_related_pks(Model, parent, Model.embedding_fields)
+    if not related_pks:
+      continue
+    items = db.all(list(related_pks))
+    ModelSerializer._embed_related_objects(parent, embedding_meta_list, { item['PK']: item for item in items })
+    Model.did_populate(parent)
+    populate_stack.extend(items)
+  return populated_src_parent
+
+
+def user(pk):
+  return { 'PK': pk, 'item_type': 'user', 'name': pk }
+
+def build_gdm_fixture(annotation_count=5, groups_per_annotation=2, families_per_group=3, individuals_per_family=4):
+  ''' Builds a GDM with curators, classifications and annotations carrying case level evidence. '''
+
+  users = [user(f'user-{i}') for i in range(4)]
+  items = list(users)
+  by = { 'submitted_by': 'user-0', 'modified_by': 'user-1' }
+
+  def add(item):
+    items.append(item)
+    return item['PK']
+
+  variants = [add({ 'PK': f'variant-{i}', 'item_type': 'variant', **by }) for i in range(10)]
+  diseases = [add({ 'PK': f'disease-{i}', 'item_type': 'disease' }) for i in range(3)]
+  snapshots = [add({ 'PK': f'snapshot-{i}', 'item_type': 'snapshot' }) for i in range(3)]
+  add({ 'PK': 'gene-HGNC:1', 'item_type': 'gene' })
+  classification = add({
+    'PK': 'classification-0', 'item_type': 'provisionalClassification',
+    'submitted_by': 'user-2', 'associatedClassificationSnapshots': snapshots
+  })
+  gdm = {
+    'PK': 'gdm-0', 'item_type': 'gdm', 'gene': 'gene-HGNC:1', 'disease': diseases[0],
+    'contributors': [u['PK'] for u in users], 'provisionalClassifications': [classification], **by
+  }
+
+  annotations = []
+  individual_count = 0
+  for a in range(annotation_count):
+    article = add({ 'PK': f'article-{a}', 'item_type': 'article' })
+    groups = []
+    for g in range(groups_per_annotation):
+      families = []
+      group_individuals = []
+      for f in range(families_per_group):
+        individuals = []
+        for _ in range(individuals_per_family):
+          individuals.append(add({
+            'PK': f'individual-{individual_count}', 'item_type': 'individual',
+            'variants': [variants[individual_count % len(variants)]], 'diagnosis': [diseases[1]], **by
+          }))
+          individual_count += 1
+        group_individuals.append(individuals[0])
+        families.append(add({
+          'PK': f'family-{a}-{g}-{f}', 'item_type': 'family', 'individualIncluded': individuals,
+          'segregation': { 'variants': [variants[f]] }, 'commonDiagnosis': [diseases[2]], **by
+        }))
+      groups.append(add({
+        'PK': f'group-{a}-{g}', 'item_type': 'group', 'familyIncluded': families,
+        'individualIncluded': group_individuals, 'commonDiagnosis': [diseases[2]], **by
+      }))
+    annotations.append({
+      'PK': f'annotation-{a}', 'item_type': 'annotation', 'article': article, 'groups': groups, **by
+    })
+
+  return gdm, annotations, items
+
+
+def test_populate_matches_depth_first_result():
+  gdm, annotations, items = build_gdm_fixture()
+
+  for parent in [gdm] + annotations:
+    assert ModelSerializer.populate(RoundTripCountingDb(items), parent) == \
+      populate_depth_first(RoundTripCountingDb(items), parent)
+
+def test_populate_round_trips_scale_with_depth_not_object_count():
+  gdm, annotations, items = build_gdm_fixture()
+
+  depth_first_db = RoundTripCountingDb(items)
+  for annotation in annotations:
+    populate_depth_first(depth_first_db, annotation)
+
+  breadth_first_db = RoundTripCountingDb(items)
+  ModelSerializer.populate_many(breadth_first_db, annotations)
+
+  # annotation -> group -> family -> individual -> variant -> user
+  assert breadth_first_db.round_trips == 5
+  assert depth_first_db.round_trips > 20 * breadth_first_db.round_trips
+
+  larger_gdm, larger_annotations, larger_items = build_gdm_fixture(annotation_count=20)
+  larger_db = RoundTripCountingDb(larger_items)
+  ModelSerializer.populate_many(larger_db, larger_annotations)
+  assert larger_db.round_trips == breadth_first_db.round_trips
+
+def test_populate_gives_each_parent_its_own_copy():
+  gdm, annotations, items = build_gdm_fixture(annotation_count=1, groups_per_annotation=1)
+
+  annotation = ModelSerializer.populate(RoundTripCountingDb(items), annotations[0])
+  group = annotation['groups'][0]
+  group_individual = group['individualIncluded'][0]
+  family_individual = group['familyIncluded'][0]['individualIncluded'][0]
+
+  assert group_individual['PK'] == family_individual['PK']
+  assert group_individual is not family_individual
+  assert group_individual['associatedGroups'] == [group['PK']]
+  assert 'associatedGroups' not in family_individual
+
+def test_populate_in_place_embeds_into_the_given_objects():
+  gdm, annotations, items = build_gdm_fixture(annotation_count=2)
+  db = RoundTripCountingDb(items)
+  expected = ModelSerializer.populate_many(db, annotations)
+  assert isinstance(annotations[0]['article'], str)
+
+  populated = ModelSerializer.populate_many(db, annotations, in_place=True)
+
+  assert populated == expected
+  assert all(populated_annotation is annotation for populated_annotation, annotation in zip(populated, annotations))
+
+def test_populate_many_respects_include_keys():
+  gdm, annotations, items = build_gdm_fixture(annotation_count=2)
+
+  populated = ModelSerializer.populate_many(RoundTripCountingDb(items), annotations, include_key_list=['article'])
+
+  assert [annotation['article']['PK'] for annotation in populated] == ['article-0', 'article-1']
+  assert populated[0]['submitted_by'] == 'user-0'
+  assert isinstance(populated[0]['groups'][0], str)
+
+def test_populate_raises_on_missing_related_objects():
+  gdm, annotations, items = build_gdm_fixture()
+  items = [item for item in items if item['PK'] != 'gene-HGNC:1']
+
+  with pytest.raises(PopulatorException):
+    ModelSerializer.populate(RoundTripCountingDb(items), gdm)
@@ -0,0 +1,113 @@
+import importlib
+import json
+import os
+
+import boto3
+import pytest
+
+from src.db import ddb_client
+from tests.ddb_table import load_items
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'vpt')
+
+os.environ.setdefault('DB_VPT_TABLE_NAME', 'TEST_TABLE')
+ldh_lambda = importlib.import_module('src.kafka.ldh-lambda')
+
+@pytest.fixture
+def db(ddb_table, monkeypatch):
+  db = ddb_client.Client(ddb_table, False)
+  monkeypatch.setattr(ldh_lambda, 'db', db)
+  return db
+
+@pytest.fixture
+def retry_queue(ddb_table, monkeypatch):
+  ''' Yields the URL of a moto-backed retry queue. '''
+
+  sqs = boto3.client('sqs')
+  url = sqs.create_queue(QueueName='ldh-retry')['QueueUrl']
+  monkeypatch.setattr(ldh_lambda, 'RETRY_QUEUE_URL', url)
+  monkeypatch.setattr(ldh_lambda, '_sqs', sqs)
+  return url
+
+def queued_records(url):
+  messages = boto3.client('sqs').receive_message(QueueUrl=url, MaxNumberOfMessages=10, MessageAttributeNames=['All'])
+  return { message['MessageAttributes']['record']['StringValue']: json.loads(message['Body']) for message in messages.get('Messages', []) }
+
+def ldh_record(file_name, offset, **changes):
+  with open(os.path.join(DATA_DIR, file_name)) as ldh_file:
+    variant = json.load(ldh_file)
+  variant.update(changes)
+  return { 'topic': 'ldh', 'partition': 0, 'offset': offset, 'value': json.dumps(variant) }
+
+def test_events_of_an_allele_are_coalesced_into_one_item(db):
+  event = [
+    ldh_record('CA021691.json', 1, event='Add'),
+    ldh_record('CA023679.json', 2, event='Add'),
+    ldh_record('CA021691.json', 3, event='Update', clinVarVariantTitle='renamed'),
+  ]
+
+  stats = ldh_lambda.process(event, None)
+
+  assert stats['failed'] == []
+  assert (stats['alleles'], stats['created'], stats['updated']) == (2, 2, 0)
+  items = db.query_by_car_id('CA021691')
+  assert len(items) == 1
+  item = db.find(items[0]['PK'])
+  assert item['clinVarVariantTitle'] == 'renamed'
+  assert item['event'] == 'Update'
+  # grouped as the first record of the batch (partition 0, odd position)
+  assert item['gr'] == 'GLA_0_1'
+
+def test_existing_alleles_are_updated_in_place(db):
+  load_items([{ 'PK': 'vp-1', 'item_type': 'variant', 'carId': 'CA021691', 'vciStatus': { 'd': 1 } }])
+
+  stats = ldh_lambda.process([ldh_record('CA021691.json', 1, event='Add', clinVarVariantTitle='renamed')], None)
+
+  assert (stats['created'], stats['updated']) == (0, 1)
+  assert [item['PK'] for item in db.query_by_car_id('CA021691')] == ['vp-1']
+  item = db.find('vp-1')
+  assert item['clinVarVariantTitle'] == 'renamed'
+  assert item['vciStatus'] == { 'd': 1 }
+
+def test_handler_sends_failed_records_to_the_retry_queue(db, retry_queue, monkeypatch, capsys):
+  def update_fails(pk, allele):
+    raise Exception('throttled')
+  monkeypatch.setattr(ldh_lambda, 'update_allele', update_fails)
+  load_items([{ 'PK': 'vp-1', 'item_type': 'variant', 'carId': 'CA023679' }])
+  event = [
+    ldh_record('CA021691.json', 10, event='Add'),
+    { 'topic': 'ldh', 'partition': 1, 'offset': 11, 'value': '{ not json' },
+    ldh_record('CA023679.json', 12, event='Update'),
+    ldh_record('CA000052.json', 13, event=None),
+  ]
+
+  result = ldh_lambda.handler(event, None)
+
+  failed_ids = ['ldh/1/11', 'ldh/0/12', 'ldh/0/13']
+  assert result == { 'batchItemFailures': [{ 'itemIdentifier': name } for name in failed_ids] }
+  assert queued_records(retry_queue) == { name: record for name, record in zip(failed_ids, event[1:]) }
+  assert len(db.query_by_car_id('CA021691')) == 1
+  summary = next(json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"'))
+  assert summary['Route'] == 'kafka/ldh'
+  assert (summary['Records'], summary['AllelesCreated'], summary['FailedRecords']) == (4, 1, 3)
+  assert summary['Lag'] > 0
+
+def test_handler_fails_when_failed_records_cannot_be_queued(db, retry_queue, monkeypatch):
+  monkeypatch.setattr(ldh_lambda, 'RETRY_QUEUE_URL', retry_queue + '-missing')
+
+  with pytest.raises(RuntimeError, match='ldh/0/11'):
+    ldh_lambda.handler([{ 'topic': 'ldh', 'partition': 0, 'offset': 11, 'value': '{ not json' }], None)
+
+def test_retry_queue_batch_reports_failed_messages(db, retry_queue):
+  load_items([{ 'PK': 'vp-1', 'item_type': 'variant', 'carId': 'CA021691' }])
+  event = { 'Records': [
+    { 'messageId': 'm-1', 'body': json.dumps(ldh_record('CA021691.json', 10, event='Update', clinVarVariantTitle='renamed')) },
+    { 'messageId': 'm-2', 'body': json.dumps({ 'topic': 'ldh', 'partition': 0, 'offset': 11, 'value': '{ not json' }) },
+  ] }
+
+  result = ldh_lambda.handler(event, None)
+
+  assert result == { 'batchItemFailures': [{ 'itemIdentifier': 'm-2' }] }
+  assert db.find('vp-1')['clinVarVariantTitle'] == 'renamed'
+  # failed messages are redelivered by SQS, not queued again
+  assert queued_records(retry_queue) == {}
@@ -0,0 +1,356 @@
+import json
+import random
+from copy import deepcopy
+
+import pytest
+
+pytest.importorskip('confluent_kafka')
+
+from src.helpers import affiliation_file, messaging_helpers
+
+TEMPLATES = {
+  'classification_v7': messaging_helpers.publish_classification_message_template_v7,
+  'classification_v8': messaging_helpers.publish_classification_message_template,
+  'interpretation': messaging_helpers.publish_interpretation_message_template,
+}
+
+AFFILIATIONS = [
+  { 'affiliation_id': '10001', 'affiliation_fullname': 'First Affiliation', 'subgroups': { 'gcep': { 'id': '40001', 'fullname': 'First GCEP' } } },
+  { 'affiliation_id': '10002', 'affiliation_fullname': 'Second Affiliation', 'subgroups': { 'vcep': { 'id': '50002', 'fullname': 'Second VCEP' } } },
+  { 'affiliation_id': '10003', 'affiliation_fullname': 'Third Affiliation' },
+]
+
+def legacy_add_data_to_message_template(data, evidence, evidence_counts, template):
+  ''' The previous renderer: interprets the directives of a deep copy of the template in place. '''
+
+  keep_falsy_data = False
+  keys_to_delete = []
+
+  for key, value in template.items():
+    if isinstance(value, str):
+      if value == '':
+        keys_to_delete.append(key)
+
+    elif isinstance(value, list):
+      value_length = len(value)
+
+      if value_length > 0:
+        # Retrieve data using data path lists
+        if value[0] == '$PATH_TO_DATA':
+          template[key] = messaging_helpers.get_data_by_path(data, value[1:])
+
+        # Keep first, non-excluded data found (using data path lists)
+        elif value[0] == '$USE_FIRST_DATA':
+          if value_length > 2:
+            for data_path in value[2:]:
+              temp_result = messaging_helpers.get_data_by_path(data, data_path)
+
+              if temp_result not in {value[1], None}:
+                break
+
+            if temp_result != value[1]:
+              template[key] = temp_result
+            else:
+              template[key] = ''
+          else:
+            template[key] = ''
+
+        # Use one of two provided values, based on data (from a data path list)
+        elif value[0] == '$CHECK_FOR_DATA':
+          if value_length == 4:
+            if messaging_helpers.get_data_by_path(data, value[1]):
+              template[key] = value[2]
+            else:
+              template[key] = value[3]
+          else:
+            template[key] = ''
+
+        # Replace data (from a data path list) using the provided strings
+        elif value[0] == '$REPLACE_DATA':
+          if value_length == 4:
+            temp_result = messaging_helpers.get_data_by_path(data, value[1])
+
+            if isinstance(temp_result, str):
+              template[key] = temp_result.replace(value[2], value[3])
+            else:
+              template[key] = ''
+          else:
+            template[key] = ''
+
+        # Convert data (from a data path list) using the provided map
+        elif value[0] == '$CONVERT_DATA':
+          if value_length == 3:
+            temp_result = messaging_helpers.get_data_by_path(data, value[1])
+            default_result_key = '$DEFAULT'
+
+            if temp_result in value[2]:
+              template[key] = value[2][temp_result]
+            elif default_result_key in value[2]:
+              template[key] = value[2][default_result_key]
+            else:
+              template[key] = ''
+          else:
+            template[key] = ''
+
+        # Combine data (from dictionary of data path lists) with a separator
+        elif value[0] == '$COMBINE_DATA':
+          if value_length == 3:
+            legacy_add_data_to_message_template(data, evidence, evidence_counts, value[2])
+            template[key] = value[1].join(value[2].values())
+          else:
+            template[key] = ''
+
+        # Lookup an affiliation name by ID (from a data path list)
+        elif value[0] == '$LOOKUP_AFFILIATION_DATA':
+          if value_length == 4:
+            template[key] = affiliation_file.lookup_affiliation_data(messaging_helpers.get_data_by_path(data, value[1]), value[3], value[2])
+          elif value_length == 3:
+            template[key] = affiliation_file.lookup_affiliation_data(messaging_helpers.get_data_by_path(data, value[1]), value[2])
+          else:
+            template[key] = ''
+
+        # Add evidence count (using a data path list)
+        elif value[0] == '$EVIDENCE_COUNT':
+          if value_length == 2:
+            template[key] = messaging_helpers.get_data_by_path(evidence_counts, value[1])
+          else:
+            template[key] = ''
+
+        # Add score (using a data path list)
+        elif value[0] == '$SCORE_DATA':
+          if value_length >= 3:
+            template[key] = messaging_helpers.get_data_by_path(data, value[1])
+
+            # If score is zero, check if it should be included in message (e.g. if evidence count is non-zero)
+            if template[key] == 0:
+              if value[2] == True:
+                keep_falsy_data = True
+              else:
+                for data_path in value[2:]:
+                  if messaging_helpers.get_data_by_path(evidence_counts, data_path):
+                    keep_falsy_data = True
+                    break
+          else:
+            template[key] = ''
+
+        # Add evidence (articles, counts or points) based on information type
+        elif value[0] == '$EVIDENCE_DATA':
+          if value_length in (2, 3) and value[1] in evidence:
+            template[key] = evidence[value[1]]
+
+            if not template[key] and value_length == 3 and value[2] == True:
+              keep_falsy_data = True
+
+          else:
+            template[key] = ''
+
+        else:
+          for element in value:
+            if isinstance(element, dict):
+              legacy_add_data_to_message_template(data, evidence, evidence_counts, element)
+      else:
+        # If empty list, check for EarliestArticles
+        # SOP8 - handling to incorporate earliest articles
+        if key == 'EarliestArticles':
+          messaging_helpers.add_earliest_articles(data, value)
+
+      # Save keys with falsy values for later deletion
+      if not template[key]:
+        if keep_falsy_data:
+          keep_falsy_data = False
+        else:
+          keys_to_delete.append(key)
+
+    elif isinstance(value, dict):
+      legacy_add_data_to_message_template(data, evidence, evidence_counts, value)
+
+      # Special handling to incorporate contradictory evidence (articles)
+      if key == 'ValidContradictoryEvidence':
+        messaging_helpers.add_contradictory_evidence(data, evidence, value)
+
+      # Special handling to incorporate secondary contributors/approver
+      elif key == 'summary':
+        messaging_helpers.add_animal_model_only(data, value)
+        messaging_helpers.add_secondary_contributors_approver(data, value)
+
+      if not template[key]:
+        keys_to_delete.append(key)
+
+  # Remove keys with no values
+  for key in keys_to_delete:
+    del template[key]
+
+def template_paths(template, paths=None):
+  ''' Collects the data, evidence count and evidence paths used by the directives of a template. '''
+
+  if paths is None:
+    paths = { 'data': [], 'counts': [], 'evidence': [] }
+  values = template.values() if isinstance(template, dict) else template
+  for value in values:
+    if isinstance(value, dict):
+      template_paths(value, paths)
+    elif isinstance(value, list) and value and isinstance(value[0], str) and value[0] in messaging_helpers.message_template_directives:
+      directive = value[0]
+      if directive == '$PATH_TO_DATA':
+        paths['data'].append(value[1:])
+      elif directive == '$USE_FIRST_DATA':
+        paths['data'].extend(value[2:])
+      elif directive in ('$CHECK_FOR_DATA', '$REPLACE_DATA', '$CONVERT_DATA', '$LOOKUP_AFFILIATION_DATA'):
+        paths['data'].append(value[1])
+      elif directive == '$COMBINE_DATA':
+        template_paths(value[2], paths)
+      elif directive == '$EVIDENCE_COUNT':
+        paths['counts'].append(value[1])
+      elif directive == '$SCORE_DATA':
+        paths['data'].append(value[1])
+        paths['counts'].extend(path for path in value[2:] if isinstance(path, list))
+      elif directive == '$EVIDENCE_DATA':
+        paths['evidence'].append(value[1])
+    elif isinstance(value, list):
+      template_paths(value, paths)
+  return paths
+
+def leaf_paths(paths):
+  ''' Drops the paths that lead to objects other paths look into (e.g. a points total and its evidence counts). '''
+
+  return [path for path in paths if not any(len(other) > len(path) and other[:len(path)] == path for other in paths)]
+
+def set_path(data, path, value):
+  for key in path[:-1]:
+    data = data.setdefault(key, {})
+    if not isinstance(data, dict):
+      return
+  data.setdefault(path[-1], value)
+
+def data_value(rng, path):
+  ''' A value for a data path, sometimes missing or empty, shaped by what the path holds. '''
+
+  leaf = path[-1]
+  if 'classificationPoints' in path:
+    return rng.choice([0, 0, 1, 2.5, 12, None])
+  if leaf == 'affiliation':
+    return rng.choice(['10001', '10002', '10003', '10004', None])
+  if leaf in ('publishClassification', 'replicatedOverTime'):
+    return rng.choice([True, False, None])
+  if leaf == 'alteredClassification':
+    return rng.choice(['No Modification', 'Strong', '', None])
+  if leaf == 'autoClassification':
+    return rng.choice(['No Known Disease Relationship', 'Definitive', None])
+  if leaf == 'hgncId':
+    return rng.choice(['HGNC:1100', None])
+  if path[-2:] == ['disease', 'PK']:
+    return rng.choice(['MONDO_0007254', None])
+  if leaf == 'interpretation':
+    return { 'PK': 'interpretation-1', 'variant': { 'carId': 'CA123' }, 'evaluations': [] }
+  return rng.choice([leaf + '-value', leaf + '-other', '', None])
+
+def build_source(rng, template_name, paths):
+  ''' Builds the snapshot data, evidence and evidence counts a template is rendered from. '''
+
+  data = { 'resourceType': 'interpretation' if template_name == 'interpretation' else 'classification' }
+  for path in leaf_paths(paths['data']):
+    if path and path != ['resourceType']:
+      value = data_value(rng, path)
+      if value is not None:
+        set_path(data, path, value)
+
+  if template_name == 'interpretation':
+    return data, None, None
+
+  resource = data.setdefault('resource', {})
+  points = resource.setdefault('classificationPoints', {})
+  points.setdefault('experimentalEvidenceTotal', rng.choice([0, 2]))
+  points.setdefault('modelsRescue', {}).setdefault('modelsNonHuman', {}).setdefault('totalPointsGiven', rng.choice([0, 2]))
+  resource['earliestArticles'] = rng.choice([[], [{ 'PK': '12345', 'date': '2019 Jan;4' }, { 'PK': '', 'date': '2020' }]])
+  resource['contradictingEvidence'] = rng.choice([{}, { 'proband': True }, { 'caseControl': False }])
+  resource['classificationContributors'] = rng.choice([[], ['10002', '10001']])
+  resource['additionalApprover'] = rng.choice([None, '40001', '50002'])
+
+  evidence = {}
+  for key in paths['evidence'] + ['contradicts']:
+    if key.endswith('-count') or key.endswith('-points'):
+      value = rng.choice([0, 1, 3.5, None])
+    else:
+      value = rng.choice([[], [{ 'pmid': '111', 'title': key }], None])
+    if value is not None:
+      evidence[key] = value
+
+  evidence_counts = {}
+  for path in leaf_paths(paths['counts']):
+    value = rng.choice([0, 1, 4, None])
+    if value is not None:
+      set_path(evidence_counts, path, value)
+
+  return data, evidence, evidence_counts
+
+def render_both(template_name, seed):
+  template = TEMPLATES[template_name]
+  data, evidence, evidence_counts = build_source(random.Random(seed), template_name, template_paths(template))
+
+  expected = deepcopy(template)
+  legacy_add_data_to_message_template(deepcopy(data), deepcopy(evidence), deepcopy(evidence_counts), expected)
+
+  rendered = messaging_helpers.render_message_template(template, data, evidence, evidence_counts)
+  return expected, rendered
+
+@pytest.fixture
+def affiliations(monkeypatch, tmp_path):
+  (tmp_path / 'affiliations.json').write_text(json.dumps(AFFILIATIONS))
+  monkeypatch.setattr(affiliation_file, 'local_file_dir', str(tmp_path))
+  monkeypatch.setattr(affiliation_file, 'registry', None)
+
+@pytest.mark.parametrize('template_name', list(TEMPLATES))
+@pytest.mark.parametrize('seed', range(20))
+def test_render_matches_legacy_renderer(affiliations, template_name, seed):
+  template_before = deepcopy(TEMPLATES[template_name])
+
+  expected, rendered = render_both(template_name, seed)
+
+  # Same keys, values and key order
+  assert json.dumps(rendered) == json.dumps(expected)
+  assert TEMPLATES[template_name] == template_before
+
+def test_rendered_messages_share_nothing_with_the_template(affiliations):
+  template = messaging_helpers.publish_classification_message_template
+  data, evidence, evidence_counts = build_source(random.Random(1), 'classification_v8', template_paths(template))
+  data['resource']['earliestArticles'] = [{ 'PK': '12345', 'date': '2019' }]
+
+  first = messaging_helpers.render_message_template(template, data, evidence, evidence_counts)
+  first['scoreJson']['EarliestArticles'].append('changed')
+  second = messaging_helpers.render_message_template(template, data, evidence, evidence_counts)
+
+  assert second['scoreJson']['EarliestArticles'] == [{ 'pmid': '12345', 'year': '2019' }]
+  assert template['scoreJson']['EarliestArticles'] == []
+
+def test_templates_are_compiled_once(affiliations, monkeypatch):
+  compiled = []
+  compile_message_template = messaging_helpers.compile_message_template
+  def counting_compile(template):
+    compiled.append(template)
+    return compile_message_template(template)
+  monkeypatch.setattr(messaging_helpers, 'compile_message_template', counting_compile)
+  monkeypatch.setattr(messaging_helpers, 'message_template_plans', {})
+  data = { 'resourceType': 'interpretation', 'resource': { 'publishClassification': True }, 'resourceParent': { 'interpretation': { 'PK': 'i-1' } } }
+
+  for _ in range(3):
+    message = messaging_helpers.render_message_template(messaging_helpers.publish_interpretation_message_template, data)
+
+  assert message == { 'interpretation': { 'PK': 'i-1' }, 'statusPublishFlag': 'Unpublish' }
+  assert len(compiled) == 1
+
+def test_secondary_contributors_and_approver_are_resolved_from_the_registry(affiliations):
+  summary = {}
+  data = { 'resource': { 'classificationContributors': ['10003', '99999', '10002', '10001'], 'additionalApprover': '50002' } }
+
+  messaging_helpers.add_secondary_contributors_approver(data, summary)
+
+  assert summary['contributors'] == [
+    { 'id': '10001', 'name': 'First Affiliation', 'role': 'secondary contributor' },
+    { 'id': '10002', 'name': 'Second Affiliation', 'role': 'secondary contributor' },
+    { 'id': '10003', 'name': 'Third Affiliation', 'role': 'secondary contributor' },
+    { 'id': '50002', 'name': 'Second VCEP', 'role': 'secondary approver' },
+  ]
+
+  summary = {}
+  messaging_helpers.add_secondary_contributors_approver({ 'resource': { 'additionalApprover': '49999' } }, summary)
+  assert summary == { 'contributors': [] }
@@ -0,0 +1,124 @@
+import pytest
+
+pytest.importorskip('confluent_kafka')
+
+from confluent_kafka import KafkaError
+
+from src.helpers import messaging_helpers
+
+
+class FakeMessage:
+  def __init__(self, offset):
+    self._offset = offset
+
+  def partition(self):
+    return 0
+
+  def offset(self):
+    return self._offset
+
+
+class FakeProducer:
+  ''' Queues produced messages and reports them delivered (or failed) on flush. '''
+
+  instances = []
+
+  def __init__(self, **conf):
+    self.conf = conf
+    self.pending = []
+    self.produced = []
+    self.reports = []
+    self.error = None
+    FakeProducer.instances.append(self)
+
+  def produce(self, topic, value, key=None, callback=None):
+    self.pending.append((topic, value, key, callback))
+
+  def poll(self, timeout):
+    for callback, err in self.reports:
+      callback(err, None)
+    served, self.reports = len(self.reports), []
+    return served
+
+  def purge(self, in_queue=True, in_flight=True, blocking=True):
+    self.reports.extend((callback, KafkaError(KafkaError._PURGE_QUEUE)) for _, _, _, callback in self.pending)
+    self.pending = []
+
+  def flush(self, timeout):
+    for topic, value, key, callback in self.pending:
+      self.produced.append((topic, value, key))
+      if self.error:
+        callback(self.error, None)
+      else:
+        callback(None, FakeMessage(len(self.produced) - 1))
+    self.pending = []
+    return 0
+
+
+@pytest.fixture
+def fake_producer(monkeypatch):
+  FakeProducer.instances = []
+  monkeypatch.setattr(messaging_helpers, 'Producer', FakeProducer)
+  monkeypatch.setattr(messaging_helpers, 'kafka_producers', {})
+  yield FakeProducer
+
+
+def test_send_message_reuses_producer_across_calls(fake_producer):
+  first = messaging_helpers.send_message('one', 'test', True)
+  second = messaging_helpers.send_message('two', 'test', True, message_key='key-2')
+
+  assert len(fake_producer.instances) == 1
+  assert first == { 'status': 'Success', 'message': 'one', 'partition': 0, 'offset': 0 }
+  assert second['offset'] == 1
+  assert fake_producer.instances[0].produced[1] == ('test', 'two', 'key-2')
+
+
+def test_producer_conf_includes_batching_and_idempotence(fake_producer):
+  messaging_helpers.send_message('one', 'test', True, { 'compression.type': 'gzip' })
+  messaging_helpers.send_message('two', 'test', True)
+
+  # Distinct configurations get their own producer
+  assert len(fake_producer.instances) == 2
+  conf = fake_producer.instances[0].conf
+  assert conf['enable.idempotence'] is True
+  assert conf['compression.type'] == 'gzip'
+  assert 'linger.ms' in conf and 'batch.size' in conf
+
+
+def test_send_messages_reports_each_delivery(fake_producer):
+  results = messaging_helpers.send_messages([('a', 'k1'), ('b', None), ('c', 'k3')], 'test', True)
+
+  assert [r['status'] for r in results] == ['Success'] * 3
+  assert [r['message'] for r in results] == ['a', 'b', 'c']
+  assert [p[2] for p in fake_producer.instances[0].produced] == ['k1', None, 'k3']
+
+
+def test_fatal_error_discards_producer(fake_producer):
+  messaging_helpers.send_message('one', 'test', True)
+  fake_producer.instances[0].error = KafkaError(KafkaError._FATAL, 'fenced', fatal=True)
+
+  result = messaging_helpers.send_message('two', 'test', True)
+  assert result['status'] == 'Fail'
+
+  messaging_helpers.send_message('three', 'test', True)
+  assert len(fake_producer.instances) == 2
+
+
+def test_queued_messages_are_purged_when_the_deadline_passes(fake_producer, monkeypatch):
+  monkeypatch.setattr(FakeProducer, 'flush', lambda self, timeout: len(self.pending))
+
+  result = messaging_helpers.send_message('one', 'test', True)
+
+  assert result == { 'status': 'Fail', 'message': 'Message delivery timed out' }
+  assert fake_producer.instances[0].pending == []
+
+
+def test_unacknowledged_messages_are_reported_pending(fake_producer, monkeypatch):
+  def flush_sends_without_acknowledgement(self, timeout):
+    in_flight, self.pending = len(self.pending), []
+    return in_flight
+  monkeypatch.setattr(FakeProducer, 'flush', flush_sends_without_acknowledgement)
+
+  result = messaging_helpers.send_message('one', 'test', True)
+
+  assert result['status'] == 'Pending'
@@ -0,0 +1,83 @@
+import importlib
+import json
+
+import pytest
+
+from src.db import ddb_client
+from tests.ddb_table import load_items
+
+@pytest.fixture
+def controllers(ddb_table, monkeypatch):
+  ''' Returns the variants and interpretations controllers, reading from the test table. '''
+
+  monkeypatch.setenv('DB_TABLE_NAME', ddb_table)
+  db = ddb_client.Client(ddb_table, False)
+  modules = {}
+  for name in ('variants_controller', 'interpretations_controller'):
+    modules[name] = importlib.import_module(f'src.controllers.{name}')
+    monkeypatch.setattr(modules[name], 'db', db)
+  return modules
+
+def variant(i, **attrs):
+  return dict({ 'PK': f'variant-{i:02d}', 'item_type': 'variant', 'carId': f'CA{i}', 'clinvarVariantId': str(i), 'last_modified': f'2021-01-01T00:00:{i:02d}' }, **attrs)
+
+def interpretation(i, variant_pk):
+  return { 'PK': f'interpretation-{i:02d}', 'item_type': 'interpretation', 'variant': variant_pk, 'last_modified': f'2021-01-01T00:00:{i:02d}' }
+
+def get_event(query_params, path_params=None):
+  return { 'httpMethod': 'GET', 'path': '/', 'pathParameters': path_params, 'queryStringParameters': query_params }
+
+def walk_pages(handle, query_params, path_params=None):
+  ''' Follows the cursors of a paginated endpoint, returning the PKs of each page. '''
+
+  pages = []
+  cursor = None
+  while True:
+    params = dict(query_params, cursor=cursor) if cursor else dict(query_params)
+    response = handle(get_event(params, path_params))
+    assert response['statusCode'] == 200
+    page = json.loads(response['body'])
+    pages.append([item['PK'] for item in page['items']])
+    cursor = page['cursor']
+    if not cursor:
+      return pages
+
+def test_variants_are_listed_a_page_at_a_time(controllers):
+  load_items([variant(i) for i in range(5)])
+
+  pages = walk_pages(controllers['variants_controller'].handle, { 'page_size': '2' })
+
+  assert pages == [['variant-00', 'variant-01'], ['variant-02', 'variant-03'], ['variant-04']]
+
+def test_variants_are_not_listed_without_a_page_size(controllers):
+  response = controllers['variants_controller'].handle(get_event({ 'status': 'in progress' }))
+
+  assert response['statusCode'] == 400
+
+def test_create_or_update_finds_live_variants_by_index(controllers, monkeypatch):
+  load_items([variant(1, status='deleted'), variant(2, PK='variant-02-copy', carId='CA1', clinvarVariantId='2')])
+  variants_controller = controllers['variants_controller']
+  updates = []
+  monkeypatch.setattr(variants_controller, 'update', lambda pk, attrs: updates.append(pk) or { 'statusCode': 200 })
+  monkeypatch.setattr(variants_controller, 'create', lambda attrs: updates.append(None) or { 'statusCode': 201 })
+
+  variants_controller.create_or_update({ 'clinvarVariantId': '1', 'carId': 'CA1' })
+  variants_controller.create_or_update({ 'clinvarVariantId': '3', 'carId': 'CA3' })
+
+  # the deleted variant with clinvarVariantId 1 is skipped, the live one with its CAR ID is updated
+  assert updates == ['variant-02-copy', None]
+
+def test_interpretations_are_listed_a_page_at_a_time(controllers):
+  load_items([interpretation(i, 'variant-01') for i in range(3)])
+
+  pages = walk_pages(controllers['interpretations_controller'].handle, { 'page_size': '2' })
+
+  assert pages == [['interpretation-00', 'interpretation-01'], ['interpretation-02']]
+
+def test_interpretations_of_a_variant_are_listed_a_page_at_a_time(controllers):
+  load_items([interpretation(i, 'variant-01' if i % 2 else 'variant-02') for i in range(5)])
+
+  pages = walk_pages(controllers['interpretations_controller'].handle, { 'page_size': '1' }, { 'pk': 'variant-01' })
+
+  assert [pk for page in pages for pk in page] == ['interpretation-01', 'interpretation-03']
+  assert all(len(page) <= 1 for page in pages)
@@ -0,0 +1,136 @@
+import json
+
+import boto3
+import pytest
+import requests
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from src.clients import response_cache
+from src.db import s3_client
+
+BUCKET = 'test-upstream-cache'
+
+class FakeResponse:
+  def __init__(self, status_code, content=b'', headers=None):
+    self.status_code = status_code
+    self.content = content
+    self.headers = headers or {}
+
+  @property
+  def ok(self):
+    return self.status_code < 400
+
+class FakeUpstream:
+  ''' Stands in for external_http.get, answering from a list of responses (or exceptions). '''
+
+  def __init__(self, *responses):
+    self.responses = list(responses)
+    self.calls = []
+
+  def __call__(self, url, params=None, headers=None, **kwargs):
+    self.calls.append({ 'url': url, 'params': params, 'headers': headers })
+    response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+    if isinstance(response, Exception):
+      raise response
+    return response
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+  monkeypatch.delenv('UPSTREAM_CACHE_BUCKET', raising=False)
+  response_cache.clear()
+  yield
+  response_cache.clear()
+
+@pytest.fixture
+def cache_bucket(monkeypatch):
+  monkeypatch.setattr(s3_client, '_shared_client', None)
+  with mock_aws():
+    boto3.client('s3').create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': 'us-west-2'})
+    monkeypatch.setenv('UPSTREAM_CACHE_BUCKET', BUCKET)
+    yield BUCKET
+
+def expire(source, monkeypatch):
+  monkeypatch.setitem(response_cache.SOURCE_TTLS, source, -1)
+
+def test_normalized_urls_share_an_entry(monkeypatch):
+  upstream = FakeUpstream(FakeResponse(200, b'{"id": 1}'))
+  monkeypatch.setattr(response_cache.external_http, 'get', upstream)
+
+  first = response_cache.get('vep', 'https://REST.example.org/vep/1?b=2&a=1')
+  second = response_cache.get('vep', 'https://rest.example.org/vep/1', params={'a': '1', 'b': 2})
+
+  assert first.json() == second.json() == {'id': 1}
+  assert len(upstream.calls) == 1
+  assert response_cache.stats()['vep'] == { 'memoryHits': 1, 'durableHits': 0, 'misses': 1, 'revalidated': 0, 'staleServed': 0, 'hitRatio': 0.5 }
+
+def test_errors_are_not_cached(monkeypatch):
+  upstream = FakeUpstream(FakeResponse(404, b'not found'), FakeResponse(200, b'<xml/>'))
+  monkeypatch.setattr(response_cache.external_http, 'get', upstream)
+
+  assert response_cache.get('clinvar', 'https://ncbi.example.org/vcv?id=1').status_code == 404
+  assert response_cache.get('clinvar', 'https://ncbi.example.org/vcv?id=1').text == '<xml/>'
+  assert len(upstream.calls) == 2
+
+def test_stale_entries_are_revalidated(monkeypatch):
+  upstream = FakeUpstream(FakeResponse(200, b'{"v": 1}', {'ETag': '"abc"', 'Last-Modified': 'Tue, 01 Jun 2021 00:00:00 GMT'}), FakeResponse(304))
+  monkeypatch.setattr(response_cache.external_http, 'get', upstream)
+
+  response_cache.get('car', 'https://car.example.org/allele/CA1')
+  expire('car', monkeypatch)
+  response = response_cache.get('car', 'https://car.example.org/allele/CA1')
+
+  assert response.json() == {'v': 1}
+  assert upstream.calls[1]['headers'] == { 'If-None-Match': '"abc"', 'If-Modified-Since': 'Tue, 01 Jun 2021 00:00:00 GMT' }
+  assert response_cache.stats()['car']['revalidated'] == 1
+
+def test_stale_entries_are_served_when_upstream_fails(monkeypatch):
+  upstream = FakeUpstream(FakeResponse(200, b'{"v": 1}'), requests.exceptions.ConnectionError('down'), FakeResponse(503))
+  monkeypatch.setattr(response_cache.external_http, 'get', upstream)
+
+  response_cache.get('ldh', 'https://ldh.example.org/Variant/id/CA1')
+  expire('ldh', monkeypatch)
+
+  assert response_cache.get('ldh', 'https://ldh.example.org/Variant/id/CA1').json() == {'v': 1}
+  assert response_cache.get('ldh', 'https://ldh.example.org/Variant/id/CA1').json() == {'v': 1}
+  assert response_cache.stats()['ldh']['staleServed'] == 2
+
+def test_memory_tier_evicts_least_recently_used():
+  lru = response_cache.MemoryLRU(10)
+  for key in ('a', 'b', 'c'):
+    lru.put(key, response_cache.CachedResponse(key, b'1234', {}, 0))
+
+  assert lru.get('a') is None
+  assert lru.get('b') is not None and lru.get('c') is not None
+  assert lru.bytes == 8
+
+def test_durable_tier_is_shared_and_compressed(cache_bucket, monkeypatch):
+  body = json.dumps({'transcripts': ['NM_000001.1'] * 500}).encode('utf-8')
+  upstream = FakeUpstream(FakeResponse(200, body, {'Content-Type': 'application/json', 'ETag': '"v1"'}))
+  monkeypatch.setattr(response_cache.external_http, 'get', upstream)
+
+  response_cache.get('vep', 'https://rest.example.org/vep/1')
+
+  # A new container starts with an empty memory tier
+  response_cache._memory.clear()
+  response = response_cache.get('vep', 'https://rest.example.org/vep/1')
+
+  assert response.content == body
+  assert response.headers['ETag'] == '"v1"'
+  assert len(upstream.calls) == 1
+  assert response_cache.stats()['vep']['durableHits'] == 1
+
+  stored = boto3.client('s3').get_object(Bucket=cache_bucket, Key=response_cache.cache_key('vep', 'https://rest.example.org/vep/1'))
+  assert stored['ContentLength'] < len(body) / 10
+
+def test_only_missing_durable_entries_are_quiet(cache_bucket, monkeypatch, capsys):
+  monkeypatch.setattr(response_cache.external_http, 'get', FakeUpstream(FakeResponse(200, b'<xml/>'), FakeResponse(200, b'<xml/>')))
+
+  response_cache.get('clinvar', 'https://ncbi.example.org/vcv?id=1')
+  assert 'WARNING' not in capsys.readouterr().out
+
+  def access_denied(**kwargs):
+    raise ClientError({ 'Error': { 'Code': 'AccessDenied', 'Message': 'Access Denied' } }, 'GetObject')
+  monkeypatch.setattr(s3_client.get_shared_client().s3_client, 'get_object', access_denied)
+  response_cache.get('clinvar', 'https://ncbi.example.org/vcv?id=2')
+  assert 'WARNING: Upstream cache read error' in capsys.readouterr().out
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import boto3
+import pytest
+import simplejson as json
+
+from moto import mock_aws
+
+from src.db.s3_client import Client as S3Client
+from src.helpers import snapshot_helpers
+from src.helpers import snapshot_report_helpers
+
+BUCKET = 'snapshot-archive'
+
+
+@pytest.fixture
+def s3_archives():
+  ''' Yields a function that uploads curation data and returns its archive key. '''
+
+  with mock_aws():
+    boto3.client('s3').create_bucket(Bucket=BUCKET, CreateBucketConfiguration={ 'LocationConstraint': 'us-west-2' })
+
+    def upload(key, curation):
+      boto3.client('s3').put_object(Bucket=BUCKET, Key=key, Body=json.dumps(curation))
+      return f'{BUCKET}/{key}'
+    yield upload
+
+
+class ConcurrencyTrackingS3Client(S3Client):
+  ''' Records the highest number of concurrent get_object calls. '''
+
+  def __init__(self):
+    super().__init__()
+    self.active = 0
+    self.max_active = 0
+    self.lock = threading.Lock()
+
+  def get_object(self, bucket, key):
+    with self.lock:
+      self.active += 1
+      self.max_active = max(self.max_active, self.active)
+    try:
+      time.sleep(0.01)
+      return super().get_object(bucket, key)
+    finally:
+      with self.lock:
+        self.active -= 1
+
+
+def test_iter_from_archives_keeps_order_and_bounds_concurrency(s3_archives):
+  keys = [s3_archives(f'gdm-{i}.json', { 'PK': f'gdm-{i}', 'score': 1.5 }) for i in range(20)]
+  s3_client = ConcurrencyTrackingS3Client()
+
+  curations = list(snapshot_helpers.iter_from_archives(keys, max_workers=4, s3_client=s3_client))
+
+  assert [c['PK'] for c in curations] == [f'gdm-{i}' for i in range(20)]
+  assert str(curations[0]['score']) == '1.5'
+  assert 1 < s3_client.max_active <= 4
+
+def test_iter_from_archives_raises_failed_archive_in_order(s3_archives):
+  keys = [s3_archives('gdm-0.json', { 'PK': 'gdm-0' }), f'{BUCKET}/missing.json', None]
+  curations = snapshot_helpers.iter_from_archives(keys, max_workers=2, s3_client=S3Client())
+
+  assert next(curations)['PK'] == 'gdm-0'
+  with pytest.raises(Exception):
+    next(curations)
+
+def test_summary_report_reads_every_archive(s3_archives):
+  snapshots = [
+    {
+      'PK': f'snapshot-{i}',
+      'resource': { 'affiliation': '10007' },
+      'resourceParent': { 's3_archive_key': s3_archives(f'gdm-{i}.json', { 'PK': f'gdm-{i}', 'annotations': [] }) }
+    }
+    for i in range(5)
+  ] + [{ 'PK': 'snapshot-unarchived', 'resource': {}, 'resourceParent': {} }]
+
+  assert snapshot_report_helpers.generate_gci_summary_report({ 'affiliation': '10007' }, snapshots) == \
+    { 'statusCode': 200, 'body': '[]' }
+
+  snapshots[2]['resourceParent']['s3_archive_key'] = f'{BUCKET}/missing.json'
+  assert snapshot_report_helpers.generate_gci_summary_report({ 'affiliation': '10007' }, snapshots)['statusCode'] == 400
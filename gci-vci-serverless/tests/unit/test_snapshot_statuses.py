@@ -0,0 +1,116 @@
+import copy
+
+from src.helpers import gdm_helpers, interpretation_helpers
+
+AFFILIATION = '10007'
+
+
+class RoundTripCountingDb:
+  ''' In-memory stand-in for the DynamoDB client that counts `find()` and `all()` round trips. '''
+
+  def __init__(self, items):
+    self.items = { item['PK']: item for item in items }
+    self.round_trips = 0
+
+  def find(self, pk):
+    self.round_trips += 1
+    return copy.deepcopy(self.items.get(pk))
+
+  def all(self, pks):
+    self.round_trips += 1
+    return [copy.deepcopy(self.items[pk]) for pk in dict.fromkeys(pks) if pk in self.items]
+
+
+def snapshot(pk, status):
+  return {
+    'PK': pk, 'item_type': 'snapshot', 'last_modified': '2020-01-01',
+    'resource': { 'classificationStatus': status, 'approvedClassification': status == 'Approved' }
+  }
+
+def build_gdm_fixture(gdm_count=500):
+  ''' Builds GDMs whose provisional classifications alternate between approved, provisional and in progress.
+
+  Every GDM also carries a classification from another affiliation, which must be ignored.
+  '''
+
+  items = []
+  gdms = []
+  for i in range(gdm_count):
+    status = ['Approved', 'Provisional', 'In progress'][i % 3]
+    snapshots = [snapshot(f'snapshot-{i}-{s}', status) for s in range(2)]
+    items.extend(snapshots)
+    items.append({
+      'PK': f'provisional-other-{i}', 'item_type': 'provisionalClassification', 'affiliation': 'other',
+      'classificationStatus': 'Approved'
+    })
+    items.append({
+      'PK': f'provisional-{i}', 'item_type': 'provisionalClassification', 'affiliation': AFFILIATION,
+      'classificationStatus': status, 'autoClassification': 'Moderate', 'approvedClassification': status == 'Approved',
+      'rid': f'provisional-{i}', 'associatedClassificationSnapshots': [
+        snapshots[0]['PK'], { 'uuid': snapshots[1]['PK'] }, 'snapshot-deleted'
+      ]
+    })
+    gdms.append({ 'PK': f'gdm-{i}', 'provisionalClassifications': [f'provisional-other-{i}', f'provisional-{i}'] })
+  gdms.append({ 'PK': 'gdm-unclassified' })
+  return gdms, items
+
+def build_interpretation_fixture(interpretation_count=500):
+  items = []
+  interpretations = []
+  for i in range(interpretation_count):
+    status = ['Approved', 'Provisional', 'In progress'][i % 3]
+    snapshots = [snapshot(f'snapshot-{i}-{s}', status) for s in range(2)]
+    items.extend(snapshots)
+    interpretations.append({
+      'PK': f'interpretation-{i}',
+      'provisionalVariant': { 'classificationStatus': status, 'alteredClassification': 'Benign', 'rid': f'provisional-{i}' },
+      'snapshots': [s['PK'] for s in snapshots] + ['snapshot-deleted']
+    })
+  return interpretations, items
+
+
+def test_gdm_snapshot_statuses_use_constant_round_trips():
+  gdms, items = build_gdm_fixture()
+  db = RoundTripCountingDb(items)
+
+  gdm_helpers.appendSnapshotStatuses(db, gdms, { 'affiliation': AFFILIATION })
+
+  # one read for the provisional classifications, one for their snapshots
+  assert db.round_trips == 2
+
+def test_gdm_snapshot_statuses():
+  gdms, items = build_gdm_fixture(gdm_count=3)
+
+  gdm_helpers.appendSnapshotStatuses(RoundTripCountingDb(items), gdms, { 'affiliation': AFFILIATION })
+
+  approved, provisional, in_progress, unclassified = gdms
+  assert approved['autoClassification'] == 'Moderate'
+  assert [s.get('classificationStatus') for s in approved['snapshotStatuses']] == [None, 'Approved']
+  assert provisional['snapshotStatuses'] == [
+    { 'PK': 'snapshot-1-0', 'last_modified': '2020-01-01', 'classificationStatus': 'Provisional', 'approvedClassification': False },
+    { 'PK': 'snapshot-1-1', 'last_modified': '2020-01-01', 'classificationStatus': 'Provisional', 'approvedClassification': False },
+  ]
+  assert [s['PK'] for s in in_progress['snapshotStatuses']] == ['snapshot-2-0', 'snapshot-2-1']
+  assert unclassified['snapshotStatuses'] == []
+
+def test_gdm_snapshot_statuses_require_affiliation():
+  gdms, items = build_gdm_fixture(gdm_count=3)
+  db = RoundTripCountingDb(items)
+
+  gdm_helpers.appendSnapshotStatuses(db, gdms, {})
+
+  assert db.round_trips == 0
+  assert all('snapshotStatuses' not in gdm for gdm in gdms[:3])
+
+def test_interpretation_snapshot_statuses_use_one_round_trip():
+  interpretations, items = build_interpretation_fixture()
+  db = RoundTripCountingDb(items)
+
+  interpretation_helpers.appendSnapshotStatuses(db, interpretations, { 'affiliation': AFFILIATION })
+
+  assert db.round_trips == 1
+  approved, provisional = interpretations[0], interpretations[1]
+  assert approved['alteredClassification'] == 'Benign'
+  assert len(approved['snapshotStatuses']) == 2
+  assert [s['PK'] for s in provisional['snapshotStatuses']] == ['snapshot-1-0', 'snapshot-1-1']
+  assert 'provisionalVariant' not in provisional
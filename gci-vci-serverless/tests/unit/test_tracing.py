@@ -0,0 +1,71 @@
+import json
+
+from src.db import ddb_client
+from src.utils import tracing
+from tests.ddb_table import load_items
+
+def make_items(count):
+  return [
+    { 'PK': f'pk-{i:05d}', 'item_type': 'variant', 'last_modified': '2020-03-22T17:52:33' }
+    for i in range(count)
+  ]
+
+def test_span_is_a_noop_without_a_trace():
+  assert tracing.current_trace() is None
+  with tracing.span('dynamodb', 'GetItem') as span:
+    span.add(items=1)
+  assert span is tracing._NOOP_SPAN
+
+def test_unsampled_request_prints_nothing(capsys):
+  with tracing.request_trace(sample_rate=0) as trace:
+    assert trace is None
+    with tracing.span('http', 'example.org'):
+      pass
+
+  assert capsys.readouterr().out == ''
+
+def test_traced_is_identity_when_disabled(monkeypatch):
+  monkeypatch.setattr(tracing, 'SAMPLE_RATE', 0)
+
+  def handler():
+    return 1
+
+  assert tracing.traced('function')(handler) is handler
+
+def test_request_summary_reports_dynamodb_calls(ddb_table, capsys):
+  load_items(make_items(3))
+  test_client = ddb_client.Client(ddb_table, False)
+
+  with tracing.request_trace(sample_rate=1) as trace:
+    trace.set(Route='/variants')
+    with tracing.span('route', 'variants_controller'):
+      test_client.find('pk-00001')
+      test_client.all(['pk-00000', 'pk-00002'])
+
+  summary = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+
+  assert tracing.current_trace() is None
+  assert summary['Route'] == '/variants'
+  assert summary['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Route']]
+  assert summary['DynamoDBCalls'] == 2
+  assert summary['DynamoDBTime'] >= 0
+  assert 'Duration' in summary
+
+  spans = { (s['kind'], s['name']): s for s in summary['spans'] }
+  assert spans[('route', 'variants_controller')]['count'] == 1
+  assert spans[('dynamodb', 'GetItem')]['count'] == 1
+  assert spans[('dynamodb', 'BatchGetItem')]['count'] == 1
+
+def test_queries_report_pages_and_items(ddb_table, capsys):
+  load_items(make_items(5))
+  test_client = ddb_client.Client(ddb_table, False)
+
+  with tracing.request_trace(sample_rate=1):
+    test_client.query_by_item_type('variant')
+
+  summary = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+  query = [s for s in summary['spans'] if s['kind'] == 'dynamodb' and s['name'] == 'Query'][0]
+
+  assert query['pages'] >= 1
+  assert query['items'] == 5
+  assert summary.get('DynamoDBConsumedCapacity', 0) == query.get('consumedCapacity', 0)
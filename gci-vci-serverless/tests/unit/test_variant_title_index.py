@@ -0,0 +1,95 @@
+import pytest
+
+from src.db import ddb_client
+from src.helpers import interpretation_helpers
+from src.helpers.variant_title_index import VariantTitleIndex
+from tests.ddb_table import load_items
+
+
+def variant(i, **attrs):
+  return {
+    'PK': f'variant-{i}',
+    'item_type': 'variant',
+    'last_modified': '2021-01-01T00:00:00',
+    'preferredTitle': f'NM_000151.4(G6PC):c.{i}C>T',
+    'carId': f'CA{i}',
+    'hgvsNames': { 'GRCh38': f'NC_000017.11:g.{i}C>T', 'others': ['NM_000151.4:c.1C>T'] * 20 },
+    'molecularConsequenceList': [{ 'term': 'missense variant' }],
+    **attrs
+  }
+
+@pytest.fixture
+def db(ddb_table):
+  load_items([variant(i) for i in range(5)])
+  return ddb_client.Client(ddb_table, False)
+
+def test_lookup_returns_compact_records_for_requested_variants(db):
+  index = VariantTitleIndex()
+
+  records = index.lookup(db, ['variant-1', 'variant-3', 'variant-1', None, 'variant-missing'])
+
+  assert sorted(records) == ['variant-1', 'variant-3']
+  assert records['variant-1'] == {
+    'PK': 'variant-1',
+    'preferredTitle': 'NM_000151.4(G6PC):c.1C>T',
+    'clinvarVariantTitle': None,
+    'carId': 'CA1',
+    'hgvsNames': { 'GRCh38': 'NC_000017.11:g.1C>T' },
+    'last_modified': '2021-01-01T00:00:00',
+  }
+
+def test_lookup_serves_warm_records_without_reading(db):
+  index = VariantTitleIndex()
+  index.lookup(db, ['variant-1'])
+  db.ddb_client = None
+
+  assert index.lookup(db, ['variant-1'])['variant-1']['carId'] == 'CA1'
+  assert index.stats()['hits'] == 1
+
+def test_lookup_rereads_expired_records(db):
+  index = VariantTitleIndex(max_age=0)
+  index.lookup(db, ['variant-1'])
+  load_items([variant(1, preferredTitle='updated elsewhere', last_modified='2021-02-01T00:00:00')])
+
+  assert index.lookup(db, ['variant-1'])['variant-1']['preferredTitle'] == 'updated elsewhere'
+
+def test_record_keeps_the_newest_version():
+  index = VariantTitleIndex()
+  index.record(variant(1, preferredTitle='newer', last_modified='2021-02-01T00:00:00'))
+  version = index.version
+
+  stored = index.record(variant(1, preferredTitle='older', last_modified='2021-01-01T00:00:00'))
+
+  assert stored['preferredTitle'] == 'newer'
+  assert index.version == version
+
+def test_record_of_an_older_version_refreshes_the_newer_record(db):
+  index = VariantTitleIndex(max_age=60)
+  index.record(variant(1, preferredTitle='newer', last_modified='2021-02-01T00:00:00'), loaded_at=0)
+
+  index.record(variant(1, preferredTitle='older', last_modified='2021-01-01T00:00:00'))
+  db.ddb_client = None
+
+  assert index.lookup(db, ['variant-1'])['variant-1']['preferredTitle'] == 'newer'
+  assert index.stats()['hits'] == 1
+
+def test_record_evicts_least_recently_used_entries():
+  index = VariantTitleIndex(max_entries=2)
+  for i in range(3):
+    index.record(variant(i))
+
+  assert index.stats()['entries'] == 2
+
+def test_append_variant_title_only_reads_referenced_variants(db, monkeypatch):
+  monkeypatch.setattr(interpretation_helpers, 'variant_title_index', VariantTitleIndex())
+  interpretations = [
+    { 'PK': 'interpretation-1', 'variant': 'variant-2', 'snapshotStatuses': [] },
+    { 'PK': 'interpretation-2', 'variant': 'variant-4', 'snapshotStatuses': [] },
+  ]
+
+  result = interpretation_helpers.append_variant_title(db, interpretations)
+
+  assert [(i['PK'], i['preferredTitle']) for i in result] == [
+    ('interpretation-1', 'NM_000151.4(G6PC):c.2C>T'),
+    ('interpretation-2', 'NM_000151.4(G6PC):c.4C>T'),
+  ]
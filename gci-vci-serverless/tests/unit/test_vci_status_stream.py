@@ -0,0 +1,241 @@
+import boto3
+import pytest
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from ddb_stream_interp_count.dynamodb.client import DynamoClient
+from ddb_stream_interp_count.reconcile import reconcile
+from ddb_stream_interp_count.vci_status import REMOVED, VciStatusAggregator, interpretation_statuses
+from tests.ddb_table import create_table
+
+VP_TABLE_NAME = 'TEST_VP_TABLE'
+
+type_serializer = TypeSerializer()
+
+
+def create_vp_table():
+  boto3.client('dynamodb').create_table(
+    TableName=VP_TABLE_NAME,
+    BillingMode='PAY_PER_REQUEST',
+    AttributeDefinitions=[
+      {'AttributeName': 'PK', 'AttributeType': 'S'},
+      {'AttributeName': 'carId', 'AttributeType': 'S'},
+    ],
+    KeySchema=[{'AttributeName': 'PK', 'KeyType': 'HASH'}],
+    GlobalSecondaryIndexes=[{
+      'IndexName': 'carId_index',
+      'KeySchema': [{'AttributeName': 'carId', 'KeyType': 'HASH'}],
+      'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['rid', 'clinvarVariantId']},
+    }],
+  )
+
+
+def stream_record(sequence_number, event_name, old_item=None, new_item=None):
+  record = { 'eventName': event_name, 'dynamodb': { 'SequenceNumber': str(sequence_number) } }
+  if old_item is not None:
+    record['dynamodb']['OldImage'] = { k: type_serializer.serialize(v) for k, v in old_item.items() }
+  if new_item is not None:
+    record['dynamodb']['NewImage'] = { k: type_serializer.serialize(v) for k, v in new_item.items() }
+  return record
+
+
+def interpretation(pk, variant='variant-1', affiliation='10007', snapshots=None):
+  item = { 'PK': pk, 'item_type': 'interpretation', 'variant': variant, 'last_modified': '2021-08-06' }
+  # Individual interpretations have no affiliation
+  if affiliation is not None:
+    item['affiliation'] = affiliation
+  if snapshots is not None:
+    item['snapshots'] = snapshots
+  return item
+
+
+def snapshot(pk, status):
+  return { 'PK': pk, 'item_type': 'snapshot', 'approvalStatus': status, 'last_modified': '2021-08-06' }
+
+
+@pytest.fixture
+def tables():
+  ''' Yields (GVC table, VP table) clients, with variant-1 (CA1) and variant-2 (CA2) in both. '''
+
+  with mock_aws():
+    create_table()
+    create_vp_table()
+    gvc_table = DynamoClient('TEST_TABLE')
+    vp_table = DynamoClient(VP_TABLE_NAME)
+    for index in (1, 2):
+      gvc_table.table.put_item(Item={ 'PK': f'variant-{index}', 'item_type': 'variant', 'carId': f'CA{index}', 'last_modified': '2021-08-06' })
+      vp_table.table.put_item(Item={ 'PK': f'vp-{index}', 'carId': f'CA{index}' })
+    yield gvc_table, vp_table
+
+
+def count_calls(client, operation):
+  calls = []
+  client.table.meta.client.meta.events.register(f'before-call.dynamodb.{operation}', lambda **kwargs: calls.append(operation))
+  return calls
+
+
+def vci_status(vp_table, pk='vp-1'):
+  item = vp_table.table.get_item(Key={ 'PK': pk })['Item']
+  vci_status = {}
+  for group, counts in item.get('vciStatus', {}).items():
+    group_counts = { key: int(count) for key, count in counts.items() if count }
+    if group_counts:
+      vci_status[group] = group_counts
+  return vci_status
+
+
+def test_interpretation_statuses_match_load_vci_status():
+  statuses = { 's-1': 'Provisioned', 's-2': 'Approved', 's-3': 'Provisioned' }
+
+  assert interpretation_statuses({}, statuses) == 'i'
+  assert interpretation_statuses({ 'snapshots': [] }, statuses) == 'i'
+  assert interpretation_statuses({ 'snapshots': ['s-1', 's-3'] }, statuses) == 'p'
+  assert interpretation_statuses({ 'snapshots': ['s-2', 's-1'] }, statuses) == 'pa'
+  # Snapshots that cannot be found are ignored
+  assert interpretation_statuses({ 'snapshots': ['s-9'] }, statuses) == 'i'
+
+def test_batch_is_coalesced_into_one_counts_update_per_variant(tables):
+  gvc_table, vp_table = tables
+  gvc_table.table.put_item(Item=snapshot('s-0', 'Approved'))
+  aggregator = VciStatusAggregator(gvc_table, vp_table)
+  # s-1 is created in the batch, and read from its stream image
+  records = [
+    stream_record(1, 'INSERT', new_item=interpretation('int-1')),
+    stream_record(2, 'INSERT', new_item=snapshot('s-1', 'Provisioned')),
+    stream_record(3, 'MODIFY', interpretation('int-1'), interpretation('int-1', snapshots=['s-1'])),
+    stream_record(4, 'INSERT', new_item=interpretation('int-2', affiliation=None)),
+    stream_record(5, 'INSERT', new_item=interpretation('int-3', variant='variant-2', affiliation='10008', snapshots=['s-0'])),
+    stream_record(6, 'MODIFY', interpretation('int-2', affiliation=None), interpretation('int-2', affiliation=None)),
+  ]
+  updates = count_calls(vp_table, 'UpdateItem')
+  batch_gets = count_calls(gvc_table, 'BatchGetItem')
+
+  assert aggregator.handle_records(records) == []
+  assert vci_status(vp_table) == { '10007': { 'p': 1 }, 'a': { 'p': 1 }, 'd': { 'i': 1 } }
+  assert vci_status(vp_table, 'vp-2') == { '10008': { 'a': 1 }, 'a': { 'a': 1 } }
+  # Per variant: one failed counts update, two to create the maps, the counts update
+  assert len(updates) == 8
+  # s-0 in one request, the carIds of both variants in another
+  assert len(batch_gets) == 2
+
+  updates.clear()
+  gvc_table.table.put_item(Item=snapshot('s-1', 'Provisioned'))
+  assert aggregator.handle_records([stream_record(7, 'MODIFY', interpretation('int-1', snapshots=['s-1']), interpretation('int-1', snapshots=['s-1', 's-0']))]) == []
+  assert vci_status(vp_table) == { '10007': { 'p': 1, 'a': 1 }, 'a': { 'p': 1, 'a': 1 }, 'd': { 'i': 1 } }
+  assert len(updates) == 1
+
+def test_retried_batches_are_applied_once(tables):
+  gvc_table, vp_table = tables
+  aggregator = VciStatusAggregator(gvc_table, vp_table)
+  gvc_table.table.put_item(Item=snapshot('s-1', 'Provisioned'))
+  gvc_table.table.put_item(Item=snapshot('s-2', 'Approved'))
+  records = [
+    stream_record(1, 'INSERT', new_item=interpretation('int-1')),
+    stream_record(2, 'MODIFY', interpretation('int-1'), interpretation('int-1', snapshots=['s-1'])),
+    stream_record(3, 'MODIFY', interpretation('int-1', snapshots=['s-1']), interpretation('int-1', snapshots=['s-1', 's-2'])),
+    stream_record(4, 'INSERT', new_item=interpretation('int-2', affiliation='10008')),
+  ]
+
+  assert aggregator.handle_records(records[:2]) == []
+  # The same batch again, then one that starts inside the first and goes further
+  assert aggregator.handle_records(records[:2]) == []
+  assert aggregator.handle_records(records[1:]) == []
+  assert aggregator.handle_records(records[1:]) == []
+  assert vci_status(vp_table) == {
+    '10007': { 'p': 1, 'a': 1 },
+    '10008': { 'i': 1 },
+    'a': { 'i': 1, 'p': 1, 'a': 1 },
+  }
+
+  removal = [stream_record(5, 'REMOVE', old_item=interpretation('int-2', affiliation='10008'))]
+  assert aggregator.handle_records(removal) == []
+  assert aggregator.handle_records(removal) == []
+  assert vci_status(vp_table) == { '10007': { 'p': 1, 'a': 1 }, 'a': { 'p': 1, 'a': 1 } }
+  item = vp_table.table.get_item(Key={ 'PK': 'vp-1' })['Item']
+  assert item['vciStatusCounted'] == { 'int-1': '10007:pa', 'int-2': REMOVED }
+
+def test_counts_loaded_without_markers_are_updated(tables):
+  gvc_table, vp_table = tables
+  gvc_table.table.put_item(Item=snapshot('s-1', 'Approved'))
+  # As written by load_vciStatus.py
+  vp_table.table.put_item(Item={ 'PK': 'vp-1', 'carId': 'CA1', 'vciStatus': {
+    '10007': { 'i': 2, 'a': 0, 'p': 0 }, 'a': { 'i': 2, 'a': 0, 'p': 0 }, 'd': { 'i': 1, 'a': 0, 'p': 0 },
+  } })
+  aggregator = VciStatusAggregator(gvc_table, vp_table)
+
+  assert aggregator.handle_records([
+    stream_record(1, 'MODIFY', interpretation('int-1'), interpretation('int-1', snapshots=['s-1'])),
+    stream_record(2, 'REMOVE', old_item=interpretation('int-3', affiliation=None)),
+  ]) == []
+  assert vci_status(vp_table) == { '10007': { 'i': 1, 'a': 1 }, 'a': { 'i': 1, 'a': 1 } }
+
+def test_variants_that_cannot_be_updated_are_reported(tables):
+  gvc_table, vp_table = tables
+  gvc_table.table.put_item(Item={ 'PK': 'variant-3', 'item_type': 'variant', 'last_modified': '2021-08-06' })
+  aggregator = VciStatusAggregator(gvc_table, vp_table)
+  update_item = vp_table.update_item
+  def throttled_update_item(pk, keyname, **kwargs):
+    if pk == 'vp-2':
+      raise ClientError({ 'Error': { 'Code': 'ProvisionedThroughputExceededException', 'Message': 'Throttled' } }, 'UpdateItem')
+    return update_item(pk, keyname, **kwargs)
+  vp_table.update_item = throttled_update_item
+  records = [
+    stream_record(1, 'INSERT', new_item=interpretation('int-1', variant='variant-3')),
+    stream_record(2, 'INSERT', new_item=interpretation('int-2', variant='variant-2', affiliation=None)),
+    stream_record(3, 'INSERT', new_item=interpretation('int-3')),
+    stream_record(4, 'INSERT', new_item=interpretation('int-4', variant='variant-2', affiliation=None)),
+  ]
+
+  failed = aggregator.handle_records(records)
+
+  # variant-3 has no carId and is skipped; the update of variant-2 is throttled
+  assert failed == [records[1]]
+  assert vci_status(vp_table) == { '10007': { 'i': 1 }, 'a': { 'i': 1 } }
+
+def test_reconcile_reports_and_repairs_drift(tables):
+  gvc_table, vp_table = tables
+  gvc_table.table.put_item(Item=snapshot('s-1', 'Provisioned'))
+  gvc_table.table.put_item(Item=interpretation('int-1', snapshots=['s-1']))
+  gvc_table.table.put_item(Item=interpretation('int-2', affiliation=None))
+  vp_table.table.put_item(Item={ 'PK': 'vp-1', 'carId': 'CA1', 'vciStatus': { '10007': { 'i': 1, 'p': 0 }, 'a': { 'i': 1 }, 'd': { 'i': 1 } } })
+  vp_table.table.put_item(Item={ 'PK': 'vp-2', 'carId': 'CA2', 'vciStatus': { 'd': { 'i': 1 } }, 'vciStatusVersion': 3 })
+
+  report = reconcile(gvc_table, vp_table)
+
+  assert report['checked'] == 2
+  assert report['drifted'] == [
+    { 'carId': 'CA1', 'PK': 'vp-1', 'expected': { '10007': { 'p': 1 }, 'a': { 'p': 1 }, 'd': { 'i': 1 } }, 'actual': { '10007': { 'i': 1 }, 'a': { 'i': 1 }, 'd': { 'i': 1 } } },
+    { 'carId': 'CA2', 'PK': 'vp-2', 'expected': {}, 'actual': { 'd': { 'i': 1 } } },
+  ]
+  assert report['repaired'] == 0
+
+  report = reconcile(gvc_table, vp_table, repair=True)
+  assert report['repaired'] == 2
+  assert vci_status(vp_table) == { '10007': { 'p': 1 }, 'a': { 'p': 1 }, 'd': { 'i': 1 } }
+  assert vci_status(vp_table, 'vp-2') == {}
+  assert reconcile(gvc_table, vp_table)['drifted'] == []
+
+  # The stream processor carries on from the markers the repair wrote
+  aggregator = VciStatusAggregator(gvc_table, vp_table)
+  assert aggregator.handle_records([stream_record(1, 'REMOVE', old_item=interpretation('int-2', affiliation=None))]) == []
+  assert vci_status(vp_table) == { '10007': { 'p': 1 }, 'a': { 'p': 1 } }
+
+def test_reconcile_does_not_overwrite_concurrent_updates(tables):
+  gvc_table, vp_table = tables
+  gvc_table.table.put_item(Item=interpretation('int-1'))
+  vp_table.table.put_item(Item={ 'PK': 'vp-1', 'carId': 'CA1', 'vciStatus': {}, 'vciStatusVersion': 1 })
+
+  scan_all = vp_table.scan_all
+  def scan_then_update(*args, **kwargs):
+    items = scan_all(*args, **kwargs)
+    vp_table.table.update_item(Key={ 'PK': 'vp-1' }, UpdateExpression='ADD vciStatusVersion :one', ExpressionAttributeValues={ ':one': 1 })
+    return items
+  vp_table.scan_all = scan_then_update
+
+  report = reconcile(gvc_table, vp_table, repair=True)
+
+  assert report['skipped'] == 1
+  assert report['repaired'] == 0
+  assert vci_status(vp_table) == {}